@@ -1,25 +1,34 @@
 import streamlit as st
 import traceback
 import time
-import gc
-from itertools import groupby
-import pandas as pd
 import math
 import io
-import os
-import shutil
-import tempfile
-import subprocess
-import re
-import requests
+import sys
+import json
+import hashlib
+import zipfile
+import pandas as pd
 from datetime import timedelta, datetime, date
-from copy import copy
 
-# Excel 處理相關庫
-import openpyxl
-from openpyxl.utils import get_column_letter, column_index_from_string
-from openpyxl.styles import Alignment, Font, Border, Side, PatternFill
-from openpyxl.drawing.image import Image as OpenpyxlImage
+# 核心邏輯 (設定檔、運算、渲染、上傳、工作佇列) 皆在 cuesheet 套件，本檔只負責 Streamlit 介面
+from cuesheet.settings import GSHEET_SHARE_URL, REGIONS_ORDER, DURATIONS, CUE_FORMATS, JOB_POLL_INTERVAL, PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE, RAGIC_API_KEY, RAGIC_API_URL
+from cuesheet.helpers import safe_filename, get_remarks_text, format_campaign_details
+from cuesheet.config import get_config_store, load_config_from_cloud
+from cuesheet.pricing import calculate_plan_data, PricingEngine, sweep_scenarios, SWEEP_OBJECTIVES
+from cuesheet.html_preview import generate_html_preview, preview_periods, default_granularity, PREVIEW_GRANULARITIES
+from cuesheet.assets import get_cloud_logo_bytes
+from cuesheet.httpclient import get_http_client
+from cuesheet.soffice import get_soffice_pool
+from cuesheet.excel import get_skeleton_cache
+from cuesheet.cache import get_artifact_cache, plan_fingerprint, renderer_fingerprint, cached_excel, pdf_cache_kind, pdf_cache_kinds
+from cuesheet.batch import BATCH_TEMPLATE, read_batch_orders
+from cuesheet.portfolio import Portfolio, month_window
+from cuesheet.ragic import RAGIC_FIELDS, fetch_ragic_records, set_ragic_api_key
+from cuesheet.jobs import get_job_queue, JOB_ACTIVE
+from cuesheet.inventory import get_inventory_ledger, capacity_limits, ALL_SECONDS
+from cuesheet.plan_store import get_plan_store, plan_record_id
+from cuesheet.plan_diff import PlanVersion, PlanDiff, diff_report_html, diff_report_xlsx
+from cuesheet import metrics
 
 # =========================================================
 # 1. 頁面設定 (Page Config) - 必須放在最上方
@@ -36,8 +45,8 @@ st.set_page_config(
 # =========================================================
 # 2. Session State 初始化 (State Initialization)
 # =========================================================
-DEFAULT_RAGIC_URL = "https://ap15.ragic.com/liuskyo/cue/2" 
-DEFAULT_RAGIC_KEY = "L04zZGhrVmtTV3pqN1VLbUpnOFZMa01NTHh3OUw3RUVlb0ovNXUrTXJsaGJhMWpKOUxHanFUODREMmN1dEZvcw==" 
+DEFAULT_RAGIC_URL = RAGIC_API_URL
+DEFAULT_RAGIC_KEY = RAGIC_API_KEY   # 可由環境變數 CUE_RAGIC_KEY 設定
 
 DEFAULT_STATES = {
     "is_supervisor": False,      # 主管權限開關
@@ -49,7 +58,8 @@ DEFAULT_STATES = {
     "cb_cf": False,              # 啟用家樂福
     "ragic_url": DEFAULT_RAGIC_URL,
     "ragic_key": DEFAULT_RAGIC_KEY,
-    "ragic_confirm_state": False # 上傳確認視窗狀態
+    "ragic_confirm_state": False, # 上傳確認視窗狀態
+    "pdf_engine": "WeasyPrint"   # PDF 引擎 (WeasyPrint 原生 / LibreOffice)
 }
 
 for key, default_val in DEFAULT_STATES.items():
@@ -57,319 +67,10 @@ for key, default_val in DEFAULT_STATES.items():
         st.session_state[key] = default_val
 
 # =========================================================
-# 3. 全域常數設定 (Global Constants)
-# =========================================================
-GSHEET_SHARE_URL = "https://docs.google.com/spreadsheets/d/1bzmG-N8XFsj8m3LUPqA8K70AcIqaK4Qhq1VPWcK0w_s/edit?usp=sharing"
-BOLIN_LOGO_URL = "https://docs.google.com/drawings/d/17Uqgp-7LJJj9E4bV7Azo7TwXESPKTTIsmTbf-9tU9eE/export/png"
-
-FONT_MAIN = "微軟正黑體"
-BS_THIN = 'thin'
-BS_MEDIUM = 'medium'
-BS_HAIR = 'hair'
-FMT_MONEY = '"$"#,##0_);[Red]("$"#,##0)'
-FMT_NUMBER = '#,##0'
-
-REGIONS_ORDER = ["北區", "桃竹苗", "中區", "雲嘉南", "高屏", "東區"]
-DURATIONS = [5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
-REGION_DISPLAY_MAP = {
-    "北區": "北區-北北基",
-    "桃竹苗": "桃區-桃竹苗",
-    "中區": "中區-中彰投",
-    "雲嘉南": "雲嘉南區-雲嘉南",
-    "高屏": "高屏區-高屏",
-    "東區": "東區-宜花東",
-    "全省量販": "全省量販",
-    "全省超市": "全省超市"
-}
-
-# =========================================================
-# 4. 基礎工具函式 (Helper Functions)
-# =========================================================
-
-def parse_count_to_int(x):
-    if x is None: return 0
-    if isinstance(x, (int, float)): return int(x)
-    s = str(x)
-    m = re.findall(r"[\d,]+", s)
-    return int(m[0].replace(",", "")) if m else 0
-
-def safe_filename(name: str) -> str:
-    return re.sub(r'[\\/*?:"<>|]', "_", name).strip()
-
-def html_escape(s):
-    if s is None: return ""
-    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;").replace("'", "&#39;")
-
-def region_display(region):
-    return REGION_DISPLAY_MAP.get(region, region)
-
-def get_sec_factor(media_type, seconds, sec_factors):
-    """取得秒數加成係數 (Factor)。"""
-    factors = sec_factors.get(media_type)
-    if not factors:
-        if media_type == "新鮮視": factors = sec_factors.get("全家新鮮視")
-        elif media_type == "全家廣播": factors = sec_factors.get("全家廣播")
-    if not factors: return 1.0
-    if seconds in factors: return factors[seconds]
-    for base in [10, 20, 15, 30]:
-        if base in factors: return (seconds / base) * factors[base]
-    return 1.0
-
-def calculate_schedule(total_spots, days):
-    if days <= 0: return []
-    if total_spots % 2 != 0: total_spots += 1
-    base, rem = divmod(total_spots // 2, days)
-    sch = [base + (1 if i < rem else 0) for i in range(days)]
-    return [x * 2 for x in sch]
-
-def get_remarks_text(sign_deadline, billing_month, payment_date):
-    d_str = sign_deadline.strftime("%Y/%m/%d (%a)") if sign_deadline else "____/__/__ (__)"
-    p_str = payment_date.strftime("%Y/%m/%d") if payment_date else "____/__/__"
-    return [
-        f"1.請於 {d_str} 11:30前 回簽及進單，方可順利上檔。",
-        "2.以上節目名稱如有異動，以上檔時節目名稱為主，如遇電台時段滿檔，上檔時間挪後或更換至同級時段。",
-        "3.通路店鋪數與開機率開機率至少七成(以上)。每日因加盟數調整，或遇店舖年度季度改裝、設備維護升級及保修等狀況，會有一定幅度增減。",
-        "4.託播方需於上檔前 5 個工作天，提供廣告帶(mp3)、影片/影像 1920x1080 (mp4)。",
-        f"5.雙方同意費用請款月份 : {billing_month}，如有修正必要，將另行E-Mail告知，並視為正式合約之一部分。",
-        f"6.付款兌現日期：{p_str}"
-    ]
-
-def format_campaign_details(config):
-    details = []
-    for media, settings in config.items():
-        sec_str = ", ".join([f"{s}秒({p}%)" for s, p in settings.get("sec_shares", {}).items()])
-        reg_str = "全省聯播" if settings.get("is_national") else "/".join(settings.get("regions", []))
-        info = f"【{media}】 預算佔比: {settings.get('share')}% | 秒數分配: {sec_str} | 區域: {reg_str}"
-        details.append(info)
-    return "\n".join(details)
-
-# =========================================================
-# Ragic API 整合
-# =========================================================
-
-def upload_to_ragic(api_url, api_key, data_dict, files_dict=None):
-    if not api_url or not api_key:
-        return False, "API URL 或 API Key 未設定"
-    base_url = api_url.split("?")[0]
-    headers = {"Authorization": f"Basic {api_key}"}
-    payload = dict(data_dict)
-    payload["api"] = ""   
-    payload["v"] = "3"    
-    try:
-        resp = requests.post(
-            base_url, headers=headers, data=payload, files=files_dict, timeout=120
-        )
-        try:
-            j = resp.json()
-        except:
-            j = None
-        if resp.status_code != 200:
-            return False, f"HTTP {resp.status_code}: {resp.text[:200]}"
-        if not j:
-            return False, f"Ragic 回傳非 JSON 格式: {resp.text[:200]}"
-        if j.get("status") == "SUCCESS":
-            return True, f"✅ 上傳成功! Ragic ID: {j.get('ragicId')}"
-        return False, f"❌ Ragic 錯誤 (Code: {j.get('code')}): {j.get('msg')}"
-    except Exception as e:
-        return False, f"❌ 連線異常: {str(e)}"
-
-# =========================================================
-# 系統工具: PDF 轉檔與資源讀取
-# =========================================================
-
-def find_soffice_path():
-    soffice = shutil.which("soffice") or shutil.which("libreoffice")
-    if soffice: return soffice
-    if os.name == "nt":
-        candidates = [r"C:\Program Files\LibreOffice\program\soffice.exe", r"C:\Program Files (x86)\LibreOffice\program\soffice.exe"]
-        for p in candidates:
-            if os.path.exists(p): return p
-    return None
-
-@st.cache_data(show_spinner="正在下載 Logo...", ttl=3600)
-def get_cloud_logo_bytes():
-    try:
-        response = requests.get(BOLIN_LOGO_URL, timeout=10)
-        return response.content if response.status_code == 200 else None
-    except: return None
-
-@st.cache_data(show_spinner="正在生成 PDF (LibreOffice)...", ttl=3600)
-def xlsx_bytes_to_pdf_bytes(xlsx_bytes: bytes):
-    soffice = find_soffice_path()
-    if not soffice: return None, "Fail", "伺服器未安裝 LibreOffice"
-    try:
-        with tempfile.TemporaryDirectory() as tmp:
-            xlsx_path = os.path.join(tmp, "cue.xlsx")
-            with open(xlsx_path, "wb") as f: f.write(xlsx_bytes)
-            subprocess.run([soffice, "--headless", "--nologo", "--convert-to", "pdf:calc_pdf_Export", "--outdir", tmp, xlsx_path], capture_output=True, timeout=60)
-            pdf_path = os.path.join(tmp, "cue.pdf")
-            if not os.path.exists(pdf_path):
-                for fn in os.listdir(tmp):
-                    if fn.endswith(".pdf"): pdf_path = os.path.join(tmp, fn); break
-            if os.path.exists(pdf_path):
-                with open(pdf_path, "rb") as f: return f.read(), "LibreOffice", ""
-            return None, "Fail", "LibreOffice 未產出檔案"
-    except Exception as e: return None, "Fail", str(e)
-    finally: gc.collect()
-
-# =========================================================
-# HTML 預覽生成引擎
+# 3. 介面元件 (UI Panels)
 # =========================================================
 
-def generate_html_preview(rows, days_cnt, start_dt, end_dt, c_name, p_display, format_type, remarks, total_list, grand_total, budget, prod):
-    eff_days = days_cnt
-    header_cls = "bg-sh-head"
-    # === 修改點：改用中文判斷 ===
-    if format_type == "東吳": header_cls = "bg-dw-head"
-    elif format_type == "鉑霖": header_cls = "bg-bolin-head"
-    # ==========================
-
-    date_th1, date_th2 = "", ""
-    curr = start_dt
-    weekdays = ["一", "二", "三", "四", "五", "六", "日"]
-    for i in range(eff_days):
-        wd = curr.weekday()
-        bg = "bg-weekend" if wd >= 5 else ""
-        date_th1 += f"<th class='{header_cls} col_day'>{curr.day}</th>"
-        date_th2 += f"<th class='{bg} col_day'>{weekdays[wd]}</th>"
-        curr += timedelta(days=1)
-
-    cols_def = ["Station", "Location", "Program", "Day-part", "Size", "rate<br>(Net)", "Package-cost<br>(Net)"]
-    # === 修改點：改用中文判斷 ===
-    if format_type == "聲活": cols_def = ["頻道", "播出地區", "播出店數", "播出時間", "秒數/規格", "單價", "金額"]
-    elif format_type == "鉑霖": cols_def = ["頻道", "播出地區", "播出店數", "播出時間", "規格", "單價", "金額"]
-    # ==========================
-
-    th_fixed = "".join([f"<th rowspan='2' class='{header_cls}'>{c}</th>" for c in cols_def])
-    th_total_right = f"<th rowspan='2' class='{header_cls}' style='min-width:50px;'>Total<br>Spots</th>"
-      
-    unique_media = sorted(list(set([r['media'] for r in rows])))
-    order_map = {"全家廣播": 1, "新鮮視": 2, "家樂福": 3}
-    unique_media.sort(key=lambda x: order_map.get(x, 99))
-    medium_str = "/".join(unique_media)
-      
-    tbody = ""
-    rows_sorted = sorted(rows, key=lambda x: ({"全家廣播":1,"新鮮視":2,"家樂福":3}.get(x["media"],9), x["seconds"]))
-    daily_totals = [0] * eff_days
-
-    for key, group in groupby(rows_sorted, lambda x: (x['media'], x['seconds'], x.get('nat_pkg_display', 0))):
-        g_list = list(group)
-        g_size = len(g_list)
-        is_pkg = g_list[0]['is_pkg_member']
-        for i, r in enumerate(g_list):
-            tbody += "<tr>"
-            rate = f"${r['rate_display']:,}" if isinstance(r['rate_display'], (int, float)) else r['rate_display']
-            pkg_val_str = ""
-            if is_pkg:
-                if i == 0:
-                    val = f"${r['nat_pkg_display']:,}"
-                    pkg_val_str = f"<td class='right' rowspan='{g_size}'>{val}</td>"
-            else:
-                val = f"${r['pkg_display']:,}" if isinstance(r['pkg_display'], (int, float)) else r['pkg_display']
-                pkg_val_str = f"<td class='right'>{val}</td>"
-              
-            # === 修改點：改用中文判斷 ===
-            if format_type == "聲活":
-                sec_txt = f"{r['seconds']}秒"
-                tbody += f"<td>{r['media']}</td><td>{r['region']}</td><td>{r.get('program_num','')}</td><td>{r['daypart']}</td><td>{sec_txt}</td><td>{rate}</td>{pkg_val_str}"
-            elif format_type == "鉑霖":
-                tbody += f"<td>{r['media']}</td><td>{r['region']}</td><td>{r.get('program_num','')}</td><td>{r['daypart']}</td><td>{r['seconds']}秒</td><td>{rate}</td>{pkg_val_str}"
-            else:
-                tbody += f"<td>{r['media']}</td><td>{r['region']}</td><td>{r.get('program_num','')}</td><td>{r['daypart']}</td><td>{r['seconds']}</td><td>{rate}</td>{pkg_val_str}"
-            # ==========================
-              
-            row_spots_sum = 0
-            for d_idx, d in enumerate(r['schedule'][:eff_days]):
-                tbody += f"<td>{d}</td>"
-                row_spots_sum += d
-                if d_idx < len(daily_totals): daily_totals[d_idx] += d
-            tbody += f"<td style='font-weight:bold; background-color:#f0f0f0;'>{row_spots_sum}</td></tr>"
-
-    total_row_html = "<tr><td colspan='5' style='text-align:center; font-weight:bold; background-color:#e0e0e0;'>Total</td>"
-    total_row_html += f"<td style='text-align:center; font-weight:bold; background-color:#e0e0e0;'>${total_list:,}</td>"
-    total_row_html += f"<td style='text-align:center; font-weight:bold; background-color:#e0e0e0;'>${budget:,}</td>"
-    grand_total_spots = 0
-    for day_sum in daily_totals:
-        grand_total_spots += day_sum
-        total_row_html += f"<td style='font-weight:bold; background-color:#e0e0e0;'>{day_sum}</td>"
-    total_row_html += f"<td style='font-weight:bold; background-color:#d0d0d0; border: 2px solid #000;'>{grand_total_spots}</td></tr>"
-    tbody += total_row_html
-
-    remarks_html = "<br>".join([html_escape(x) for x in remarks])
-    vat = int(round(budget * 0.05))
-    footer_html = f"<div style='margin-top:10px; font-weight:bold; text-align:right;'>製作費: ${prod:,}<br>5% VAT: ${vat:,}<br>Grand Total: ${grand_total:,}</div>"
-      
-    css = """
-    body { font-family: sans-serif; font-size: 10px; background-color: #ffffff; color: #000000; padding: 5px; }
-    table { border-collapse: collapse; width: 100%; background-color: #ffffff; }
-    th, td { border: 0.5pt solid #000; padding: 4px; text-align: center; white-space: nowrap; color: #000000; }
-    .bg-dw-head { background-color: #4472C4; color: white; }
-    .bg-sh-head { background-color: white; color: black; font-weight: bold; border-bottom: 2px solid black; }
-    .bg-bolin-head { background-color: #F8CBAD; color: black; }
-    .bg-weekend { background-color: #FFFFCC; }
-    """
-    return f"<html><head><style>{css}</style></head><body><div style='margin-bottom:10px;'><b>客戶名稱：</b>{html_escape(c_name)} &nbsp; <b>Product：</b>{html_escape(p_display)}<br><b>Period：</b>{start_dt.strftime('%Y.%m.%d')} - {end_dt.strftime('%Y.%m.%d')} &nbsp; <b>Medium：</b>{html_escape(medium_str)}</div><div style='overflow-x:auto;'><table><thead><tr>{th_fixed}{date_th1}{th_total_right}</tr><tr>{date_th2}</tr></thead><tbody>{tbody}</tbody></table></div>{footer_html}<div style='margin-top:10px; font-size:11px;'><b>Remarks：</b><br>{remarks_html}</div></body></html>"
-
-# =========================================================
-# 5. 資料讀取與運算 (Data Loading & Calculation)
-# =========================================================
-
-@st.cache_data(ttl=300)
-def load_config_from_cloud(share_url):
-    try:
-        match = re.search(r"/d/([a-zA-Z0-9-_]+)", share_url)
-        if not match: return None, None, None, None, None, "連結格式錯誤"
-        file_id = match.group(1)
-        def read_sheet(sheet_name):
-            url = f"https://docs.google.com/spreadsheets/d/{file_id}/gviz/tq?tqx=out:csv&sheet={sheet_name}"
-            return pd.read_csv(url)
-          
-        df_store = read_sheet("Stores")
-        df_store.columns = [c.strip() for c in df_store.columns]
-        store_counts = dict(zip(df_store['Key'], df_store['Display_Name']))
-        store_counts_num = dict(zip(df_store['Key'], df_store['Count']))
-          
-        df_fact = read_sheet("Factors")
-        df_fact.columns = [c.strip() for c in df_fact.columns]
-        sec_factors = {}
-        for _, row in df_fact.iterrows():
-            if row['Media'] not in sec_factors: sec_factors[row['Media']] = {}
-            sec_factors[row['Media']][int(row['Seconds'])] = float(row['Factor'])
-          
-        name_map = {"全家新鮮視": "新鮮視", "全家廣播": "全家廣播", "家樂福": "家樂福"}
-        for k, v in name_map.items():
-            if k in sec_factors and v not in sec_factors: sec_factors[v] = sec_factors[k]
-          
-        df_price = read_sheet("Pricing")
-        df_price.columns = [c.strip() for c in df_price.columns]
-        pricing_db = {}
-        for _, row in df_price.iterrows():
-            m, r = row['Media'], row['Region']
-            if m == "家樂福":
-                if m not in pricing_db: pricing_db[m] = {}
-                pricing_db[m][r] = {
-                    "List": int(row['List_Price']), "Net": int(row['Net_Price']),
-                    "Std_Spots": int(row['Std_Spots']), "Day_Part": row['Day_Part']
-                }
-            else:
-                if m not in pricing_db: pricing_db[m] = {"Std_Spots": int(row['Std_Spots']), "Day_Part": row['Day_Part']}
-                pricing_db[m][r] = [int(row['List_Price']), int(row['Net_Price'])]
-        
-        # === 新增：讀取 Sales 分頁 (真名 vs 綽號) ===
-        df_sales = read_sheet("Sales")
-        df_sales.columns = [c.strip() for c in df_sales.columns]
-        # 假設欄位為 Name (真名) 和 Nickname (Ragic用)，建立對照表
-        # 如果 Google Sheet 欄位名不同，請修正這裡
-        if 'Name' in df_sales.columns and 'Nickname' in df_sales.columns:
-            sales_map = dict(zip(df_sales['Name'], df_sales['Nickname']))
-        else:
-            # 若欄位沒設對，做個防呆，Key=Name, Value=Name (都用真名)
-            sales_map = {name: name for name in df_sales.iloc[:, 0].tolist()}
-
-        return store_counts, store_counts_num, pricing_db, sec_factors, sales_map, None
-    except Exception as e: return None, None, None, None, None, f"讀取失敗: {str(e)}"
-
-# --- 新增: 運算邏輯面板渲染函式 ---
+# --- 運算邏輯面板 ---
 def render_logic_panel(logs):
     """
     繪製運算邏輯面板
@@ -419,683 +120,348 @@ def render_logic_panel(logs):
             if item.get('note'):
                 st.info(f"備註: {item['note']}")
 
+# --- 預算配比試算面板 ---
+SCENARIO_WIDGET_KEYS = {
+    "全家廣播": ("rad_share", "rs_", "rad_nat", "rad_reg"),
+    "新鮮視": ("fv_share", "fs_", "fv_nat", "fv_reg"),
+    "家樂福": ("cf_share", "cs_", None, None),
+}
 
-def calculate_plan_data(config, total_budget, days_count, pricing_db, sec_factors, store_counts_num, regions_order):
-    """
-    排程運算核心函式 (已增加邏輯記錄功能)
-    """
-    rows, total_list_accum = [], 0
-    logs = [] # 初始化日誌列表
+def apply_scenario(scenario):
+    """把試算結果寫回表單的 session state (作為按鈕 on_click 使用)。"""
+    for m, cfg in scenario.items():
+        share_key, sec_prefix, nat_key, reg_key = SCENARIO_WIDGET_KEYS[m]
+        st.session_state[share_key] = cfg["share"]
+        for s, p in cfg["sec_shares"].items(): st.session_state[f"{sec_prefix}{s}"] = p
+        if nat_key:
+            st.session_state[nat_key] = cfg["is_national"]
+            if not cfg["is_national"]: st.session_state[reg_key] = cfg["regions"]
+
+def render_scenario_panel(config, total_budget, days_count, pricing_db, sec_factors, store_counts_num):
+    """預算配比試算面板：只做運算與排名，不產生 Excel / PDF。"""
+    with st.expander("🔍 預算配比試算 (Scenario Sweep)", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        objective = c1.selectbox("目標", list(SWEEP_OBJECTIVES.keys()), format_func=lambda k: SWEEP_OBJECTIVES[k], key="sw_obj")
+        share_step = c2.selectbox("媒體佔比級距 %", [5, 10, 20, 25], index=1, key="sw_share_step")
+        sec_step = c3.selectbox("秒數配比級距 %", [10, 20, 25, 50], index=2, key="sw_sec_step")
+        top_n = c4.number_input("顯示前 N 名", 1, 50, 10, key="sw_top_n")
+        c5, c6, c7 = st.columns(3)
+        min_spots = c5.number_input("檔次目標 (最少)", 0, value=0, step=100, key="sw_min_spots")
+        min_stores = c6.number_input("店數目標 (最少)", 0, value=0, step=100, key="sw_min_stores")
+        try_national = c7.checkbox("同時試算全省聯播", True, key="sw_try_nat")
+
+        config_sig = json.dumps([config, total_budget, days_count], sort_keys=True, default=str)
+        if st.button("開始試算", key="sw_run"):
+            region_options = {}
+            for m, cfg in config.items():
+                if m == "家樂福": continue
+                opts = [(cfg["is_national"], cfg["regions"])]
+                if try_national and not cfg["is_national"]: opts.append((True, ["全省"]))
+                region_options[m] = opts
+            engine = PricingEngine(pricing_db, sec_factors, store_counts_num, REGIONS_ORDER)
+            t0 = time.perf_counter()
+            df, scenarios, n_evaluated = sweep_scenarios(engine, config, total_budget, days_count, share_step, sec_step, region_options,
+                                                          objective, min_spots, min_stores, int(top_n))
+            st.session_state["sweep_result"] = (config_sig, df, scenarios, n_evaluated, time.perf_counter() - t0)
+
+        result = st.session_state.get("sweep_result")
+        if result and result[0] == config_sig:
+            _, df, scenarios, n_evaluated, elapsed = result
+            st.caption(f"共試算 {n_evaluated:,} 種組合，耗時 {elapsed * 1000:.0f} ms")
+            st.dataframe(df, hide_index=True, use_container_width=True)
+            if scenarios:
+                pick = st.selectbox("套用方案", list(range(len(scenarios))), format_func=lambda i: f"#{i + 1} {df.iloc[i]['媒體佔比']}", key="sw_pick")
+                st.button("✅ 套用到表單", key="sw_apply", on_click=apply_scenario, args=(scenarios[pick],))
+
+# --- 方案紀錄 (搜尋 / 載回表單) ---
+FORM_INPUT_KEYS = ("format_type", "client_name", "product_name", "total_budget", "prod_cost", "sales_person",
+                   "start_date", "end_date", "sign_deadline", "billing_month", "payment_date")
+PLAN_MEDIA_KEYS = {"全家廣播": ("cb_rad", "rad_sec"), "新鮮視": ("cb_fv", "fv_sec"), "家樂福": ("cb_cf", "cf_sec")}
+
+def plan_artifact_hashes(plan_key):
+    """目前已產生的檔案 (Excel / 兩種 PDF) 的 sha256。"""
+    cache = get_artifact_cache()
+    digests = {kind: cache.digest(plan_key, kind) for kind in ("xlsx", pdf_cache_kind(PDF_ENGINE_NATIVE), pdf_cache_kind(PDF_ENGINE_SOFFICE))}
+    return {kind: d for kind, d in digests.items() if d}
+
+def load_plan_into_form(plan_id, sales_options):
+    """把保存的方案寫回表單的 session state (作為按鈕 on_click 使用)。"""
+    plan = get_plan_store().get(plan_id)
+    if plan is None: return
+    inputs = plan["inputs"]
+    for key in FORM_INPUT_KEYS:
+        if key in inputs and (key != "sales_person" or inputs[key] in sales_options): st.session_state[key] = inputs[key]
+    st.session_state[f"final_budget_{inputs['total_budget']}"] = inputs.get("final_budget", inputs["total_budget"])
+    for m, (cb_key, sec_key) in PLAN_MEDIA_KEYS.items():
+        st.session_state[cb_key] = m in plan["config"]
+        if m in plan["config"]: st.session_state[sec_key] = sorted(plan["config"][m]["sec_shares"])
+    apply_scenario(plan["config"])
+    st.session_state.loaded_plan = plan_id
+
+def render_plan_store_panel(sales_options):
+    """搜尋本機保存的方案 (客戶 / 產品 / 業務關鍵字、業務、走期)，選取後一鍵載回表單。"""
+    with st.expander("🗂️ 方案紀錄 (搜尋 / 載入)", expanded=False):
+        store = get_plan_store()
+        c_text, c_sales, c_from, c_to = st.columns([3, 1, 1, 1])
+        text = c_text.text_input("搜尋", placeholder="客戶、產品或業務關鍵字 (空白分隔)", key="ps_query")
+        sales = c_sales.selectbox("業務", ["全部"] + list(sales_options), key="ps_sales")
+        d_from = c_from.date_input("走期起", None, key="ps_from")
+        d_to = c_to.date_input("走期迄", None, key="ps_to")
+        results = store.search(text, None if sales == "全部" else sales, date_from=d_from, date_to=d_to)
+        st.caption(f"共 {store.count():,} 筆紀錄，顯示最近更新的 {len(results)} 筆")
+        if not results: return
+        st.dataframe(pd.DataFrame([{"客戶": r["client"], "產品": r["product"], "業務": r["sales"], "格式": r["format"], "開始": r["start_date"], "結束": r["end_date"],
+                                    "成交價": r["final_budget"], "總檔次": r["total_spots"], "更新時間": datetime.fromtimestamp(r["updated_at"]).strftime("%Y-%m-%d %H:%M")}
+                                   for r in results]), hide_index=True, use_container_width=True)
+        labels = {r["id"]: f"{r['client']} - {r['product']} ({r['start_date']} ~ {r['end_date']}, ${r['final_budget']:,})" for r in results}
+        c_pick, c_load, c_del = st.columns([4, 1, 1])
+        plan_id = c_pick.selectbox("選擇方案", list(labels), format_func=labels.get, key="ps_pick")
+        c_load.button("📂 載入到表單", key="ps_load_btn", on_click=load_plan_into_form, args=(plan_id, sales_options))
+        if st.session_state.is_supervisor and c_del.button("🗑️ 刪除", key="ps_del_btn"):
+            store.delete(plan_id)
+            st.rerun()
+
+# --- 改版比較 ---
+DIFF_RESULTS_KEPT = 8  # session 中保留的改版比較結果數
+
+def saved_plan_version(plan, cloud_cfg):
+    """以保存的輸入重新計算舊版排程 (使用目前的價格設定)。"""
+    inputs = plan["inputs"]
+    days = (inputs["end_date"] - inputs["start_date"]).days + 1
+    rows, total_list, logs = calculate_plan_data(plan["config"], inputs["total_budget"], days, cloud_cfg.pricing_db, cloud_cfg.sec_factors, cloud_cfg.store_counts_num, REGIONS_ORDER)
+    label = f"{plan['client']} - {plan['product']} ({datetime.fromtimestamp(plan['updated_at']).strftime('%m/%d %H:%M')})"
+    return PlanVersion(rows, inputs["start_date"], logs, inputs.get("final_budget", inputs["total_budget"]), total_list, label)
+
+def render_revision_panel(plan_id, plan_key, current, client_name, cloud_cfg):
+    """目前的方案與方案紀錄中的某一版比較：變動的列、每日檔次差、金額差與 1.1 加價變化，可下載 HTML / XLSX 變更報告。"""
+    with st.expander("🔀 改版比較 (與方案紀錄中的版本)", expanded=False):
+        store = get_plan_store()
+        candidates = [r for r in store.search(client=client_name) if r["id"] != plan_id] or [r for r in store.search() if r["id"] != plan_id]
+        if not candidates:
+            st.caption("方案紀錄中沒有可比較的版本 (請先儲存方案)")
+            return
+        labels = {r["id"]: f"{r['client']} - {r['product']} ({r['start_date']} ~ {r['end_date']}, ${r['final_budget']:,}, {datetime.fromtimestamp(r['updated_at']).strftime('%m/%d %H:%M')})" for r in candidates}
+        base_id = st.selectbox("比較的舊版", list(labels), format_func=labels.get, key="diff_base")
+        # 比較結果依 (舊版 id, 舊版更新時間, 目前方案 plan_key) 存在 session_state，按下「比較」才計算，其餘重新執行直接沿用
+        diff_key = (base_id, next(r["updated_at"] for r in candidates if r["id"] == base_id), plan_key)
+        results = st.session_state.setdefault("diff_results", {})
+        if diff_key not in results:
+            if not st.button("🔀 比較", key="diff_run_btn"): return
+            plan = store.get(base_id)
+            if plan is None: return
+            diff = PlanDiff(saved_plan_version(plan, cloud_cfg), current)
+            results[diff_key] = (diff, diff_report_html(diff))
+            while len(results) > DIFF_RESULTS_KEPT: results.pop(next(iter(results)))
+        diff, report = results[diff_key]
+        counts = diff.counts()
+        st.caption("舊版以目前的價格設定重新計算；" + " / ".join([f"{label} {counts[s]} 列" for s, label in (("added", "新增"), ("removed", "刪除"), ("changed", "變更"))])
+                   + (f"；1.1 加價變化 {len(diff.penalty_flips)} 項" if diff.penalty_flips else ""))
+        st.components.v1.html(report, height=500, scrolling=True)
+        stem = f"Cue_{safe_filename(client_name)}_diff"
+        c_html, c_xlsx = st.columns(2)
+        c_html.download_button("📥 下載變更報告 (HTML)", report.encode("utf-8"), f"{stem}.html", mime="text/html", key="diff_html_btn")
+        # Excel 報告在按下下載時才產生
+        c_xlsx.download_button("📥 下載變更報告 (Excel)", lambda: diff_report_xlsx(diff), f"{stem}.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="diff_xlsx_btn")
+
+# --- 背景工作進度與批次產生面板 ---
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_job_progress(job_id, label):
+    """輪詢顯示工作進度；工作結束時重新執行整頁以顯示結果。"""
+    job = get_job_queue().get(job_id)
+    if job is None or job["status"] not in JOB_ACTIVE:
+        st.rerun()
+    retry_note = f" (第 {job['attempts']} 次嘗試)" if job["attempts"] > 1 else ""
+    st.progress(job["progress"], text=f"{label}: {job['message']}{retry_note}")
+
+def render_batch_panel(pdf_engine):
+    """批次產生面板 (主管權限)：上傳訂單表後交由背景工作產生 ZIP (XLSX / PDF 與摘要報告)。"""
+    with st.expander("📦 批次產生 (訂單表 CSV / Excel)", expanded=False):
+        st.caption("媒體設定格式：「媒體 佔比% [區域/區域] 秒數[:配比],...」，多個媒體以分號隔開；區域省略時為全省聯播，秒數配比省略時平均分配。")
+        st.download_button("📄 下載訂單範本", pd.DataFrame(BATCH_TEMPLATE).to_csv(index=False).encode("utf-8-sig"), "cue_batch_template.csv", mime="text/csv", key="batch_tpl_btn")
+        upload = st.file_uploader("訂單表", type=["csv", "xlsx"], key="batch_upload")
+        make_pdf = st.checkbox("同時產生 PDF", True, key="batch_pdf")
+        if upload is None: return
+        data = upload.getvalue()
+        try: orders = read_batch_orders(data, upload.name)
+        except Exception as e:
+            st.error(f"訂單表讀取失敗: {e}")
+            return
+
+        # 回簽截止日預設為今天 + 3 天，因此 key 含當天日期
+        batch_key = hashlib.sha256(data + f"|{make_pdf}|{pdf_engine}|{date.today()}|{renderer_fingerprint()}".encode()).hexdigest()
+        job_queue, cache = get_job_queue(), get_artifact_cache()
+        job = job_queue.latest("batch", batch_key)
+        if job and job["status"] in JOB_ACTIVE:
+            render_job_progress(job["id"], "批次產生")
+            return
+        zip_bytes = cache.get(batch_key, "zip") if cache.has(batch_key, "zip") else None
+        if zip_bytes:
+            if job and job["status"] == "succeeded": st.success(job["message"])
+            with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf: summary = pd.read_csv(zf.open("summary.csv"), encoding="utf-8-sig")
+            st.dataframe(summary, hide_index=True, use_container_width=True)
+            st.download_button("📥 下載批次 ZIP", zip_bytes, f"cue_batch_{batch_key[:8]}.zip", mime="application/zip", key="batch_dl_btn")
+        else:
+            if job and job["status"] == "failed": st.error(f"批次產生失敗: {job['message']}")
+            st.caption(f"共 {len(orders)} 筆訂單")
+            if st.button("🛠️ 開始批次產生", key="batch_run_btn"):
+                job_queue.submit("batch", {"orders": orders, "make_pdf": make_pdf, "engine": pdf_engine, "batch_key": batch_key}, dedupe_key=batch_key)
+                st.rerun()
 
-    for m, cfg in config.items():
-        # 根據各媒體的預算佔比 (Share) 分配預算
-        m_budget_total = total_budget * (cfg["share"] / 100.0)
-          
-        for sec, sec_pct in cfg["sec_shares"].items():
-            s_budget = m_budget_total * (sec_pct / 100.0)
-            if s_budget <= 0: continue
-              
-            factor = get_sec_factor(m, sec, sec_factors)
-              
-            # --- 邏輯 A: 廣播與新鮮視 ---
-            if m in ["全家廣播", "新鮮視"]:
-                db = pricing_db[m]
-                calc_regs = ["全省"] if cfg["is_national"] else cfg["regions"]
-                display_regs = regions_order if cfg["is_national"] else cfg["regions"]
-                  
-                # 計算單位成本總和 (如果是全省，就是各區單價加總或直接取全省價)
-                # 這裡為了能夠還原 "實作價"，我們需要知道用的是哪個 Base Net
-                # 因為程式邏輯是: unit_net_sum = sum( (Region_Net / Std_Spots) * Factor )
-                  
-                # 為了 Log 清晰，我們反推 "總實作價 (Net Price Sum)"
-                base_net_price_sum = 0
-                std_spots_ref = db["Std_Spots"] # 4800 or 5040
-                  
-                # 核心運算
-                unit_net_sum = 0
-                for r in calc_regs:
-                      # 取得該區域(或全省)的實作價
-                    reg_net = db[r][1] 
-                    base_net_price_sum += reg_net
-                    # 算出該區域的單檔成本
-                    unit_net_sum += (reg_net / std_spots_ref) * factor
-                  
-                if unit_net_sum == 0: continue
-                  
-                # 計算檔次 (Spots)
-                spots_init_raw = s_budget / unit_net_sum
-                spots_init = math.ceil(spots_init_raw)
-                  
-                is_under_target = spots_init < std_spots_ref
-                calc_penalty = 1.1 if is_under_target else 1.0 
-                  
-                if cfg["is_national"]:
-                    row_display_penalty = 1.0
-                    total_display_penalty = 1.1 if is_under_target else 1.0
+def ready_pdf_kind(cache, key, pdf_engine):
+    """已產生的 PDF 所在的快取種類 (原生引擎失敗時為 LibreOffice 版本)；尚未產生時為 None。"""
+    return next((kind for kind in pdf_cache_kinds(pdf_engine) if cache.has(key, kind)), None)
+
+def formats_zip(cache, keys, pdf_engine, with_xlsx, stem):
+    """把快取中各格式的 PDF (主管另含 Excel) 打包成 ZIP。"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for fmt, key in keys.items():
+            for kind, ext in [(ready_pdf_kind(cache, key, pdf_engine), "pdf")] + ([("xlsx", "xlsx")] if with_xlsx else []):
+                data = cache.get(key, kind) if kind else None
+                if data: zf.writestr(f"{stem}_{fmt}.{ext}", data)
+    return buf.getvalue()
+
+def render_formats_panel(render_args, pdf_engine, client_name):
+    """三種格式一次產生：同一份排程的彙總只算一次，三種版面一起渲染，PDF 集中在一次轉檔工作；完成後打包成 ZIP 下載 (Excel 僅主管)。"""
+    st.markdown("#### 🗂️ 三種格式一次產生")
+    plan_args, with_xlsx = render_args[1:], st.session_state.is_supervisor
+    keys = {fmt: plan_fingerprint(fmt, *plan_args) for fmt in CUE_FORMATS}
+    job_key = f"{keys[CUE_FORMATS[0]]}:formats:{pdf_engine}:{int(with_xlsx)}"
+    job_queue, cache = get_job_queue(), get_artifact_cache()
+    job = job_queue.latest("formats", job_key)
+    if job and job["status"] in JOB_ACTIVE:
+        render_job_progress(job["id"], "三種格式")
+        return
+    if all([ready_pdf_kind(cache, key, pdf_engine) and (not with_xlsx or cache.has(key, "xlsx")) for key in keys.values()]):
+        if job and job["status"] == "succeeded": st.caption(f"✅ {job['message']}")
+        stem = f"Cue_{safe_filename(client_name)}"
+        st.download_button(f"📥 下載{'、'.join(CUE_FORMATS)} (ZIP)", lambda: formats_zip(cache, keys, pdf_engine, with_xlsx, stem), f"{stem}_all.zip",
+                           mime="application/zip", key="formats_dl_btn")
+        return
+    if job and job["status"] == "failed": st.warning(f"產生失敗: {job['message']}")
+    elif job and job["status"] == "succeeded": st.warning(f"部分格式未完成: {job['message']}")
+    st.caption(f"以目前的排程同時產生{'、'.join(CUE_FORMATS)}的 PDF{' 與 Excel' if with_xlsx else ''}")
+    if st.button("🛠️ 產生三種格式", key="formats_build_btn"):
+        job_queue.submit("formats", {"engine": pdf_engine, "formats": list(CUE_FORMATS), "render_args": plan_args, "with_xlsx": with_xlsx}, dedupe_key=job_key)
+        st.rerun()
+
+# --- 跨訂單月度總覽 (主管) ---
+def render_portfolio_panel(cloud_cfg):
+    """當月所有訂單的每日檔次負載與業務 / 客戶金額；資料來源為 Ragic 紀錄或訂單表，重新讀取時只重算有變動的方案。"""
+    with st.expander("📊 月度總覽 (跨訂單檔次負載)", expanded=False):
+        today = date.today()
+        c_year, c_month = st.columns(2)
+        year = int(c_year.number_input("年", 2020, 2100, today.year, key="pf_year"))
+        month = c_month.selectbox("月", list(range(1, 13)), index=today.month - 1, key="pf_month")
+        pf_key = f"portfolio_{year}_{month}"
+        if pf_key not in st.session_state: st.session_state[pf_key] = Portfolio(*month_window(year, month))
+        pf = st.session_state[pf_key]
+
+        c_ragic, c_file = st.columns(2)
+        errors = []
+        with c_ragic:
+            if st.button("☁️ 讀取 / 更新 Ragic 紀錄", key="pf_ragic_btn"):
+                with st.spinner("正在讀取 Ragic 紀錄..."):
+                    records, err = fetch_ragic_records(st.session_state.ragic_url, st.session_state.ragic_key, pf.start, pf.end)
+                if err: st.error(f"Ragic 讀取失敗: {err}")
                 else:
-                    row_display_penalty = 1.1 if is_under_target else 1.0
-                    total_display_penalty = 1.0 
-                  
-                # 最終檔次計算
-                spots_final_raw = s_budget / (unit_net_sum * calc_penalty)
-                spots_final = math.ceil(spots_final_raw)
-                  
-                if spots_final % 2 != 0: spots_final += 1
-                if spots_final == 0: spots_final = 2
-                  
-                # --- [新增] 記錄運算邏輯 ---
-                logs.append({
-                    "media": m,
-                    "region": "全省聯播" if cfg["is_national"] else "/".join(cfg["regions"]),
-                    "seconds": sec,
-                    "budget": s_budget,
-                    "base_net_price": base_net_price_sum, # 總實作價
-                    "std_spots": std_spots_ref,            # 標準檔次
-                    "factor": factor,                      # 秒數係數
-                    "unit_cost_actual": unit_net_sum,      # 加成後的單檔成本
-                    "spots_init_raw": spots_init_raw,
-                    "is_under_target": is_under_target,
-                    "spots_final_raw_penalty": spots_final_raw,
-                    "spots": spots_final,
-                    "note": "若選全省聯播，實作價為全省定價；若選區域，則為各區實作價加總。"
-                })
-                # -------------------------
-
-                # 計算每日分配
-                sch = calculate_schedule(spots_final, days_count)
-                  
-                # 計算全省打包價與單一區域價
-                nat_pkg_display = 0
-                if cfg["is_national"]:
-                    nat_list = db["全省"][0]
-                    nat_unit_price = int((nat_list / db["Std_Spots"]) * factor * total_display_penalty)
-                    nat_pkg_display = nat_unit_price * spots_final
-                    total_list_accum += nat_pkg_display
-                  
-                for i, r in enumerate(display_regs):
-                    list_price_region = db[r][0]
-                    unit_rate_display = int((list_price_region / db["Std_Spots"]) * factor * row_display_penalty)
-                    total_rate_display = unit_rate_display * spots_final
-                    row_pkg_display = total_rate_display
-                    if not cfg["is_national"]: total_list_accum += row_pkg_display
-                      
-                    rows.append({
-                        "media": m, "region": r, "program_num": store_counts_num.get(f"新鮮視_{r}" if m=="新鮮視" else r, 0),
-                        "daypart": db["Day_Part"], "seconds": sec, "spots": spots_final, "schedule": sch,
-                        "rate_display": total_rate_display, "pkg_display": row_pkg_display,
-                        "is_pkg_member": cfg["is_national"], "nat_pkg_display": nat_pkg_display
-                    })
-              
-            # --- 邏輯 B: 家樂福 ---
-            elif m == "家樂福":
-                db = pricing_db["家樂福"]
-                base_std = db["量販_全省"]["Std_Spots"]
-                base_net_price = db["量販_全省"]["Net"]
-                  
-                # 核心運算
-                unit_net = (base_net_price / base_std) * factor
-                  
-                spots_init_raw = s_budget / unit_net
-                spots_init = math.ceil(spots_init_raw)
-                  
-                is_under_target = spots_init < base_std
-                penalty = 1.1 if is_under_target else 1.0
-                  
-                spots_final_raw = s_budget / (unit_net * penalty)
-                spots_final = math.ceil(spots_final_raw)
-                  
-                if spots_final % 2 != 0: spots_final += 1
-                  
-                # --- [新增] 記錄運算邏輯 ---
-                logs.append({
-                    "media": m,
-                    "region": "全省量販+超市",
-                    "seconds": sec,
-                    "budget": s_budget,
-                    "base_net_price": base_net_price,
-                    "std_spots": base_std,
-                    "factor": factor,
-                    "unit_cost_actual": unit_net,
-                    "spots_init_raw": spots_init_raw,
-                    "is_under_target": is_under_target,
-                    "spots_final_raw_penalty": spots_final_raw,
-                    "spots": spots_final,
-                    "note": f"超市檔次會依照比例自動計算 (量販:{spots_final})"
-                })
-                # -------------------------
-
-                sch_h = calculate_schedule(spots_final, days_count)
-                base_list = db["量販_全省"]["List"]
-                unit_rate_h = int((base_list / base_std) * factor * penalty)
-                total_rate_h = unit_rate_h * spots_final
-                total_list_accum += total_rate_h
-                  
-                rows.append({
-                    "media": m, "region": "全省量販", "program_num": store_counts_num["家樂福_量販"],
-                    "daypart": db["量販_全省"]["Day_Part"], "seconds": sec, "spots": spots_final, "schedule": sch_h,
-                    "rate_display": total_rate_h, "pkg_display": total_rate_h, "is_pkg_member": False
-                })
-                  
-                # 家樂福超市的檔次是依照量販比例計算
-                spots_s = int(spots_final * (db["超市_全省"]["Std_Spots"] / base_std))
-                sch_s = calculate_schedule(spots_s, days_count)
-                rows.append({
-                    "media": m, "region": "全省超市", "program_num": store_counts_num["家樂福_超市"],
-                    "daypart": db["超市_全省"]["Day_Part"], "seconds": sec, "spots": spots_s, "schedule": sch_s,
-                    "rate_display": "計量販", "pkg_display": "計量販", "is_pkg_member": False
-                })
-                  
-    return rows, total_list_accum, logs
-
-# =========================================================
-# 6. Excel 渲染引擎 (Excel Rendering Engines)
-# =========================================================
-
-@st.cache_data(show_spinner="正在生成 Excel 報表...", ttl=3600)
-def generate_excel_from_scratch(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person):
-      
-    # Common Excel Styles
-    SIDE_THIN, SIDE_MEDIUM, SIDE_HAIR = Side(style=BS_THIN), Side(style=BS_MEDIUM), Side(style=BS_HAIR)
-    SIDE_DOUBLE = Side(style='double')
-    BORDER_ALL_THIN = Border(top=SIDE_THIN, bottom=SIDE_THIN, left=SIDE_THIN, right=SIDE_THIN)
-    BORDER_ALL_MEDIUM = Border(top=SIDE_MEDIUM, bottom=SIDE_MEDIUM, left=SIDE_MEDIUM, right=SIDE_MEDIUM)
-    ALIGN_CENTER = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    ALIGN_LEFT = Alignment(horizontal='left', vertical='center', wrap_text=True)
-    ALIGN_RIGHT = Alignment(horizontal='right', vertical='center', wrap_text=True)
-    FONT_STD, FONT_BOLD, FONT_TITLE = Font(name=FONT_MAIN, size=12), Font(name=FONT_MAIN, size=14, bold=True), Font(name=FONT_MAIN, size=48, bold=True)
-    FILL_WEEKEND = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
-      
-    def set_border(cell, top=None, bottom=None, left=None, right=None):
-        cur = cell.border
-        new_top = Side(style=top) if top else cur.top
-        new_bottom = Side(style=bottom) if bottom else cur.bottom
-        new_left = Side(style=left) if left else cur.left
-        new_right = Side(style=right) if right else cur.right
-        cell.border = Border(top=new_top, bottom=new_bottom, left=new_left, right=new_right)
-
-    def draw_outer_border_fast(ws, min_r, max_r, min_c, max_c):
-        for c in range(min_c, max_c + 1):
-            set_border(ws.cell(min_r, c), top=BS_MEDIUM)
-            set_border(ws.cell(max_r, c), bottom=BS_MEDIUM)
-        for r in range(min_r, max_r + 1):
-            set_border(ws.cell(r, min_c), left=BS_MEDIUM)
-            set_border(ws.cell(r, max_c), right=BS_MEDIUM)
-
-    # ---------------------------------------------------------
-    # Sub-Engine: Dongwu (東吳格式)
-    # ---------------------------------------------------------
-    def render_dongwu_optimized(ws, start_dt, end_dt, rows, budget, prod):
-        eff_days = (end_dt - start_dt).days + 1
-        spots_col_idx = 7 + eff_days + 1
-        total_cols = spots_col_idx
-
-        COL_WIDTHS = {'A': 19.6, 'B': 22.8, 'C': 14.6, 'D': 20.0, 'E': 13.0, 'F': 19.6, 'G': 17.9}
-        ROW_HEIGHTS = {1: 61.0, 2: 29.0, 3: 40.0, 4: 40.0, 5: 40.0, 6: 40.0, 7: 40.0, 8: 40.0}
-          
-        for k, v in COL_WIDTHS.items(): ws.column_dimensions[k].width = v
-        for i in range(eff_days): ws.column_dimensions[get_column_letter(8+i)].width = 8.5
-        ws.column_dimensions[get_column_letter(spots_col_idx)].width = 13.0
-        for r, h in ROW_HEIGHTS.items(): ws.row_dimensions[r].height = h
-
-        ws.merge_cells(f"A1:{get_column_letter(total_cols)}1"); c = ws['A1']; c.value = "Media Schedule"; c.font = FONT_TITLE; c.alignment = ALIGN_CENTER
-        unique_secs = sorted(list(set([r['seconds'] for r in rows])))
-        p_str = f"{'、'.join([f'{s}秒' for s in unique_secs])} {product_name}"
-        unique_media = sorted(list(set([r['media'] for r in rows])))
-        medium_str = "/".join(unique_media)
-          
-        infos = [("A3", "客戶名稱：", client_name), ("A4", "Product：", p_str), ("A5", "Period :", f"{start_dt.strftime('%Y. %m. %d')} - {end_dt.strftime('%Y. %m. %d')}"), ("A6", "Medium :", medium_str)]
-        for pos, lbl, val in infos:
-            c = ws[pos]; c.value = lbl; c.font = FONT_BOLD; c.alignment = Alignment(vertical='center')
-            c2 = ws.cell(c.row, 2); c2.value = val; c2.font = FONT_BOLD; c2.alignment = Alignment(vertical='center')
-          
-        for c_idx in range(1, total_cols + 1): set_border(ws.cell(3, c_idx), top=BS_MEDIUM)
-        ws['H6'] = f"{start_dt.month}月"; ws['H6'].font = Font(name=FONT_MAIN, size=16, bold=True); ws['H6'].alignment = ALIGN_CENTER
-          
-        headers = [("A","Station"), ("B","Location"), ("C","Program"), ("D","Day-part"), ("E","Size"), ("F","rate\n(Net)"), ("G","Package-cost\n(Net)")]
-        for col, txt in headers:
-            col_idx = column_index_from_string(col)
-            ws.merge_cells(f"{col}7:{col}8"); c7 = ws.cell(7, col_idx); c7.value = txt; c8 = ws.cell(8, col_idx)
-            c7.font = FONT_BOLD; c7.alignment = ALIGN_CENTER; c7.border = BORDER_ALL_THIN; c8.border = BORDER_ALL_THIN
-            set_border(c7, top=BS_MEDIUM); set_border(c8, bottom=BS_MEDIUM)
-
-        curr = start_dt
-        for i in range(eff_days):
-            col_idx = 8 + i
-            c_d = ws.cell(7, col_idx); c_w = ws.cell(8, col_idx)
-            c_d.value = curr; c_d.number_format = 'm/d'; c_w.value = ["一","二","三","四","五","六","日"][curr.weekday()]
-            if curr.weekday() >= 5: c_w.fill = FILL_WEEKEND
-            curr += timedelta(days=1)
-            c_d.font = FONT_STD; c_w.font = FONT_STD; c_d.alignment = ALIGN_CENTER; c_w.alignment = ALIGN_CENTER
-            c_d.border = BORDER_ALL_THIN; c_w.border = BORDER_ALL_THIN
-            set_border(c_d, top=BS_MEDIUM); set_border(c_w, bottom=BS_MEDIUM)
-
-        c_spots_7 = ws.cell(7, spots_col_idx); c_spots_7.value = "檔次"; c_spots_8 = ws.cell(8, spots_col_idx)
-        ws.merge_cells(start_row=7, start_column=spots_col_idx, end_row=8, end_column=spots_col_idx)
-        c_spots_7.font = FONT_BOLD; c_spots_7.alignment = ALIGN_CENTER; c_spots_7.border = BORDER_ALL_THIN; c_spots_8.border = BORDER_ALL_THIN
-        set_border(c_spots_7, top=BS_MEDIUM, left=BS_MEDIUM); set_border(c_spots_8, bottom=BS_MEDIUM, left=BS_MEDIUM)
-        set_border(ws['A7'], right=BS_MEDIUM); set_border(ws['A8'], right=BS_MEDIUM)
-
-        curr_row = 9; grouped_data = {"全家廣播": sorted([r for r in rows if r["media"] == "全家廣播"], key=lambda x: x["seconds"]), "新鮮視": sorted([r for r in rows if r["media"] == "新鮮視"], key=lambda x: x["seconds"]), "家樂福": sorted([r for r in rows if r["media"] == "家樂福"], key=lambda x: x["seconds"])}
-        total_rate_sum = 0 
-
-        for m_key, data in grouped_data.items():
-            if not data: continue
-            start_merge = curr_row
-            display_name = f"全家便利商店\n{m_key if m_key!='家樂福' else ''}廣告"
-            if m_key == "家樂福": display_name = "家樂福"
-            elif m_key == "全家廣播": display_name = "全家便利商店\n通路廣播廣告"
-            elif m_key == "新鮮視": display_name = "全家便利商店\n新鮮視廣告"
-
-            for idx, r in enumerate(data):
-                ws.row_dimensions[curr_row].height = 40
-                ws.cell(curr_row, 1, display_name).alignment = ALIGN_CENTER
-                ws.cell(curr_row, 2, r["region"]).alignment = ALIGN_CENTER
-                ws.cell(curr_row, 3, r.get("program_num", 0)).alignment = ALIGN_CENTER
-                ws.cell(curr_row, 4, r["daypart"]).alignment = ALIGN_CENTER
-                ws.cell(curr_row, 5, f"{r['seconds']}秒").alignment = ALIGN_CENTER
-                rate = r['rate_display']; pkg = r['pkg_display']
-                if isinstance(rate, (int, float)): total_rate_sum += rate
-                if r.get("is_pkg_member"): pkg = r['nat_pkg_display'] if idx == 0 else None
-                c_rate = ws.cell(curr_row, 6); c_rate.value = rate; c_rate.number_format = FMT_MONEY; c_rate.alignment = ALIGN_CENTER
-                if pkg is not None: c_pkg = ws.cell(curr_row, 7); c_pkg.value = pkg; c_pkg.number_format = FMT_MONEY; c_pkg.alignment = ALIGN_CENTER
-                row_sum = 0
-                for d_idx in range(eff_days):
-                    if d_idx < len(r["schedule"]): val = r["schedule"][d_idx]; row_sum += val; c_s = ws.cell(curr_row, 8+d_idx); c_s.value = val; c_s.number_format = FMT_NUMBER; c_s.alignment = ALIGN_CENTER
-                ws.cell(curr_row, spots_col_idx, row_sum).alignment = ALIGN_CENTER
-                for c_idx in range(1, total_cols + 1): cell = ws.cell(curr_row, c_idx); cell.font = FONT_STD; cell.border = BORDER_ALL_THIN
-                curr_row += 1
-
-            ws.merge_cells(start_row=start_merge, start_column=1, end_row=curr_row-1, end_column=1)
-            if data[0].get("is_pkg_member"): ws.merge_cells(start_row=start_merge, start_column=7, end_row=curr_row-1, end_column=7)
-            for col in [4, 5]:
-                m_start = start_merge
-                while m_start < curr_row:
-                    m_end = m_start; val = ws.cell(m_start, col).value
-                    while m_end + 1 < curr_row and ws.cell(m_end+1, col).value == val: m_end += 1
-                    if m_end > m_start: ws.merge_cells(start_row=m_start, start_column=col, end_row=m_end, end_column=col)
-                    m_start = m_end + 1
-            draw_outer_border_fast(ws, start_merge, curr_row-1, 1, total_cols)
-            for r in range(start_merge, curr_row): set_border(ws.cell(r, 1), right=BS_MEDIUM); set_border(ws.cell(r, spots_col_idx), left=BS_MEDIUM)
-
-        ws.row_dimensions[curr_row].height = 30
-        c_lbl = ws.cell(curr_row, 5, "Total"); c_lbl.alignment = ALIGN_CENTER; c_lbl.font = FONT_BOLD
-        c_rate_sum = ws.cell(curr_row, 6, total_rate_sum); c_rate_sum.number_format = FMT_MONEY; c_rate_sum.alignment = ALIGN_CENTER; c_rate_sum.font = FONT_BOLD
-        c_val = ws.cell(curr_row, 7, budget); c_val.number_format = FMT_MONEY; c_val.alignment = ALIGN_CENTER; c_val.font = FONT_BOLD
-        total_spots_all = 0
-        for d_idx in range(eff_days):
-            daily_sum = sum([r['schedule'][d_idx] for r in rows if d_idx < len(r['schedule'])]); total_spots_all += daily_sum
-            c = ws.cell(curr_row, 8+d_idx); c.value = daily_sum; c.alignment = ALIGN_CENTER; c.font = FONT_STD; c.number_format = FMT_NUMBER
-        ws.cell(curr_row, spots_col_idx, total_spots_all).alignment = ALIGN_CENTER; ws.cell(curr_row, spots_col_idx).font = FONT_STD
-        for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), top=BS_MEDIUM, bottom=BS_MEDIUM, left=BS_THIN, right=BS_THIN)
-        set_border(ws.cell(curr_row, 1), left=BS_MEDIUM, right=BS_MEDIUM); set_border(ws.cell(curr_row, spots_col_idx), left=BS_MEDIUM, right=BS_MEDIUM); curr_row += 1
-
-        vat = int(budget * 0.05); grand_total = budget + vat
-        footer_items = [("媒體", budget), ("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]
-        for label, val in footer_items:
-            if label == "媒體": continue 
-            ws.row_dimensions[curr_row].height = 30
-            c_l = ws.cell(curr_row, 6); c_l.value = label; c_l.alignment = ALIGN_LEFT; c_l.font = FONT_STD
-            c_v = ws.cell(curr_row, 7); c_v.value = val; c_v.number_format = FMT_MONEY; c_v.alignment = ALIGN_CENTER; c_v.font = FONT_STD
-            set_border(c_l, left=BS_MEDIUM, top=BS_THIN, bottom=BS_THIN, right=BS_THIN)
-            set_border(c_v, right=BS_MEDIUM, top=BS_THIN, bottom=BS_THIN, left=BS_THIN)
-            if label == "Grand Total":
-                for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), top=BS_MEDIUM, bottom=BS_MEDIUM)
-            curr_row += 1
-          
-        draw_outer_border_fast(ws, 7, curr_row-1, 1, total_cols); curr_row += 1
-        ws.cell(curr_row, 1, "Remarks:").font = Font(name=FONT_MAIN, size=16, bold=True, underline='single')
-        for rm in remarks_list:
-            curr_row += 1
-            is_red = rm.strip().startswith("1.") or rm.strip().startswith("4.")
-            c = ws.cell(curr_row, 1); c.value = rm; c.font = Font(name=FONT_MAIN, size=14, color="FF0000" if is_red else "000000")
-
-        curr_row += 2; sig_start = curr_row
-        ws.merge_cells(start_row=sig_start, start_column=1, end_row=sig_start, end_column=7); ws.cell(sig_start, 1, "甲    方：東吳廣告股份有限公司").alignment = ALIGN_LEFT
-        ws.merge_cells(start_row=sig_start+1, start_column=1, end_row=sig_start+1, end_column=7); ws.cell(sig_start+1, 1, "統一編號：20935458").alignment = ALIGN_LEFT
-        ws.merge_cells(start_row=sig_start+2, start_column=1, end_row=sig_start+2, end_column=7); ws.cell(sig_start+2, 1, sales_person).alignment = ALIGN_LEFT; ws.cell(sig_start+2, 1).font = FONT_STD
-          
-        right_start_col = 20 # Column T
-        ws.merge_cells(start_row=sig_start, start_column=right_start_col, end_row=sig_start, end_column=right_start_col+7); ws.cell(sig_start, right_start_col, f"乙    方：{client_name}").alignment = ALIGN_LEFT
-        ws.merge_cells(start_row=sig_start+1, start_column=right_start_col, end_row=sig_start+1, end_column=right_start_col+7); ws.cell(sig_start+1, right_start_col, "統一編號：").alignment = ALIGN_LEFT
-        ws.merge_cells(start_row=sig_start+2, start_column=right_start_col, end_row=sig_start+2, end_column=right_start_col+7); ws.cell(sig_start+2, right_start_col, "客戶簽章：").alignment = ALIGN_LEFT
-        for c_idx in range(1, total_cols + 1): set_border(ws.cell(sig_start, c_idx), top=BS_THIN)
-        return curr_row + 3
-
-    # ---------------------------------------------------------
-    # Sub-Engine: Shenghuo (聲活數位格式)
-    # ---------------------------------------------------------
-    def render_shenghuo_optimized(ws, start_dt, end_dt, rows, budget, prod):
-        SIDE_DOUBLE = Side(style='double')
-        eff_days = (end_dt - start_dt).days + 1
-        end_c_start = 6 + eff_days
-        total_cols = end_c_start + 2
-
-        ws.column_dimensions['A'].width = 22.5; ws.column_dimensions['B'].width = 24.5; ws.column_dimensions['C'].width = 13.8; ws.column_dimensions['D'].width = 19.4; ws.column_dimensions['E'].width = 15.0
-        for i in range(eff_days): ws.column_dimensions[get_column_letter(6 + i)].width = 8.1 
-        ws.column_dimensions[get_column_letter(end_c_start)].width = 9.5; ws.column_dimensions[get_column_letter(end_c_start+1)].width = 58.0; ws.column_dimensions[get_column_letter(end_c_start+2)].width = 20.0 
-        ROW_H_MAP = {1:30, 2:30, 3:46, 4:46, 5:40, 6:40, 7:35, 8:35}; 
-        for r, h in ROW_H_MAP.items(): ws.row_dimensions[r].height = h
-          
-        ws.merge_cells(f"A1:{get_column_letter(total_cols)}1"); c1 = ws['A1']; c1.value = "聲活數位-媒體計劃排程表"; c1.font = Font(name=FONT_MAIN, size=24, bold=True); c1.alignment = ALIGN_CENTER
-        ws.merge_cells(f"A2:{get_column_letter(total_cols)}2"); c2 = ws['A2']; c2.value = "Media Schedule"; c2.font = Font(name=FONT_MAIN, size=18, bold=True); c2.alignment = ALIGN_CENTER
-        FONT_16 = Font(name=FONT_MAIN, size=16); ws.merge_cells(f"A3:{get_column_letter(total_cols)}3"); ws['A3'].value = "聲活數位科技股份有限公司 統編 28710100"; ws['A3'].font = FONT_16; ws['A3'].alignment = ALIGN_LEFT
-        ws.merge_cells(f"A4:{get_column_letter(total_cols)}4"); ws['A4'].value = sales_person; ws['A4'].font = FONT_16; ws['A4'].alignment = ALIGN_LEFT
-          
-        unique_secs = sorted(list(set([r['seconds'] for r in rows]))); sec_str = " ".join([f"{s}秒廣告" for s in unique_secs]); period_str = f"執行期間：{start_dt.strftime('%Y.%m.%d')} - {end_dt.strftime('%Y.%m.%d')}"
-        FONT_14 = Font(name=FONT_MAIN, size=14); c5a = ws['A5']; c5a.value = "客戶名稱："; c5a.font = FONT_14; c5a.alignment = ALIGN_LEFT
-        ws.merge_cells("B5:E5"); c5b = ws['B5']; c5b.value = client_name; c5b.font = FONT_14; c5b.alignment = ALIGN_LEFT
-        ws.merge_cells(f"F5:{get_column_letter(end_c_start)}5"); c5f = ws['F5']; c5f.value = f"廣告規格：{sec_str}"; c5f.font = FONT_14; c5f.alignment = ALIGN_LEFT
-        ws.merge_cells(f"{get_column_letter(end_c_start+1)}5:{get_column_letter(total_cols)}5"); c5_r = ws[f"{get_column_letter(end_c_start+1)}5"]; c5_r.value = period_str; c5_r.font = FONT_14; c5_r.alignment = ALIGN_LEFT 
-        draw_outer_border_fast(ws, 5, 5, 1, total_cols)
-
-        c6a = ws['A6']; c6a.value = "廣告名稱："; c6a.font = FONT_14; c6a.alignment = ALIGN_LEFT; ws.merge_cells("B6:E6"); c6b = ws['B6']; c6b.value = product_name; c6b.font = FONT_14; c6b.alignment = ALIGN_LEFT
-        month_groups = []
-        for i in range(eff_days):
-            d = start_dt + timedelta(days=i); m_key = (d.year, d.month)
-            if not month_groups or month_groups[-1][0] != m_key: month_groups.append([m_key, i, i]) 
-            else: month_groups[-1][2] = i
-        for m_key, s_idx, e_idx in month_groups:
-            start_col = 6 + s_idx; end_col = 6 + e_idx
-            ws.merge_cells(start_row=6, start_column=start_col, end_row=6, end_column=end_col); c = ws.cell(6, start_col); c.value = f"{m_key[1]}月"; c.font = FONT_BOLD; c.alignment = ALIGN_LEFT; c.border = BORDER_ALL_MEDIUM
-        for c_idx in range(1, total_cols + 1):
-            c = ws.cell(6, c_idx); t, b, l, r = BS_MEDIUM, BS_MEDIUM, None, None
-            if c_idx == 1: l = BS_MEDIUM 
-            if c_idx == total_cols: r = BS_MEDIUM 
-            if c_idx == 6: l = None 
-            c.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l) if l else None, right=Side(style=r) if r else None)
-        draw_outer_border_fast(ws, 6, 6, 1, 5); ws.cell(6, 5).border = Border(top=Side(style=BS_MEDIUM), bottom=Side(style=BS_MEDIUM), right=Side(style=None))
-          
-        header_start_row = 7; headers = ["頻道", "播出地區", "播出店數", "播出時間", "秒數\n規格"]
-        for i, h in enumerate(headers):
-            c_idx = i + 1; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
-            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
-            if c_idx == 1: l = BS_MEDIUM
-            c.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r)); ws.cell(header_start_row+1, c_idx).border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=l), right=Side(style=r))
-
-        curr = start_dt
-        for i in range(eff_days):
-            col_idx = 6 + i; c7 = ws.cell(header_start_row, col_idx); c7.value = curr.day; c7.font = FONT_BOLD; c7.alignment = ALIGN_CENTER; c7.border = BORDER_ALL_MEDIUM
-            c7.border = Border(top=Side(style=BS_MEDIUM), bottom=Side(style=BS_THIN), left=Side(style=BS_THIN), right=Side(style=BS_THIN))
-            c8 = ws.cell(header_start_row+1, col_idx); c8.value = ["日","一","二","三","四","五","六"][(curr.weekday()+1)%7]; c8.font = FONT_BOLD; c8.alignment = ALIGN_CENTER
-            style_left = BS_MEDIUM if col_idx == 6 else BS_THIN
-            c8.border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=style_left), right=Side(style=BS_THIN)); 
-            if curr.weekday() >= 5: c8.fill = FILL_WEEKEND
-            curr += timedelta(days=1)
-
-        end_headers = ["檔次", "定價", "專案價"]; 
-        for i, h in enumerate(end_headers):
-            c_idx = end_c_start + i; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
-            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
-            if c_idx == total_cols: r = BS_MEDIUM
-            c.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r)); ws.cell(header_start_row+1, c_idx).border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=l), right=Side(style=r))
-
-        date_start_col = 6
-        for c_idx in range(date_start_col, total_cols + 1):
-            c7 = ws.cell(header_start_row, c_idx); c7.border = Border(top=Side(style=BS_MEDIUM), bottom=Side(style=BS_THIN), left=Side(style=BS_THIN), right=Side(style=BS_THIN))
-            if c_idx == date_start_col: set_border(c7, left=BS_MEDIUM)
-            if c_idx == total_cols: set_border(c7, right=BS_MEDIUM)
-            c8 = ws.cell(header_start_row+1, c_idx); c8.border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=BS_THIN), right=Side(style=BS_THIN))
-            if c_idx == date_start_col: set_border(c8, left=BS_MEDIUM)
-            if c_idx == total_cols: set_border(c8, right=BS_MEDIUM)
-
-        curr_row = header_start_row + 2; grouped_data = {"全家廣播": sorted([r for r in rows if r["media"]=="全家廣播"], key=lambda x:x['seconds']), "新鮮視": sorted([r for r in rows if r["media"]=="新鮮視"], key=lambda x:x['seconds']), "家樂福": sorted([r for r in rows if r["media"]=="家樂福"], key=lambda x:x['seconds'])}
-        total_store_count = 0; total_list_sum = 0
-
-        for m_key, data in grouped_data.items():
-            if not data: continue
-            start_merge = curr_row; d_name = f"全家便利商店\n{m_key}廣告" if m_key != "家樂福" else "家樂福"
-            for idx, r in enumerate(data):
-                ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 1, d_name).alignment = ALIGN_CENTER; ws.cell(curr_row, 2, r['region']).alignment = ALIGN_CENTER
-                p_num = int(r.get('program_num', 0)); total_store_count += p_num; suffix = "面" if m_key == "新鮮視" else "店"; ws.cell(curr_row, 3, f"{p_num:,}{suffix}").alignment = ALIGN_CENTER
-                ws.cell(curr_row, 4, r['daypart']).alignment = ALIGN_CENTER
-                sec = r['seconds']; sec_txt = f"{sec}秒\n影片/影像 1920x1080 (mp4)" if m_key == "新鮮視" else f"{sec}秒廣告"; c_spec = ws.cell(curr_row, 5, sec_txt); c_spec.alignment = ALIGN_CENTER; c_spec.font = Font(name=FONT_MAIN, size=10)
-                row_sum = 0
-                for d_idx in range(eff_days):
-                    if d_idx < len(r['schedule']): val = r['schedule'][d_idx]; row_sum += val; c = ws.cell(curr_row, 6+d_idx); c.value = val; c.alignment = ALIGN_CENTER; c.font = FONT_STD; c.border = BORDER_ALL_THIN
-                ws.cell(curr_row, end_c_start, row_sum).alignment = ALIGN_CENTER
-                rate_val = r['rate_display']; 
-                if isinstance(rate_val, (int, float)): total_list_sum += rate_val
-                ws.cell(curr_row, end_c_start+1, rate_val).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER 
-                pkg = r['pkg_display']; 
-                if r.get('is_pkg_member'): pkg = r['nat_pkg_display'] if idx == 0 else None
-                ws.cell(curr_row, end_c_start+2, pkg).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
-                for c_idx in range(1, total_cols + 1): c = ws.cell(curr_row, c_idx); c.font = FONT_STD; c.border = BORDER_ALL_THIN
-                set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
-            ws.merge_cells(start_row=start_merge, start_column=1, end_row=curr_row-1, end_column=1)
-            if data[0].get('is_pkg_member'): ws.merge_cells(start_row=start_merge, start_column=end_c_start+2, end_row=curr_row-1, end_column=end_c_start+2)
-            draw_outer_border_fast(ws, start_merge, curr_row-1, 1, total_cols)
-
-        ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 3, total_store_count).number_format = FMT_NUMBER; ws.cell(curr_row, 3).alignment = ALIGN_CENTER; ws.cell(curr_row, 3).font = FONT_BOLD
-        ws.cell(curr_row, 5, "Total").alignment = ALIGN_CENTER; ws.cell(curr_row, 5).font = FONT_BOLD
-        for d_idx in range(eff_days): daily_sum = sum([r['schedule'][d_idx] for r in rows if d_idx < len(r['schedule'])]); c = ws.cell(curr_row, 6+d_idx); c.value = daily_sum; c.alignment = ALIGN_CENTER; c.font = FONT_BOLD
-        ws.cell(curr_row, end_c_start, sum([sum(r['schedule']) for r in rows])).alignment = ALIGN_CENTER; ws.cell(curr_row, end_c_start).font = FONT_BOLD
-        ws.cell(curr_row, end_c_start+1, total_list_sum).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).font = FONT_BOLD; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER
-        ws.cell(curr_row, end_c_start+2, budget).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).font = FONT_BOLD; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
-        for c_idx in range(1, total_cols+1): ws.cell(curr_row, c_idx).border = BORDER_ALL_THIN
-        draw_outer_border_fast(ws, curr_row, curr_row, 1, total_cols)
-        for c_idx in range(1, total_cols+1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
-        set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
-
-        vat = int(budget * 0.05); grand_total = budget + vat
-        footer_stack = [("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]
-        for lbl, val in footer_stack:
-            ws.row_dimensions[curr_row].height = 30; c_l = ws.cell(curr_row, end_c_start+1); c_l.value = lbl; c_l.alignment = ALIGN_RIGHT; c_l.font = FONT_STD
-            c_v = ws.cell(curr_row, end_c_start+2); c_v.value = val; c_v.number_format = FMT_MONEY; c_v.alignment = ALIGN_CENTER; c_v.font = FONT_BOLD 
-            t, b, l, r = BS_THIN, BS_THIN, BS_MEDIUM, BS_THIN; 
-            if lbl == "Grand Total": b = BS_MEDIUM 
-            c_l.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r))
-            t, b, l, r = BS_THIN, BS_THIN, BS_THIN, BS_MEDIUM; 
-            if lbl == "Grand Total": b = BS_MEDIUM 
-            c_v.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r))
-            if lbl == "Grand Total":
-                for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
-            curr_row += 1
-          
-        curr_row += 1; start_footer = curr_row; r_col_start = 6 
-        ws.row_dimensions[start_footer].height = 25; ws.cell(start_footer, r_col_start).value = "Remarks："
-        ws.cell(start_footer, r_col_start).font = Font(name=FONT_MAIN, size=16, bold=True)
-        r_row = start_footer
-        for rm in remarks_list:
-            r_row += 1; ws.row_dimensions[r_row].height = 25; is_red = rm.strip().startswith("1.") or rm.strip().startswith("4."); is_blue = rm.strip().startswith("6."); color = "000000"
-            if is_red: color = "FF0000"
-            if is_blue: color = "0000FF"
-            c = ws.cell(r_row, r_col_start); c.value = rm; c.font = Font(name=FONT_MAIN, size=16, color=color)
-
-        sig_col_start = 1
-        ws.cell(start_footer, sig_col_start).value = "乙        方："; ws.cell(start_footer, sig_col_start).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+1, sig_col_start+1).value = client_name; ws.cell(start_footer+1, sig_col_start+1).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+2, sig_col_start).value = "統一編號："; ws.cell(start_footer+2, sig_col_start).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+2, sig_col_start+2).value = ""; ws.cell(start_footer+2, sig_col_start+2).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+3, sig_col_start).value = "客戶簽章："; ws.cell(start_footer+3, sig_col_start).font = Font(name=FONT_MAIN, size=16)
-
-        target_border_row = r_row + 2
-        for c_idx in range(1, total_cols + 1): ws.cell(target_border_row, c_idx).border = Border(bottom=SIDE_DOUBLE)
-        return target_border_row
-
-    # ---------------------------------------------------------
-    # Sub-Engine: Bolin (鉑霖格式)
-    # ---------------------------------------------------------
-    def render_bolin_optimized(ws, start_dt, end_dt, rows, budget, prod):
-        SIDE_DOUBLE = Side(style='double')
-        logo_bytes = get_cloud_logo_bytes()
-        eff_days = (end_dt - start_dt).days + 1; end_c_start = 6 + eff_days; total_cols = end_c_start + 2
-        ws.column_dimensions['A'].width = 21.0; ws.column_dimensions['B'].width = 21.0; ws.column_dimensions['C'].width = 13.8; ws.column_dimensions['D'].width = 19.4; ws.column_dimensions['E'].width = 15.0
-        for i in range(eff_days): ws.column_dimensions[get_column_letter(6 + i)].width = 8.1
-        ws.column_dimensions[get_column_letter(end_c_start)].width = 9.5; ws.column_dimensions[get_column_letter(end_c_start+1)].width = 36.0; ws.column_dimensions[get_column_letter(end_c_start+2)].width = 20.0
-        ROW_H_MAP = {1:70, 2:33.5, 3:33.5, 4:46, 5:40, 6:35, 7:35}
-        for r, h in ROW_H_MAP.items(): ws.row_dimensions[r].height = h
-          
-        ws.merge_cells(f"A1:{get_column_letter(total_cols)}1"); c1 = ws['A1']; c1.value = "鉑霖行動行銷-媒體計劃排程表 Mobi Media Schedule"; c1.font = Font(name=FONT_MAIN, size=28, bold=True); c1.alignment = ALIGN_LEFT 
-        if logo_bytes:
-            try: img = OpenpyxlImage(io.BytesIO(logo_bytes)); scale = 125 / img.height; img.height = 125; img.width = int(img.width * scale); col_letter = get_column_letter(total_cols - 1); img.anchor = f"{col_letter}1"; ws.add_image(img)
-            except Exception: pass
-
-        c2a = ws['A2']; c2a.value = "TO："; c2a.font = Font(name=FONT_MAIN, size=20, bold=True, color="FF0000"); c2a.alignment = ALIGN_LEFT
-        ws.merge_cells(f"B2:{get_column_letter(total_cols)}2"); c2b = ws['B2']; c2b.value = client_name; c2b.font = Font(name=FONT_MAIN, size=20, bold=True, color="FF0000"); c2b.alignment = ALIGN_LEFT
-        c3a = ws['A3']; c3a.value = "FROM："; c3a.font = Font(name=FONT_MAIN, size=20, bold=True); c3a.alignment = ALIGN_LEFT
-        ws.merge_cells(f"B3:{get_column_letter(total_cols)}3"); c3b = ws['B3']; c3b.value = f"鉑霖行動行銷 {sales_person}"; c3b.font = Font(name=FONT_MAIN, size=20, bold=True); c3b.alignment = ALIGN_LEFT
-
-        unique_secs = sorted(list(set([r['seconds'] for r in rows]))); sec_str = " ".join([f"{s}秒廣告" for s in unique_secs]); period_str = f"執行期間：{start_dt.strftime('%Y.%m.%d')} - {end_dt.strftime('%Y.%m.%d')}"
-        c4a = ws['A4']; c4a.value = "客戶名稱："; c4a.font = Font(name=FONT_MAIN, size=14, bold=True); c4a.alignment = ALIGN_LEFT
-        ws.merge_cells("B4:E4"); c4b = ws['B4']; c4b.value = client_name; c4b.font = Font(name=FONT_MAIN, size=14, bold=True); c4b.alignment = ALIGN_LEFT
-        spec_merge_start = "F4"; spec_merge_end = f"{get_column_letter(end_c_start)}4"; ws.merge_cells(f"{spec_merge_start}:{spec_merge_end}"); c4f = ws['F4']; c4f.value = f"廣告規格：{sec_str}"; c4f.font = Font(name=FONT_MAIN, size=14, bold=True); c4f.alignment = ALIGN_LEFT
-        ws.merge_cells(f"{get_column_letter(end_c_start+1)}4:{get_column_letter(total_cols)}4"); c4_r = ws[f"{get_column_letter(end_c_start+1)}4"]; c4_r.value = period_str; c4_r.font = Font(name=FONT_MAIN, size=14, bold=True); c4_r.alignment = ALIGN_LEFT
-        draw_outer_border_fast(ws, 4, 4, 1, total_cols)
-
-        c5a = ws['A5']; c5a.value = "廣告名稱："; c5a.font = Font(name=FONT_MAIN, size=14, bold=True); c5a.alignment = ALIGN_LEFT
-        ws.merge_cells("B5:E5"); c5b = ws['B5']; c5b.value = product_name; c5b.font = Font(name=FONT_MAIN, size=14, bold=True); c5b.alignment = ALIGN_LEFT
-        month_groups = []
-        for i in range(eff_days):
-            d = start_dt + timedelta(days=i); m_key = (d.year, d.month)
-            if not month_groups or month_groups[-1][0] != m_key: month_groups.append([m_key, i, i]) 
-            else: month_groups[-1][2] = i
-        for m_key, s_idx, e_idx in month_groups:
-            start_col = 6 + s_idx; end_col = 6 + e_idx; ws.merge_cells(start_row=5, start_column=start_col, end_row=5, end_column=end_col); c = ws.cell(5, start_col); c.value = f"{m_key[1]}月"; c.font = FONT_BOLD; c.alignment = ALIGN_LEFT 
-        for c_idx in range(1, total_cols + 1):
-            c = ws.cell(5, c_idx); t, b, l, r = BS_MEDIUM, BS_MEDIUM, None, None
-            if c_idx == 1: l = BS_MEDIUM 
-            if c_idx == total_cols: r = BS_MEDIUM 
-            if c_idx == 6: l = None 
-            c.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l) if l else None, right=Side(style=r) if r else None)
-        draw_outer_border_fast(ws, 5, 5, 1, 5); ws.cell(5, 5).border = Border(top=Side(style=BS_MEDIUM), bottom=Side(style=BS_MEDIUM), right=Side(style=None))
-
-        header_start_row = 6; headers = ["頻道", "播出地區", "播出店數", "播出時間", "秒數\n規格"]
-        for i, h in enumerate(headers):
-            c_idx = i + 1; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
-            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
-            if c_idx == 1: l = BS_MEDIUM
-            c.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r)); ws.cell(header_start_row+1, c_idx).border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=l), right=Side(style=r))
-
-        curr = start_dt
-        for i in range(eff_days):
-            col_idx = 6 + i; c6 = ws.cell(header_start_row, col_idx); c6.value = curr.day; c6.font = FONT_BOLD; c6.alignment = ALIGN_CENTER; c6.border = BORDER_ALL_MEDIUM; c6.border = Border(top=Side(style=BS_MEDIUM), bottom=Side(style=BS_THIN), left=Side(style=BS_THIN), right=Side(style=BS_THIN))
-            c7 = ws.cell(header_start_row+1, col_idx); c7.value = ["日","一","二","三","四","五","六"][(curr.weekday()+1)%7]; c7.font = FONT_BOLD; c7.alignment = ALIGN_CENTER; style_left = BS_MEDIUM if col_idx == 6 else BS_THIN; c7.border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=style_left), right=Side(style=BS_THIN))
-            if curr.weekday() >= 5: c7.fill = FILL_WEEKEND
-            curr += timedelta(days=1)
-
-        end_headers = ["檔次", "定價", "專案價"]; 
-        for i, h in enumerate(end_headers):
-            c_idx = end_c_start + i; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
-            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
-            if c_idx == total_cols: r = BS_MEDIUM
-            c.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r)); ws.cell(header_start_row+1, c_idx).border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=l), right=Side(style=r))
-
-        date_start_col = 6
-        for c_idx in range(date_start_col, total_cols + 1):
-            c7 = ws.cell(header_start_row, c_idx); c7.border = Border(top=Side(style=BS_MEDIUM), bottom=Side(style=BS_THIN), left=Side(style=BS_THIN), right=Side(style=BS_THIN))
-            if c_idx == date_start_col: set_border(c7, left=BS_MEDIUM)
-            if c_idx == total_cols: set_border(c7, right=BS_MEDIUM)
-            c8 = ws.cell(8, c_idx); c8.border = Border(top=Side(style=BS_THIN), bottom=Side(style=BS_THIN), left=Side(style=BS_THIN), right=Side(style=BS_THIN))
-            if c_idx == date_start_col: set_border(c8, left=BS_MEDIUM)
-            if c_idx == total_cols: set_border(c8, right=BS_MEDIUM)
-
-        curr_row = header_start_row + 2; grouped_data = {"全家廣播": sorted([r for r in rows if r["media"]=="全家廣播"], key=lambda x:x['seconds']), "新鮮視": sorted([r for r in rows if r["media"]=="新鮮視"], key=lambda x:x['seconds']), "家樂福": sorted([r for r in rows if r["media"]=="家樂福"], key=lambda x:x['seconds'])}
-        total_store_count = 0; total_list_sum = 0
-        for m_key, data in grouped_data.items():
-            if not data: continue
-            start_merge = curr_row; d_name = f"全家便利商店\n{m_key}廣告" if m_key != "家樂福" else "家樂福"
-            for idx, r in enumerate(data):
-                ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 1, d_name).alignment = ALIGN_CENTER; ws.cell(curr_row, 2, r['region']).alignment = ALIGN_CENTER
-                p_num = int(r.get('program_num', 0)); total_store_count += p_num; suffix = "面" if m_key == "新鮮視" else "店"; ws.cell(curr_row, 3, f"{p_num:,}{suffix}").alignment = ALIGN_CENTER
-                ws.cell(curr_row, 4, r['daypart']).alignment = ALIGN_CENTER
-                sec = r['seconds']; sec_txt = f"{sec}秒\n影片/影像 1920x1080 (mp4)" if m_key == "新鮮視" else f"{sec}秒廣告"; c_spec = ws.cell(curr_row, 5, sec_txt); c_spec.alignment = ALIGN_CENTER; c_spec.font = Font(name=FONT_MAIN, size=10)
-                row_sum = 0
-                for d_idx in range(eff_days):
-                    if d_idx < len(r['schedule']): val = r['schedule'][d_idx]; row_sum += val; c = ws.cell(curr_row, 6+d_idx); c.value = val; c.alignment = ALIGN_CENTER; c.font = FONT_STD; c.border = BORDER_ALL_THIN
-                ws.cell(curr_row, end_c_start, row_sum).alignment = ALIGN_CENTER
-                rate_val = r['rate_display']; 
-                if isinstance(rate_val, (int, float)): total_list_sum += rate_val
-                ws.cell(curr_row, end_c_start+1, rate_val).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER 
-                pkg = r['pkg_display']; 
-                if r.get('is_pkg_member'): pkg = r['nat_pkg_display'] if idx == 0 else None
-                ws.cell(curr_row, end_c_start+2, pkg).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
-                for c_idx in range(1, total_cols + 1): c = ws.cell(curr_row, c_idx); c.font = FONT_STD; c.border = BORDER_ALL_THIN
-                set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
-            ws.merge_cells(start_row=start_merge, start_column=1, end_row=curr_row-1, end_column=1)
-            if data[0].get('is_pkg_member'): ws.merge_cells(start_row=start_merge, start_column=end_c_start+2, end_row=curr_row-1, end_column=end_c_start+2)
-            draw_outer_border_fast(ws, start_merge, curr_row-1, 1, total_cols)
-
-        ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 3, total_store_count).number_format = FMT_NUMBER; ws.cell(curr_row, 3).alignment = ALIGN_CENTER; ws.cell(curr_row, 3).font = FONT_BOLD
-        ws.cell(curr_row, 5, "Total").alignment = ALIGN_CENTER; ws.cell(curr_row, 5).font = FONT_BOLD
-        for d_idx in range(eff_days): daily_sum = sum([r['schedule'][d_idx] for r in rows if d_idx < len(r['schedule'])]); c = ws.cell(curr_row, 6+d_idx); c.value = daily_sum; c.alignment = ALIGN_CENTER; c.font = FONT_BOLD
-        ws.cell(curr_row, end_c_start, sum([sum(r['schedule']) for r in rows])).alignment = ALIGN_CENTER; ws.cell(curr_row, end_c_start).font = FONT_BOLD
-        ws.cell(curr_row, end_c_start+1, total_list_sum).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).font = FONT_BOLD; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER
-        ws.cell(curr_row, end_c_start+2, budget).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).font = FONT_BOLD; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
-        for c_idx in range(1, total_cols+1): ws.cell(curr_row, c_idx).border = BORDER_ALL_THIN
-        draw_outer_border_fast(ws, curr_row, curr_row, 1, total_cols)
-        for c_idx in range(1, total_cols+1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
-        set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
-
-        vat = int(budget * 0.05); grand_total = budget + vat
-        footer_stack = [("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]
-        for lbl, val in footer_stack:
-            ws.row_dimensions[curr_row].height = 30; c_l = ws.cell(curr_row, end_c_start+1); c_l.value = lbl; c_l.alignment = ALIGN_RIGHT; c_l.font = FONT_STD
-            c_v = ws.cell(curr_row, end_c_start+2); c_v.value = val; c_v.number_format = FMT_MONEY; c_v.alignment = ALIGN_CENTER; c_v.font = FONT_BOLD 
-            t, b, l, r = BS_THIN, BS_THIN, BS_MEDIUM, BS_THIN; 
-            if lbl == "Grand Total": b = BS_MEDIUM 
-            c_l.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r))
-            t, b, l, r = BS_THIN, BS_THIN, BS_THIN, BS_MEDIUM; 
-            if lbl == "Grand Total": b = BS_MEDIUM 
-            c_v.border = Border(top=Side(style=t), bottom=Side(style=b), left=Side(style=l), right=Side(style=r))
-            if lbl == "Grand Total":
-                for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
-            curr_row += 1
-          
-        curr_row += 1; start_footer = curr_row; r_col_start = 6 
-        ws.row_dimensions[start_footer].height = 25; ws.cell(start_footer, r_col_start).value = "Remarks："
-        ws.cell(start_footer, r_col_start).font = Font(name=FONT_MAIN, size=16, bold=True)
-        r_row = start_footer
-        for rm in remarks_list:
-            r_row += 1; ws.row_dimensions[r_row].height = 25; is_red = rm.strip().startswith("1.") or rm.strip().startswith("4."); is_blue = rm.strip().startswith("6."); color = "000000"
-            if is_red: color = "FF0000"
-            if is_blue: color = "0000FF"
-            c = ws.cell(r_row, r_col_start); c.value = rm; c.font = Font(name=FONT_MAIN, size=16, color=color)
-
-        sig_col_start = 1
-        ws.cell(start_footer, sig_col_start).value = "乙        方："; ws.cell(start_footer, sig_col_start).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+1, sig_col_start+1).value = client_name; ws.cell(start_footer+1, sig_col_start+1).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+2, sig_col_start).value = "統一編號："; ws.cell(start_footer+2, sig_col_start).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+2, sig_col_start+2).value = ""; ws.cell(start_footer+2, sig_col_start+2).font = Font(name=FONT_MAIN, size=16)
-        ws.cell(start_footer+3, sig_col_start).value = "客戶簽章："; ws.cell(start_footer+3, sig_col_start).font = Font(name=FONT_MAIN, size=16)
-
-        target_border_row = r_row + 2
-        for c_idx in range(1, total_cols + 1): ws.cell(target_border_row, c_idx).border = Border(bottom=SIDE_DOUBLE)
-        return target_border_row
-
-    # Main Execution of Excel Generation
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Schedule"
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-    ws.page_setup.paperSize = ws.PAPERSIZE_A4
-    ws.page_setup.fitToPage = True
-      
-    # === 修改點：改用中文判斷 ===
-    if format_type == "東吳":
-        render_dongwu_optimized(ws, start_dt, end_dt, rows, final_budget_val, prod_cost)
-    elif format_type == "聲活":
-        render_shenghuo_optimized(ws, start_dt, end_dt, rows, final_budget_val, prod_cost)
-    else:
-        render_bolin_optimized(ws, start_dt, end_dt, rows, final_budget_val, prod_cost)
-    # ==========================
-
-    out = io.BytesIO()
-    wb.save(out)
-    return out.getvalue()
+                    _, errors = pf.add_ragic_records(records, cloud_cfg)
+                    st.caption(f"Ragic 紀錄 {len(records)} 筆")
+        with c_file:
+            upload = st.file_uploader("加入訂單表 (格式同批次產生)", type=["csv", "xlsx"], key="pf_upload")
+            if upload is not None:
+                # 每次 rerun 都會重新加入，但內容未變的訂單會直接略過；同一檔案改版的列取代舊版本
+                try: _, errors = pf.add_upload(read_batch_orders(upload.getvalue(), upload.name), cloud_cfg, upload.name)
+                except Exception as e: st.error(f"訂單表讀取失敗: {e}")
+        if errors:
+            st.warning(f"{len(errors)} 筆無法計算，未列入彙總")
+            st.dataframe(pd.DataFrame(errors, columns=["序號", "方案", "錯誤"]), hide_index=True, use_container_width=True)
+
+        totals = pf.totals()
+        m1, m2, m3 = st.columns(3)
+        m1.metric("方案數", totals["plans"]); m2.metric("區間內總檔次", f"{totals['window_spots']:,}"); m3.metric("區間內金額", f"${totals['window_budget']:,}")
+        if not len(pf): return
+        st.markdown("**各媒體 / 區域檔次負載**")
+        st.dataframe(pf.load_summary(cloud_cfg.pricing_db), hide_index=True, use_container_width=True)
+        media = st.radio("每日明細", ["全部"] + sorted(set(pf.rows_frame()["media"])), horizontal=True, key="pf_media")
+        st.dataframe(pf.daily_load(None if media == "全部" else media), hide_index=True, use_container_width=True)
+        t_sales, t_client, t_plans = st.tabs(["依業務", "依客戶", "方案明細"])
+        with t_sales: st.dataframe(pf.budget_by("sales"), hide_index=True, use_container_width=True)
+        with t_client: st.dataframe(pf.budget_by("client"), hide_index=True, use_container_width=True)
+        with t_plans: st.dataframe(pf.plans_frame(), hide_index=True, use_container_width=True)
+
+# --- 檔次庫存 ---
+def render_inventory_warning(conflicts):
+    if not conflicts: return
+    days = len(set([c["date"] for c in conflicts]))
+    st.warning(f"⚠️ 檔次超過可播容量：共 {days} 天 {len(conflicts)} 筆 (含其他已上傳的方案)，上傳 Ragic 時將無法預約，請調整走期或秒數配置。")
+    with st.expander("超賣明細", expanded=False):
+        st.dataframe(pd.DataFrame([{"日期": c["date"], "媒體": c["media"], "區域": c["region"], "秒數": "合計" if c["seconds"] == ALL_SECONDS else c["seconds"],
+                                    "容量": c["capacity"], "已預約": c["booked"], "本方案": c["requested"], "超出": c["over"]} for c in conflicts]),
+                     hide_index=True, use_container_width=True)
+
+def render_inventory_panel(capacity):
+    """檔次庫存面板 (主管)：各預約與未來走期的容量使用率，可取消預約 (例如 Ragic 紀錄已刪除)。"""
+    with st.expander("🗓️ 檔次庫存 (容量預約)", expanded=False):
+        ledger = get_inventory_ledger()
+        if not capacity: st.caption("設定檔沒有 Capacity 分頁 (Media / Region / Seconds / Daily_Spots)，目前只記錄預約、不檢查容量。")
+        c_from, c_to = st.columns(2)
+        d_from = c_from.date_input("起", date.today(), key="inv_from")
+        d_to = c_to.date_input("迄", date.today() + timedelta(days=30), key="inv_to")
+        if d_to >= d_from:
+            usage = []
+            for (media, region, sec), vec in sorted(ledger.usage(d_from, d_to).items()):
+                cap = capacity_limits(capacity, media, region).get(sec)
+                peak = int(vec.argmax())
+                usage.append({"媒體": media, "區域": region, "秒數": sec, "每日容量": cap, "最高預約": int(vec[peak]), "最高日": d_from + timedelta(days=peak),
+                              "使用率": f"{vec[peak] / cap:.0%}" if cap else ""})
+            st.dataframe(pd.DataFrame(usage), hide_index=True, use_container_width=True)
+        reservations = ledger.reservations()
+        st.markdown(f"**預約 ({len(reservations)} 筆)**")
+        if not reservations: return
+        st.dataframe(pd.DataFrame([{"方案": r["label"], "媒體": r["media"], "開始": r["start"], "結束": r["end"], "總檔次": r["total"],
+                                    "預約時間": datetime.fromtimestamp(r["created_at"]).strftime("%Y-%m-%d %H:%M")} for r in reservations]),
+                     hide_index=True, use_container_width=True)
+        res_id = st.selectbox("取消預約", [r["id"] for r in reservations], format_func=lambda i: next(f"{r['label']} ({r['start']} ~ {r['end']})" for r in reservations if r["id"] == i), key="inv_release")
+        if st.button("🗑️ 取消此預約", key="inv_release_btn"):
+            ledger.release(res_id)
+            st.rerun()
+
+# --- 效能量測面板 (主管) ---
+def render_timing_panel(spans, total_ms):
+    """顯示本次 rerun 各步驟的耗時 (含快取命中) 與程序累計統計；背景工作的步驟只出現在累計中。"""
+    with st.expander(f"⏱️ 效能量測：本次執行 {total_ms:.0f} ms", expanded=False):
+        done = [s for s in spans if s["ms"] is not None]
+        if done:
+            top_ms = sum([s["ms"] for s in done if s["depth"] == 0])
+            st.caption(f"已量測步驟合計 {top_ms:.0f} ms (其餘 {max(total_ms - top_ms, 0):.0f} ms 為介面繪製等)")
+            st.dataframe(pd.DataFrame([{
+                "步驟": "　" * s["depth"] + s["span"], "耗時 ms": round(s["ms"], 1),
+                "標記": ", ".join([f"{k}={v}" for k, v in s.items() if k not in ("span", "depth", "ms", "error")]),
+                "錯誤": "❌" if s["error"] else "",
+            } for s in done]), hide_index=True, use_container_width=True)
+        else:
+            st.caption("本次執行沒有經過主要路徑")
+        st.markdown("**程序累計 (含背景工作)**")
+        st.dataframe(pd.DataFrame(metrics.summary()), hide_index=True, use_container_width=True)
 
 # =========================================================
-# 7. 主程式邏輯 (Main Execution Block)
+# 4. 主程式邏輯 (Main Execution Block)
 # =========================================================
 
 def main():
     try:
         with st.spinner("正在讀取 Google 試算表設定檔..."):
             # === 修改點：解包新增的 SALES_MAP ===
-            STORE_COUNTS, STORE_COUNTS_NUM, PRICING_DB, SEC_FACTORS, SALES_MAP, err_msg = load_config_from_cloud(GSHEET_SHARE_URL)
+            cloud_cfg, err_msg = load_config_from_cloud(GSHEET_SHARE_URL)
           
-        if err_msg:
+        if cloud_cfg is None:
             st.error(f"❌ 設定檔載入失敗: {err_msg}")
             st.stop()
+        if err_msg:
+            st.warning(f"⚠️ 雲端設定檔暫時無法更新，沿用 {datetime.fromtimestamp(cloud_cfg.fetched_at).strftime('%Y-%m-%d %H:%M')} 的設定 ({err_msg})")
+        STORE_COUNTS, STORE_COUNTS_NUM, PRICING_DB, SEC_FACTORS, SALES_MAP = cloud_cfg.store_counts, cloud_cfg.store_counts_num, cloud_cfg.pricing_db, cloud_cfg.sec_factors, cloud_cfg.sales_map
           
         # --- Sidebar 邏輯 (登入與設定) ---
         with st.sidebar:
@@ -1123,28 +489,47 @@ def main():
             else:
                 st.text_input("Ragic 表單網址", value=st.session_state.ragic_url, disabled=True)
               
+            if st.session_state.is_supervisor:
+                st.session_state.pdf_engine = st.radio("PDF 引擎", [PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE], index=[PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE].index(st.session_state.pdf_engine), horizontal=True)
+                pool = get_soffice_pool()
+                if pool is not None:
+                    st.caption("🖨️ PDF 轉檔服務: " + " / ".join([f"#{w['worker']} {w['mode']} {'🟢' if w['alive'] else '🔴'} {w['jobs']}份 啟動{w['cold_starts']}次" for w in pool.status()]))
+                    if pool.mode == "CLI": st.caption("⚠️ 未安裝 python3-uno：LibreOffice 以命令列轉檔，每次轉檔都要冷啟動一次 soffice (較慢)")
+                st.caption(f"💾 檔案快取: {get_artifact_cache().summary()}")
+                job_counts = get_job_queue().counts()
+                st.caption("🌐 連線: " + " / ".join([f"{k} {v['calls']}次 p95 {v['p95_ms']:.0f}ms" + (f" 重試{v['retries']}" if v["retries"] else "") for k, v in get_http_client().stats().items()]))
+                st.caption("🧵 背景工作: " + " / ".join([f"{k} {job_counts.get(k, 0)}" for k in ("queued", "running", "succeeded", "failed")]))
+
             st.markdown("---")
             if st.button("🧹 清除快取"):
-                st.cache_data.clear()
+                get_cloud_logo_bytes.clear()
+                get_artifact_cache().clear()
+                get_skeleton_cache().clear()
+                get_config_store(GSHEET_SHARE_URL).refresh()
                 st.rerun()
 
         # --- Main Content 邏輯 (輸入與報表) ---
         st.title("📺 媒體 Cue 表生成器 (v112.6 Sales Alias)")
+        if st.session_state.is_supervisor:
+            render_batch_panel(st.session_state.pdf_engine)
+            render_portfolio_panel(cloud_cfg)
+            render_inventory_panel(cloud_cfg.capacity)
         # === 修改點：顯示選項改為中文 ===
-        format_type = st.radio("選擇格式", ["東吳", "聲活", "鉑霖"], horizontal=True)
+        render_plan_store_panel(list(SALES_MAP.keys()) if SALES_MAP else [])
+        format_type = st.radio("選擇格式", list(CUE_FORMATS), horizontal=True, key="format_type")
         # ==============================
 
         c1, c2, c3, c4, c5_sales = st.columns(5)
-        with c1: client_name = st.text_input("客戶名稱", "萬國通路")
-        with c2: product_name = st.text_input("產品名稱", "統一布丁")
-        with c3: total_budget_input = st.number_input("總預算 (未稅 Net)", value=1000000, step=10000)
-        with c4: prod_cost_input = st.number_input("製作費 (未稅)", value=0, step=1000)
+        with c1: client_name = st.text_input("客戶名稱", "萬國通路", key="client_name")
+        with c2: product_name = st.text_input("產品名稱", "統一布丁", key="product_name")
+        with c3: total_budget_input = st.number_input("總預算 (未稅 Net)", value=1000000, step=10000, key="total_budget")
+        with c4: prod_cost_input = st.number_input("製作費 (未稅)", value=0, step=1000, key="prod_cost")
         
         # === 修改點：業務名稱改為下拉選單 ===
         with c5_sales: 
             # 取得 Sales Map 的所有 Key (真名) 作為選項
             sales_options = list(SALES_MAP.keys()) if SALES_MAP else []
-            sales_person = st.selectbox("業務名稱", options=sales_options)
+            sales_person = st.selectbox("業務名稱", options=sales_options, key="sales_person")
         # ================================
 
         # 處理主管覆寫預算功能
@@ -1154,23 +539,24 @@ def main():
             col_sup1, col_sup2 = st.columns([1, 2])
             with col_sup1: st.error("🔒 [主管] 專案優惠價覆寫")
             with col_sup2:
-                override_val = st.number_input("輸入最終成交價", value=total_budget_input)
+                # key 含總預算：總預算變更時成交價回到新的總預算 (載入方案時寫入對應的 key)
+                override_val = st.number_input("輸入最終成交價", value=total_budget_input, key=f"final_budget_{total_budget_input}")
                 if override_val != total_budget_input:
                     final_budget_val = override_val
                     st.caption(f"⚠️ 使用 ${final_budget_val:,} 結算")
             st.markdown("---")
 
         c5, c6 = st.columns(2)
-        with c5: start_date = st.date_input("開始日", datetime(2026, 1, 1))
-        with c6: end_date = st.date_input("結束日", datetime(2026, 1, 31))
+        with c5: start_date = st.date_input("開始日", datetime(2026, 1, 1), key="start_date")
+        with c6: end_date = st.date_input("結束日", datetime(2026, 1, 31), key="end_date")
         days_count = (end_date - start_date).days + 1
         st.info(f"📅 走期共 **{days_count}** 天")
 
         with st.expander("📝 備註欄位設定", expanded=False):
             rc1, rc2, rc3 = st.columns(3)
-            sign_deadline = rc1.date_input("回簽截止日", datetime.now() + timedelta(days=3))
-            billing_month = rc2.text_input("請款月份", "2026年2月")
-            payment_date = rc3.date_input("付款兌現日", datetime(2026, 3, 31))
+            sign_deadline = rc1.date_input("回簽截止日", datetime.now() + timedelta(days=3), key="sign_deadline")
+            billing_month = rc2.text_input("請款月份", "2026年2月", key="billing_month")
+            payment_date = rc3.date_input("付款兌現日", datetime(2026, 3, 31), key="payment_date")
 
         st.markdown("### 3. 媒體投放設定")
         col_cb1, col_cb2, col_cb3 = st.columns(3)
@@ -1362,50 +748,111 @@ def main():
             p_str = f"{'、'.join([f'{s}秒' for s in sorted(list(set(r['seconds'] for r in rows)))])} {product_name}"
             rem = get_remarks_text(sign_deadline, billing_month, payment_date)
               
-            html_preview = generate_html_preview(rows, days_count, start_date, end_date, client_name, p_str, format_type, rem, total_list_accum, grand_total, final_budget_val, prod_cost)
+            # 長走期預設以週 / 月彙總顯示 (可展開其中一段為逐日)，避免預覽欄位過多
+            gran_options = list(PREVIEW_GRANULARITIES.keys())
+            c_gran, c_expand = st.columns([1, 2])
+            granularity = c_gran.radio("預覽顯示", gran_options, index=gran_options.index(default_granularity(days_count)),
+                                       format_func=lambda g: f"逐{PREVIEW_GRANULARITIES[g]}" if g == "day" else f"每{PREVIEW_GRANULARITIES[g]}彙總",
+                                       horizontal=True, key=f"preview_gran_{days_count}")
+            expand = None
+            if granularity != "day":
+                periods = preview_periods(start_date, days_count, granularity)
+                expand = c_expand.selectbox("展開逐日", [None] + list(range(len(periods))), format_func=lambda i: "不展開" if i is None else periods[i][2],
+                                            key=f"preview_expand_{granularity}_{start_date}_{days_count}")
+            render_args = (format_type, start_date, end_date, client_name, product_name, rows, rem, final_budget_val, prod_cost, sales_person)
+            plan_key = plan_fingerprint(*render_args)
+            # 方案紀錄的 id 不含渲染程式指紋 (改版後儲存同一方案仍更新同一筆)
+            plan_inputs = {"format_type": format_type, "client_name": client_name, "product_name": product_name, "total_budget": total_budget_input,
+                           "final_budget": final_budget_val, "prod_cost": prod_cost_input, "sales_person": sales_person, "start_date": start_date, "end_date": end_date,
+                           "sign_deadline": sign_deadline, "billing_month": billing_month, "payment_date": payment_date}
+            plan_id = plan_record_id(plan_inputs, config, rows)
+            loaded_plan = st.session_state.pop("loaded_plan", None)   # 剛載入方案的第一次執行：檢查重算結果是否與保存時相同
+            if loaded_plan and loaded_plan != plan_id: st.info("ℹ️ 已依目前的價格設定重新計算，排程與保存時的版本不同")
+            # 檔次庫存：設定檔有 Capacity 分頁時，與其他已上傳 (已預約) 的方案合計超過每日容量的日子在預覽上方提示
+            if cloud_cfg.capacity: render_inventory_warning(get_inventory_ledger().check(rows, start_date, cloud_cfg.capacity, exclude=plan_id))
+            html_preview = generate_html_preview(rows, days_count, start_date, end_date, client_name, p_str, format_type, rem, total_list_accum, grand_total, final_budget_val, prod_cost,
+                                                 granularity, expand)
             st.components.v1.html(html_preview, height=700, scrolling=True)
               
             # ========== [新增] 插入運算邏輯面板 ==========
             render_logic_panel(logs)
             # ===========================================
+            render_scenario_panel(config, total_budget_input, days_count, PRICING_DB, SEC_FACTORS, STORE_COUNTS_NUM)
+            render_revision_panel(plan_id, plan_key, PlanVersion(rows, start_date, logs, final_budget_val, total_list_accum, "目前方案"), client_name, cloud_cfg)
               
             st.markdown("---")
             st.subheader("📥 檔案下載區")
+            # 方案紀錄：保存表單輸入與已產生檔案的雜湊 (上傳 Ragic 時也會自動保存)
+            total_spots = sum([sum(r["schedule"]) for r in rows])
+            if st.button("💾 儲存方案紀錄", key="plan_save_btn"):
+                get_plan_store().save(plan_id, plan_inputs, config, total_spots, plan_artifact_hashes(plan_key))
+                st.toast("✅ 已儲存到方案紀錄")
               
-            xlsx_temp = generate_excel_from_scratch(format_type, start_date, end_date, client_name, product_name, rows, rem, final_budget_val, prod_cost, sales_person)
+            # 檔案採用「需要時才產生」：預覽不受影響，只有按下產生 / 上傳時才渲染 Excel 與 PDF
+            artifact_cache = get_artifact_cache()
+            pdf_engine = st.session_state.pdf_engine
+            job_queue = get_job_queue()
+            pdf_job_key = f"{plan_key}:{pdf_engine}"
               
             col_dl1, col_dl2, col_ragic = st.columns([1, 1, 2])
               
             with col_dl2:
-                pdf_bytes, method, err = xlsx_bytes_to_pdf_bytes(xlsx_temp)
-                if pdf_bytes:
+                pdf_kind = ready_pdf_kind(artifact_cache, plan_key, pdf_engine)
+                pdf_ready = artifact_cache.get(plan_key, pdf_kind) if pdf_kind else None
+                if pdf_ready:
                     st.download_button(
                         f"📥 下載 PDF", 
-                        pdf_bytes, 
+                        pdf_ready, 
                         f"Cue_{safe_filename(client_name)}.pdf", 
                         key="pdf_dl_btn",
                         mime="application/pdf"
                     )
+                    st.caption("✅ PDF 已就緒")
+                    pdf_job = job_queue.latest("pdf", pdf_job_key)
+                    if pdf_job and pdf_job["status"] == "succeeded" and "失敗" in pdf_job["message"]: st.caption(f"⚠️ {pdf_job['message']}")
                 else:
-                    st.warning(f"PDF 生成失敗: {err}")
+                    pdf_job = job_queue.latest("pdf", pdf_job_key)
+                    if pdf_job and pdf_job["status"] in JOB_ACTIVE:
+                        render_job_progress(pdf_job["id"], "PDF")
+                    else:
+                        if pdf_job and pdf_job["status"] == "failed": st.warning(f"PDF 生成失敗: {pdf_job['message']}")
+                        else: st.caption("⏳ PDF 尚未產生")
+                        if st.button("🛠️ 產生 PDF", key="pdf_build_btn"):
+                            job_queue.submit("pdf", {"plan_key": plan_key, "engine": pdf_engine, "render_args": render_args}, dedupe_key=pdf_job_key)
+                            st.rerun()
 
             with col_dl1:
                 if st.session_state.is_supervisor:
-                    st.download_button(
-                        "📥 下載 Excel (主管權限)", 
-                        xlsx_temp, 
-                        f"Cue_{safe_filename(client_name)}.xlsx", 
-                        key="xlsx_dl_btn",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                    xlsx_ready = artifact_cache.get(plan_key, "xlsx") if artifact_cache.has(plan_key, "xlsx") else None
+                    if xlsx_ready:
+                        st.download_button(
+                            "📥 下載 Excel (主管權限)", 
+                            xlsx_ready, 
+                            f"Cue_{safe_filename(client_name)}.xlsx", 
+                            key="xlsx_dl_btn",
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )
+                        st.caption("✅ Excel 已就緒")
+                    else:
+                        st.caption("⏳ Excel 尚未產生")
+                        if st.button("🛠️ 產生 Excel", key="xlsx_build_btn"):
+                            with st.spinner("正在生成 Excel 報表..."):
+                                cached_excel(artifact_cache, plan_key, *render_args)
+                            st.rerun()
                 else:
                     st.info("🔒 Excel 下載功能僅限主管使用")
 
             with col_ragic:
                 st.markdown("#### ☁️ 上傳至 Ragic")
+                ragic_job_key = f"{plan_key}:{st.session_state.ragic_url.split('?')[0]}"
+                ragic_job = job_queue.latest("ragic", ragic_job_key)
                   
-                if not st.session_state.ragic_confirm_state:
-                    if st.button("🚀 上傳資料至 Ragic", type="primary"):
+                if ragic_job and ragic_job["status"] in JOB_ACTIVE:
+                    render_job_progress(ragic_job["id"], "Ragic 上傳")
+                elif not st.session_state.ragic_confirm_state:
+                    if ragic_job and ragic_job["status"] == "succeeded": st.success(ragic_job["message"])
+                    elif ragic_job and ragic_job["status"] == "failed": st.error(f"上傳失敗: {ragic_job['message']}")
+                    if st.button("🚀 上傳資料至 Ragic", type="primary", disabled=bool(ragic_job and ragic_job["status"] == "succeeded")):
                         st.session_state.ragic_confirm_state = True
                         st.rerun()
                 else:
@@ -1419,83 +866,56 @@ def main():
                             
                     with c_conf2:
                         if st.button("✅ 確認上傳"):
-                            with st.spinner("正在上傳資料與檔案..."):
-                                  
-                                # Ragic 欄位對照表 (請勿隨意修改 ID)
-                                RAGIC_MAP = {
-                                    'client':     '1000080',  # 客戶名稱
-                                    'product':    '1000081',  # 產品名稱
-                                    'budget_raw': '1000082',  # 總預算 (未稅 Net)
-                                    'budget_fin': '1000083',  # 最終成交價 (主管覆寫後)
-                                    'prod_cost':  '1000084',  # 製作費
-                                    'format':     '1000078',  # 報表格式 (Dongwu/Shenghuo/Bolin)
-                                    'sales':      '1000079',  # 業務名稱
-                                    'date_start': '1000085',  # 開始日
-                                    'date_end':   '1000086',  # 結束日
-                                    'date_sign':  '1000087',  # 回簽截止日
-                                    'bill_month': '1000089',  # 請款月份
-                                    'date_pay':   '1000088',  # 付款兌現日
-                                    'details':    '1000090',  # 詳細投放設定摘要
-                                    'file_xls':   '1000091',  # Excel 檔案上傳欄位
-                                    'file_pdf':   '1000092'   # PDF 檔案上傳欄位
-                                }
-
-                                campaign_summary = format_campaign_details(config)
-                                
-                                # === 修改點：取得對應的綽號 (若無則用真名) ===
-                                sales_nickname = SALES_MAP.get(sales_person, sales_person)
-                                # ========================================
-
-                                data_payload = {
-                                    RAGIC_MAP['client']:     client_name,
-                                    RAGIC_MAP['product']:    product_name,
-                                    RAGIC_MAP['budget_raw']: total_budget_input,
-                                    RAGIC_MAP['budget_fin']: final_budget_val,
-                                    RAGIC_MAP['prod_cost']:  prod_cost_input,
-                                    RAGIC_MAP['format']:     format_type,
-                                    RAGIC_MAP['sales']:      sales_nickname,  # 這裡上傳綽號
-                                    RAGIC_MAP['date_start']: str(start_date),
-                                    RAGIC_MAP['date_end']:   str(end_date),
-                                    RAGIC_MAP['date_sign']:  str(sign_deadline),
-                                    RAGIC_MAP['bill_month']: billing_month,
-                                    RAGIC_MAP['date_pay']:   str(payment_date),
-                                    RAGIC_MAP['details']:    campaign_summary,
-                                }
+                            RAGIC_MAP = RAGIC_FIELDS   # Ragic 欄位對照表 (見 cuesheet/ragic.py)
 
-                                files_payload = {}
-                                files_payload[RAGIC_MAP['file_xls']] = (
-                                    f"Cue_{safe_filename(client_name)}.xlsx", 
-                                    xlsx_temp, 
-                                    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                                )
-                                  
-                                if pdf_bytes:
-                                    files_payload[RAGIC_MAP['file_pdf']] = (
-                                        f"Cue_{safe_filename(client_name)}.pdf", 
-                                        pdf_bytes, 
-                                        'application/pdf'
-                                    )
-
-                                success, msg = upload_to_ragic(
-                                    st.session_state.ragic_url,
-                                    st.session_state.ragic_key,
-                                    data_payload,
-                                    files_payload
-                                )
-                                  
-                                if success:
-                                    st.success(msg)
-                                    time.sleep(3)
-                                else:
-                                    st.error(f"上傳失敗: {msg}")
+                            campaign_summary = format_campaign_details(config)
                             
+                            # === 修改點：取得對應的綽號 (若無則用真名) ===
+                            sales_nickname = SALES_MAP.get(sales_person, sales_person)
+                            # ========================================
+
+                            data_payload = {
+                                RAGIC_MAP['client']:     client_name,
+                                RAGIC_MAP['product']:    product_name,
+                                RAGIC_MAP['budget_raw']: total_budget_input,
+                                RAGIC_MAP['budget_fin']: final_budget_val,
+                                RAGIC_MAP['prod_cost']:  prod_cost_input,
+                                RAGIC_MAP['format']:     format_type,
+                                RAGIC_MAP['sales']:      sales_nickname,  # 這裡上傳綽號
+                                RAGIC_MAP['date_start']: str(start_date),
+                                RAGIC_MAP['date_end']:   str(end_date),
+                                RAGIC_MAP['date_sign']:  str(sign_deadline),
+                                RAGIC_MAP['bill_month']: billing_month,
+                                RAGIC_MAP['date_pay']:   str(payment_date),
+                                RAGIC_MAP['details']:    campaign_summary,
+                            }
+
+                            # 產生檔案與上傳交由背景工作處理，頁面只輪詢進度 (同一方案重複送出會沿用既有工作)
+                            # API Key 不放進工作內容 (會寫入佇列資料庫)，上傳時才由 ragic_api_key 取得
+                            set_ragic_api_key(st.session_state.ragic_url, st.session_state.ragic_key)
+                            job_queue.submit("ragic", {
+                                "plan_key": plan_key, "engine": pdf_engine, "render_args": render_args,
+                                "url": st.session_state.ragic_url, "data": data_payload,
+                                "file_stem": f"Cue_{safe_filename(client_name)}",
+                                "file_fields": {"xlsx": RAGIC_MAP['file_xls'], "pdf": RAGIC_MAP['file_pdf']},
+                                "reservation": {"id": plan_id, "rows": rows, "start": start_date, "label": f"{client_name} - {product_name}"},
+                            }, dedupe_key=ragic_job_key, reuse_succeeded=True)
+                            get_plan_store().save(plan_id, plan_inputs, config, total_spots, plan_artifact_hashes(plan_key))
                             st.session_state.ragic_confirm_state = False
-                            time.sleep(1)
                             st.rerun()
 
+            render_formats_panel(render_args, pdf_engine, client_name)
+
     except Exception as e:
         st.error("程式執行發生錯誤，請聯絡開發者。")
         st.error(traceback.format_exc())
 
 if __name__ == "__main__":
-    main()
+    # python app.py batch ... 沿用命令列批次模式 (同 python -m cuesheet batch)；以 streamlit run 啟動時一律顯示頁面
+    if len(sys.argv) > 1 and sys.argv[1] == "batch" and not st.runtime.exists():
+        from cuesheet.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+    t0 = time.perf_counter()
+    with metrics.collect() as rerun_spans:
+        main()
+    if st.session_state.is_supervisor: render_timing_panel(rerun_spans, (time.perf_counter() - t0) * 1000)
@@ -0,0 +1,74 @@
+"""
+Excel 輸出後端效能比較 (openpyxl vs xlsxwriter)。
+
+使用合成的排程資料 (不需連線 Google 試算表)，對每種格式與走期長度各渲染數次，
+輸出平均耗時、峰值記憶體 (tracemalloc) 與檔案大小。
+
+    python benchmarks/excel_backends.py --days 31 90 365 --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cuesheet import excel, helpers  # noqa: E402
+from cuesheet.settings import REGIONS_ORDER  # noqa: E402
+
+def synthetic_rows(days, regions=REGIONS_ORDER, seconds=(10, 20, 30)):
+    """依媒體 / 區域 / 秒數展開的排程列，結構與 calculate_plan_data 的輸出相同。"""
+    rows = []
+    for media in ("全家廣播", "新鮮視"):
+        for sec in seconds:
+            spots = 2 * days + sec
+            for r in regions:
+                rows.append({"media": media, "region": r, "program_num": 1000, "daypart": "00:00-24:00", "seconds": sec,
+                             "spots": spots, "schedule": helpers.calculate_schedule(spots, days),
+                             "rate_display": 120000 + sec * 1000, "pkg_display": 120000 + sec * 1000, "is_pkg_member": False})
+    for sec in seconds[:1]:
+        rows.append({"media": "家樂福", "region": "全省量販", "program_num": 68, "daypart": "09:00-22:00", "seconds": sec,
+                     "spots": 2 * days, "schedule": helpers.calculate_schedule(2 * days, days),
+                     "rate_display": 300000, "pkg_display": 300000, "is_pkg_member": False})
+        rows.append({"media": "家樂福", "region": "全省超市", "program_num": 250, "daypart": "09:00-22:00", "seconds": sec,
+                     "spots": days, "schedule": helpers.calculate_schedule(days, days),
+                     "rate_display": "計量販", "pkg_display": "計量販", "is_pkg_member": False})
+    return rows
+
+def bench(backend, format_type, days, repeat):
+    start = date(2026, 1, 1); end = start + timedelta(days=days - 1)
+    rows = synthetic_rows(days)
+    remarks = helpers.get_remarks_text(start, "2026年1月", start)
+    args = (format_type, start, end, "客戶", "產品", rows, remarks, 1000000, 0, "業務")
+    excel.generate_excel_from_scratch(*args, backend=backend)   # 暖機 (字型 / 模組載入)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        data = excel.generate_excel_from_scratch(*args, backend=backend)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    excel.generate_excel_from_scratch(*args, backend=backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"backend": backend, "format": format_type, "days": days, "rows": len(rows),
+            "mean_s": sum(times) / len(times), "min_s": min(times), "peak_mb": peak / 1048576, "size_kb": len(data) / 1024}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[31, 90, 365])
+    parser.add_argument("--formats", nargs="+", default=["東吳", "聲活", "鉑霖"])
+    parser.add_argument("--repeat", type=int, default=3)
+    opts = parser.parse_args()
+    excel.get_cloud_logo_bytes = lambda: None   # 不下載 Logo，只量測渲染本身
+
+    print(f"{'format':<6}{'days':>6}{'rows':>6}  {'backend':<11}{'mean s':>9}{'min s':>9}{'peak MB':>9}{'KB':>8}")
+    for days in opts.days:
+        for fmt in opts.formats:
+            results = [bench(b, fmt, days, opts.repeat) for b in (excel.EXCEL_BACKEND_OPENPYXL, excel.EXCEL_BACKEND_XLSXWRITER)]
+            for r in results:
+                print(f"{r['format']:<6}{r['days']:>6}{r['rows']:>6}  {r['backend']:<11}{r['mean_s']:>9.3f}{r['min_s']:>9.3f}{r['peak_mb']:>9.1f}{r['size_kb']:>8.0f}")
+            print(f"{'':<20}speedup x{results[0]['mean_s'] / results[1]['mean_s']:.1f}")
+
+if __name__ == "__main__":
+    main()
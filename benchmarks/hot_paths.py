@@ -0,0 +1,195 @@
+"""
+主要路徑的效能基準 (排程運算 / HTML 預覽 / Excel 渲染 / PDF 轉檔)，結果輸出為 JSON 以便追蹤退化。
+HTML 預覽分為 html (每次都用新的 builder，沒有列片段快取) 與 html_cached (列片段全部命中) 兩種。
+excel_multi / pdf_soffice_multi 為所選格式一次產生 (共用彙總、一次轉檔工作) 的合計耗時，可與各格式單獨產生的耗時相加比較。
+
+使用合成的 pricing_db / sec_factors (不需連線 Google 試算表)，依下列參數組合展開方案：
+走期天數、媒體數 (1-3)、秒數數量 (1-12)、全省聯播 / 六區。每個階段量測 repeat 次耗時，
+另以 tracemalloc 單獨跑一次量測峰值記憶體 (避免追蹤本身影響耗時)。
+PDF 轉檔需要 LibreOffice (xlsx_bytes_to_pdf_bytes) 或 WeasyPrint；無法使用時該階段標記為 skipped。
+
+    python benchmarks/hot_paths.py -o bench.json
+    python benchmarks/hot_paths.py --days 7 31 --media 1 3 --durations 1 12 --stages plan html excel
+    python benchmarks/hot_paths.py --baseline bench.json --threshold 0.2     # 與先前結果比較，變慢超過 20% 時回傳 1
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cuesheet import excel, helpers, pdf, soffice  # noqa: E402
+from cuesheet.html_preview import HtmlPreviewBuilder  # noqa: E402
+from cuesheet.pricing import calculate_plan_data  # noqa: E402
+from cuesheet.settings import DURATIONS, REGIONS_ORDER  # noqa: E402
+
+STAGES = ("plan", "html", "html_cached", "excel", "excel_multi", "pdf_soffice", "pdf_soffice_multi", "pdf_native")
+FORMATS = ("東吳", "聲活", "鉑霖")
+MEDIA_ORDER = ("全家廣播", "新鮮視", "家樂福")
+
+# ==========================================
+# 合成資料
+# ==========================================
+def synthetic_pricing():
+    """結構與 parse_config_sheets 的輸出相同的 (pricing_db, sec_factors, store_counts_num)。"""
+    pricing_db = {}
+    for m, std in (("全家廣播", 4800), ("新鮮視", 5040)):
+        pricing_db[m] = {"Std_Spots": std, "Day_Part": "00:00-24:00", "全省": [900000, 400000]}
+        for i, r in enumerate(REGIONS_ORDER): pricing_db[m][r] = [200000 + i * 13000, 90000 + i * 7000]
+    pricing_db["家樂福"] = {"量販_全省": {"List": 300000, "Net": 150000, "Std_Spots": 1500, "Day_Part": "09:00-22:00"},
+                         "超市_全省": {"List": 0, "Net": 0, "Std_Spots": 900, "Day_Part": "09:00-22:00"}}
+    sec_factors = {m: {s: round(s / 20, 2) for s in DURATIONS} for m in MEDIA_ORDER}
+    store_counts_num = {r: 1000 + i for i, r in enumerate(REGIONS_ORDER)}
+    store_counts_num.update({f"新鮮視_{r}": 500 + i for i, r in enumerate(REGIONS_ORDER)})
+    store_counts_num.update({"家樂福_量販": 68, "家樂福_超市": 250})
+    return pricing_db, sec_factors, store_counts_num
+
+def synthetic_config(n_media, n_durations, national):
+    """前 n_media 個媒體平均分配預算，每個媒體使用前 n_durations 種秒數 (配比同表單預設)。"""
+    secs = DURATIONS[:n_durations]
+    default_val = 100 // len(secs)
+    sec_shares = {s: (100 - default_val * (len(secs) - 1) if i == len(secs) - 1 else default_val) for i, s in enumerate(secs)}
+    medias = MEDIA_ORDER[:n_media]
+    config = {}
+    for i, m in enumerate(medias):
+        share = 100 - (100 // n_media) * (n_media - 1) if i == n_media - 1 else 100 // n_media
+        if m == "家樂福": config[m] = {"regions": ["全省"], "sec_shares": dict(sec_shares), "share": share}
+        else: config[m] = {"is_national": national, "regions": ["全省"] if national else list(REGIONS_ORDER), "sec_shares": dict(sec_shares), "share": share}
+    return config
+
+# ==========================================
+# 量測
+# ==========================================
+def measure(fn, repeat):
+    """暖機一次後量測 repeat 次耗時，再以 tracemalloc 單獨跑一次取得峰值記憶體。回傳 (統計, 最後一次的結果)。"""
+    result = fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); result = fn(); times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    try: fn(); _, peak = tracemalloc.get_traced_memory()
+    finally: tracemalloc.stop()
+    times.sort()
+    return {"mean_ms": round(sum(times) / len(times), 3), "min_ms": round(times[0], 3), "median_ms": round(times[len(times) // 2], 3),
+            "max_ms": round(times[-1], 3), "peak_kb": round(peak / 1024, 1)}, result
+
+def run_case(days, n_media, n_durations, national, stages, formats, backends, repeat, budget, fixtures):
+    pricing_db, sec_factors, store_counts_num = fixtures
+    case = {"days": days, "media": n_media, "durations": n_durations, "regions": "national" if national else "6"}
+    start = date(2026, 1, 1); end = start + timedelta(days=days - 1)
+    config = synthetic_config(n_media, n_durations, national)
+    plan = lambda: calculate_plan_data(config, budget, days, pricing_db, sec_factors, store_counts_num, REGIONS_ORDER)
+    stats, (rows, total_list, _) = measure(plan, repeat)
+    case["rows"] = len(rows)
+    results = []
+    if "plan" in stages: results.append(dict(case, stage="plan", **stats))
+    remarks = helpers.get_remarks_text(start, "2026年1月", start)
+    for fmt in formats:
+        html_args = (rows, days, start, end, "客戶", "產品", fmt, remarks, total_list, int(budget * 1.05), budget, 0)
+        if "html" in stages:
+            stats, html = measure(lambda: HtmlPreviewBuilder().build(*html_args), repeat)
+            results.append(dict(case, stage="html", format=fmt, size_kb=round(len(html.encode("utf-8")) / 1024, 1), **stats))
+        if "html_cached" in stages:
+            builder = HtmlPreviewBuilder()
+            stats, _ = measure(lambda: builder.build(*html_args), repeat)
+            results.append(dict(case, stage="html_cached", format=fmt, **stats))
+        render = lambda backend=None: excel.generate_excel_from_scratch(fmt, start, end, "客戶", "產品", rows, remarks, budget, 0, "業務", backend=backend)
+        for backend in backends if "excel" in stages else []:
+            stats, xlsx_bytes = measure(lambda: render(backend), repeat)
+            results.append(dict(case, stage="excel", format=fmt, backend=backend, size_kb=round(len(xlsx_bytes) / 1024, 1), **stats))
+        if "pdf_soffice" in stages:
+            if soffice.find_soffice_path() is None: results.append(dict(case, stage="pdf_soffice", format=fmt, skipped="LibreOffice 未安裝"))
+            else:
+                xlsx_bytes = render()
+                stats, (pdf_bytes, _, err) = measure(lambda: soffice.xlsx_bytes_to_pdf_bytes(xlsx_bytes), repeat)
+                results.append(dict(case, stage="pdf_soffice", format=fmt, **(dict(size_kb=round(len(pdf_bytes) / 1024, 1), **stats) if pdf_bytes else {"skipped": err})))
+        if "pdf_native" in stages:
+            if pdf._load_weasyprint() is None: results.append(dict(case, stage="pdf_native", format=fmt, skipped="WeasyPrint 無法載入"))
+            else:
+                stats, (pdf_bytes, _, err) = measure(lambda: pdf.generate_pdf_native(fmt, start, end, "客戶", "產品", rows, remarks, budget, 0, "業務"), repeat)
+                results.append(dict(case, stage="pdf_native", format=fmt, **(dict(size_kb=round(len(pdf_bytes) / 1024, 1), **stats) if pdf_bytes else {"skipped": err})))
+    render_all = lambda backend=None: excel.generate_excel_all_formats(formats, start, end, "客戶", "產品", rows, remarks, budget, 0, "業務", backend=backend)
+    for backend in backends if "excel_multi" in stages else []:
+        stats, out = measure(lambda: render_all(backend), repeat)
+        results.append(dict(case, stage="excel_multi", format="+".join(formats), backend=backend, size_kb=round(sum([len(b) for b in out.values()]) / 1024, 1), **stats))
+    if "pdf_soffice_multi" in stages:
+        if soffice.find_soffice_path() is None: results.append(dict(case, stage="pdf_soffice_multi", format="+".join(formats), skipped="LibreOffice 未安裝"))
+        else:
+            xlsx_list = list(render_all().values())
+            stats, out = measure(lambda: soffice.xlsx_batch_to_pdf_bytes(xlsx_list), repeat)
+            failed = [err for pdf_bytes, _, err in out if not pdf_bytes]
+            results.append(dict(case, stage="pdf_soffice_multi", format="+".join(formats),
+                                **({"skipped": failed[0]} if failed else dict(size_kb=round(sum([len(b) for b, _, _ in out]) / 1024, 1), **stats))))
+    return results
+
+# ==========================================
+# 退化比較
+# ==========================================
+RESULT_KEY = ("stage", "format", "backend", "days", "media", "durations", "regions")
+
+def compare(results, baseline, threshold):
+    """與先前的 JSON 結果比較 mean_ms，回傳變慢超過 threshold 的項目。"""
+    base = {tuple(r.get(k) for k in RESULT_KEY): r for r in baseline["results"] if "mean_ms" in r}
+    regressions = []
+    for r in results:
+        old = base.get(tuple(r.get(k) for k in RESULT_KEY))
+        if old is None or "mean_ms" not in r or old["mean_ms"] <= 0: continue
+        ratio = r["mean_ms"] / old["mean_ms"]
+        r["baseline_mean_ms"] = old["mean_ms"]; r["ratio"] = round(ratio, 3)
+        if ratio > 1 + threshold: regressions.append(r)
+    return regressions
+
+def _label(r):
+    return "/".join([str(r[k]) for k in RESULT_KEY if r.get(k) is not None])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 31, 90, 365])
+    parser.add_argument("--media", type=int, nargs="+", default=[1, 3], choices=[1, 2, 3])
+    parser.add_argument("--durations", type=int, nargs="+", default=[1, 4, 12], choices=range(1, len(DURATIONS) + 1), metavar="1-12")
+    parser.add_argument("--regions", nargs="+", default=["national", "6"], choices=["national", "6"])
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--backends", nargs="+", default=[excel.EXCEL_BACKEND], choices=[excel.EXCEL_BACKEND_OPENPYXL, excel.EXCEL_BACKEND_XLSXWRITER])
+    parser.add_argument("--budget", type=int, default=5000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="JSON 輸出路徑 (預設輸出到 stdout)")
+    parser.add_argument("--baseline", help="先前的 JSON 結果，用於比較")
+    parser.add_argument("--threshold", type=float, default=0.2, help="mean_ms 變慢超過此比例視為退化 (預設 0.2)")
+    opts = parser.parse_args()
+    excel.get_cloud_logo_bytes = pdf.get_cloud_logo_bytes = lambda: None   # 不下載 Logo，只量測渲染本身
+
+    fixtures = synthetic_pricing()
+    results, t0 = [], time.perf_counter()
+    for days in opts.days:
+        for n_media in opts.media:
+            for n_dur in opts.durations:
+                for reg in opts.regions:
+                    case_results = run_case(days, n_media, n_dur, reg == "national", opts.stages, opts.formats, opts.backends, opts.repeat, opts.budget, fixtures)
+                    results.extend(case_results)
+                    for r in case_results:
+                        note = f"skipped: {r['skipped']}" if "skipped" in r else f"{r['mean_ms']:>10.2f} ms {r['peak_kb'] / 1024:>7.1f} MB"
+                        print(f"{_label(r):<48}{r['rows']:>5} rows  {note}", file=sys.stderr, flush=True)
+
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "platform": platform.platform(),
+                 "cpu_count": os.cpu_count(), "repeat": opts.repeat, "budget": opts.budget, "elapsed_s": round(time.perf_counter() - t0, 1)},
+        "results": results,
+    }
+    regressions = []
+    if opts.baseline:
+        with open(opts.baseline, encoding="utf-8") as f: regressions = compare(results, json.load(f), opts.threshold)
+        report["meta"].update(baseline=opts.baseline, threshold=opts.threshold, regressions=len(regressions))
+        for r in regressions: print(f"退化: {_label(r)} {r['baseline_mean_ms']:.2f} → {r['mean_ms']:.2f} ms (x{r['ratio']})", file=sys.stderr)
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if opts.output:
+        with open(opts.output, "w", encoding="utf-8") as f: f.write(data)
+    else: print(data)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
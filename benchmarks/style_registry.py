@@ -0,0 +1,67 @@
+"""
+樣式登錄 (StyleRegistry) 的微型效能比較。
+
+以 90 天、20 列的排程，比較「每次都建立新樣式物件」(cache=False，等同舊寫法) 與共用樣式物件的差異：
+樣式物件建立次數、渲染耗時與峰值記憶體。兩種 Excel 輸出後端都會量測。
+
+    python benchmarks/style_registry.py --days 90 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cuesheet import excel, helpers  # noqa: E402
+from cuesheet.settings import REGIONS_ORDER  # noqa: E402
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side  # noqa: E402
+from excel_backends import synthetic_rows  # noqa: E402
+
+STYLE_CLASSES = (Side, Border, Font, Alignment, PatternFill)
+
+def count_style_objects(fn):
+    """執行 fn 並計算期間建立了多少個 openpyxl 樣式物件。"""
+    counts = {cls.__name__: 0 for cls in STYLE_CLASSES}
+    originals = {cls: cls.__init__ for cls in STYLE_CLASSES}
+    def wrap(cls, init):
+        def counted(self, *args, **kwargs):
+            if type(self) is cls: counts[cls.__name__] += 1
+            init(self, *args, **kwargs)
+        return counted
+    for cls, init in originals.items(): cls.__init__ = wrap(cls, init)
+    try: fn()
+    finally:
+        for cls, init in originals.items(): cls.__init__ = init
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--formats", nargs="+", default=["東吳", "聲活", "鉑霖"])
+    opts = parser.parse_args()
+    excel.get_cloud_logo_bytes = lambda: None
+
+    start = date(2026, 1, 1); end = start + timedelta(days=opts.days - 1)
+    rows = synthetic_rows(opts.days, regions=REGIONS_ORDER[:3])
+    remarks = helpers.get_remarks_text(start, "2026年1月", start)
+    print(f"{opts.days} 天 / {len(rows)} 列")
+    print(f"{'format':<8}{'backend':<12}{'styles':<8}{'objects':>9}{'mean s':>9}{'peak MB':>9}")
+    for fmt in opts.formats:
+        args = (fmt, start, end, "客戶", "產品", rows, remarks, 1000000, 0, "業務")
+        for backend in (excel.EXCEL_BACKEND_OPENPYXL, excel.EXCEL_BACKEND_XLSXWRITER):
+            for label, registry in (("new", excel.StyleRegistry(cache=False)), ("shared", excel.StyleRegistry())):
+                excel.STYLES = registry
+                render = lambda: excel.generate_excel_from_scratch(*args, backend=backend)
+                render()
+                objects = sum(count_style_objects(render).values())
+                times = []
+                for _ in range(opts.repeat):
+                    t0 = time.perf_counter(); render(); times.append(time.perf_counter() - t0)
+                tracemalloc.start(); render(); _, peak = tracemalloc.get_traced_memory(); tracemalloc.stop()
+                print(f"{fmt:<8}{backend:<12}{label:<8}{objects:>9}{sum(times) / len(times):>9.3f}{peak / 1048576:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Cue Sheet 核心函式庫 (不依賴 Streamlit)。
+
+設定檔讀取、排程運算、HTML / Excel / PDF 渲染 (可一次產生三種格式)、Ragic 上傳、批次產生、跨訂單彙總、檔次庫存、方案紀錄與改版比較、背景工作佇列與 REST 服務，
+可直接在腳本、子程序與測試中使用；命令列入口為 python -m cuesheet。
+
+匯入本套件只會載入標準函式庫；下列名稱在第一次取用時才載入對應的子模組，
+pandas / numpy / openpyxl 等也只在真正用到時才載入。
+"""
+import importlib
+
+_EXPORTS = {
+    "config":       ("CloudConfig", "ConfigStore", "get_config_store", "load_config_from_cloud", "parse_config_sheets"),
+    "pricing":      ("calculate_plan_data", "PlanMatrix", "PlanSummary", "PricingEngine", "sweep_scenarios"),
+    "html_preview": ("generate_html_preview", "HtmlPreviewBuilder"),
+    "excel":        ("generate_excel_from_scratch", "generate_excel_all_formats"),
+    "pdf":          ("generate_pdf_bytes", "generate_pdf_formats", "generate_print_html"),
+    "ragic":        ("post_to_ragic", "upload_to_ragic", "fetch_ragic_records", "ragic_api_key", "set_ragic_api_key"),
+    "cache":        ("ArtifactCache", "get_artifact_cache", "plan_fingerprint", "renderer_fingerprint", "cached_excel", "cached_pdf", "cached_formats"),
+    "batch":        ("build_batch_order", "normalize_media_config", "parse_media_spec", "plan_order", "read_batch_orders", "run_batch"),
+    "portfolio":    ("Portfolio", "month_window"),
+    "inventory":    ("InventoryLedger", "get_inventory_ledger"),
+    "plan_store":   ("PlanStore", "get_plan_store", "plan_record_id"),
+    "plan_diff":    ("PlanDiff", "PlanVersion", "diff_report_html", "diff_report_xlsx"),
+    "jobs":         ("JobQueue", "get_job_queue"),
+    "metrics":      ("span", "traced", "collect"),
+    "server":       ("CueSheetHTTPServer", "serve"),
+    "helpers":      ("calculate_schedule", "get_remarks_text", "format_campaign_details", "safe_filename"),
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULE_OF)
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
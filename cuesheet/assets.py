@@ -0,0 +1,13 @@
+"""
+外部資源讀取 (Logo)。
+"""
+from .cache import ttl_cache
+from .httpclient import get_http_client
+from .settings import BOLIN_LOGO_URL
+
+@ttl_cache(3600)
+def get_cloud_logo_bytes():
+    try:
+        response = get_http_client().get("logo", BOLIN_LOGO_URL)
+        return response.content if response.status_code == 200 else None
+    except: return None
@@ -0,0 +1,242 @@
+"""
+批次產生：讀取訂單表 (CSV / Excel)，以子程序平行計算與渲染，輸出含檔案與摘要報告的 ZIP。
+"""
+import io
+import json
+import multiprocessing
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .cache import cached_excel, cached_pdf, get_artifact_cache, plan_fingerprint
+from .helpers import get_remarks_text, parse_count_to_int, safe_filename
+from .pricing import PRICING_MEDIA, calculate_plan_data
+from .settings import BATCH_MAX_ORDERS, BATCH_WORKERS, DURATIONS, PDF_ENGINE_NATIVE, REGIONS_ORDER
+
+# 訂單表欄位 -> 可接受的表頭 (中文與英文皆可，不分大小寫)
+BATCH_COLUMNS = {
+    "client":        ("客戶名稱", "client"),
+    "product":       ("產品名稱", "product"),
+    "budget":        ("總預算", "budget"),
+    "final_budget":  ("最終成交價", "final_budget"),
+    "prod_cost":     ("製作費", "prod_cost"),
+    "start":         ("開始日", "start"),
+    "end":           ("結束日", "end"),
+    "format":        ("格式", "format"),
+    "sales":         ("業務名稱", "sales"),
+    "media":         ("媒體設定", "media"),
+    "sign_deadline": ("回簽截止日", "sign_deadline"),
+    "billing_month": ("請款月份", "billing_month"),
+    "payment_date":  ("付款兌現日", "payment_date"),
+}
+BATCH_REQUIRED = ("client", "product", "budget", "start", "end", "format", "media")
+BATCH_FORMATS = {"東吳": "東吳", "聲活": "聲活", "鉑霖": "鉑霖", "dongwu": "東吳", "shenghuo": "聲活", "bolin": "鉑霖"}
+BATCH_MEDIA_ALIASES = {"全家廣播": "全家廣播", "廣播": "全家廣播", "新鮮視": "新鮮視", "全家新鮮視": "新鮮視", "家樂福": "家樂福",
+                       "radio": "全家廣播", "fv": "新鮮視", "cf": "家樂福"}
+BATCH_TEMPLATE = [
+    {"客戶名稱": "萬國通路", "產品名稱": "統一布丁", "總預算": 1000000, "製作費": 0, "開始日": "2026-01-01", "結束日": "2026-01-31",
+     "格式": "東吳", "業務名稱": "", "媒體設定": "全家廣播 50% 全省 20; 新鮮視 30% 北區/中區 10:60,15:40; 家樂福 20% 20"},
+]
+
+def parse_media_spec(spec):
+    """
+    解析訂單的「媒體設定」欄位，回傳與表單相同結構的 config。
+    格式為「媒體 佔比% [區域/區域] 秒數[:配比],...」，多個媒體以分號隔開；
+    區域省略時為全省聯播，秒數配比省略時平均分配 (同表單預設)。也接受與 config 相同結構的 JSON。
+    """
+    spec = str(spec or "").strip()
+    if spec.startswith("{"): return normalize_media_config(json.loads(spec))
+    config = {}
+    for item in re.split(r"[;；\n]", spec):
+        tokens = item.split()
+        if not tokens: continue
+        media = BATCH_MEDIA_ALIASES.get(tokens[0].lower())
+        if media is None: raise ValueError(f"未知的媒體: {tokens[0]}")
+        share, regions, secs = None, ["全省"], []
+        for tok in tokens[1:]:
+            if tok.endswith("%"): share = int(tok[:-1])
+            elif re.fullmatch(r"[\d:：,，秒sS]+", tok): secs = re.findall(r"(\d+)\s*(?:秒|s|S)?\s*(?:[:：](\d+))?", tok)
+            else: regions = [r for r in re.split(r"[/、,，]", tok) if r]
+        if share is None: raise ValueError(f"{media} 未設定預算佔比 (例如 50%)")
+        if not secs: raise ValueError(f"{media} 未設定秒數")
+        sorted_secs = sorted([int(s) for s, _ in secs])
+        if all([p for _, p in secs]): sec_shares = {int(s): int(p) for s, p in sorted(secs, key=lambda x: int(x[0]))}
+        elif any([p for _, p in secs]): raise ValueError(f"{media} 的秒數配比需全部填寫或全部省略")
+        else:
+            default_val = 100 // len(sorted_secs)
+            sec_shares = {s: (100 - default_val * (len(sorted_secs) - 1) if i == len(sorted_secs) - 1 else default_val) for i, s in enumerate(sorted_secs)}
+        if media == "家樂福": config[media] = {"regions": ["全省"], "sec_shares": sec_shares, "share": share}
+        else: config[media] = {"is_national": "全省" in regions, "regions": regions, "sec_shares": sec_shares, "share": share}
+    return _validate_media_config(config)
+
+def normalize_media_config(config):
+    """把 JSON 形式的 config (秒數 key 為字串、媒體可用別名、可省略 is_national) 轉成表單的結構並驗證。"""
+    if not isinstance(config, dict): raise ValueError("媒體設定需為物件 (媒體 -> 設定)")
+    out = {}
+    for m, cfg in config.items():
+        media = BATCH_MEDIA_ALIASES.get(str(m).lower(), m)
+        sec_shares = {int(s): int(p) for s, p in sorted(cfg.get("sec_shares", {}).items(), key=lambda x: int(x[0]))}
+        if media == "家樂福": out[media] = {"regions": ["全省"], "sec_shares": sec_shares, "share": int(cfg.get("share", 0))}
+        else:
+            regions = list(cfg.get("regions") or ["全省"])
+            out[media] = {"is_national": bool(cfg.get("is_national", "全省" in regions)), "regions": regions, "sec_shares": sec_shares, "share": int(cfg.get("share", 0))}
+    return _validate_media_config(out)
+
+def _validate_media_config(config):
+    """與表單相同的限制：秒數需在 DURATIONS 內、配比合計 100%，選滿六區視為全省聯播。"""
+    for m, cfg in config.items():
+        if m not in PRICING_MEDIA: raise ValueError(f"未知的媒體: {m}")
+        if m != "家樂福":
+            bad = [r for r in cfg["regions"] if r != "全省" and r not in REGIONS_ORDER]
+            if bad: raise ValueError(f"{m} 區域錯誤: {'/'.join(bad)}")
+            if cfg["is_national"] or len(set(cfg["regions"])) == len(REGIONS_ORDER): cfg.update(is_national=True, regions=["全省"])
+            else: cfg["regions"] = [r for r in REGIONS_ORDER if r in cfg["regions"]]
+        if not cfg["sec_shares"]: raise ValueError(f"{m} 未設定秒數")
+        bad_secs = [s for s in cfg["sec_shares"] if s not in DURATIONS]
+        if bad_secs: raise ValueError(f"{m} 不支援的秒數: {bad_secs}")
+        if sum(cfg["sec_shares"].values()) != 100: raise ValueError(f"{m} 秒數配比合計為 {sum(cfg['sec_shares'].values())}%，需為 100%")
+    total_share = sum([cfg["share"] for cfg in config.values()])
+    if not config: raise ValueError("未設定任何媒體")
+    if total_share != 100: raise ValueError(f"媒體預算佔比合計為 {total_share}%，需為 100%")
+    return {m: config[m] for m in PRICING_MEDIA if m in config}   # 與表單相同的媒體順序
+
+def _batch_date(value):
+    value = str(value or "").strip()
+    return pd.to_datetime(value).date() if value else None
+
+def build_batch_order(raw):
+    """驗證並轉換一筆訂單 (欄位值皆為字串)，備註欄位未填時套用與表單相同的預設值。"""
+    missing = [BATCH_COLUMNS[k][0] for k in BATCH_REQUIRED if not str(raw.get(k, "")).strip()]
+    if missing: raise ValueError(f"缺少欄位: {'、'.join(missing)}")
+    format_type = BATCH_FORMATS.get(raw["format"].strip().lower())
+    if format_type is None: raise ValueError(f"未知的格式: {raw['format']}")
+    start_dt, end_dt = _batch_date(raw["start"]), _batch_date(raw["end"])
+    if end_dt < start_dt: raise ValueError("結束日早於開始日")
+    budget = parse_count_to_int(raw["budget"])
+    if budget <= 0: raise ValueError("總預算需大於 0")
+    # 請款月份預設為走期結束的下個月，付款兌現日為請款月份的下個月底
+    bill_dt = (end_dt.replace(day=1) + timedelta(days=32)).replace(day=1)
+    pay_default = ((bill_dt + timedelta(days=32)).replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return {
+        "client": raw["client"].strip(), "product": raw["product"].strip(), "format": format_type,
+        "budget": budget, "final_budget": parse_count_to_int(raw.get("final_budget")) or budget, "prod_cost": parse_count_to_int(raw.get("prod_cost")),
+        "start": start_dt, "end": end_dt, "sales": str(raw.get("sales", "")).strip(),
+        "config": normalize_media_config(raw["media"]) if isinstance(raw["media"], dict) else parse_media_spec(raw["media"]),
+        "sign_deadline": _batch_date(raw.get("sign_deadline")) or date.today() + timedelta(days=3),
+        "billing_month": str(raw.get("billing_month", "")).strip() or f"{bill_dt.year}年{bill_dt.month}月",
+        "payment_date": _batch_date(raw.get("payment_date")) or pay_default,
+    }
+
+def read_batch_orders(data, filename):
+    """讀取訂單表 (CSV 或 Excel)，回傳以 BATCH_COLUMNS 欄位名稱為 key 的原始訂單列表。"""
+    if filename.lower().endswith((".xlsx", ".xlsm", ".xls")): df = pd.read_excel(io.BytesIO(data), dtype=str)
+    else: df = pd.read_csv(io.BytesIO(data), dtype=str, encoding="utf-8-sig")
+    header_map = {alias.lower(): key for key, aliases in BATCH_COLUMNS.items() for alias in aliases}
+    columns = {c: header_map.get(str(c).strip().lower()) for c in df.columns}
+    missing = [BATCH_COLUMNS[k][0] for k in BATCH_REQUIRED if k not in columns.values()]
+    if missing: raise ValueError(f"訂單表缺少欄位: {'、'.join(missing)}")
+    orders = []
+    for rec in df.fillna("").to_dict("records"):
+        raw = {columns[c]: str(v).strip() for c, v in rec.items() if columns[c]}
+        if any(raw.values()): orders.append(raw)
+    if len(orders) > BATCH_MAX_ORDERS: raise ValueError(f"訂單數 {len(orders)} 超過上限 {BATCH_MAX_ORDERS}")
+    return orders
+
+def plan_order(order, cfg):
+    """計算一筆訂單 (build_batch_order 的結果) 的排程，回傳 (rows, 定價合計, 運算紀錄, 渲染參數)。"""
+    days_count = (order["end"] - order["start"]).days + 1
+    rows, total_list, logs = calculate_plan_data(order["config"], order["budget"], days_count, cfg.pricing_db, cfg.sec_factors, cfg.store_counts_num, REGIONS_ORDER)
+    if not rows: raise ValueError("媒體設定沒有產生任何排程")
+    rem = get_remarks_text(order["sign_deadline"], order["billing_month"], order["payment_date"])
+    render_args = (order["format"], order["start"], order["end"], order["client"], order["product"], rows, rem, order["final_budget"], order["prod_cost"], order["sales"])
+    return rows, total_list, logs, render_args
+
+def order_totals(order, rows):
+    """訂單的金額摘要 (與頁面相同：營業稅 5% 四捨五入)。"""
+    vat = int(round(order["final_budget"] * 0.05))
+    return {"total_spots": sum([r["spots"] for r in rows]), "final_budget": order["final_budget"], "vat": vat,
+            "grand_total": order["final_budget"] + vat, "prod_cost": order["prod_cost"]}
+
+def order_preview_html(order, rows, total_list, render_args, granularity="day"):
+    """以 plan_order 的結果產生 HTML 預覽 (產品字串與頁面相同，加上秒數)；granularity 見 generate_html_preview。"""
+    from .html_preview import generate_html_preview
+    days_count = (order["end"] - order["start"]).days + 1
+    p_str = f"{'、'.join([f'{s}秒' for s in sorted(list(set(r['seconds'] for r in rows)))])} {order['product']}"
+    return generate_html_preview(rows, days_count, order["start"], order["end"], order["client"], p_str, order["format"], render_args[6],
+                                 total_list, order_totals(order, rows)["grand_total"], order["final_budget"], order["prod_cost"], granularity)
+
+def _batch_result(idx, raw):
+    return {"序號": idx, "客戶名稱": raw.get("client", ""), "產品名稱": raw.get("product", ""), "格式": raw.get("format", ""),
+            "狀態": "失敗", "總檔次": 0, "成交價": 0, "耗時_ms": 0, "訊息": ""}
+
+def process_batch_order(idx, raw, cfg, make_pdf=True, pdf_engine=PDF_ENGINE_NATIVE):
+    """處理單筆訂單 (在子程序或執行緒中執行)；任何錯誤只記錄在這筆的結果，不影響其他訂單。回傳 (結果, {檔名: 位元組})。"""
+    t0 = time.perf_counter()
+    result, files = _batch_result(idx, raw), {}
+    try:
+        order = build_batch_order(raw)
+        rows, _, _, render_args = plan_order(order, cfg)
+        # 與頁面共用磁碟快取：內容相同的訂單重跑時直接取用既有檔案
+        cache = get_artifact_cache()
+        plan_key = plan_fingerprint(*render_args)
+        stem = f"{idx:03d}_Cue_{safe_filename(order['client'])}_{safe_filename(order['product'])}"
+        files[f"{stem}.xlsx"] = cached_excel(cache, plan_key, *render_args)
+        result.update({"格式": order["format"], "狀態": "成功", "總檔次": sum([r["spots"] for r in rows]), "成交價": order["final_budget"]})
+        if make_pdf:
+            pdf_bytes, _, err = cached_pdf(cache, plan_key, pdf_engine, *render_args)
+            if pdf_bytes: files[f"{stem}.pdf"] = pdf_bytes
+            else: result["狀態"] = "部分成功"
+            result["訊息"] = f"PDF: {err}" if err else ""
+    except Exception as e:
+        result["訊息"] = f"{type(e).__name__}: {e}"
+    result["耗時_ms"] = round((time.perf_counter() - t0) * 1000)
+    return result, files
+
+def run_batch(orders, cfg, make_pdf=True, pdf_engine=PDF_ENGINE_NATIVE, workers=BATCH_WORKERS, use_processes=True, progress=None):
+    """
+    批次產生 Cue 表，回傳 (ZIP 位元組, 摘要 DataFrame, 效能統計)。
+    - 訂單分散到子程序 (spawn) 平行計算與渲染；完成一筆就寫入 ZIP，不必等全部完成
+    - ZIP 內含每筆的 XLSX / PDF、summary.csv (每筆狀態與錯誤) 與 metrics.json (吞吐量)
+    - use_processes=False 時改用執行緒
+    progress(完成數, 總數, 該筆結果) 會在每筆完成時呼叫。
+    """
+    if not orders: raise ValueError("沒有任何訂單")
+    t0 = time.perf_counter()
+    workers = max(1, min(workers, len(orders)))
+    use_processes = use_processes and workers > 1
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) if use_processes else ThreadPoolExecutor(max_workers=workers)
+    results, n_files = {}, 0
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        with executor:
+            futures = {executor.submit(process_batch_order, i, raw, cfg, make_pdf, pdf_engine): (i, raw) for i, raw in enumerate(orders, start=1)}
+            for fut in as_completed(futures):
+                i, raw = futures[fut]
+                try: result, files = fut.result()
+                except Exception as e:   # 子程序異常結束 (BrokenProcessPool 等)
+                    result, files = dict(_batch_result(i, raw), 訊息=f"{type(e).__name__}: {e}"), {}
+                for name, data in files.items(): zf.writestr(name, data, compress_type=zipfile.ZIP_STORED)   # XLSX / PDF 本身已壓縮
+                n_files += len(files)
+                results[i] = result
+                if progress: progress(len(results), len(orders), result)
+
+        summary = pd.DataFrame([results[i] for i in sorted(results)])
+        wall = time.perf_counter() - t0
+        order_ms = summary["耗時_ms"].to_numpy()
+        status = summary["狀態"].value_counts().to_dict()
+        metrics = {
+            "orders": len(orders), "succeeded": status.get("成功", 0), "partial": status.get("部分成功", 0), "failed": status.get("失敗", 0),
+            "files": n_files, "mode": "process" if use_processes else "thread", "workers": workers,
+            "pdf_engine": pdf_engine if make_pdf else None, "wall_s": round(wall, 3),
+            "orders_per_min": round(len(orders) / wall * 60, 1) if wall else None,
+            "order_ms_p50": round(float(np.percentile(order_ms, 50)), 1), "order_ms_p95": round(float(np.percentile(order_ms, 95)), 1), "order_ms_max": int(order_ms.max()),
+            "parallel_efficiency": round(order_ms.sum() / 1000 / (wall * workers), 2) if wall else None,   # 各筆耗時總和 / (牆鐘時間 × worker 數)
+        }
+        zf.writestr("summary.csv", summary.to_csv(index=False).encode("utf-8-sig"))
+        zf.writestr("metrics.json", json.dumps(metrics, ensure_ascii=False, indent=2))
+    return buf.getvalue(), summary, metrics
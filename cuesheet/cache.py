@@ -0,0 +1,247 @@
+"""
+快取層 (不依賴 Streamlit)。
+- singleton: 程序內單例 (取代 st.cache_resource)，用於連線池、轉檔程序池、工作佇列等
+- ttl_cache: 有時效的記憶體快取 (取代 st.cache_data)，用於 Logo 等外部資源
+- ArtifactCache: 以內容雜湊為 key 的磁碟快取 (Excel / PDF)，多程序共用
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from .metrics import span
+from .settings import ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_MB, ARTIFACT_CACHE_VERSION, PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE
+
+def singleton(fn):
+    """依參數在程序內只建立一次物件 (執行緒安全)；fn.clear() 丟棄既有物件，下次呼叫時重建。"""
+    instances, lock = {}, threading.Lock()
+    @functools.wraps(fn)
+    def wrapper(*args):
+        if args in instances: return instances[args]
+        with lock:
+            if args not in instances: instances[args] = fn(*args)
+            return instances[args]
+    wrapper.clear = instances.clear
+    return wrapper
+
+def ttl_cache(ttl):
+    """結果保留 ttl 秒的記憶體快取 (依參數區分)；fn.clear() 清除全部。"""
+    def decorator(fn):
+        entries, lock = {}, threading.Lock()
+        @functools.wraps(fn)
+        def wrapper(*args):
+            now = time.time()
+            with lock: hit = entries.get(args)
+            if hit and now - hit[0] < ttl: return hit[1]
+            value = fn(*args)
+            with lock: entries[args] = (now, value)
+            return value
+        wrapper.clear = entries.clear
+        return wrapper
+    return decorator
+
+def source_fingerprint(objs, extra=""):
+    """
+    函式 / 類別原始碼的指紋。只看原始碼文字 (不含檔案路徑、行號與 bytecode)，換部署目錄或 Python 版本都不變；
+    取不到原始碼時 (只部署 .pyc) 為空字串，此時僅靠 ARTIFACT_CACHE_VERSION 區分。
+    """
+    try: src = "".join([inspect.getsource(o) for o in objs])
+    except (OSError, TypeError): return ""
+    return hashlib.sha256((src + extra).encode("utf-8")).hexdigest()[:16]
+
+def renderer_fingerprint():
+    """快取版本：手動遞增的 ARTIFACT_CACHE_VERSION 加上 Excel / 列印版面渲染程式的指紋 (程式改動後舊檔自動失效)。"""
+    from .excel import excel_code_fingerprint
+    from .pdf import print_code_fingerprint
+    return f"{ARTIFACT_CACHE_VERSION}-{excel_code_fingerprint()}-{print_code_fingerprint()}"
+
+def plan_fingerprint(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, budget, prod_cost, sales_person):
+    """以排程內容產生穩定的雜湊值，內容相同的 Cue 表 (在同一版渲染程式下) 不論何時產生都會得到同一把 key。"""
+    payload = [renderer_fingerprint(), format_type, str(start_dt), str(end_dt), client_name, product_name,
+               rows, list(remarks_list), budget, prod_cost, sales_person]
+    blob = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ArtifactCache:
+    """
+    以內容雜湊為 key 的磁碟快取。
+    - 檔案存放於 <root>/<key 前兩碼>/<key>.<kind>，寫入採暫存檔 + rename，多程序共用安全
+    - 超過容量上限時依最後使用時間 (mtime) 淘汰最舊的檔案 (LRU)
+    - 命中時更新 mtime，並記錄命中 / 未命中次數供調整容量參考
+    """
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        os.makedirs(root, exist_ok=True)
+        self.total_bytes = sum([size for _, _, size in self._entries()])
+
+    def _path(self, key, kind):
+        return os.path.join(self.root, key[:2], f"{key}.{kind}")
+
+    def _entries(self):
+        for dirpath, _, files in os.walk(self.root):
+            for fn in files:
+                if fn.startswith("."): continue
+                path = os.path.join(dirpath, fn)
+                try: st_ = os.stat(path)
+                except OSError: continue
+                yield path, st_.st_mtime, st_.st_size
+
+    def has(self, key, kind):
+        """只檢查是否存在 (不計入命中統計)，用於顯示檔案是否已就緒。"""
+        return os.path.exists(self._path(key, kind))
+
+    def get(self, key, kind):
+        path = self._path(key, kind)
+        try:
+            with open(path, "rb") as f: data = f.read()
+            os.utime(path)
+        except OSError:
+            with self.lock: self.stats["misses"] += 1
+            return None
+        with self.lock: self.stats["hits"] += 1
+        return data
+
+    def digest(self, key, kind):
+        """已快取檔案內容的 sha256 (不存在時為 None)；不更新使用時間、不計入命中統計。"""
+        try:
+            with open(self._path(key, kind), "rb") as f: return hashlib.sha256(f.read()).hexdigest()
+        except OSError: return None
+
+    def put(self, key, kind, data):
+        path = self._path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+        with os.fdopen(fd, "wb") as f: f.write(data)
+        try: old_size = os.path.getsize(path)   # 覆寫既有檔案時只計入大小差
+        except OSError: old_size = 0
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.stats["writes"] += 1
+            self.total_bytes += len(data) - old_size
+            if self.total_bytes > self.max_bytes: self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda x: x[1])
+        self.total_bytes = sum([size for _, _, size in entries])
+        for path, _, size in entries:
+            if self.total_bytes <= self.max_bytes: break
+            try: os.remove(path)
+            except OSError: continue
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self.lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+            self.total_bytes = 0
+
+    def summary(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return f"命中 {self.stats['hits']} / 未命中 {self.stats['misses']} ({hit_rate:.0%}) · {self.total_bytes / 1048576:.1f} / {self.max_bytes / 1048576:.0f} MB"
+
+@singleton
+def get_artifact_cache():
+    return ArtifactCache(ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_MB * 1024 * 1024)
+
+def cached_excel(cache, plan_key, format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person):
+    with span("cached_excel", cache="hit") as sp:
+        xlsx_bytes = cache.get(plan_key, "xlsx")
+        if xlsx_bytes is None:
+            sp["cache"] = "miss"
+            from .excel import generate_excel_from_scratch
+            xlsx_bytes = generate_excel_from_scratch(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person)
+            cache.put(plan_key, "xlsx", xlsx_bytes)
+        return xlsx_bytes
+
+def pdf_cache_kind(engine):
+    return f"{engine.lower()}.pdf"
+
+def pdf_cache_kinds(engine):
+    """讀取已產生的 PDF 時依序查找的快取種類：原生引擎失敗改用 LibreOffice 的結果存在 LibreOffice 名下，同樣視為就緒。"""
+    return [pdf_cache_kind(engine)] + ([pdf_cache_kind(PDF_ENGINE_SOFFICE)] if engine == PDF_ENGINE_NATIVE else [])
+
+def pdf_produced_by(method):
+    """實際產生 PDF 的引擎 (method 為 "WeasyPrint"、"LibreOffice (UNO)"、"LibreOffice (快取)" 等)。"""
+    return PDF_ENGINE_SOFFICE if method.startswith(PDF_ENGINE_SOFFICE) else PDF_ENGINE_NATIVE
+
+def cached_pdf(cache, plan_key, engine, format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person):
+    """
+    取得 (pdf_bytes, method, err_msg)。PDF 依實際產生的引擎存放：原生引擎失敗時的 LibreOffice 結果不會存成原生版本，
+    下次仍先試原生引擎，失敗時沿用已轉好的 LibreOffice 檔。
+    """
+    args = (format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person)
+    kind = pdf_cache_kind(engine)
+    with span("cached_pdf", engine=engine, cache="hit") as sp:
+        pdf_bytes = cache.get(plan_key, kind)
+        if pdf_bytes is not None: return pdf_bytes, f"{engine} (快取)", ""
+        sp["cache"] = "miss"
+        get_xlsx = lambda: cached_excel(cache, plan_key, *args)
+        soffice = (lambda: cached_pdf(cache, plan_key, PDF_ENGINE_SOFFICE, *args)) if engine == PDF_ENGINE_NATIVE else None
+        from .pdf import generate_pdf_bytes
+        pdf_bytes, method, err = generate_pdf_bytes(engine, get_xlsx, *args, soffice=soffice)
+        if pdf_bytes and pdf_produced_by(method) == engine: cache.put(plan_key, kind, pdf_bytes)
+        return pdf_bytes, method, err
+
+def cached_formats(cache, engine, formats, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, with_xlsx=True, with_pdf=True):
+    """
+    同一方案一次取得多種格式的 Excel / PDF，回傳 {格式: {"key": plan_key, "xlsx": bytes, "pdf": (pdf_bytes, method, err_msg)}}。
+    各格式仍以自己的 plan_fingerprint 存取快取 (與 cached_excel / cached_pdf 共用，PDF 同樣依實際產生的引擎存放)；
+    未命中的部分共用同一份 PlanSummary 一起渲染，需要 LibreOffice 的 PDF 集中在一次轉檔工作。
+    """
+    args = (start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person)
+    keys = {fmt: plan_fingerprint(fmt, *args) for fmt in formats}
+    xlsx, state = {}, {}
+    def summary():
+        if "shared" not in state:
+            from .pricing import PlanSummary
+            state["shared"] = PlanSummary(rows, (end_dt - start_dt).days + 1)
+        return state["shared"]
+    def get_xlsx_many(fmts):
+        for fmt in fmts:
+            if fmt not in xlsx: xlsx[fmt] = cache.get(keys[fmt], "xlsx")
+        missing = [fmt for fmt in fmts if xlsx[fmt] is None]
+        if missing:
+            from .excel import generate_excel_all_formats
+            for fmt, data in generate_excel_all_formats(missing, *args, shared=summary()).items():
+                cache.put(keys[fmt], "xlsx", data); xlsx[fmt] = data
+        return [xlsx[fmt] for fmt in fmts]
+    def soffice_many(fmts):
+        # 原生引擎失敗的格式：已有 LibreOffice 版本的直接沿用，其餘一次轉檔並存在 LibreOffice 名下
+        kind = pdf_cache_kind(PDF_ENGINE_SOFFICE)
+        hits = {fmt: cache.get(keys[fmt], kind) for fmt in fmts}
+        todo = [fmt for fmt in fmts if hits[fmt] is None]
+        from .soffice import xlsx_batch_to_pdf_bytes
+        converted = dict(zip(todo, xlsx_batch_to_pdf_bytes(get_xlsx_many(todo)))) if todo else {}
+        for fmt, res in converted.items():
+            if res[0]: cache.put(keys[fmt], kind, res[0])
+        return [converted[fmt] if hits[fmt] is None else (hits[fmt], f"{PDF_ENGINE_SOFFICE} (快取)", "") for fmt in fmts]
+
+    out = {fmt: {"key": keys[fmt]} for fmt in formats}
+    with span("cached_formats", engine=engine, formats=len(formats)) as sp:
+        if with_pdf:
+            kind = pdf_cache_kind(engine)
+            pending = []
+            for fmt in formats:
+                pdf_bytes = cache.get(keys[fmt], kind)
+                if pdf_bytes is None: pending.append(fmt)
+                else: out[fmt]["pdf"] = (pdf_bytes, f"{engine} (快取)", "")
+            sp["pdf_misses"] = len(pending)
+            if pending:
+                from .pdf import generate_pdf_formats
+                soffice = soffice_many if engine == PDF_ENGINE_NATIVE else None
+                for fmt, res in generate_pdf_formats(engine, get_xlsx_many, pending, *args, shared=summary(), soffice_many=soffice).items():
+                    if res[0] and pdf_produced_by(res[1]) == engine: cache.put(keys[fmt], kind, res[0])
+                    out[fmt]["pdf"] = res
+        if with_xlsx:
+            for fmt, data in zip(formats, get_xlsx_many(formats)): out[fmt]["xlsx"] = data
+    return out
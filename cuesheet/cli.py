@@ -0,0 +1,164 @@
+"""
+命令列入口 (cue-sheet)：python -m cuesheet <指令>
+
+    python -m cuesheet config [--refresh]
+    python -m cuesheet price  --budget 1000000 --start 2026-01-01 --end 2026-01-31 --media "全家廣播 100% 全省 20"
+    python -m cuesheet render --client 客戶 --product 產品 ... -o cue.xlsx [--pdf cue.pdf] [--html cue.html]
+    python -m cuesheet batch  orders.csv -o out.zip [-w 4] [--no-pdf]
+    python -m cuesheet serve  [--host 0.0.0.0] [--port 8600] [--workers 8]   (REST / JSON 服務，見 server.py)
+
+單筆訂單的欄位與批次訂單表相同 (媒體設定格式見 batch.parse_media_spec)。
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from .settings import API_HOST, API_PORT, API_QUEUE_LIMIT, API_WORKERS, BATCH_WORKERS, GSHEET_SHARE_URL, PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE
+
+PDF_ENGINES = (PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE)
+
+def _load_config(refresh=False):
+    """同步載入設定檔 (不啟動背景更新執行緒)；失敗時回傳 None。"""
+    from .config import get_config_store
+    store = get_config_store(GSHEET_SHARE_URL)
+    if refresh or not store.load_snapshot(): store.refresh()
+    if store.config is None: print(f"設定檔載入失敗: {store.last_error}", file=sys.stderr)
+    return store.config
+
+def _order_from_args(opts):
+    from .batch import BATCH_COLUMNS, build_batch_order
+    raw = {k: str(v) for k, v in vars(opts).items() if k in BATCH_COLUMNS and v is not None}
+    return build_batch_order(raw)
+
+def _add_order_args(parser):
+    parser.add_argument("--client", default="客戶")
+    parser.add_argument("--product", default="產品")
+    parser.add_argument("--budget", required=True, help="總預算 (未稅 Net)")
+    parser.add_argument("--final-budget", dest="final_budget", help="最終成交價 (預設同總預算)")
+    parser.add_argument("--prod-cost", dest="prod_cost", default="0")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--format", default="東吳", help="東吳 / 聲活 / 鉑霖")
+    parser.add_argument("--sales", default="")
+    parser.add_argument("--media", required=True, help='例如 "全家廣播 50%% 全省 20; 家樂福 50%% 20"')
+    parser.add_argument("--sign-deadline", dest="sign_deadline")
+    parser.add_argument("--billing-month", dest="billing_month")
+    parser.add_argument("--payment-date", dest="payment_date")
+
+def cmd_config(opts):
+    cfg = _load_config(opts.refresh)
+    if cfg is None: return 2
+    print(f"來源: {cfg.source} · 更新時間: {datetime.fromtimestamp(cfg.fetched_at):%Y-%m-%d %H:%M}")
+    print(f"媒體: {', '.join(cfg.pricing_db.keys())} · 店數項目: {len(cfg.store_counts_num)} · 業務: {len(cfg.sales_map)}")
+    return 0
+
+def cmd_price(opts):
+    cfg = _load_config(opts.refresh_config)
+    if cfg is None: return 2
+    from .batch import plan_order
+    order = _order_from_args(opts)
+    rows, total_list, logs, _ = plan_order(order, cfg)
+    print(f"{'媒體':<6}{'區域':<8}{'秒數':>4}{'檔次':>8}{'定價':>12}")
+    for r in rows:
+        rate = f"{r['rate_display']:,}" if isinstance(r["rate_display"], int) else r["rate_display"]
+        print(f"{r['media']:<6}{r['region']:<8}{r['seconds']:>4}{r['spots']:>8,}{rate:>12}")
+    print(f"總檔次 {sum([r['spots'] for r in rows]):,} · 定價合計 ${total_list:,} · 成交價 ${order['final_budget']:,}")
+    for log in logs:
+        if log["is_under_target"]: print(f"⚠️ {log['media']} {log['seconds']}秒 未達標準檔次，已套用 1.1 倍懲罰")
+    return 0
+
+def cmd_render(opts):
+    cfg = _load_config(opts.refresh_config)
+    if cfg is None: return 2
+    from .batch import plan_order
+    from .excel import generate_excel_from_scratch
+    order = _order_from_args(opts)
+    rows, total_list, _, render_args = plan_order(order, cfg)
+    xlsx_bytes = generate_excel_from_scratch(*render_args)
+    if opts.output:
+        with open(opts.output, "wb") as f: f.write(xlsx_bytes)
+        print(f"Excel → {opts.output}")
+    if opts.pdf:
+        from .pdf import generate_pdf_bytes
+        pdf_bytes, method, err = generate_pdf_bytes(opts.pdf_engine, lambda: xlsx_bytes, *render_args)
+        if not pdf_bytes:
+            print(f"PDF 生成失敗: {err}", file=sys.stderr)
+            return 1
+        with open(opts.pdf, "wb") as f: f.write(pdf_bytes)
+        print(f"PDF ({method}) → {opts.pdf}" + (f" · {err}" if err else ""))
+    if opts.html:
+        from .batch import order_preview_html
+        html = order_preview_html(order, rows, total_list, render_args, opts.html_view)
+        with open(opts.html, "w", encoding="utf-8") as f: f.write(html)
+        print(f"HTML → {opts.html}")
+    return 0
+
+def cmd_batch(opts):
+    from .batch import read_batch_orders, run_batch
+    with open(opts.orders, "rb") as f: orders = read_batch_orders(f.read(), opts.orders)
+    cfg = _load_config(opts.refresh_config)   # 設定會隨每筆工作傳給子程序
+    if cfg is None: return 2
+    print(f"設定檔: {cfg.source} {datetime.fromtimestamp(cfg.fetched_at):%Y-%m-%d %H:%M} · 訂單 {len(orders)} 筆", flush=True)
+
+    def progress(done, total, r):
+        note = f" {r['訊息']}" if r["訊息"] else ""
+        print(f"[{done}/{total}] {r['狀態']} #{r['序號']} {r['客戶名稱']} - {r['產品名稱']} ({r['耗時_ms']} ms){note}", flush=True)
+
+    zip_bytes, _, metrics = run_batch(orders, cfg, not opts.no_pdf, opts.pdf_engine, opts.workers, not opts.threads, progress)
+    output = opts.output or f"cue_batch_{datetime.now():%Y%m%d_%H%M%S}.zip"
+    with open(output, "wb") as f: f.write(zip_bytes)
+    print(f"完成 {metrics['succeeded']} / 部分成功 {metrics['partial']} / 失敗 {metrics['failed']} · {metrics['wall_s']:.1f} 秒 "
+          f"({metrics['orders_per_min']} 筆/分, {metrics['mode']} × {metrics['workers']}) → {output}")
+    return 0 if metrics["failed"] == 0 and metrics["partial"] == 0 else 1
+
+def cmd_serve(opts):
+    from .server import serve
+    return serve(opts.host, opts.port, opts.workers, opts.queue_limit)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cue-sheet", description="媒體 Cue 表生成器 (命令列版)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("config", help="載入並顯示雲端設定檔")
+    p.add_argument("--refresh", action="store_true", help="不使用本機快照，重新下載")
+    p.set_defaults(func=cmd_config)
+
+    p = sub.add_parser("price", help="計算單筆訂單的排程 (不產生檔案)")
+    _add_order_args(p)
+    p.set_defaults(func=cmd_price)
+
+    p = sub.add_parser("render", help="產生單筆訂單的 Excel / PDF / HTML")
+    _add_order_args(p)
+    p.add_argument("-o", "--output", help="Excel 輸出路徑")
+    p.add_argument("--pdf", help="PDF 輸出路徑")
+    p.add_argument("--pdf-engine", choices=PDF_ENGINES, default=PDF_ENGINE_NATIVE)
+    p.add_argument("--html", help="HTML 預覽輸出路徑")
+    p.add_argument("--html-view", dest="html_view", choices=["day", "week", "month"], default="day", help="HTML 預覽的日期欄：逐日 / 每週 / 每月彙總")
+    p.set_defaults(func=cmd_render)
+
+    p = sub.add_parser("batch", help="依訂單表 (CSV / Excel) 批次產生 Cue 表並輸出 ZIP")
+    p.add_argument("orders", help="訂單表路徑 (.csv / .xlsx)")
+    p.add_argument("-o", "--output", help="輸出 ZIP 路徑 (預設為 cue_batch_<時間>.zip)")
+    p.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS, help=f"平行處理數 (預設 {BATCH_WORKERS})")
+    p.add_argument("--no-pdf", action="store_true", help="只產生 Excel")
+    p.add_argument("--pdf-engine", choices=PDF_ENGINES, default=PDF_ENGINE_NATIVE)
+    p.add_argument("--threads", action="store_true", help="使用執行緒而非子程序")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("serve", help="啟動 REST / JSON 服務 (排程試算與檔案產生)")
+    p.add_argument("--host", default=API_HOST)
+    p.add_argument("--port", type=int, default=API_PORT)
+    p.add_argument("-w", "--workers", type=int, default=API_WORKERS, help=f"同時處理的請求數 (預設 {API_WORKERS})")
+    p.add_argument("--queue-limit", dest="queue_limit", type=int, default=API_QUEUE_LIMIT, help="排隊上限，超過時回 503")
+    p.set_defaults(func=cmd_serve)
+
+    for name in ("price", "render", "batch"):
+        sub.choices[name].add_argument("--refresh-config", action="store_true", help="不使用本機快照，重新下載雲端設定檔")
+    return parser
+
+def main(argv=None):
+    opts = build_parser().parse_args(argv)
+    try: return opts.func(opts)
+    except (ValueError, OSError) as e:
+        print(f"錯誤: {e}", file=sys.stderr)
+        return 2
@@ -0,0 +1,196 @@
+"""
+雲端設定檔 (Google 試算表) 的下載、解析與本機快照。
+"""
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from .cache import singleton
+from .helpers import parse_count_to_int
+from .httpclient import get_http_client
+from .metrics import span
+from .settings import CONFIG_REFRESH_TTL, CONFIG_SNAPSHOT_PATH, GSHEET_BASE_URL
+
+CONFIG_SHEETS = ["Stores", "Factors", "Pricing", "Sales"]
+CONFIG_OPTIONAL_SHEETS = ["Capacity"]   # 缺少或讀取失敗時視為未設定，不影響其他分頁
+CAPACITY_COLUMNS = {"Media", "Region", "Daily_Spots"}
+
+@dataclass
+class CloudConfig:
+    """Google 試算表設定檔解析後的結果 (各分頁合併為一個物件)。"""
+    store_counts: dict       # Key -> 顯示名稱
+    store_counts_num: dict   # Key -> 店數
+    pricing_db: dict         # 媒體 -> 區域 -> 價格
+    sec_factors: dict        # 媒體 -> 秒數 -> 係數
+    sales_map: dict          # 業務真名 -> Ragic 綽號
+    fetched_at: float        # 資料抓取時間 (epoch)
+    source: str              # "cloud" 或 "snapshot"
+    capacity: dict = field(default_factory=dict)   # (媒體, 區域, 秒數) -> 每日可播檔次；秒數 0 為不分秒數合計，區域「全省」為各區預設
+
+def parse_config_sheets(csv_texts, fetched_at, source):
+    def read_sheet(sheet_name):
+        import pandas as pd
+        df = pd.read_csv(io.StringIO(csv_texts[sheet_name]))
+        df.columns = [c.strip() for c in df.columns]
+        return df
+
+    df_store = read_sheet("Stores")
+    store_counts = dict(zip(df_store['Key'], df_store['Display_Name']))
+    store_counts_num = dict(zip(df_store['Key'], df_store['Count']))
+
+    df_fact = read_sheet("Factors")
+    sec_factors = {}
+    for _, row in df_fact.iterrows():
+        if row['Media'] not in sec_factors: sec_factors[row['Media']] = {}
+        sec_factors[row['Media']][int(row['Seconds'])] = float(row['Factor'])
+
+    name_map = {"全家新鮮視": "新鮮視", "全家廣播": "全家廣播", "家樂福": "家樂福"}
+    for k, v in name_map.items():
+        if k in sec_factors and v not in sec_factors: sec_factors[v] = sec_factors[k]
+
+    df_price = read_sheet("Pricing")
+    pricing_db = {}
+    for _, row in df_price.iterrows():
+        m, r = row['Media'], row['Region']
+        if m == "家樂福":
+            if m not in pricing_db: pricing_db[m] = {}
+            pricing_db[m][r] = {
+                "List": int(row['List_Price']), "Net": int(row['Net_Price']),
+                "Std_Spots": int(row['Std_Spots']), "Day_Part": row['Day_Part']
+            }
+        else:
+            if m not in pricing_db: pricing_db[m] = {"Std_Spots": int(row['Std_Spots']), "Day_Part": row['Day_Part']}
+            pricing_db[m][r] = [int(row['List_Price']), int(row['Net_Price'])]
+
+    # Sales 分頁 (真名 vs 綽號)；欄位沒設對時 Key=Name, Value=Name (都用真名)
+    df_sales = read_sheet("Sales")
+    if 'Name' in df_sales.columns and 'Nickname' in df_sales.columns:
+        sales_map = dict(zip(df_sales['Name'], df_sales['Nickname']))
+    else:
+        sales_map = {name: name for name in df_sales.iloc[:, 0].tolist()}
+
+    # Capacity 分頁 (選用)：Media / Region / Seconds / Daily_Spots，Seconds 空白表示各秒數合計的上限
+    capacity = {}
+    if (csv_texts.get("Capacity") or "").strip():
+        df_cap = read_sheet("Capacity")
+        if CAPACITY_COLUMNS <= set(df_cap.columns):
+            for _, row in df_cap.dropna(subset=list(CAPACITY_COLUMNS)).iterrows():
+                sec = row.get('Seconds')
+                sec = parse_count_to_int(sec) if sec == sec else 0   # 空白 (NaN) 為不分秒數
+                media = name_map.get(str(row['Media']).strip(), str(row['Media']).strip())
+                capacity[(media, str(row['Region']).strip(), sec)] = int(row['Daily_Spots'])
+
+    return CloudConfig(store_counts, store_counts_num, pricing_db, sec_factors, sales_map, fetched_at, source, capacity)
+
+class ConfigStore:
+    """
+    雲端設定檔管理。
+    - 各分頁並行下載，帶 ETag / Last-Modified 做條件式請求，未變動時不重新解析
+    - 每次成功下載都寫入本機快照；程式啟動時先讀快照，頁面可立即顯示
+    - 過期後在背景執行緒更新，不阻塞頁面；雲端無法連線時沿用最後一份成功的設定
+    """
+    def __init__(self, share_url, snapshot_path=CONFIG_SNAPSHOT_PATH, ttl=CONFIG_REFRESH_TTL, base_url=GSHEET_BASE_URL):
+        match = re.search(r"/d/([a-zA-Z0-9-_]+)", share_url)
+        self.file_id = match.group(1) if match else None
+        self.snapshot_path = snapshot_path
+        self.ttl = ttl
+        self.base_url = base_url.rstrip("/")
+        self.lock = threading.Lock()
+        self.config = None
+        self.raw = {}            # 分頁名稱 -> {"csv", "etag", "last_modified"}
+        self.last_checked = 0.0
+        self.last_error = None
+        self._refreshing = False
+
+    def _sheet_url(self, sheet_name):
+        return f"{self.base_url}/spreadsheets/d/{self.file_id}/gviz/tq?tqx=out:csv&sheet={sheet_name}"
+
+    def _fetch_sheet(self, sheet_name):
+        prev = self.raw.get(sheet_name, {})
+        headers = {}
+        if prev.get("etag"): headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"): headers["If-Modified-Since"] = prev["last_modified"]
+        resp = get_http_client().get("gsheet", self._sheet_url(sheet_name), headers=headers)
+        if resp.status_code == 304 and prev: return prev
+        resp.raise_for_status()
+        resp.encoding = "utf-8"
+        return {"csv": resp.text, "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+
+    def _fetch_optional_sheet(self, sheet_name):
+        try: return self._fetch_sheet(sheet_name)
+        except Exception: return self.raw.get(sheet_name) or {"csv": "", "etag": None, "last_modified": None}
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f: snap = json.load(f)
+            if snap.get("file_id") != self.file_id: return False
+            config = parse_config_sheets({k: v["csv"] for k, v in snap["sheets"].items()}, snap["fetched_at"], "snapshot")
+        except (OSError, ValueError, KeyError):
+            return False
+        with self.lock:
+            self.raw, self.config = snap["sheets"], config
+        return True
+
+    def _save_snapshot(self, raw, fetched_at):
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.snapshot_path) or ".", prefix=".cfg_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"file_id": self.file_id, "fetched_at": fetched_at, "sheets": raw}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def refresh(self):
+        """同步更新一次；成功回傳 True，失敗時保留原本的設定並記錄錯誤。"""
+        if not self.file_id:
+            self.last_error = "連結格式錯誤"
+            return False
+        try:
+            with span("config_refresh"), ThreadPoolExecutor(max_workers=len(CONFIG_SHEETS) + len(CONFIG_OPTIONAL_SHEETS)) as ex:
+                raw = dict(zip(CONFIG_SHEETS, ex.map(self._fetch_sheet, CONFIG_SHEETS)))
+                raw.update(zip(CONFIG_OPTIONAL_SHEETS, ex.map(self._fetch_optional_sheet, CONFIG_OPTIONAL_SHEETS)))
+            now = time.time()
+            changed = any([raw[k] is not self.raw.get(k) for k in CONFIG_SHEETS + CONFIG_OPTIONAL_SHEETS])
+            config = parse_config_sheets({k: v["csv"] for k, v in raw.items()}, now, "cloud") if changed or self.config is None else None
+            with self.lock:
+                self.raw = raw
+                if config is not None: self.config = config
+                else: self.config.fetched_at, self.config.source = now, "cloud"
+                self.last_checked = now
+                self.last_error = None
+            self._save_snapshot(raw, now)
+            return True
+        except Exception as e:
+            with self.lock:
+                self.last_checked = time.time()
+                self.last_error = f"讀取失敗: {str(e)}"
+            return False
+        finally:
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self.lock:
+            if self._refreshing: return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def get(self):
+        """回傳 (CloudConfig 或 None, 錯誤訊息)。有可用設定時錯誤訊息只作為提示。"""
+        if self.config is None and not self.load_snapshot():
+            self.refresh()
+        elif time.time() - self.last_checked > self.ttl:
+            self._refresh_in_background()
+        return self.config, self.last_error
+
+@singleton
+def get_config_store(share_url):
+    return ConfigStore(share_url)
+
+def load_config_from_cloud(share_url):
+    store = get_config_store(share_url)
+    with span("config", cache="hit" if store.config is not None else "miss"):
+        return store.get()
@@ -0,0 +1,835 @@
+"""
+Excel 渲染引擎：三種格式的 Cue 表，輸出後端為 openpyxl 或 SheetModel + xlsxwriter。
+"""
+import io
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
+
+import openpyxl
+from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.utils.cell import coordinate_from_string, range_boundaries
+from openpyxl.styles import Alignment, Font, Border, Side, PatternFill
+from openpyxl.drawing.image import Image as OpenpyxlImage
+
+from .assets import get_cloud_logo_bytes
+from .cache import singleton, source_fingerprint
+from .metrics import span
+from .pricing import PlanSummary
+from .settings import BS_MEDIUM, BS_THIN, FMT_MONEY, FMT_NUMBER, FONT_MAIN
+
+class StyleRegistry:
+    """
+    依規格快取 openpyxl 的 Font / Border / Alignment / PatternFill。
+    相同規格永遠回傳同一個物件：渲染時不再為每個儲存格重建樣式，openpyxl 與 xlsxwriter 輸出時也只需比對少量物件。
+    框線以 (上, 下, 左, 右) 樣式組成的狀態表示；border_state 可把任何 Border 還原成狀態，方便在既有框線上疊加。
+    cache=False 時每次都建立新物件 (僅供效能比較)。
+    """
+    def __init__(self, cache=True):
+        self.cache = cache
+        self.objects = {}
+        self.border_states = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _get(self, key, build):
+        if not self.cache: return build()
+        obj = self.objects.get(key)
+        if obj is None:
+            obj = self.objects[key] = build()
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        return obj
+
+    def font(self, size=12, bold=None, color=None, underline=None, name=FONT_MAIN):
+        return self._get(("font", name, size, bold, color, underline), lambda: Font(name=name, size=size, bold=bold, color=color, underline=underline))
+
+    def alignment(self, horizontal=None, vertical=None, wrap_text=None):
+        return self._get(("align", horizontal, vertical, wrap_text), lambda: Alignment(horizontal=horizontal, vertical=vertical, wrap_text=wrap_text))
+
+    def fill(self, color):
+        return self._get(("fill", color), lambda: PatternFill(start_color=color, end_color=color, fill_type="solid"))
+
+    def border(self, top=None, bottom=None, left=None, right=None):
+        state = (top, bottom, left, right)
+        def build():
+            b = Border(top=Side(style=top), bottom=Side(style=bottom), left=Side(style=left), right=Side(style=right))
+            if self.cache: self.border_states[id(b)] = state
+            return b
+        return self._get(("border",) + state, build)
+
+    def border_state(self, border):
+        """Border → (上, 下, 左, 右) 樣式；由登錄表產生的 Border 直接查表，其他 (例如合併儲存格產生的) 則讀取各邊。"""
+        state = self.border_states.get(id(border)) if self.cache else None
+        if state is None:
+            state = tuple([getattr(border, k).style if getattr(border, k) is not None else None for k in ("top", "bottom", "left", "right")])
+        return state
+
+STYLES = StyleRegistry()
+
+# --- Excel 輸出後端 (SheetModel + xlsxwriter) ---
+EXCEL_BACKEND_OPENPYXL = "openpyxl"
+EXCEL_BACKEND_XLSXWRITER = "xlsxwriter"
+EXCEL_BACKEND = os.environ.get("CUE_EXCEL_BACKEND", EXCEL_BACKEND_XLSXWRITER)
+
+XLSXWRITER_BORDER = {None: 0, "thin": 1, "medium": 2, "dashed": 3, "dotted": 4, "thick": 5, "double": 6, "hair": 7}
+
+class _ModelCell:
+    """SheetModel 的儲存格，屬性名稱與 openpyxl Cell 相同，渲染程式不需修改。"""
+    __slots__ = ("row", "column", "_value", "font", "alignment", "border", "fill", "number_format", "merged")
+
+    def __init__(self, row, column, merged=False):
+        self.row, self.column, self.merged = row, column, merged
+        self._value = None; self.font = None; self.alignment = None; self.border = STYLES.border(); self.fill = None; self.number_format = "General"
+
+    @property
+    def value(self): return self._value
+
+    def copy(self):
+        c = _ModelCell(self.row, self.column, self.merged)
+        c._value, c.font, c.alignment, c.border, c.fill, c.number_format = self._value, self.font, self.alignment, self.border, self.fill, self.number_format
+        return c
+
+    @value.setter
+    def value(self, v):
+        # 與 openpyxl 相同：日期寫入時若尚未指定格式，預設為 yyyy-mm-dd
+        if isinstance(v, (date, datetime)) and self.number_format == "General": self.number_format = "yyyy-mm-dd"
+        self._value = v
+
+class _ModelDimension:
+    __slots__ = ("width", "height")
+    def __init__(self): self.width = None; self.height = None
+
+class SheetModel:
+    """
+    輕量的工作表模型，提供渲染程式用到的 openpyxl Worksheet 介面
+    (cell / [] / merge_cells / column_dimensions / row_dimensions / add_image)。
+    儲存格只是一般物件，不經過 openpyxl 的樣式登錄；最後每個儲存格的最終樣式只換算一次，交給 xlsxwriter 輸出。
+    合併儲存格的框線處理與 openpyxl 的 MergedCellRange 相同，輸出外觀一致。
+    """
+    ORIENTATION_LANDSCAPE = "landscape"
+    PAPERSIZE_A4 = 9
+
+    def __init__(self, title="Schedule"):
+        self.title = title
+        self.cells = {}
+        self.merges = []
+        self.images = []
+        self.column_dimensions = defaultdict(_ModelDimension)
+        self.row_dimensions = defaultdict(_ModelDimension)
+
+    def clone(self):
+        """複製一份可獨立修改的模型 (樣式物件為共用的不可變物件，不需複製)。"""
+        other = SheetModel(self.title)
+        other.cells = {k: c.copy() for k, c in self.cells.items()}
+        other.merges = list(self.merges)
+        other.images = list(self.images)
+        for dims, src in ((other.column_dimensions, self.column_dimensions), (other.row_dimensions, self.row_dimensions)):
+            for k, d in src.items(): dims[k].width, dims[k].height = d.width, d.height
+        return other
+
+    def cell(self, row, column, value=None):
+        c = self.cells.get((row, column))
+        if c is None: c = self.cells[(row, column)] = _ModelCell(row, column)
+        if value is not None: c.value = value
+        return c
+
+    def __getitem__(self, coord):
+        col, row = coordinate_from_string(coord)
+        return self.cell(row, column_index_from_string(col))
+
+    def __setitem__(self, coord, value):
+        self[coord].value = value
+
+    def add_image(self, img):
+        self.images.append(img)
+
+    def merge_cells(self, range_string=None, start_row=None, start_column=None, end_row=None, end_column=None):
+        if range_string is not None:
+            start_column, start_row, end_column, end_row = range_boundaries(range_string)
+        # 框線以 (上, 下, 左, 右) 狀態疊加，等同 openpyxl 的 Border 相加 (只有設定了樣式的邊會覆蓋)
+        start = self.cell(start_row, start_column)
+        end = self.cells.get((end_row, end_column))
+        if end is not None:
+            t, b, l, r = STYLES.border_state(start.border); _, end_b, _, end_r = STYLES.border_state(end.border)
+            start.border = STYLES.border(t, end_b or b, l, end_r or r)
+        for r in range(start_row, end_row + 1):
+            for c in range(start_column, end_column + 1):
+                if (r, c) != (start_row, start_column): self.cells[(r, c)] = _ModelCell(r, c, merged=True)
+        edges = [
+            (0, [(start_row, c) for c in range(start_column, end_column + 1)]),    # top
+            (2, [(r, start_column) for r in range(start_row, end_row + 1)]),      # left
+            (3, [(r, end_column) for r in range(start_row, end_row + 1)]),        # right
+            (1, [(end_row, c) for c in range(start_column, end_column + 1)]),     # bottom
+        ]
+        start_state = STYLES.border_state(start.border)
+        for idx, coords in edges:
+            if start_state[idx] is None: continue
+            for coord in coords:
+                cell = self.cells[coord]
+                state = list(STYLES.border_state(cell.border)); state[idx] = start_state[idx]
+                cell.border = STYLES.border(*state)
+        self.merges.append((start_row, start_column, end_row, end_column))
+
+    @staticmethod
+    def _format_props(cell):
+        props = {}
+        f = cell.font
+        if f is not None:
+            props["font_name"] = f.name; props["font_size"] = f.sz
+            if f.b: props["bold"] = True
+            if f.u: props["underline"] = {"single": 1, "double": 2}.get(f.u, 1)
+            if f.color is not None and f.color.type == "rgb": props["font_color"] = f"#{f.color.rgb[-6:]}"
+        a = cell.alignment
+        if a is not None:
+            if a.horizontal: props["align"] = a.horizontal
+            if a.vertical: props["valign"] = "vcenter" if a.vertical == "center" else a.vertical
+            if a.wrap_text: props["text_wrap"] = True
+        b = cell.border
+        for name in ("top", "bottom", "left", "right"):
+            side = getattr(b, name)
+            if side is not None and side.style: props[name] = XLSXWRITER_BORDER[side.style]
+        if cell.fill is not None and cell.fill.fill_type == "solid":
+            props["pattern"] = 1; props["bg_color"] = f"#{cell.fill.fgColor.rgb[-6:]}"
+        if cell.number_format != "General": props["num_format"] = cell.number_format
+        return props
+
+    def to_xlsx(self, landscape=True, paper=PAPERSIZE_A4, fit_to_page=True):
+        """以 xlsxwriter 輸出 .xlsx 位元組；相同樣式的儲存格共用同一個 Format。"""
+        import xlsxwriter
+        out = io.BytesIO()
+        wb = xlsxwriter.Workbook(out, {"in_memory": True, "strings_to_formulas": False, "strings_to_urls": False, "strings_to_numbers": False})
+        ws = wb.add_worksheet(self.title)
+        if landscape: ws.set_landscape()
+        ws.set_paper(paper)
+        if fit_to_page: ws.fit_to_pages(1, 1)
+        for letter, dim in self.column_dimensions.items():
+            if dim.width is None: continue
+            # 依 Excel 的欄寬換算成像素，與 openpyxl 直接寫入的欄寬顯示結果相同
+            col = column_index_from_string(letter) - 1
+            ws.set_column_pixels(col, col, int((256 * dim.width + int(128 / 7)) / 256 * 7))
+        for r, dim in self.row_dimensions.items():
+            if dim.height is not None: ws.set_row(r - 1, dim.height)
+
+        formats, by_style = {}, {}
+        def fmt_of(cell):
+            # 樣式物件由 STYLES 共用，先以物件組合查表，只有新組合才需要換算屬性
+            style_key = (id(cell.font), id(cell.alignment), id(cell.border), id(cell.fill), cell.number_format)
+            fmt = by_style.get(style_key)
+            if fmt is None:
+                props = self._format_props(cell)
+                key = tuple(sorted(props.items()))
+                if key not in formats: formats[key] = wb.add_format(props)
+                fmt = by_style[style_key] = formats[key]
+            return fmt
+
+        def write(cell, fmt):
+            r, c, v = cell.row - 1, cell.column - 1, cell.value
+            if v is None or v == "": ws.write_blank(r, c, None, fmt)
+            elif isinstance(v, bool): ws.write_boolean(r, c, v, fmt)
+            elif isinstance(v, (int, float)): ws.write_number(r, c, v, fmt)
+            elif isinstance(v, (date, datetime)): ws.write_datetime(r, c, v, fmt)
+            else: ws.write_string(r, c, str(v), fmt)
+
+        merged_anchor = {(r1, c1) for r1, c1, _, _ in self.merges}
+        for (r, c), cell in sorted(self.cells.items()):
+            if (r, c) in merged_anchor or cell.merged: continue
+            if cell.value is None and not self._format_props(cell): continue   # 只被讀取過的空白儲存格
+            write(cell, fmt_of(cell))
+        for r1, c1, r2, c2 in self.merges:
+            start = self.cells[(r1, c1)]
+            if (r1, c1) != (r2, c2): ws.merge_range(r1 - 1, c1 - 1, r2 - 1, c2 - 1, None, fmt_of(start))   # 單格合併 (一天走期的月份列) 沒有外觀差異，xlsxwriter 也不接受
+            write(start, fmt_of(start))
+            # merge_range 會把整個範圍套上左上角的格式，這裡改回每格自己的樣式
+            for r in range(r1, r2 + 1):
+                for c in range(c1, c2 + 1):
+                    if (r, c) != (r1, c1): ws.write_blank(r - 1, c - 1, None, fmt_of(self.cells[(r, c)]))
+
+        if self.images: from PIL import Image as PILImage
+        for img in self.images:
+            col, row = coordinate_from_string(img.anchor)
+            data = img.ref.getvalue() if hasattr(img.ref, "getvalue") else open(img.ref, "rb").read()
+            with PILImage.open(io.BytesIO(data)) as pil:
+                (w0, h0), dpi = pil.size, pil.info.get("dpi", (96, 96))
+            ws.insert_image(row - 1, column_index_from_string(col) - 1, "logo.png", {
+                "image_data": io.BytesIO(data),
+                "x_scale": img.width / (w0 * 96.0 / (dpi[0] or 96)), "y_scale": img.height / (h0 * 96.0 / (dpi[1] or 96))})
+        wb.close()
+        return out.getvalue()
+
+# --- 表頭骨架快取 (Skeleton Cache) ---
+SKELETON_CACHE_SIZE = 64
+SKELETON_CACHE_TTL = 3600       # 與 Logo 快取時間相同，Logo 更新後骨架也會重建
+
+class SkeletonCache:
+    """
+    (格式, 走期, 程式碼指紋) → 表頭骨架 SheetModel 的 LRU 快取。
+    取出時回傳複本，呼叫端可直接在上面填入資料；程式碼指紋改變 (格式程式被修改) 時自然不會命中舊骨架。
+    """
+    def __init__(self, max_entries=SKELETON_CACHE_SIZE, ttl=SKELETON_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, build):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1].clone()
+        model = build()
+        with self.lock:
+            self.stats["misses"] += 1
+            self.entries[key] = (now, model)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+        return model.clone()
+
+    def clear(self):
+        with self.lock: self.entries.clear()
+
+@singleton
+def get_skeleton_cache():
+    return SkeletonCache()
+
+_EXCEL_CODE_FINGERPRINT = None
+
+def excel_code_fingerprint():
+    """Excel 渲染相關程式碼 (各格式渲染程式、SheetModel、StyleRegistry) 的指紋，程式有改動時骨架快取自動失效。"""
+    global _EXCEL_CODE_FINGERPRINT
+    if _EXCEL_CODE_FINGERPRINT is None:
+        _EXCEL_CODE_FINGERPRINT = source_fingerprint([generate_excel_from_scratch, _ModelCell, SheetModel, StyleRegistry])
+    return _EXCEL_CODE_FINGERPRINT
+
+def generate_excel_from_scratch(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, backend=None, shared=None):
+    """
+    backend: "xlsxwriter" (預設，渲染到 SheetModel 後一次輸出) 或 "openpyxl" (原本直接操作 Workbook 的方式)。
+    兩者使用同一套渲染程式，輸出外觀相同。
+    shared: 同一方案的 PlanSummary (一次輸出多種格式時共用)；未提供時自行建立。
+    """
+    backend = backend or EXCEL_BACKEND
+    shared = shared or PlanSummary(rows, (end_dt - start_dt).days + 1)
+      
+    # Common Excel Styles (全部由 STYLES 快取，相同規格共用同一個物件)
+    BORDER_ALL_THIN = STYLES.border(BS_THIN, BS_THIN, BS_THIN, BS_THIN)
+    BORDER_ALL_MEDIUM = STYLES.border(BS_MEDIUM, BS_MEDIUM, BS_MEDIUM, BS_MEDIUM)
+    ALIGN_CENTER = STYLES.alignment('center', 'center', True)
+    ALIGN_LEFT = STYLES.alignment('left', 'center', True)
+    ALIGN_RIGHT = STYLES.alignment('right', 'center', True)
+    FONT_STD, FONT_BOLD, FONT_TITLE = STYLES.font(12), STYLES.font(14, bold=True), STYLES.font(48, bold=True)
+    FILL_WEEKEND = STYLES.fill("FFFFCC")
+      
+    def set_border(cell, top=None, bottom=None, left=None, right=None):
+        # 以儲存格目前的框線狀態 (四邊樣式) 組合出新狀態，再向 STYLES 取得共用的 Border
+        t, b, l, r = STYLES.border_state(cell.border)
+        cell.border = STYLES.border(top or t, bottom or b, left or l, right or r)
+
+    def draw_outer_border_fast(ws, min_r, max_r, min_c, max_c):
+        for c in range(min_c, max_c + 1):
+            set_border(ws.cell(min_r, c), top=BS_MEDIUM)
+            set_border(ws.cell(max_r, c), bottom=BS_MEDIUM)
+        for r in range(min_r, max_r + 1):
+            set_border(ws.cell(r, min_c), left=BS_MEDIUM)
+            set_border(ws.cell(r, max_c), right=BS_MEDIUM)
+
+    # ---------------------------------------------------------
+    # Sub-Engine: Dongwu (東吳格式)
+    # ---------------------------------------------------------
+    def skeleton_dongwu(ws, start_dt, end_dt):
+        eff_days = (end_dt - start_dt).days + 1
+        spots_col_idx = 7 + eff_days + 1
+        total_cols = spots_col_idx
+
+        COL_WIDTHS = {'A': 19.6, 'B': 22.8, 'C': 14.6, 'D': 20.0, 'E': 13.0, 'F': 19.6, 'G': 17.9}
+        ROW_HEIGHTS = {1: 61.0, 2: 29.0, 3: 40.0, 4: 40.0, 5: 40.0, 6: 40.0, 7: 40.0, 8: 40.0}
+          
+        for k, v in COL_WIDTHS.items(): ws.column_dimensions[k].width = v
+        for i in range(eff_days): ws.column_dimensions[get_column_letter(8+i)].width = 8.5
+        ws.column_dimensions[get_column_letter(spots_col_idx)].width = 13.0
+        for r, h in ROW_HEIGHTS.items(): ws.row_dimensions[r].height = h
+
+        ws.merge_cells(f"A1:{get_column_letter(total_cols)}1"); c = ws['A1']; c.value = "Media Schedule"; c.font = FONT_TITLE; c.alignment = ALIGN_CENTER
+          
+        infos = [("A3", "客戶名稱：", None), ("A4", "Product：", None), ("A5", "Period :", f"{start_dt.strftime('%Y. %m. %d')} - {end_dt.strftime('%Y. %m. %d')}"), ("A6", "Medium :", None)]
+        for pos, lbl, val in infos:
+            c = ws[pos]; c.value = lbl; c.font = FONT_BOLD; c.alignment = STYLES.alignment(vertical='center')
+            c2 = ws.cell(c.row, 2); c2.value = val; c2.font = FONT_BOLD; c2.alignment = STYLES.alignment(vertical='center')
+          
+        for c_idx in range(1, total_cols + 1): set_border(ws.cell(3, c_idx), top=BS_MEDIUM)
+        ws['H6'] = f"{start_dt.month}月"; ws['H6'].font = STYLES.font(16, bold=True); ws['H6'].alignment = ALIGN_CENTER
+          
+        headers = [("A","Station"), ("B","Location"), ("C","Program"), ("D","Day-part"), ("E","Size"), ("F","rate\n(Net)"), ("G","Package-cost\n(Net)")]
+        for col, txt in headers:
+            col_idx = column_index_from_string(col)
+            ws.merge_cells(f"{col}7:{col}8"); c7 = ws.cell(7, col_idx); c7.value = txt; c8 = ws.cell(8, col_idx)
+            c7.font = FONT_BOLD; c7.alignment = ALIGN_CENTER; c7.border = BORDER_ALL_THIN; c8.border = BORDER_ALL_THIN
+            set_border(c7, top=BS_MEDIUM); set_border(c8, bottom=BS_MEDIUM)
+
+        curr = start_dt
+        for i in range(eff_days):
+            col_idx = 8 + i
+            c_d = ws.cell(7, col_idx); c_w = ws.cell(8, col_idx)
+            c_d.value = curr; c_d.number_format = 'm/d'; c_w.value = ["一","二","三","四","五","六","日"][curr.weekday()]
+            if curr.weekday() >= 5: c_w.fill = FILL_WEEKEND
+            curr += timedelta(days=1)
+            c_d.font = FONT_STD; c_w.font = FONT_STD; c_d.alignment = ALIGN_CENTER; c_w.alignment = ALIGN_CENTER
+            c_d.border = BORDER_ALL_THIN; c_w.border = BORDER_ALL_THIN
+            set_border(c_d, top=BS_MEDIUM); set_border(c_w, bottom=BS_MEDIUM)
+
+        c_spots_7 = ws.cell(7, spots_col_idx); c_spots_7.value = "檔次"; c_spots_8 = ws.cell(8, spots_col_idx)
+        ws.merge_cells(start_row=7, start_column=spots_col_idx, end_row=8, end_column=spots_col_idx)
+        c_spots_7.font = FONT_BOLD; c_spots_7.alignment = ALIGN_CENTER; c_spots_7.border = BORDER_ALL_THIN; c_spots_8.border = BORDER_ALL_THIN
+        set_border(c_spots_7, top=BS_MEDIUM, left=BS_MEDIUM); set_border(c_spots_8, bottom=BS_MEDIUM, left=BS_MEDIUM)
+        set_border(ws['A7'], right=BS_MEDIUM); set_border(ws['A8'], right=BS_MEDIUM)
+
+    def render_dongwu_optimized(ws, start_dt, end_dt, rows, budget, prod):
+        eff_days = (end_dt - start_dt).days + 1
+        spots_col_idx = 7 + eff_days + 1
+        total_cols = spots_col_idx
+
+        p_str = f"{'、'.join([f'{s}秒' for s in shared.unique_secs])} {product_name}"
+        medium_str = "/".join(shared.media)
+        ws['B3'] = client_name; ws['B4'] = p_str; ws['B6'] = medium_str
+
+        curr_row = 9
+
+        for m_key, data in shared.groups:
+            if not data: continue
+            start_merge = curr_row
+            display_name = f"全家便利商店\n{m_key if m_key!='家樂福' else ''}廣告"
+            if m_key == "家樂福": display_name = "家樂福"
+            elif m_key == "全家廣播": display_name = "全家便利商店\n通路廣播廣告"
+            elif m_key == "新鮮視": display_name = "全家便利商店\n新鮮視廣告"
+
+            for idx, r in enumerate(data):
+                ws.row_dimensions[curr_row].height = 40
+                ws.cell(curr_row, 1, display_name).alignment = ALIGN_CENTER
+                ws.cell(curr_row, 2, r["region"]).alignment = ALIGN_CENTER
+                ws.cell(curr_row, 3, r.get("program_num", 0)).alignment = ALIGN_CENTER
+                ws.cell(curr_row, 4, r["daypart"]).alignment = ALIGN_CENTER
+                ws.cell(curr_row, 5, f"{r['seconds']}秒").alignment = ALIGN_CENTER
+                rate = r['rate_display']; pkg = r['pkg_display']
+                if r.get("is_pkg_member"): pkg = r['nat_pkg_display'] if idx == 0 else None
+                c_rate = ws.cell(curr_row, 6); c_rate.value = rate; c_rate.number_format = FMT_MONEY; c_rate.alignment = ALIGN_CENTER
+                if pkg is not None: c_pkg = ws.cell(curr_row, 7); c_pkg.value = pkg; c_pkg.number_format = FMT_MONEY; c_pkg.alignment = ALIGN_CENTER
+                row_sum = 0
+                for d_idx in range(eff_days):
+                    if d_idx < len(r["schedule"]): val = r["schedule"][d_idx]; row_sum += val; c_s = ws.cell(curr_row, 8+d_idx); c_s.value = val; c_s.number_format = FMT_NUMBER; c_s.alignment = ALIGN_CENTER
+                ws.cell(curr_row, spots_col_idx, row_sum).alignment = ALIGN_CENTER
+                for c_idx in range(1, total_cols + 1): cell = ws.cell(curr_row, c_idx); cell.font = FONT_STD; cell.border = BORDER_ALL_THIN
+                curr_row += 1
+
+            ws.merge_cells(start_row=start_merge, start_column=1, end_row=curr_row-1, end_column=1)
+            if data[0].get("is_pkg_member"): ws.merge_cells(start_row=start_merge, start_column=7, end_row=curr_row-1, end_column=7)
+            for col in [4, 5]:
+                m_start = start_merge
+                while m_start < curr_row:
+                    m_end = m_start; val = ws.cell(m_start, col).value
+                    while m_end + 1 < curr_row and ws.cell(m_end+1, col).value == val: m_end += 1
+                    if m_end > m_start: ws.merge_cells(start_row=m_start, start_column=col, end_row=m_end, end_column=col)
+                    m_start = m_end + 1
+            draw_outer_border_fast(ws, start_merge, curr_row-1, 1, total_cols)
+            for r in range(start_merge, curr_row): set_border(ws.cell(r, 1), right=BS_MEDIUM); set_border(ws.cell(r, spots_col_idx), left=BS_MEDIUM)
+
+        ws.row_dimensions[curr_row].height = 30
+        c_lbl = ws.cell(curr_row, 5, "Total"); c_lbl.alignment = ALIGN_CENTER; c_lbl.font = FONT_BOLD
+        c_rate_sum = ws.cell(curr_row, 6, shared.rate_sum); c_rate_sum.number_format = FMT_MONEY; c_rate_sum.alignment = ALIGN_CENTER; c_rate_sum.font = FONT_BOLD
+        c_val = ws.cell(curr_row, 7, budget); c_val.number_format = FMT_MONEY; c_val.alignment = ALIGN_CENTER; c_val.font = FONT_BOLD
+        for d_idx, daily_sum in enumerate(shared.day_totals):
+            c = ws.cell(curr_row, 8+d_idx); c.value = daily_sum; c.alignment = ALIGN_CENTER; c.font = FONT_STD; c.number_format = FMT_NUMBER
+        ws.cell(curr_row, spots_col_idx, shared.grand_total).alignment = ALIGN_CENTER; ws.cell(curr_row, spots_col_idx).font = FONT_STD
+        for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), top=BS_MEDIUM, bottom=BS_MEDIUM, left=BS_THIN, right=BS_THIN)
+        set_border(ws.cell(curr_row, 1), left=BS_MEDIUM, right=BS_MEDIUM); set_border(ws.cell(curr_row, spots_col_idx), left=BS_MEDIUM, right=BS_MEDIUM); curr_row += 1
+
+        vat = int(budget * 0.05); grand_total = budget + vat
+        footer_items = [("媒體", budget), ("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]
+        for label, val in footer_items:
+            if label == "媒體": continue 
+            ws.row_dimensions[curr_row].height = 30
+            c_l = ws.cell(curr_row, 6); c_l.value = label; c_l.alignment = ALIGN_LEFT; c_l.font = FONT_STD
+            c_v = ws.cell(curr_row, 7); c_v.value = val; c_v.number_format = FMT_MONEY; c_v.alignment = ALIGN_CENTER; c_v.font = FONT_STD
+            set_border(c_l, left=BS_MEDIUM, top=BS_THIN, bottom=BS_THIN, right=BS_THIN)
+            set_border(c_v, right=BS_MEDIUM, top=BS_THIN, bottom=BS_THIN, left=BS_THIN)
+            if label == "Grand Total":
+                for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), top=BS_MEDIUM, bottom=BS_MEDIUM)
+            curr_row += 1
+          
+        draw_outer_border_fast(ws, 7, curr_row-1, 1, total_cols); curr_row += 1
+        ws.cell(curr_row, 1, "Remarks:").font = STYLES.font(16, bold=True, underline='single')
+        for rm in remarks_list:
+            curr_row += 1
+            is_red = rm.strip().startswith("1.") or rm.strip().startswith("4.")
+            c = ws.cell(curr_row, 1); c.value = rm; c.font = STYLES.font(14, color="FF0000" if is_red else "000000")
+
+        curr_row += 2; sig_start = curr_row
+        ws.merge_cells(start_row=sig_start, start_column=1, end_row=sig_start, end_column=7); ws.cell(sig_start, 1, "甲    方：東吳廣告股份有限公司").alignment = ALIGN_LEFT
+        ws.merge_cells(start_row=sig_start+1, start_column=1, end_row=sig_start+1, end_column=7); ws.cell(sig_start+1, 1, "統一編號：20935458").alignment = ALIGN_LEFT
+        ws.merge_cells(start_row=sig_start+2, start_column=1, end_row=sig_start+2, end_column=7); ws.cell(sig_start+2, 1, sales_person).alignment = ALIGN_LEFT; ws.cell(sig_start+2, 1).font = FONT_STD
+          
+        right_start_col = 20 # Column T
+        ws.merge_cells(start_row=sig_start, start_column=right_start_col, end_row=sig_start, end_column=right_start_col+7); ws.cell(sig_start, right_start_col, f"乙    方：{client_name}").alignment = ALIGN_LEFT
+        ws.merge_cells(start_row=sig_start+1, start_column=right_start_col, end_row=sig_start+1, end_column=right_start_col+7); ws.cell(sig_start+1, right_start_col, "統一編號：").alignment = ALIGN_LEFT
+        ws.merge_cells(start_row=sig_start+2, start_column=right_start_col, end_row=sig_start+2, end_column=right_start_col+7); ws.cell(sig_start+2, right_start_col, "客戶簽章：").alignment = ALIGN_LEFT
+        for c_idx in range(1, total_cols + 1): set_border(ws.cell(sig_start, c_idx), top=BS_THIN)
+        return curr_row + 3
+
+    # ---------------------------------------------------------
+    # Sub-Engine: Shenghuo (聲活數位格式)
+    # ---------------------------------------------------------
+    def skeleton_shenghuo(ws, start_dt, end_dt):
+        eff_days = (end_dt - start_dt).days + 1
+        end_c_start = 6 + eff_days
+        total_cols = end_c_start + 2
+
+        ws.column_dimensions['A'].width = 22.5; ws.column_dimensions['B'].width = 24.5; ws.column_dimensions['C'].width = 13.8; ws.column_dimensions['D'].width = 19.4; ws.column_dimensions['E'].width = 15.0
+        for i in range(eff_days): ws.column_dimensions[get_column_letter(6 + i)].width = 8.1 
+        ws.column_dimensions[get_column_letter(end_c_start)].width = 9.5; ws.column_dimensions[get_column_letter(end_c_start+1)].width = 58.0; ws.column_dimensions[get_column_letter(end_c_start+2)].width = 20.0 
+        ROW_H_MAP = {1:30, 2:30, 3:46, 4:46, 5:40, 6:40, 7:35, 8:35}; 
+        for r, h in ROW_H_MAP.items(): ws.row_dimensions[r].height = h
+          
+        ws.merge_cells(f"A1:{get_column_letter(total_cols)}1"); c1 = ws['A1']; c1.value = "聲活數位-媒體計劃排程表"; c1.font = STYLES.font(24, bold=True); c1.alignment = ALIGN_CENTER
+        ws.merge_cells(f"A2:{get_column_letter(total_cols)}2"); c2 = ws['A2']; c2.value = "Media Schedule"; c2.font = STYLES.font(18, bold=True); c2.alignment = ALIGN_CENTER
+        FONT_16 = STYLES.font(16); ws.merge_cells(f"A3:{get_column_letter(total_cols)}3"); ws['A3'].value = "聲活數位科技股份有限公司 統編 28710100"; ws['A3'].font = FONT_16; ws['A3'].alignment = ALIGN_LEFT
+        ws.merge_cells(f"A4:{get_column_letter(total_cols)}4"); ws['A4'].font = FONT_16; ws['A4'].alignment = ALIGN_LEFT
+          
+        period_str = f"執行期間：{start_dt.strftime('%Y.%m.%d')} - {end_dt.strftime('%Y.%m.%d')}"
+        FONT_14 = STYLES.font(14); c5a = ws['A5']; c5a.value = "客戶名稱："; c5a.font = FONT_14; c5a.alignment = ALIGN_LEFT
+        ws.merge_cells("B5:E5"); c5b = ws['B5']; c5b.font = FONT_14; c5b.alignment = ALIGN_LEFT
+        ws.merge_cells(f"F5:{get_column_letter(end_c_start)}5"); c5f = ws['F5']; c5f.font = FONT_14; c5f.alignment = ALIGN_LEFT
+        ws.merge_cells(f"{get_column_letter(end_c_start+1)}5:{get_column_letter(total_cols)}5"); c5_r = ws[f"{get_column_letter(end_c_start+1)}5"]; c5_r.value = period_str; c5_r.font = FONT_14; c5_r.alignment = ALIGN_LEFT 
+        draw_outer_border_fast(ws, 5, 5, 1, total_cols)
+
+        c6a = ws['A6']; c6a.value = "廣告名稱："; c6a.font = FONT_14; c6a.alignment = ALIGN_LEFT; ws.merge_cells("B6:E6"); c6b = ws['B6']; c6b.font = FONT_14; c6b.alignment = ALIGN_LEFT
+        month_groups = []
+        for i in range(eff_days):
+            d = start_dt + timedelta(days=i); m_key = (d.year, d.month)
+            if not month_groups or month_groups[-1][0] != m_key: month_groups.append([m_key, i, i]) 
+            else: month_groups[-1][2] = i
+        for m_key, s_idx, e_idx in month_groups:
+            start_col = 6 + s_idx; end_col = 6 + e_idx
+            ws.merge_cells(start_row=6, start_column=start_col, end_row=6, end_column=end_col); c = ws.cell(6, start_col); c.value = f"{m_key[1]}月"; c.font = FONT_BOLD; c.alignment = ALIGN_LEFT; c.border = BORDER_ALL_MEDIUM
+        for c_idx in range(1, total_cols + 1):
+            c = ws.cell(6, c_idx); t, b, l, r = BS_MEDIUM, BS_MEDIUM, None, None
+            if c_idx == 1: l = BS_MEDIUM 
+            if c_idx == total_cols: r = BS_MEDIUM 
+            if c_idx == 6: l = None 
+            c.border = STYLES.border(t, b, l, r)
+        draw_outer_border_fast(ws, 6, 6, 1, 5); ws.cell(6, 5).border = STYLES.border(BS_MEDIUM, BS_MEDIUM, None, None)
+          
+        header_start_row = 7; headers = ["頻道", "播出地區", "播出店數", "播出時間", "秒數\n規格"]
+        for i, h in enumerate(headers):
+            c_idx = i + 1; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
+            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
+            if c_idx == 1: l = BS_MEDIUM
+            c.border = STYLES.border(t, b, l, r); ws.cell(header_start_row+1, c_idx).border = STYLES.border(BS_THIN, BS_THIN, l, r)
+
+        curr = start_dt
+        for i in range(eff_days):
+            col_idx = 6 + i; c7 = ws.cell(header_start_row, col_idx); c7.value = curr.day; c7.font = FONT_BOLD; c7.alignment = ALIGN_CENTER; c7.border = BORDER_ALL_MEDIUM
+            c7.border = STYLES.border(BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN)
+            c8 = ws.cell(header_start_row+1, col_idx); c8.value = ["日","一","二","三","四","五","六"][(curr.weekday()+1)%7]; c8.font = FONT_BOLD; c8.alignment = ALIGN_CENTER
+            style_left = BS_MEDIUM if col_idx == 6 else BS_THIN
+            c8.border = STYLES.border(BS_THIN, BS_THIN, style_left, BS_THIN); 
+            if curr.weekday() >= 5: c8.fill = FILL_WEEKEND
+            curr += timedelta(days=1)
+
+        end_headers = ["檔次", "定價", "專案價"]; 
+        for i, h in enumerate(end_headers):
+            c_idx = end_c_start + i; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
+            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
+            if c_idx == total_cols: r = BS_MEDIUM
+            c.border = STYLES.border(t, b, l, r); ws.cell(header_start_row+1, c_idx).border = STYLES.border(BS_THIN, BS_THIN, l, r)
+
+        date_start_col = 6
+        for c_idx in range(date_start_col, total_cols + 1):
+            c7 = ws.cell(header_start_row, c_idx); c7.border = STYLES.border(BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN)
+            if c_idx == date_start_col: set_border(c7, left=BS_MEDIUM)
+            if c_idx == total_cols: set_border(c7, right=BS_MEDIUM)
+            c8 = ws.cell(header_start_row+1, c_idx); c8.border = STYLES.border(BS_THIN, BS_THIN, BS_THIN, BS_THIN)
+            if c_idx == date_start_col: set_border(c8, left=BS_MEDIUM)
+            if c_idx == total_cols: set_border(c8, right=BS_MEDIUM)
+
+    def render_shenghuo_optimized(ws, start_dt, end_dt, rows, budget, prod):
+        eff_days = (end_dt - start_dt).days + 1
+        end_c_start = 6 + eff_days
+        total_cols = end_c_start + 2
+        header_start_row = 7
+
+        sec_str = " ".join([f"{s}秒廣告" for s in shared.unique_secs])
+        ws['A4'] = sales_person; ws['B5'] = client_name; ws['F5'] = f"廣告規格：{sec_str}"; ws['B6'] = product_name
+
+        curr_row = header_start_row + 2
+
+        for m_key, data in shared.groups:
+            if not data: continue
+            start_merge = curr_row; d_name = f"全家便利商店\n{m_key}廣告" if m_key != "家樂福" else "家樂福"
+            for idx, r in enumerate(data):
+                ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 1, d_name).alignment = ALIGN_CENTER; ws.cell(curr_row, 2, r['region']).alignment = ALIGN_CENTER
+                p_num = int(r.get('program_num', 0)); suffix = "面" if m_key == "新鮮視" else "店"; ws.cell(curr_row, 3, f"{p_num:,}{suffix}").alignment = ALIGN_CENTER
+                ws.cell(curr_row, 4, r['daypart']).alignment = ALIGN_CENTER
+                sec = r['seconds']; sec_txt = f"{sec}秒\n影片/影像 1920x1080 (mp4)" if m_key == "新鮮視" else f"{sec}秒廣告"; c_spec = ws.cell(curr_row, 5, sec_txt); c_spec.alignment = ALIGN_CENTER; c_spec.font = STYLES.font(10)
+                row_sum = 0
+                for d_idx in range(eff_days):
+                    if d_idx < len(r['schedule']): val = r['schedule'][d_idx]; row_sum += val; c = ws.cell(curr_row, 6+d_idx); c.value = val; c.alignment = ALIGN_CENTER; c.font = FONT_STD; c.border = BORDER_ALL_THIN
+                ws.cell(curr_row, end_c_start, row_sum).alignment = ALIGN_CENTER
+                rate_val = r['rate_display']
+                ws.cell(curr_row, end_c_start+1, rate_val).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER 
+                pkg = r['pkg_display']; 
+                if r.get('is_pkg_member'): pkg = r['nat_pkg_display'] if idx == 0 else None
+                ws.cell(curr_row, end_c_start+2, pkg).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
+                for c_idx in range(1, total_cols + 1): c = ws.cell(curr_row, c_idx); c.font = FONT_STD; c.border = BORDER_ALL_THIN
+                set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
+            ws.merge_cells(start_row=start_merge, start_column=1, end_row=curr_row-1, end_column=1)
+            if data[0].get('is_pkg_member'): ws.merge_cells(start_row=start_merge, start_column=end_c_start+2, end_row=curr_row-1, end_column=end_c_start+2)
+            draw_outer_border_fast(ws, start_merge, curr_row-1, 1, total_cols)
+
+        ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 3, shared.store_count).number_format = FMT_NUMBER; ws.cell(curr_row, 3).alignment = ALIGN_CENTER; ws.cell(curr_row, 3).font = FONT_BOLD
+        ws.cell(curr_row, 5, "Total").alignment = ALIGN_CENTER; ws.cell(curr_row, 5).font = FONT_BOLD
+        for d_idx, daily_sum in enumerate(shared.day_totals): c = ws.cell(curr_row, 6+d_idx); c.value = daily_sum; c.alignment = ALIGN_CENTER; c.font = FONT_BOLD
+        ws.cell(curr_row, end_c_start, shared.grand_total).alignment = ALIGN_CENTER; ws.cell(curr_row, end_c_start).font = FONT_BOLD
+        ws.cell(curr_row, end_c_start+1, shared.rate_sum).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).font = FONT_BOLD; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER
+        ws.cell(curr_row, end_c_start+2, budget).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).font = FONT_BOLD; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
+        for c_idx in range(1, total_cols+1): ws.cell(curr_row, c_idx).border = BORDER_ALL_THIN
+        draw_outer_border_fast(ws, curr_row, curr_row, 1, total_cols)
+        for c_idx in range(1, total_cols+1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
+        set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
+
+        vat = int(budget * 0.05); grand_total = budget + vat
+        footer_stack = [("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]
+        for lbl, val in footer_stack:
+            ws.row_dimensions[curr_row].height = 30; c_l = ws.cell(curr_row, end_c_start+1); c_l.value = lbl; c_l.alignment = ALIGN_RIGHT; c_l.font = FONT_STD
+            c_v = ws.cell(curr_row, end_c_start+2); c_v.value = val; c_v.number_format = FMT_MONEY; c_v.alignment = ALIGN_CENTER; c_v.font = FONT_BOLD 
+            t, b, l, r = BS_THIN, BS_THIN, BS_MEDIUM, BS_THIN; 
+            if lbl == "Grand Total": b = BS_MEDIUM 
+            c_l.border = STYLES.border(t, b, l, r)
+            t, b, l, r = BS_THIN, BS_THIN, BS_THIN, BS_MEDIUM; 
+            if lbl == "Grand Total": b = BS_MEDIUM 
+            c_v.border = STYLES.border(t, b, l, r)
+            if lbl == "Grand Total":
+                for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
+            curr_row += 1
+          
+        curr_row += 1; start_footer = curr_row; r_col_start = 6 
+        ws.row_dimensions[start_footer].height = 25; ws.cell(start_footer, r_col_start).value = "Remarks："
+        ws.cell(start_footer, r_col_start).font = STYLES.font(16, bold=True)
+        r_row = start_footer
+        for rm in remarks_list:
+            r_row += 1; ws.row_dimensions[r_row].height = 25; is_red = rm.strip().startswith("1.") or rm.strip().startswith("4."); is_blue = rm.strip().startswith("6."); color = "000000"
+            if is_red: color = "FF0000"
+            if is_blue: color = "0000FF"
+            c = ws.cell(r_row, r_col_start); c.value = rm; c.font = STYLES.font(16, color=color)
+
+        sig_col_start = 1
+        ws.cell(start_footer, sig_col_start).value = "乙        方："; ws.cell(start_footer, sig_col_start).font = STYLES.font(16)
+        ws.cell(start_footer+1, sig_col_start+1).value = client_name; ws.cell(start_footer+1, sig_col_start+1).font = STYLES.font(16)
+        ws.cell(start_footer+2, sig_col_start).value = "統一編號："; ws.cell(start_footer+2, sig_col_start).font = STYLES.font(16)
+        ws.cell(start_footer+2, sig_col_start+2).value = ""; ws.cell(start_footer+2, sig_col_start+2).font = STYLES.font(16)
+        ws.cell(start_footer+3, sig_col_start).value = "客戶簽章："; ws.cell(start_footer+3, sig_col_start).font = STYLES.font(16)
+
+        target_border_row = r_row + 2
+        for c_idx in range(1, total_cols + 1): ws.cell(target_border_row, c_idx).border = STYLES.border(bottom='double')
+        return target_border_row
+
+    # ---------------------------------------------------------
+    # Sub-Engine: Bolin (鉑霖格式)
+    # ---------------------------------------------------------
+    def skeleton_bolin(ws, start_dt, end_dt):
+        logo_bytes = get_cloud_logo_bytes()
+        eff_days = (end_dt - start_dt).days + 1; end_c_start = 6 + eff_days; total_cols = end_c_start + 2
+        ws.column_dimensions['A'].width = 21.0; ws.column_dimensions['B'].width = 21.0; ws.column_dimensions['C'].width = 13.8; ws.column_dimensions['D'].width = 19.4; ws.column_dimensions['E'].width = 15.0
+        for i in range(eff_days): ws.column_dimensions[get_column_letter(6 + i)].width = 8.1
+        ws.column_dimensions[get_column_letter(end_c_start)].width = 9.5; ws.column_dimensions[get_column_letter(end_c_start+1)].width = 36.0; ws.column_dimensions[get_column_letter(end_c_start+2)].width = 20.0
+        ROW_H_MAP = {1:70, 2:33.5, 3:33.5, 4:46, 5:40, 6:35, 7:35}
+        for r, h in ROW_H_MAP.items(): ws.row_dimensions[r].height = h
+          
+        ws.merge_cells(f"A1:{get_column_letter(total_cols)}1"); c1 = ws['A1']; c1.value = "鉑霖行動行銷-媒體計劃排程表 Mobi Media Schedule"; c1.font = STYLES.font(28, bold=True); c1.alignment = ALIGN_LEFT 
+        if logo_bytes:
+            try: img = OpenpyxlImage(io.BytesIO(logo_bytes)); scale = 125 / img.height; img.height = 125; img.width = int(img.width * scale); col_letter = get_column_letter(total_cols - 1); img.anchor = f"{col_letter}1"; ws.add_image(img)
+            except Exception: pass
+
+        c2a = ws['A2']; c2a.value = "TO："; c2a.font = STYLES.font(20, bold=True, color="FF0000"); c2a.alignment = ALIGN_LEFT
+        ws.merge_cells(f"B2:{get_column_letter(total_cols)}2"); c2b = ws['B2']; c2b.font = STYLES.font(20, bold=True, color="FF0000"); c2b.alignment = ALIGN_LEFT
+        c3a = ws['A3']; c3a.value = "FROM："; c3a.font = STYLES.font(20, bold=True); c3a.alignment = ALIGN_LEFT
+        ws.merge_cells(f"B3:{get_column_letter(total_cols)}3"); c3b = ws['B3']; c3b.font = STYLES.font(20, bold=True); c3b.alignment = ALIGN_LEFT
+
+        period_str = f"執行期間：{start_dt.strftime('%Y.%m.%d')} - {end_dt.strftime('%Y.%m.%d')}"
+        c4a = ws['A4']; c4a.value = "客戶名稱："; c4a.font = STYLES.font(14, bold=True); c4a.alignment = ALIGN_LEFT
+        ws.merge_cells("B4:E4"); c4b = ws['B4']; c4b.font = STYLES.font(14, bold=True); c4b.alignment = ALIGN_LEFT
+        spec_merge_start = "F4"; spec_merge_end = f"{get_column_letter(end_c_start)}4"; ws.merge_cells(f"{spec_merge_start}:{spec_merge_end}"); c4f = ws['F4']; c4f.font = STYLES.font(14, bold=True); c4f.alignment = ALIGN_LEFT
+        ws.merge_cells(f"{get_column_letter(end_c_start+1)}4:{get_column_letter(total_cols)}4"); c4_r = ws[f"{get_column_letter(end_c_start+1)}4"]; c4_r.value = period_str; c4_r.font = STYLES.font(14, bold=True); c4_r.alignment = ALIGN_LEFT
+        draw_outer_border_fast(ws, 4, 4, 1, total_cols)
+
+        c5a = ws['A5']; c5a.value = "廣告名稱："; c5a.font = STYLES.font(14, bold=True); c5a.alignment = ALIGN_LEFT
+        ws.merge_cells("B5:E5"); c5b = ws['B5']; c5b.font = STYLES.font(14, bold=True); c5b.alignment = ALIGN_LEFT
+        month_groups = []
+        for i in range(eff_days):
+            d = start_dt + timedelta(days=i); m_key = (d.year, d.month)
+            if not month_groups or month_groups[-1][0] != m_key: month_groups.append([m_key, i, i]) 
+            else: month_groups[-1][2] = i
+        for m_key, s_idx, e_idx in month_groups:
+            start_col = 6 + s_idx; end_col = 6 + e_idx; ws.merge_cells(start_row=5, start_column=start_col, end_row=5, end_column=end_col); c = ws.cell(5, start_col); c.value = f"{m_key[1]}月"; c.font = FONT_BOLD; c.alignment = ALIGN_LEFT 
+        for c_idx in range(1, total_cols + 1):
+            c = ws.cell(5, c_idx); t, b, l, r = BS_MEDIUM, BS_MEDIUM, None, None
+            if c_idx == 1: l = BS_MEDIUM 
+            if c_idx == total_cols: r = BS_MEDIUM 
+            if c_idx == 6: l = None 
+            c.border = STYLES.border(t, b, l, r)
+        draw_outer_border_fast(ws, 5, 5, 1, 5); ws.cell(5, 5).border = STYLES.border(BS_MEDIUM, BS_MEDIUM, None, None)
+
+        header_start_row = 6; headers = ["頻道", "播出地區", "播出店數", "播出時間", "秒數\n規格"]
+        for i, h in enumerate(headers):
+            c_idx = i + 1; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
+            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
+            if c_idx == 1: l = BS_MEDIUM
+            c.border = STYLES.border(t, b, l, r); ws.cell(header_start_row+1, c_idx).border = STYLES.border(BS_THIN, BS_THIN, l, r)
+
+        curr = start_dt
+        for i in range(eff_days):
+            col_idx = 6 + i; c6 = ws.cell(header_start_row, col_idx); c6.value = curr.day; c6.font = FONT_BOLD; c6.alignment = ALIGN_CENTER; c6.border = BORDER_ALL_MEDIUM; c6.border = STYLES.border(BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN)
+            c7 = ws.cell(header_start_row+1, col_idx); c7.value = ["日","一","二","三","四","五","六"][(curr.weekday()+1)%7]; c7.font = FONT_BOLD; c7.alignment = ALIGN_CENTER; style_left = BS_MEDIUM if col_idx == 6 else BS_THIN; c7.border = STYLES.border(BS_THIN, BS_THIN, style_left, BS_THIN)
+            if curr.weekday() >= 5: c7.fill = FILL_WEEKEND
+            curr += timedelta(days=1)
+
+        end_headers = ["檔次", "定價", "專案價"]; 
+        for i, h in enumerate(end_headers):
+            c_idx = end_c_start + i; ws.merge_cells(start_row=header_start_row, start_column=c_idx, end_row=header_start_row+1, end_column=c_idx); c = ws.cell(header_start_row, c_idx); c.value = h; c.font = FONT_BOLD; c.alignment = ALIGN_CENTER
+            t, b, l, r = BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN; 
+            if c_idx == total_cols: r = BS_MEDIUM
+            c.border = STYLES.border(t, b, l, r); ws.cell(header_start_row+1, c_idx).border = STYLES.border(BS_THIN, BS_THIN, l, r)
+
+        date_start_col = 6
+        for c_idx in range(date_start_col, total_cols + 1):
+            c7 = ws.cell(header_start_row, c_idx); c7.border = STYLES.border(BS_MEDIUM, BS_THIN, BS_THIN, BS_THIN)
+            if c_idx == date_start_col: set_border(c7, left=BS_MEDIUM)
+            if c_idx == total_cols: set_border(c7, right=BS_MEDIUM)
+            c8 = ws.cell(8, c_idx); c8.border = STYLES.border(BS_THIN, BS_THIN, BS_THIN, BS_THIN)
+            if c_idx == date_start_col: set_border(c8, left=BS_MEDIUM)
+            if c_idx == total_cols: set_border(c8, right=BS_MEDIUM)
+
+    def render_bolin_optimized(ws, start_dt, end_dt, rows, budget, prod):
+        eff_days = (end_dt - start_dt).days + 1; end_c_start = 6 + eff_days; total_cols = end_c_start + 2
+        header_start_row = 6
+
+        sec_str = " ".join([f"{s}秒廣告" for s in shared.unique_secs])
+        ws['B2'] = client_name; ws['B3'] = f"鉑霖行動行銷 {sales_person}"; ws['B4'] = client_name; ws['F4'] = f"廣告規格：{sec_str}"; ws['B5'] = product_name
+
+        curr_row = header_start_row + 2
+        for m_key, data in shared.groups:
+            if not data: continue
+            start_merge = curr_row; d_name = f"全家便利商店\n{m_key}廣告" if m_key != "家樂福" else "家樂福"
+            for idx, r in enumerate(data):
+                ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 1, d_name).alignment = ALIGN_CENTER; ws.cell(curr_row, 2, r['region']).alignment = ALIGN_CENTER
+                p_num = int(r.get('program_num', 0)); suffix = "面" if m_key == "新鮮視" else "店"; ws.cell(curr_row, 3, f"{p_num:,}{suffix}").alignment = ALIGN_CENTER
+                ws.cell(curr_row, 4, r['daypart']).alignment = ALIGN_CENTER
+                sec = r['seconds']; sec_txt = f"{sec}秒\n影片/影像 1920x1080 (mp4)" if m_key == "新鮮視" else f"{sec}秒廣告"; c_spec = ws.cell(curr_row, 5, sec_txt); c_spec.alignment = ALIGN_CENTER; c_spec.font = STYLES.font(10)
+                row_sum = 0
+                for d_idx in range(eff_days):
+                    if d_idx < len(r['schedule']): val = r['schedule'][d_idx]; row_sum += val; c = ws.cell(curr_row, 6+d_idx); c.value = val; c.alignment = ALIGN_CENTER; c.font = FONT_STD; c.border = BORDER_ALL_THIN
+                ws.cell(curr_row, end_c_start, row_sum).alignment = ALIGN_CENTER
+                rate_val = r['rate_display']
+                ws.cell(curr_row, end_c_start+1, rate_val).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER 
+                pkg = r['pkg_display']; 
+                if r.get('is_pkg_member'): pkg = r['nat_pkg_display'] if idx == 0 else None
+                ws.cell(curr_row, end_c_start+2, pkg).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
+                for c_idx in range(1, total_cols + 1): c = ws.cell(curr_row, c_idx); c.font = FONT_STD; c.border = BORDER_ALL_THIN
+                set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
+            ws.merge_cells(start_row=start_merge, start_column=1, end_row=curr_row-1, end_column=1)
+            if data[0].get('is_pkg_member'): ws.merge_cells(start_row=start_merge, start_column=end_c_start+2, end_row=curr_row-1, end_column=end_c_start+2)
+            draw_outer_border_fast(ws, start_merge, curr_row-1, 1, total_cols)
+
+        ws.row_dimensions[curr_row].height = 40; ws.cell(curr_row, 3, shared.store_count).number_format = FMT_NUMBER; ws.cell(curr_row, 3).alignment = ALIGN_CENTER; ws.cell(curr_row, 3).font = FONT_BOLD
+        ws.cell(curr_row, 5, "Total").alignment = ALIGN_CENTER; ws.cell(curr_row, 5).font = FONT_BOLD
+        for d_idx, daily_sum in enumerate(shared.day_totals): c = ws.cell(curr_row, 6+d_idx); c.value = daily_sum; c.alignment = ALIGN_CENTER; c.font = FONT_BOLD
+        ws.cell(curr_row, end_c_start, shared.grand_total).alignment = ALIGN_CENTER; ws.cell(curr_row, end_c_start).font = FONT_BOLD
+        ws.cell(curr_row, end_c_start+1, shared.rate_sum).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+1).font = FONT_BOLD; ws.cell(curr_row, end_c_start+1).alignment = ALIGN_CENTER
+        ws.cell(curr_row, end_c_start+2, budget).number_format = FMT_MONEY; ws.cell(curr_row, end_c_start+2).font = FONT_BOLD; ws.cell(curr_row, end_c_start+2).alignment = ALIGN_CENTER
+        for c_idx in range(1, total_cols+1): ws.cell(curr_row, c_idx).border = BORDER_ALL_THIN
+        draw_outer_border_fast(ws, curr_row, curr_row, 1, total_cols)
+        for c_idx in range(1, total_cols+1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
+        set_border(ws.cell(curr_row, 5), right=BS_MEDIUM); curr_row += 1
+
+        vat = int(budget * 0.05); grand_total = budget + vat
+        footer_stack = [("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]
+        for lbl, val in footer_stack:
+            ws.row_dimensions[curr_row].height = 30; c_l = ws.cell(curr_row, end_c_start+1); c_l.value = lbl; c_l.alignment = ALIGN_RIGHT; c_l.font = FONT_STD
+            c_v = ws.cell(curr_row, end_c_start+2); c_v.value = val; c_v.number_format = FMT_MONEY; c_v.alignment = ALIGN_CENTER; c_v.font = FONT_BOLD 
+            t, b, l, r = BS_THIN, BS_THIN, BS_MEDIUM, BS_THIN; 
+            if lbl == "Grand Total": b = BS_MEDIUM 
+            c_l.border = STYLES.border(t, b, l, r)
+            t, b, l, r = BS_THIN, BS_THIN, BS_THIN, BS_MEDIUM; 
+            if lbl == "Grand Total": b = BS_MEDIUM 
+            c_v.border = STYLES.border(t, b, l, r)
+            if lbl == "Grand Total":
+                for c_idx in range(1, total_cols + 1): set_border(ws.cell(curr_row, c_idx), bottom=BS_MEDIUM)
+            curr_row += 1
+          
+        curr_row += 1; start_footer = curr_row; r_col_start = 6 
+        ws.row_dimensions[start_footer].height = 25; ws.cell(start_footer, r_col_start).value = "Remarks："
+        ws.cell(start_footer, r_col_start).font = STYLES.font(16, bold=True)
+        r_row = start_footer
+        for rm in remarks_list:
+            r_row += 1; ws.row_dimensions[r_row].height = 25; is_red = rm.strip().startswith("1.") or rm.strip().startswith("4."); is_blue = rm.strip().startswith("6."); color = "000000"
+            if is_red: color = "FF0000"
+            if is_blue: color = "0000FF"
+            c = ws.cell(r_row, r_col_start); c.value = rm; c.font = STYLES.font(16, color=color)
+
+        sig_col_start = 1
+        ws.cell(start_footer, sig_col_start).value = "乙        方："; ws.cell(start_footer, sig_col_start).font = STYLES.font(16)
+        ws.cell(start_footer+1, sig_col_start+1).value = client_name; ws.cell(start_footer+1, sig_col_start+1).font = STYLES.font(16)
+        ws.cell(start_footer+2, sig_col_start).value = "統一編號："; ws.cell(start_footer+2, sig_col_start).font = STYLES.font(16)
+        ws.cell(start_footer+2, sig_col_start+2).value = ""; ws.cell(start_footer+2, sig_col_start+2).font = STYLES.font(16)
+        ws.cell(start_footer+3, sig_col_start).value = "客戶簽章："; ws.cell(start_footer+3, sig_col_start).font = STYLES.font(16)
+
+        target_border_row = r_row + 2
+        for c_idx in range(1, total_cols + 1): ws.cell(target_border_row, c_idx).border = STYLES.border(bottom='double')
+        return target_border_row
+
+    # Main Execution of Excel Generation
+    # === 修改點：改用中文判斷 ===
+    if format_type == "東吳":
+        skeleton, render = skeleton_dongwu, render_dongwu_optimized
+    elif format_type == "聲活":
+        skeleton, render = skeleton_shenghuo, render_shenghuo_optimized
+    else:
+        skeleton, render = skeleton_bolin, render_bolin_optimized
+    # ==========================
+
+    # 表頭骨架 (欄寬、標題、公司資訊、日期列、Logo) 只與格式和走期有關：
+    # SheetModel 直接複製快取的骨架，只填入客戶 / 產品 / 明細 / 合計 / 備註；openpyxl 則每次重畫
+    with span("excel", backend=backend, format=format_type) as sp:
+        if backend == EXCEL_BACKEND_XLSXWRITER:
+            sp["skeleton"] = "hit"
+            def build_skeleton():
+                sp["skeleton"] = "miss"
+                model = SheetModel("Schedule")
+                skeleton(model, start_dt, end_dt)
+                return model
+            ws = get_skeleton_cache().get((format_type, str(start_dt), str(end_dt), excel_code_fingerprint()), build_skeleton)
+            render(ws, start_dt, end_dt, rows, final_budget_val, prod_cost)
+            return ws.to_xlsx(landscape=True, paper=SheetModel.PAPERSIZE_A4, fit_to_page=True)
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Schedule"
+        ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+        ws.page_setup.paperSize = ws.PAPERSIZE_A4
+        ws.page_setup.fitToPage = True
+        skeleton(ws, start_dt, end_dt)
+        render(ws, start_dt, end_dt, rows, final_budget_val, prod_cost)
+
+        out = io.BytesIO()
+        wb.save(out)
+        return out.getvalue()
+
+def generate_excel_all_formats(formats, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, backend=None, shared=None):
+    """同一方案一次產生多種格式的 Excel：分組、每日合計等彙總只算一次，回傳 {格式: xlsx 位元組}。"""
+    shared = shared or PlanSummary(rows, (end_dt - start_dt).days + 1)
+    with span("excel_multi", formats=len(formats)):
+        return {fmt: generate_excel_from_scratch(fmt, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, backend, shared)
+                for fmt in formats}
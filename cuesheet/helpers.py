@@ -0,0 +1,75 @@
+"""
+基礎工具函式：字串 / 數字處理、秒數係數、每日檔次分配與備註文字。
+"""
+import re
+
+from .settings import REGION_DISPLAY_MAP
+
+def parse_count_to_int(x):
+    if x is None: return 0
+    if isinstance(x, (int, float)): return int(x)
+    s = str(x)
+    m = re.findall(r"[\d,]+", s)
+    return int(m[0].replace(",", "")) if m else 0
+
+def safe_filename(name: str) -> str:
+    return re.sub(r'[\\/*?:"<>|]', "_", name).strip()
+
+def html_escape(s):
+    if s is None: return ""
+    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;").replace("'", "&#39;")
+
+def region_display(region):
+    return REGION_DISPLAY_MAP.get(region, region)
+
+def get_sec_factor(media_type, seconds, sec_factors):
+    """取得秒數加成係數 (Factor)。"""
+    factors = sec_factors.get(media_type)
+    if not factors:
+        if media_type == "新鮮視": factors = sec_factors.get("全家新鮮視")
+        elif media_type == "全家廣播": factors = sec_factors.get("全家廣播")
+    if not factors: return 1.0
+    if seconds in factors: return factors[seconds]
+    for base in [10, 20, 15, 30]:
+        if base in factors: return (seconds / base) * factors[base]
+    return 1.0
+
+def calculate_schedule(total_spots, days):
+    if days <= 0: return []
+    if total_spots % 2 != 0: total_spots += 1
+    base, rem = divmod(total_spots // 2, days)
+    sch = [base + (1 if i < rem else 0) for i in range(days)]
+    return [x * 2 for x in sch]
+
+def get_remarks_text(sign_deadline, billing_month, payment_date):
+    d_str = sign_deadline.strftime("%Y/%m/%d (%a)") if sign_deadline else "____/__/__ (__)"
+    p_str = payment_date.strftime("%Y/%m/%d") if payment_date else "____/__/__"
+    return [
+        f"1.請於 {d_str} 11:30前 回簽及進單，方可順利上檔。",
+        "2.以上節目名稱如有異動，以上檔時節目名稱為主，如遇電台時段滿檔，上檔時間挪後或更換至同級時段。",
+        "3.通路店鋪數與開機率開機率至少七成(以上)。每日因加盟數調整，或遇店舖年度季度改裝、設備維護升級及保修等狀況，會有一定幅度增減。",
+        "4.託播方需於上檔前 5 個工作天，提供廣告帶(mp3)、影片/影像 1920x1080 (mp4)。",
+        f"5.雙方同意費用請款月份 : {billing_month}，如有修正必要，將另行E-Mail告知，並視為正式合約之一部分。",
+        f"6.付款兌現日期：{p_str}"
+    ]
+
+def format_campaign_details(config):
+    details = []
+    for media, settings in config.items():
+        sec_str = ", ".join([f"{s}秒({p}%)" for s, p in settings.get("sec_shares", {}).items()])
+        reg_str = "全省聯播" if settings.get("is_national") else "/".join(settings.get("regions", []))
+        info = f"【{media}】 預算佔比: {settings.get('share')}% | 秒數分配: {sec_str} | 區域: {reg_str}"
+        details.append(info)
+    return "\n".join(details)
+
+def parse_campaign_details(text):
+    """format_campaign_details 的反向解析 (Ragic 紀錄只保存這段摘要)，回傳 config 結構 (未驗證，交給 batch.normalize_media_config)。"""
+    config = {}
+    for line in str(text or "").splitlines():
+        m = re.match(r"\s*【(.+?)】\s*預算佔比:\s*([\d.]+)%\s*\|\s*秒數分配:\s*(.*?)\s*\|\s*區域:\s*(.*?)\s*$", line)
+        if not m: continue
+        media, share, sec_str, reg_str = m.groups()
+        sec_shares = {int(s): int(p) for s, p in re.findall(r"(\d+)秒\((\d+)%\)", sec_str)}
+        national = reg_str in ("全省聯播", "全省", "")
+        config[media] = {"is_national": national, "regions": ["全省"] if national else reg_str.split("/"), "sec_shares": sec_shares, "share": int(float(share))}
+    return config
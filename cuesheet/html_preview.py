@@ -0,0 +1,181 @@
+"""
+HTML 預覽生成引擎 (頁面上即時顯示的 Cue 表)。
+
+輸出以 list 緩衝組合後一次 join (避免逐格字串相加)，每日 / 區段合計取自 PlanMatrix；每一列 (含每日檔次欄) 的 HTML 片段依列內容快取，
+方案調整後重新產生時只重組內容有變的列，其餘沿用上一次的片段，長走期時仍能即時更新。
+走期很長時可改用週 / 月彙總欄 (granularity)，並可指定展開其中一段為逐日欄位 (expand)，預覽大小不隨走期增加。
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+from itertools import groupby
+
+from .helpers import html_escape
+from .metrics import traced
+from .pricing import PlanMatrix
+
+HTML_ROW_CACHE_SIZE = 2048      # 每個 builder 保留的列片段數
+MEDIA_ORDER = {"全家廣播": 1, "新鮮視": 2, "家樂福": 3}
+WEEKDAYS = ["一", "二", "三", "四", "五", "六", "日"]
+PREVIEW_GRANULARITIES = {"day": "日", "week": "週", "month": "月"}
+PREVIEW_AUTO_WEEK_DAYS = 62     # 走期超過此天數時，頁面預設以週彙總顯示
+PREVIEW_AUTO_MONTH_DAYS = 180   # 走期超過此天數時，頁面預設以月彙總顯示
+
+PREVIEW_CSS = """
+    body { font-family: sans-serif; font-size: 10px; background-color: #ffffff; color: #000000; padding: 5px; }
+    table { border-collapse: collapse; width: 100%; background-color: #ffffff; }
+    th, td { border: 0.5pt solid #000; padding: 4px; text-align: center; white-space: nowrap; color: #000000; }
+    .bg-dw-head { background-color: #4472C4; color: white; }
+    .bg-sh-head { background-color: white; color: black; font-weight: bold; border-bottom: 2px solid black; }
+    .bg-bolin-head { background-color: #F8CBAD; color: black; }
+    .bg-weekend { background-color: #FFFFCC; }
+    """
+PREVIEW_PERIOD_CSS = ".bg-period { background-color: #EDEDED; } .col_period { min-width: 56px; }"
+
+# 各格式的表頭欄位 (未列出的格式沿用東吳)
+PREVIEW_COLUMNS = {
+    "東吳": ["Station", "Location", "Program", "Day-part", "Size", "rate<br>(Net)", "Package-cost<br>(Net)"],
+    "聲活": ["頻道", "播出地區", "播出店數", "播出時間", "秒數/規格", "單價", "金額"],
+    "鉑霖": ["頻道", "播出地區", "播出店數", "播出時間", "規格", "單價", "金額"],
+}
+PREVIEW_HEADER_CLS = {"東吳": "bg-dw-head", "鉑霖": "bg-bolin-head"}
+
+def _money_or_text(v):
+    return f"${v:,}" if isinstance(v, (int, float)) else v
+
+@lru_cache(maxsize=64)
+def _date_headers(start_dt, eff_days, header_cls):
+    """日期列與星期列的 <th> (只與走期和格式有關)。"""
+    th1, th2 = [], []
+    curr = start_dt
+    for _ in range(eff_days):
+        wd = curr.weekday()
+        bg = "bg-weekend" if wd >= 5 else ""
+        th1.append(f"<th class='{header_cls} col_day'>{curr.day}</th>")
+        th2.append(f"<th class='{bg} col_day'>{WEEKDAYS[wd]}</th>")
+        curr += timedelta(days=1)
+    return "".join(th1), "".join(th2)
+
+def default_granularity(days_cnt):
+    if days_cnt > PREVIEW_AUTO_MONTH_DAYS: return "month"
+    return "week" if days_cnt > PREVIEW_AUTO_WEEK_DAYS else "day"
+
+def preview_periods(start_dt, days_cnt, granularity):
+    """把走期切成彙總區段 [(開始 index, 結束 index, 標籤), ...]；週以週一起算，月以日曆月切分，頭尾可能不滿一段。"""
+    periods, lo = [], 0
+    while lo < days_cnt:
+        d = start_dt + timedelta(days=lo)
+        if granularity == "week": hi = min(days_cnt, lo + 7 - d.weekday())
+        elif granularity == "month": hi = min(days_cnt, lo + ((d.replace(day=28) + timedelta(days=4)).replace(day=1) - d).days)
+        else: hi = lo + 1
+        end = start_dt + timedelta(days=hi - 1)
+        label = f"{d.year}/{d.month:02d}" if granularity == "month" else f"{d.month}/{d.day}" + (f"-{end.month}/{end.day}" if hi - lo > 1 else "")
+        periods.append((lo, hi, label))
+        lo = hi
+    return periods
+
+@lru_cache(maxsize=64)
+def _period_layout(start_dt, eff_days, header_cls, granularity, expand):
+    """彙總模式的欄位配置：(各欄涵蓋的 (開始, 結束) index, 第一列 <th>, 第二列 <th>)；expand 指定的區段展開為逐日欄位。"""
+    spans, th1, th2 = [], [], []
+    for i, (lo, hi, label) in enumerate(preview_periods(start_dt, eff_days, granularity)):
+        if i == expand:
+            for d_idx in range(lo, hi):
+                curr = start_dt + timedelta(days=d_idx)
+                wd = curr.weekday()
+                spans.append((d_idx, d_idx + 1))
+                th1.append(f"<th class='{header_cls} col_day'>{curr.day}</th>")
+                th2.append(f"<th class='{'bg-weekend' if wd >= 5 else ''} col_day'>{WEEKDAYS[wd]}</th>")
+        else:
+            spans.append((lo, hi))
+            th1.append(f"<th class='{header_cls} col_period'>{label}</th>")
+            th2.append(f"<th class='bg-period col_period'>{hi - lo}天</th>")
+    return tuple(spans), "".join(th1), "".join(th2)
+
+class HtmlPreviewBuilder:
+    """
+    逐列快取的 HTML 預覽產生器。
+    列片段的 key 為該列輸出所需的全部內容 (格式、欄位值、合併儲存格、每日檔次)，
+    因此只有內容真的改變的列會重新組字串；last_stats 記錄上一次重用 / 重組的列數。
+    """
+    def __init__(self, max_rows=HTML_ROW_CACHE_SIZE):
+        self.max_rows = max_rows
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.last_stats = {"rows": 0, "reused": 0, "rebuilt": 0}
+
+    def _row_html(self, key):
+        with self._lock:
+            frag = self._rows.get(key)
+            if frag is not None:
+                self._rows.move_to_end(key)
+                return frag, True
+        format_type, media, region, program_num, daypart, seconds, rate, pkg_cell, schedule = key   # schedule 為每欄 (日或彙總區段) 的檔次
+        sec_txt = f"{seconds}秒" if format_type in ("聲活", "鉑霖") else f"{seconds}"
+        parts = [f"<tr><td>{media}</td><td>{region}</td><td>{program_num}</td><td>{daypart}</td><td>{sec_txt}</td><td>{rate}</td>{pkg_cell}"]
+        parts += [f"<td>{d}</td>" for d in schedule]
+        parts.append(f"<td style='font-weight:bold; background-color:#f0f0f0;'>{sum(schedule)}</td></tr>")
+        frag = "".join(parts)
+        with self._lock:
+            self._rows[key] = frag
+            while len(self._rows) > self.max_rows: self._rows.popitem(last=False)
+        return frag, False
+
+    @traced("html_preview")
+    def build(self, rows, days_cnt, start_dt, end_dt, c_name, p_display, format_type, remarks, total_list, grand_total, budget, prod, granularity="day", expand=None):
+        """granularity: "day" (逐日) / "week" / "month"；expand 為 preview_periods 的區段 index，該段以逐日欄位顯示。"""
+        eff_days = days_cnt
+        header_cls = PREVIEW_HEADER_CLS.get(format_type, "bg-sh-head")
+        spans = None
+        if granularity == "day": date_th1, date_th2 = _date_headers(start_dt, eff_days, header_cls)
+        else: spans, date_th1, date_th2 = _period_layout(start_dt, eff_days, header_cls, granularity, expand)
+        cols_def = PREVIEW_COLUMNS.get(format_type, PREVIEW_COLUMNS["東吳"])
+        th_fixed = "".join([f"<th rowspan='2' class='{header_cls}'>{c}</th>" for c in cols_def])
+        th_total_right = f"<th rowspan='2' class='{header_cls}' style='min-width:50px;'>Total<br>Spots</th>"
+
+        unique_media = sorted(list(set([r['media'] for r in rows])))
+        unique_media.sort(key=lambda x: MEDIA_ORDER.get(x, 99))
+        medium_str = "/".join(unique_media)
+
+        tbody, reused = [], 0
+        rows_sorted = sorted(rows, key=lambda x: (MEDIA_ORDER.get(x["media"], 9), x["seconds"]))
+        plan = PlanMatrix(rows_sorted, eff_days)
+        if spans is None: unique_cols, col_totals = plan.schedules.tolist(), plan.day_totals.tolist()
+        else: unique_cols, col_totals = (a.tolist() for a in plan.period_sums(spans))
+        unique_cols = [tuple(c) for c in unique_cols]   # 每個唯一排程在各欄 (日或彙總區段) 的檔次，共用的列直接取同一個 tuple
+        row_cols = iter([unique_cols[k] for k in plan.row_index.tolist()])
+        for _, group in groupby(rows_sorted, lambda x: (x['media'], x['seconds'], x.get('nat_pkg_display', 0))):
+            g_list = list(group)
+            g_size = len(g_list)
+            is_pkg = g_list[0]['is_pkg_member']
+            for i, r in enumerate(g_list):
+                if is_pkg: pkg_cell = f"<td class='right' rowspan='{g_size}'>${r['nat_pkg_display']:,}</td>" if i == 0 else ""
+                else: pkg_cell = f"<td class='right'>{_money_or_text(r['pkg_display'])}</td>"
+                frag, hit = self._row_html((format_type, r['media'], r['region'], r.get('program_num', ''), r['daypart'], r['seconds'],
+                                            _money_or_text(r['rate_display']), pkg_cell, next(row_cols)))
+                tbody.append(frag); reused += hit
+
+        cell = "font-weight:bold; background-color:#e0e0e0;"
+        tbody.append(f"<tr><td colspan='5' style='text-align:center; {cell}'>Total</td>")
+        tbody.append(f"<td style='text-align:center; {cell}'>${total_list:,}</td><td style='text-align:center; {cell}'>${budget:,}</td>")
+        tbody += [f"<td style='{cell}'>{day_sum}</td>" for day_sum in col_totals]
+        tbody.append(f"<td style='font-weight:bold; background-color:#d0d0d0; border: 2px solid #000;'>{plan.grand_total}</td></tr>")
+        self.last_stats = {"rows": len(rows_sorted), "reused": reused, "rebuilt": len(rows_sorted) - reused}
+
+        remarks_html = "<br>".join([html_escape(x) for x in remarks])
+        vat = int(round(budget * 0.05))
+        footer_html = f"<div style='margin-top:10px; font-weight:bold; text-align:right;'>製作費: ${prod:,}<br>5% VAT: ${vat:,}<br>Grand Total: ${grand_total:,}</div>"
+        return "".join([
+            f"<html><head><style>{PREVIEW_CSS}{PREVIEW_PERIOD_CSS if spans is not None else ''}</style></head><body><div style='margin-bottom:10px;'><b>客戶名稱：</b>{html_escape(c_name)} &nbsp; ",
+            f"<b>Product：</b>{html_escape(p_display)}<br><b>Period：</b>{start_dt.strftime('%Y.%m.%d')} - {end_dt.strftime('%Y.%m.%d')} &nbsp; ",
+            f"<b>Medium：</b>{html_escape(medium_str)}</div><div style='overflow-x:auto;'><table><thead><tr>{th_fixed}{date_th1}{th_total_right}</tr>",
+            f"<tr>{date_th2}</tr></thead><tbody>", "".join(tbody), f"</tbody></table></div>{footer_html}",
+            f"<div style='margin-top:10px; font-size:11px;'><b>Remarks：</b><br>{remarks_html}</div></body></html>",
+        ])
+
+_SHARED_BUILDER = HtmlPreviewBuilder()
+
+def generate_html_preview(rows, days_cnt, start_dt, end_dt, c_name, p_display, format_type, remarks, total_list, grand_total, budget, prod, granularity="day", expand=None):
+    """產生完整的 HTML 預覽 (使用程序內共用的列片段快取)；參數說明見 HtmlPreviewBuilder.build。"""
+    return _SHARED_BUILDER.build(rows, days_cnt, start_dt, end_dt, c_name, p_display, format_type, remarks, total_list, grand_total, budget, prod, granularity, expand)
@@ -0,0 +1,116 @@
+"""
+HTTP 連線層：所有對外請求 (Ragic / Google 試算表 / Logo) 共用的連線池、逾時與重試政策。
+"""
+import atexit
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+import urllib3
+
+from .cache import singleton
+from .settings import CONFIG_FETCH_TIMEOUT
+
+# 各外部服務的連線政策：timeout 為 (連線, 讀取) 秒數；retries 為額外重試次數
+HTTP_ENDPOINTS = {
+    "ragic":  {"timeout": (10, 120), "retries": 2},
+    "gsheet": {"timeout": (5, CONFIG_FETCH_TIMEOUT), "retries": 2},
+    "logo":   {"timeout": (5, 10), "retries": 1},
+}
+HTTP_RETRY_STATUS = {429, 500, 502, 503, 504}
+HTTP_SAFE_RETRY_STATUS = {429, 503}     # POST 只在伺服器明確表示未處理時重試
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 8
+HTTP_POOL_SIZE = 16
+HTTP_LATENCY_WINDOW = 200               # 每個端點保留最近幾次的延遲供統計
+
+def is_connect_error(exc):
+    """
+    連線階段就失敗的例外 (連線逾時、拒絕連線、DNS 失敗)：請求內容一定還沒送出，POST 重送也不會重複寫入。
+    重用 keep-alive 連線時對方中途斷線 (RemoteDisconnected / Connection aborted) 不算，內容可能已經送達。
+    """
+    if isinstance(exc, requests.exceptions.ConnectTimeout): return True
+    if not isinstance(exc, requests.exceptions.ConnectionError): return False
+    reason = exc.args[0] if exc.args else None
+    if isinstance(reason, urllib3.exceptions.MaxRetryError): reason = reason.reason
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+class HttpClient:
+    """
+    全程式共用的 HTTP 連線層。
+    - 單一 requests.Session + 連線池，同一主機的請求重用 TCP / TLS 連線 (keep-alive)
+    - 依端點設定 timeout 與重試次數，重試間隔為指數退避 + full jitter
+    - GET 遇到連線錯誤、逾時與暫時性狀態碼會重試；POST 只在確定伺服器未收到 (連線階段失敗，見 is_connect_error) 或回 429 / 503 時重試
+    - 記錄每個端點的呼叫次數、錯誤、重試與延遲 (p50 / p95)
+    """
+    def __init__(self, endpoints=HTTP_ENDPOINTS, pool_size=HTTP_POOL_SIZE):
+        self.endpoints = endpoints
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _record(self, endpoint, elapsed, ok, retries):
+        with self.lock:
+            m = self.metrics.setdefault(endpoint, {"calls": 0, "errors": 0, "retries": 0, "latency": deque(maxlen=HTTP_LATENCY_WINDOW)})
+            m["calls"] += 1
+            m["errors"] += 0 if ok else 1
+            m["retries"] += retries
+            m["latency"].append(elapsed)
+
+    def _should_retry(self, method, resp=None, exc=None):
+        idempotent = method.upper() in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+        if exc is not None:
+            if idempotent: return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+            return is_connect_error(exc)
+        return resp.status_code in (HTTP_RETRY_STATUS if idempotent else HTTP_SAFE_RETRY_STATUS)
+
+    def request(self, endpoint, method, url, **kwargs):
+        """送出請求；重試用盡後回傳最後一次的回應，或丟出最後一次的例外。"""
+        policy = self.endpoints[endpoint]
+        kwargs.setdefault("timeout", policy["timeout"])
+        t0 = time.perf_counter()
+        for attempt in range(policy["retries"] + 1):
+            last = attempt == policy["retries"]
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if last or not self._should_retry(method, exc=e):
+                    self._record(endpoint, time.perf_counter() - t0, False, attempt)
+                    raise
+            else:
+                if last or not self._should_retry(method, resp=resp):
+                    self._record(endpoint, time.perf_counter() - t0, resp.status_code < 400, attempt)
+                    return resp
+                resp.close()
+            time.sleep(random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt)))
+
+    def get(self, endpoint, url, **kwargs):
+        return self.request(endpoint, "GET", url, **kwargs)
+
+    def post(self, endpoint, url, **kwargs):
+        return self.request(endpoint, "POST", url, **kwargs)
+
+    def stats(self):
+        """各端點統計：呼叫數 / 錯誤 / 重試 / 延遲 p50 與 p95 (毫秒)。"""
+        with self.lock:
+            out = {}
+            for endpoint, m in self.metrics.items():
+                import numpy as np
+                lat = np.array(m["latency"]) * 1000 if m["latency"] else np.zeros(1)
+                out[endpoint] = {"calls": m["calls"], "errors": m["errors"], "retries": m["retries"],
+                                 "p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95))}
+            return out
+
+    def close(self):
+        self.session.close()
+
+@singleton
+def get_http_client():
+    client = HttpClient()
+    atexit.register(client.close)
+    return client
@@ -0,0 +1,184 @@
+"""
+檔次庫存：依 (媒體, 區域, 日期, 秒數) 記錄已預約的檔次，與設定檔 Capacity 分頁的每日容量比對，避免不同業務超賣同一時段。
+- 本機 SQLite (WAL) 檔案，多個頁面 session / 程序共用
+- load 表為 (媒體, 區域, 日, 秒數) 的已預約合計，預約 / 取消時增量更新；檢查一個方案只讀走期內的日合計，O(天數)
+- reserve 在 BEGIN IMMEDIATE 交易內「檢查 → 扣掉同一預約的舊版本 → 寫入」，兩個 session 不會同時通過檢查
+- reservations 表保存每筆預約的每日檔次，取消時據此扣回
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from .cache import singleton
+from .metrics import span
+from .pricing import PlanMatrix
+from .settings import INVENTORY_DB_PATH, INVENTORY_LOCK_TIMEOUT
+
+ALL_SECONDS = 0   # Capacity 的秒數 0：各秒數合計的上限
+
+def capacity_limits(capacity, media, region):
+    """該媒體 / 區域適用的每日容量 {秒數: 上限}；「全省」列為各區預設，該區自己的設定優先。"""
+    limits = {sec: v for (m, r, sec), v in capacity.items() if m == media and r == "全省"}
+    limits.update({sec: v for (m, r, sec), v in capacity.items() if m == media and r == region})
+    return limits
+
+def plan_demand(rows):
+    """方案的每日檔次需求 {(媒體, 區域, 秒數): np.int64[天數]} 與天數。"""
+    days = max([len(r["schedule"]) for r in rows], default=0)
+    demand = {}
+    for r, vec in zip(rows, PlanMatrix(rows, days).matrix):
+        key = (r["media"], r["region"], r["seconds"])
+        demand[key] = demand[key] + vec if key in demand else vec.copy()
+    return demand, days
+
+def format_conflicts(conflicts, limit=3):
+    """超賣明細的簡短文字 (前 limit 筆)。"""
+    parts = [f"{c['media']} {c['region']} {'各秒數合計' if c['seconds'] == ALL_SECONDS else str(c['seconds']) + '秒'} "
+             f"{c['date']:%m/%d} 超出 {c['over']:,} 檔 (容量 {c['capacity']:,})" for c in conflicts[:limit]]
+    return "；".join(parts) + (f" 等 {len(conflicts)} 筆" if len(conflicts) > limit else "")
+
+class InventoryLedger:
+    """
+    檔次預約帳本。check 只讀取不寫入 (預覽時提示用)；reserve / release 為交易，與其他程序互斥。
+    同一預約 id 再次 reserve 時視為改版：先扣掉舊的檔次再檢查與寫入。
+    """
+    def __init__(self, db_path=INVENTORY_DB_PATH):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=INVENTORY_LOCK_TIMEOUT)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS reservations (
+                id TEXT NOT NULL, media TEXT NOT NULL, region TEXT NOT NULL, seconds INTEGER NOT NULL,
+                start_day INTEGER NOT NULL, spots TEXT NOT NULL, total INTEGER NOT NULL, label TEXT, created_at REAL NOT NULL)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_reservations_id ON reservations (id)")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS load (
+                media TEXT NOT NULL, region TEXT NOT NULL, day INTEGER NOT NULL, seconds INTEGER NOT NULL, spots INTEGER NOT NULL,
+                PRIMARY KEY (media, region, day, seconds)) WITHOUT ROWID""")
+
+    # --- 內部 (呼叫端需持有 self.lock) ---
+    def _booked(self, media, region, start_day, days):
+        """走期內各秒數的已預約合計 {秒數: np.int64[天數]}。"""
+        booked = {}
+        for row in self.db.execute("SELECT seconds, day, spots FROM load WHERE media=? AND region=? AND day BETWEEN ? AND ?",
+                                   (media, region, start_day, start_day + days - 1)):
+            vec = booked.get(row["seconds"])
+            if vec is None: vec = booked[row["seconds"]] = np.zeros(days, dtype=np.int64)
+            vec[row["day"] - start_day] = row["spots"]
+        return booked
+
+    def _reservation(self, res_id):
+        return [(row["media"], row["region"], row["seconds"], row["start_day"], json.loads(row["spots"]))
+                for row in self.db.execute("SELECT media, region, seconds, start_day, spots FROM reservations WHERE id=?", (res_id,))]
+
+    def _conflicts(self, demand, start_day, days, capacity, exclude=None):
+        own = self._reservation(exclude) if exclude else []
+        by_region = {}
+        for (media, region, sec), vec in demand.items(): by_region.setdefault((media, region), {})[sec] = vec
+        conflicts = []
+        for (media, region), secs in by_region.items():
+            limits = capacity_limits(capacity, media, region)
+            if not limits: continue
+            booked = self._booked(media, region, start_day, days)
+            for m, r, sec, s_day, spots in own:   # 同一預約的舊版本不算在已預約內
+                if (m, r) != (media, region) or sec not in booked: continue
+                lo, hi = max(s_day, start_day), min(s_day + len(spots), start_day + days)
+                if lo < hi: booked[sec][lo - start_day:hi - start_day] -= np.asarray(spots[lo - s_day:hi - s_day], dtype=np.int64)
+            zeros = np.zeros(days, dtype=np.int64)
+            for sec, cap in sorted(limits.items()):
+                if sec == ALL_SECONDS: req, have = sum(secs.values()), sum(booked.values(), zeros)
+                elif sec in secs: req, have = secs[sec], booked.get(sec, zeros)
+                else: continue
+                total = have + req
+                for d in np.nonzero((total > cap) & (req > 0))[0].tolist():
+                    conflicts.append({"media": media, "region": region, "seconds": sec, "date": date.fromordinal(start_day + d),
+                                      "capacity": cap, "booked": int(have[d]), "requested": int(req[d]), "over": int(total[d] - cap)})
+        return sorted(conflicts, key=lambda c: (c["date"], c["media"], c["region"], c["seconds"]))
+
+    def _add_load(self, media, region, seconds, start_day, spots, sign):
+        self.db.executemany("INSERT INTO load (media, region, day, seconds, spots) VALUES (?, ?, ?, ?, ?) "
+                            "ON CONFLICT (media, region, day, seconds) DO UPDATE SET spots = spots + excluded.spots",
+                            [(media, region, start_day + d, seconds, sign * int(v)) for d, v in enumerate(spots) if v])
+        if sign < 0:
+            self.db.execute("DELETE FROM load WHERE media=? AND region=? AND day BETWEEN ? AND ? AND spots <= 0", (media, region, start_day, start_day + len(spots) - 1))
+
+    def _release(self, res_id):
+        for media, region, sec, s_day, spots in self._reservation(res_id): self._add_load(media, region, sec, s_day, spots, -1)
+        self.db.execute("DELETE FROM reservations WHERE id=?", (res_id,))
+
+    # --- 對外介面 ---
+    def check(self, rows, start_date, capacity, exclude=None):
+        """方案與已預約檔次合計後超過每日容量的明細 (不寫入)；exclude 為同一方案既有的預約 id。"""
+        demand, days = plan_demand(rows)
+        if not capacity or not days: return []
+        with span("inventory_check"), self.lock:
+            return self._conflicts(demand, start_date.toordinal(), days, capacity, exclude)
+
+    def reserve(self, res_id, rows, start_date, capacity, label="", force=False):
+        """
+        在同一交易內檢查並寫入預約，回傳 (是否成功, 超賣明細)。
+        有超賣且 force=False 時不寫入任何資料；同一 res_id 已存在時以新的排程取代。
+        """
+        demand, days = plan_demand(rows)
+        start_day = start_date.toordinal()
+        with span("inventory_reserve"), self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                conflicts = self._conflicts(demand, start_day, days, capacity, res_id) if capacity and days else []
+                if conflicts and not force:
+                    self.db.execute("ROLLBACK")
+                    return False, conflicts
+                self._release(res_id)
+                now = time.time()
+                for (media, region, sec), vec in demand.items():
+                    spots = vec.tolist()
+                    self.db.execute("INSERT INTO reservations (id, media, region, seconds, start_day, spots, total, label, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (res_id, media, region, sec, start_day, json.dumps(spots), sum(spots), label, now))
+                    self._add_load(media, region, sec, start_day, spots, 1)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return True, conflicts
+
+    def release(self, res_id):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._release(res_id)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def reservations(self):
+        """各預約的摘要 (新到舊)。"""
+        with self.lock:
+            rows = self.db.execute("""SELECT id, MAX(label) AS label, MIN(created_at) AS created_at, MIN(start_day) AS start_day,
+                MAX(start_day + json_array_length(spots)) - 1 AS end_day, GROUP_CONCAT(DISTINCT media) AS media, SUM(total) AS total
+                FROM reservations GROUP BY id ORDER BY created_at DESC""").fetchall()
+        return [dict(r, start=date.fromordinal(r["start_day"]), end=date.fromordinal(r["end_day"])) for r in rows]
+
+    def usage(self, start_date, end_date):
+        """區間內各 (媒體, 區域, 秒數) 的已預約每日檔次 {key: np.int64[天數]}。"""
+        start_day, days = start_date.toordinal(), (end_date - start_date).days + 1
+        out = {}
+        with self.lock:
+            for row in self.db.execute("SELECT media, region, seconds, day, spots FROM load WHERE day BETWEEN ? AND ?", (start_day, start_day + days - 1)):
+                key = (row["media"], row["region"], row["seconds"])
+                if key not in out: out[key] = np.zeros(days, dtype=np.int64)
+                out[key][row["day"] - start_day] = row["spots"]
+        return out
+
+    def close(self):
+        with self.lock: self.db.close()
+
+@singleton
+def get_inventory_ledger():
+    return InventoryLedger(INVENTORY_DB_PATH)
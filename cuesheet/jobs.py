@@ -0,0 +1,274 @@
+"""
+背景工作佇列：以 SQLite 記錄狀態，PDF 產生 (單一格式 / 三種格式一次產生)、Ragic 上傳 (含檔次預約) 與批次產生都在這裡的執行緒中執行。
+工作內容以 JSON 保存 (date 另加標記還原)，不含 API Key 等機密。
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+from .cache import cached_excel, cached_formats, cached_pdf, get_artifact_cache, singleton
+from .config import load_config_from_cloud
+from .metrics import span
+from .ragic import post_to_ragic, ragic_api_key
+from .settings import GSHEET_SHARE_URL, JOB_BACKOFF_BASE, JOB_BACKOFF_MAX, JOB_DB_PATH, JOB_KEEP_DAYS, JOB_LEASE_TTL, JOB_MAX_ATTEMPTS, JOB_WORKERS
+
+logger = logging.getLogger("cuesheet.jobs")
+
+class JobFailed(Exception):
+    """不可重試的失敗 (例如 Ragic 已回應錯誤)，工作會直接標記為失敗。"""
+
+def _payload_default(obj):
+    if isinstance(obj, datetime): return {"__datetime__": obj.isoformat()}
+    if isinstance(obj, date): return {"__date__": obj.isoformat()}
+    raise TypeError(f"工作內容無法以 JSON 保存: {type(obj).__name__}")
+
+def _payload_hook(obj):
+    if len(obj) == 1:
+        if "__date__" in obj: return date.fromisoformat(obj["__date__"])
+        if "__datetime__" in obj: return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+def dump_payload(payload):
+    """工作內容轉為 JSON (tuple 會變成 list)；無法序列化的型別在 submit 時即丟出 TypeError。"""
+    return json.dumps(payload, ensure_ascii=False, default=_payload_default)
+
+def load_payload(blob):
+    return json.loads(blob, object_hook=_payload_hook)
+
+def _loop_backoff(failures):
+    return min(JOB_BACKOFF_BASE * 2 ** (failures - 1), JOB_BACKOFF_MAX)
+
+class JobQueue:
+    """
+    以 SQLite 記錄狀態的背景工作佇列，由固定數量的執行緒處理。
+    - submit 立即回傳 job id，頁面以輪詢方式顯示進度，腳本執行緒不會被轉檔或上傳卡住
+    - 相同 (kind, dedupe_key) 的工作進行中時直接回傳既有 id，避免重複送出
+    - 失敗時以指數退避重試 (handler 丟出 JobFailed 則不重試)；重試用盡時呼叫該類型的 on_final_failure (清理預約等)
+    - 資料庫由多個程序共用 (多個頁面副本、REST 服務、命令列)：執行中的工作記錄持有者 (owner) 與租約到期時間，
+      持有的程序定期續約；只有租約過期 (程序已停止) 的工作才會重新排入佇列，其他程序執行中的工作不受影響
+    - 取出工作以「WHERE status='queued'」的條件式 UPDATE 搶占，兩個程序不會同時執行同一個工作
+    - 背景執行緒遇到例外 (例如資料庫暫時被鎖定) 時記錄錯誤並退避，執行緒不會因此停止
+    """
+    def __init__(self, db_path, handlers, workers=JOB_WORKERS, on_final_failure=None):
+        self.handlers = handlers
+        self.on_final_failure = on_final_failure or {}   # kind -> fn(payload, 最後一次的例外)
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.stop_event = threading.Event()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, dedupe_key TEXT, status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,
+                next_run_at REAL NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL,
+                progress REAL NOT NULL DEFAULT 0, message TEXT, payload BLOB, owner TEXT, lease_until REAL)""")
+            columns = [r["name"] for r in self.db.execute("PRAGMA table_info(jobs)")]
+            for col, decl in (("owner", "TEXT"), ("lease_until", "REAL")):   # 舊版資料庫補上欄位
+                if col not in columns: self.db.execute(f"ALTER TABLE jobs ADD COLUMN {col} {decl}")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (kind, dedupe_key, created_at)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, next_run_at)")
+            self._requeue_expired()
+            self.db.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?", (time.time() - JOB_KEEP_DAYS * 86400,))
+        self.threads = [threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True) for i in range(workers)]
+        self.threads.append(threading.Thread(target=self._lease_loop, name="job-lease", daemon=True))
+        for t in self.threads: t.start()
+
+    def _row(self, row):
+        if row is None: return None
+        job = dict(row)
+        job.pop("payload", None)
+        return job
+
+    def submit(self, kind, payload, dedupe_key=None, reuse_succeeded=False, max_attempts=JOB_MAX_ATTEMPTS):
+        """排入工作，回傳 (job_id, 是否為新工作)。"""
+        if kind not in self.handlers: raise ValueError(f"未知的工作類型: {kind}")
+        reuse = ("queued", "running", "succeeded") if reuse_succeeded else ("queued", "running")
+        with self.cond:
+            if dedupe_key:
+                row = self.db.execute(f"SELECT id FROM jobs WHERE kind=? AND dedupe_key=? AND status IN ({','.join('?' * len(reuse))}) ORDER BY created_at DESC LIMIT 1",
+                                      (kind, dedupe_key) + reuse).fetchone()
+                if row: return row["id"], False
+            job_id = hashlib.sha1(f"{kind}:{dedupe_key}:{time.time_ns()}:{threading.get_ident()}".encode()).hexdigest()[:16]
+            now = time.time()
+            self.db.execute("INSERT INTO jobs (id, kind, dedupe_key, status, max_attempts, next_run_at, created_at, updated_at, message, payload) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, '排隊中', ?)",
+                            (job_id, kind, dedupe_key, max_attempts, now, now, now, dump_payload(payload)))
+            self.cond.notify()
+        return job_id, True
+
+    def get(self, job_id):
+        with self.lock:
+            return self._row(self.db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+    def latest(self, kind, dedupe_key):
+        with self.lock:
+            return self._row(self.db.execute("SELECT * FROM jobs WHERE kind=? AND dedupe_key=? ORDER BY created_at DESC LIMIT 1", (kind, dedupe_key)).fetchone())
+
+    def _update(self, job_id, **fields):
+        """更新自己持有的工作；租約已過期並被其他程序接手時不寫入 (回傳 False)。"""
+        fields["updated_at"] = time.time()
+        with self.lock:
+            return self.db.execute(f"UPDATE jobs SET {', '.join([f'{k}=?' for k in fields])} WHERE id=? AND owner=?",
+                                   tuple(fields.values()) + (job_id, self.owner)).rowcount > 0
+
+    def _requeue_expired(self):
+        """租約過期 (持有的程序已停止) 的執行中工作重新排入佇列；呼叫端需持有 self.lock。"""
+        now = time.time()
+        n = self.db.execute("UPDATE jobs SET status='queued', owner=NULL, lease_until=NULL, next_run_at=?, updated_at=?, message='執行程序已停止，重新排入佇列' "
+                            "WHERE status='running' AND (lease_until IS NULL OR lease_until < ?)", (now, now, now)).rowcount
+        if n: self.cond.notify_all()
+
+    def _lease_loop(self):
+        """定期為自己執行中的工作續約，並接手其他程序過期的工作；失敗時以較短的間隔重試 (不超過續約間隔)。"""
+        failures = 0
+        while not self.stop_event.wait(min(_loop_backoff(failures), JOB_LEASE_TTL / 4) if failures else JOB_LEASE_TTL / 4):
+            try:
+                with self.cond:
+                    self.db.execute("UPDATE jobs SET lease_until=? WHERE status='running' AND owner=?", (time.time() + JOB_LEASE_TTL, self.owner))
+                    self._requeue_expired()
+                failures = 0
+            except Exception:
+                failures += 1
+                logger.exception("工作續約失敗 (連續 %d 次)", failures)
+
+    def _claim(self):
+        """
+        取出一個到期的工作並標記為執行中 (記錄持有者與租約)；沒有時回傳 (None, 下一個工作的等待秒數)。
+        條件式 UPDATE 只會有一個程序成功，被其他程序搶先時改取下一個。
+        """
+        while True:
+            now = time.time()
+            row = self.db.execute("SELECT * FROM jobs WHERE status='queued' ORDER BY next_run_at LIMIT 1").fetchone()
+            if row is None: return None, None
+            if row["next_run_at"] > now: return None, row["next_run_at"] - now
+            claimed = self.db.execute("UPDATE jobs SET status='running', attempts=attempts+1, owner=?, lease_until=?, updated_at=? WHERE id=? AND status='queued'",
+                                      (self.owner, now + JOB_LEASE_TTL, now, row["id"])).rowcount
+            if claimed: return dict(row, attempts=row["attempts"] + 1, owner=self.owner), 0
+
+    def _worker_loop(self):
+        failures = 0
+        while not self.stop_event.is_set():
+            try:
+                with self.cond:
+                    job, wait = self._claim()
+                    if job is None: self.cond.wait(timeout=min(wait, 5.0) if wait else 5.0)
+                if job is not None: self._run(job)
+                failures = 0
+            except Exception:
+                failures += 1
+                delay = _loop_backoff(failures)
+                logger.exception("工作執行緒發生錯誤 (連續 %d 次)，%.0f 秒後繼續", failures, delay)
+                self.stop_event.wait(delay)
+
+    def _run(self, job):
+        job_id = job["id"]
+        report = lambda progress, message: self._update(job_id, progress=progress, message=message)
+        try:
+            with span("job", kind=job["kind"]): message = self.handlers[job["kind"]](load_payload(job["payload"]), report)
+            self._update(job_id, status="succeeded", progress=1.0, message=message or "完成")
+        except JobFailed as e:
+            self._update(job_id, status="failed", message=str(e))
+        except Exception as e:
+            if job["attempts"] >= job["max_attempts"]:
+                message = f"{e} (已嘗試 {job['attempts']} 次)"
+                hook = self.on_final_failure.get(job["kind"])
+                if hook is not None:
+                    try: hook(load_payload(job["payload"]), e)
+                    except Exception as cleanup_err: message += f"；清理失敗: {cleanup_err}"
+                self._update(job_id, status="failed", message=message)
+                return
+            delay = min(JOB_BACKOFF_BASE * 2 ** (job["attempts"] - 1), JOB_BACKOFF_MAX)
+            self._update(job_id, status="queued", owner=None, lease_until=None, next_run_at=time.time() + delay, message=f"{e}，{delay:.0f} 秒後重試")
+            with self.cond: self.cond.notify()
+
+    def counts(self):
+        with self.lock:
+            return {r["status"]: r["n"] for r in self.db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+    def shutdown(self):
+        self.stop_event.set()
+        with self.cond: self.cond.notify_all()
+        for t in self.threads: t.join(timeout=1)
+
+def _job_build_pdf(cache, payload, report):
+    report(0.2, f"正在生成 PDF ({payload['engine']})")
+    pdf_bytes, method, err = cached_pdf(cache, payload["plan_key"], payload["engine"], *payload["render_args"])
+    if not pdf_bytes: raise RuntimeError(err or "PDF 生成失敗")
+    return f"{method} · {err}" if err else method
+
+def _job_build_formats(cache, payload, report):
+    formats = payload["formats"]
+    report(0.1, f"正在產生 {'、'.join(formats)} ({payload['engine']})")
+    out = cached_formats(cache, payload["engine"], formats, *payload["render_args"], with_xlsx=payload.get("with_xlsx", False))
+    failed = [f"{fmt}: {res['pdf'][2]}" for fmt, res in out.items() if not res["pdf"][0]]
+    if len(failed) == len(formats): raise RuntimeError("；".join(failed) or "PDF 生成失敗")
+    methods = sorted(set([res["pdf"][1] for res in out.values() if res["pdf"][0]]))
+    return f"{len(formats) - len(failed)} 種格式完成 · {'、'.join(methods)}" + (f" · 失敗 {'；'.join(failed)}" if failed else "")
+
+def _reserve_inventory(res):
+    """上傳前預約檔次 (設定檔的 Capacity 分頁為當下最新版本)；超賣時不上傳。"""
+    from .inventory import format_conflicts, get_inventory_ledger
+    cfg, _ = load_config_from_cloud(GSHEET_SHARE_URL)
+    ok, conflicts = get_inventory_ledger().reserve(res["id"], res["rows"], res["start"], cfg.capacity if cfg is not None else {}, res.get("label", ""))
+    if not ok: raise JobFailed(f"檔次超過可播容量，未上傳：{format_conflicts(conflicts)}")
+
+def _job_upload_ragic(cache, payload, report):
+    res = payload.get("reservation")
+    if res:
+        report(0.05, "正在預約檔次")
+        _reserve_inventory(res)
+    report(0.1, "正在生成 Excel")
+    xlsx_bytes = cached_excel(cache, payload["plan_key"], *payload["render_args"])
+    report(0.3, "正在生成 PDF")
+    pdf_bytes, _, _ = cached_pdf(cache, payload["plan_key"], payload["engine"], *payload["render_args"])
+    report(0.6, "正在上傳至 Ragic")
+    files_payload = {payload["file_fields"]["xlsx"]: (f"{payload['file_stem']}.xlsx", xlsx_bytes, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
+    if pdf_bytes: files_payload[payload["file_fields"]["pdf"]] = (f"{payload['file_stem']}.pdf", pdf_bytes, 'application/pdf')
+    success, msg, retryable = post_to_ragic(payload["url"], ragic_api_key(payload["url"]), payload["data"], files_payload)
+    if success: return msg
+    if retryable: raise RuntimeError(msg)   # 預約保留給重試；重試用盡時由 _release_reservation 取消
+    _release_reservation(payload)
+    raise JobFailed(msg)
+
+def _release_reservation(payload, err=None):
+    """Ragic 上傳最終失敗：取消這次上傳預約的檔次，避免失敗的方案永久佔用容量。"""
+    res = payload.get("reservation")
+    if res:
+        from .inventory import get_inventory_ledger
+        get_inventory_ledger().release(res["id"])
+
+def _job_batch(cache, payload, report):
+    from .batch import run_batch
+    cfg, _ = load_config_from_cloud(GSHEET_SHARE_URL)
+    if cfg is None: raise RuntimeError("設定檔載入失敗")
+    total = len(payload["orders"])
+    report(0.0, f"0/{total} 份完成")
+    zip_bytes, _, metrics = run_batch(payload["orders"], cfg, payload["make_pdf"], payload["engine"],
+                                      progress=lambda done, total, r: report(done / total, f"{done}/{total} 份完成"))
+    cache.put(payload["batch_key"], "zip", zip_bytes)
+    return f"成功 {metrics['succeeded']} / 部分成功 {metrics['partial']} / 失敗 {metrics['failed']} · {metrics['wall_s']:.1f} 秒 ({metrics['orders_per_min']} 筆/分)"
+
+@singleton
+def get_job_queue():
+    cache = get_artifact_cache()
+    handlers = {
+        "pdf": lambda payload, report: _job_build_pdf(cache, payload, report),
+        "formats": lambda payload, report: _job_build_formats(cache, payload, report),
+        "ragic": lambda payload, report: _job_upload_ragic(cache, payload, report),
+        "batch": lambda payload, report: _job_batch(cache, payload, report),
+    }
+    jobs = JobQueue(JOB_DB_PATH, handlers, on_final_failure={"ragic": _release_reservation})
+    atexit.register(jobs.shutdown)
+    return jobs
+
+JOB_ACTIVE = ("queued", "running")
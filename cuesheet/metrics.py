@@ -0,0 +1,177 @@
+"""
+主要路徑的執行時間量測 (span)，不依賴 Streamlit，只用標準函式庫。
+- span(name, **labels): with 區塊計時；快取命中等標記可在區塊內補上 (sp["cache"] = "hit")
+- traced(name): 函式裝飾器版本
+- collect(): 收集目前這次執行 (頁面 rerun / 單一請求) 內的 span，給主管面板逐步顯示
+- 全程序累計為固定 bucket 的 histogram：summary() 供頁面顯示、prometheus_text() 供監控抓取；
+  設定 CUE_METRICS_PROM_FILE 時定期寫出 Prometheus 文字檔 (node_exporter textfile collector)，
+  設定 CUE_METRICS_LOG 時每個 span 另寫一行 JSON 到輪替日誌
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import time
+
+from .settings import METRICS_BUCKETS_MS, METRICS_FLUSH_INTERVAL, METRICS_LOG_BACKUPS, METRICS_LOG_MAX_MB, METRICS_LOG_PATH, METRICS_PROM_FILE
+
+class LatencyHistogram:
+    """固定 bucket 的延遲分佈 (毫秒)，百分位數以 bucket 上界估計 (不超過實際最大值)。"""
+    def __init__(self, buckets_ms=METRICS_BUCKETS_MS):
+        self.buckets = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets) + 1)   # 最後一格為超過最大 bucket
+        self.count = 0; self.errors = 0; self.sum_ms = 0.0; self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms, error=False):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1; self.sum_ms += ms; self.max_ms = max(self.max_ms, ms)
+            if error: self.errors += 1
+
+    def _quantile(self, q):
+        if not self.count: return 0.0
+        target, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target: return round(min(self.buckets[i], self.max_ms), 1) if i < len(self.buckets) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self):
+        with self._lock:
+            acc, cumulative = 0, {}
+            for le, c in zip([str(b) for b in self.buckets] + ["+Inf"], self.counts):
+                acc += c; cumulative[le] = acc
+            return {"count": self.count, "errors": self.errors, "mean_ms": round(self.sum_ms / self.count, 1) if self.count else 0.0,
+                    "max_ms": round(self.max_ms, 1), "p50_ms": self._quantile(0.5), "p95_ms": self._quantile(0.95), "p99_ms": self._quantile(0.99),
+                    "sum_ms": round(self.sum_ms, 3), "buckets_ms": cumulative}
+
+# ==========================================
+# Prometheus 文字格式
+# ==========================================
+def _prom_labels(labels):
+    parts = ['{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def prometheus_histogram(name, help_text, series):
+    """輸出 {name}_duration_seconds (histogram) 與 {name}_errors_total；series: {((label, value), ...): LatencyHistogram}。"""
+    lines = [f"# HELP {name}_duration_seconds {help_text}", f"# TYPE {name}_duration_seconds histogram"]
+    errors = []
+    for labels, hist in sorted(series.items()):
+        snap = hist.snapshot()
+        for le, n in snap["buckets_ms"].items():
+            le_s = le if le == "+Inf" else repr(float(le) / 1000)
+            lines.append(f"{name}_duration_seconds_bucket{_prom_labels(labels + (('le', le_s),))} {n}")
+        lines.append(f"{name}_duration_seconds_sum{_prom_labels(labels)} {snap['sum_ms'] / 1000:.6f}")
+        lines.append(f"{name}_duration_seconds_count{_prom_labels(labels)} {snap['count']}")
+        errors.append(f"{name}_errors_total{_prom_labels(labels)} {snap['errors']}")
+    return "\n".join(lines + [f"# HELP {name}_errors_total 發生例外的次數", f"# TYPE {name}_errors_total counter"] + errors) + "\n"
+
+# ==========================================
+# Span 量測
+# ==========================================
+_collector = contextvars.ContextVar("cue_metrics_collector", default=None)
+_depth = contextvars.ContextVar("cue_metrics_depth", default=0)
+_series, _series_lock = {}, threading.Lock()
+_log_state = {"logger": None, "last_flush": 0.0}
+
+def _observe(name, labels, ms, error):
+    key = ((("span", name),) + tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _series_lock:
+        hist = _series.get(key)
+        if hist is None: hist = _series[key] = LatencyHistogram()
+    hist.observe(ms, error)
+
+def _json_logger():
+    if _log_state["logger"] is None:
+        logger = logging.getLogger("cuesheet.metrics")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        os.makedirs(os.path.dirname(os.path.abspath(METRICS_LOG_PATH)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(METRICS_LOG_PATH, maxBytes=METRICS_LOG_MAX_MB * 1024 * 1024, backupCount=METRICS_LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _log_state["logger"] = logger
+    return _log_state["logger"]
+
+def _export(rec):
+    if METRICS_LOG_PATH:
+        try: _json_logger().info(json.dumps(dict(rec, ms=round(rec["ms"], 3), ts=round(time.time(), 3), pid=os.getpid()), ensure_ascii=False, default=str))
+        except OSError: pass
+    if METRICS_PROM_FILE and time.time() - _log_state["last_flush"] > METRICS_FLUSH_INTERVAL:
+        _log_state["last_flush"] = time.time()
+        try: write_prometheus_file(METRICS_PROM_FILE)
+        except OSError: pass
+
+@contextlib.contextmanager
+def span(name, **labels):
+    """
+    量測 with 區塊的耗時；yield 的 dict 可在區塊內補上標記 (例如 cache="hit")。
+    巢狀的 span 會記錄深度，供面板縮排顯示。
+    """
+    rec = {"span": name, "depth": _depth.get(), "ms": None, "error": False, **labels}
+    spans = _collector.get()
+    if spans is not None: spans.append(rec)   # 進入時就加入，面板依開始順序顯示
+    token = _depth.set(rec["depth"] + 1)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        rec["error"] = not isinstance(e, (GeneratorExit, KeyboardInterrupt)) and type(e).__name__ not in ("RerunException", "StopException")
+        raise
+    finally:
+        rec["ms"] = (time.perf_counter() - t0) * 1000
+        _depth.reset(token)
+        _observe(name, {k: v for k, v in rec.items() if k not in ("span", "depth", "ms", "error")}, rec["ms"], rec["error"])
+        _export(rec)
+
+def traced(name):
+    """span 的裝飾器版本。"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name): return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextlib.contextmanager
+def collect():
+    """收集區塊內 (同一執行緒 / context) 的所有 span，yield 的 list 在區塊結束後仍可讀取。"""
+    spans = []
+    token = _collector.set(spans)
+    try: yield spans
+    finally: _collector.reset(token)
+
+# ==========================================
+# 匯出
+# ==========================================
+def summary():
+    """全程序累計的每個 span (含標記) 統計，依總耗時排序。"""
+    with _series_lock: series = dict(_series)
+    out = []
+    for key, hist in series.items():
+        snap = hist.snapshot()
+        labels = dict(key)
+        out.append({"span": labels.pop("span"), "labels": ", ".join([f"{k}={v}" for k, v in labels.items()]), "count": snap["count"], "errors": snap["errors"],
+                    "mean_ms": snap["mean_ms"], "p50_ms": snap["p50_ms"], "p95_ms": snap["p95_ms"], "max_ms": snap["max_ms"], "total_ms": round(snap["sum_ms"], 1)})
+    return sorted(out, key=lambda r: -r["total_ms"])
+
+def prometheus_text():
+    with _series_lock: series = dict(_series)
+    return prometheus_histogram("cue_span", "主要路徑各步驟的耗時", series)
+
+def write_prometheus_file(path):
+    """以原子替換寫出 Prometheus 文字檔 (避免抓取到寫一半的檔案)。"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".prom_")
+    with os.fdopen(fd, "w", encoding="utf-8") as f: f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+def reset():
+    with _series_lock: _series.clear()
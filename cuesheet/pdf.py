@@ -0,0 +1,342 @@
+"""
+PDF 原生渲染引擎 (WeasyPrint，不經過 Excel / LibreOffice)，失敗時退回 LibreOffice 轉檔。
+"""
+import base64
+import gc
+import re
+from datetime import timedelta
+
+from .assets import get_cloud_logo_bytes
+from .cache import source_fingerprint
+from .helpers import html_escape
+from .metrics import traced
+from .pricing import PlanSummary
+from .settings import FONT_MAIN, PDF_ENGINE_NATIVE
+from .soffice import xlsx_batch_to_pdf_bytes, xlsx_bytes_to_pdf_bytes
+
+PRINT_MARGIN_MM = 8
+PRINT_PAGE_W_PX = (297 - 2 * PRINT_MARGIN_MM) / 25.4 * 96   # A4 橫向可列印寬度
+PRINT_PAGE_H_PX = (210 - 2 * PRINT_MARGIN_MM) / 25.4 * 96   # A4 橫向可列印高度
+PRINT_DEFAULT_ROW_PT = 15
+
+PRINT_CSS = f"""
+@page {{ size: A4 landscape; margin: {PRINT_MARGIN_MM}mm; }}
+body {{ font-family: "{FONT_MAIN}", "Noto Sans CJK TC", "Noto Sans CJK JP", "Noto Sans CJK SC", sans-serif; font-size: 12pt; color: #000; margin: 0; }}
+table {{ border-collapse: collapse; table-layout: fixed; }}
+td {{ padding: 0 2px; vertical-align: middle; white-space: nowrap; overflow: hidden; }}
+.c {{ text-align: center; }} .l {{ text-align: left; }} .r {{ text-align: right; }}
+.w {{ white-space: normal; }} .b {{ font-weight: bold; }} .ul {{ text-decoration: underline; }}
+.red {{ color: #FF0000; }} .blue {{ color: #0000FF; }} .we {{ background-color: #FFFFCC; }}
+.f10 {{ font-size: 10pt; }} .f12 {{ font-size: 12pt; }} .f14 {{ font-size: 14pt; }} .f16 {{ font-size: 16pt; }}
+.f18 {{ font-size: 18pt; }} .f20 {{ font-size: 20pt; }} .f24 {{ font-size: 24pt; }} .f28 {{ font-size: 28pt; }} .f48 {{ font-size: 48pt; }}
+tr.g td, td.g {{ border: 0.5pt solid #000; }}
+tbody.box, tr.box {{ border: 1.5pt solid #000; }}
+tr.tot td {{ border-top: 1.5pt solid #000; border-bottom: 1.5pt solid #000; }}
+td.bl {{ border-left: 1.5pt solid #000; }} td.br {{ border-right: 1.5pt solid #000; }}
+.top-thin {{ border-top: 0.5pt solid #000; }} .dbl {{ border-bottom: 3pt double #000; }}
+"""
+
+_PRINT_LENGTH_RE = re.compile(r"(\d+(?:\.\d+)?)(px|pt)\b")
+_PRINT_STYLE_ATTR_RE = re.compile(r"style='([^']*)'")
+
+def _print_scale(css, zoom):
+    """CSS 中的 px / pt 長度乘上 zoom (mm 不動，@page 維持 A4)。"""
+    return _PRINT_LENGTH_RE.sub(lambda m: f"{float(m.group(1)) * zoom:.2f}".rstrip("0").rstrip(".") + m.group(2), css)
+
+def _print_txt(s):
+    return html_escape(s).replace("\n", "<br>")
+
+def _print_money(v):
+    if v is None: return ""
+    return f"${v:,}" if isinstance(v, (int, float)) else _print_txt(v)
+
+def _print_td(text="", cls="", colspan=1, rowspan=1):
+    attrs = f" class='{cls}'" if cls else ""
+    if colspan > 1: attrs += f" colspan='{colspan}'"
+    if rowspan > 1: attrs += f" rowspan='{rowspan}'"
+    return f"<td{attrs}>{text}</td>"
+
+def _print_merge_runs(values):
+    """連續相同值的 rowspan (對應 Excel 合併儲存格)；被合併的列為 0。"""
+    spans = [0] * len(values)
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1] == values[i]: j += 1
+        spans[i] = j - i + 1
+        i = j + 1
+    return spans
+
+class _PrintSheet:
+    """以 Excel 的欄寬/列高記錄 HTML 表格，最後依 A4 橫向計算縮放比例 (等同 Excel 的 fitToPage)。"""
+    def __init__(self, col_widths):
+        self.col_px = [int(w * 7 + 5) for w in col_widths]
+        self.parts = []
+        self.height_px = 0
+
+    def row(self, cells, height=PRINT_DEFAULT_ROW_PT, cls=""):
+        px = height * 4 / 3
+        self.height_px += px
+        cls_attr = f" class='{cls}'" if cls else ""
+        self.parts.append(f"<tr{cls_attr} style='height:{px:.0f}px'>{''.join(cells)}</tr>")
+
+    def raw(self, html, height_px=0):
+        self.parts.append(html)
+        self.height_px += height_px
+
+    def zoom(self):
+        return min(1.0, PRINT_PAGE_W_PX / max(1, sum(self.col_px)), PRINT_PAGE_H_PX / max(1, self.height_px))
+
+    def table_open(self):
+        cols = "".join([f"<col style='width:{w}px'>" for w in self.col_px])
+        return f"<table style='width:{sum(self.col_px)}px'><colgroup>{cols}</colgroup>"
+
+def _print_remark_cls(rm, blue_6=False):
+    s = rm.strip()
+    if s.startswith("1.") or s.startswith("4."): return "red"
+    if blue_6 and s.startswith("6."): return "blue"
+    return ""
+
+def _print_dongwu(sheet, shared, start_dt, end_dt, client_name, product_name, remarks_list, budget, prod, sales_person):
+    eff_days = (end_dt - start_dt).days + 1
+    total_cols = 7 + eff_days + 1
+    dates = [start_dt + timedelta(days=i) for i in range(eff_days)]
+    p_str = f"{'、'.join([f'{s}秒' for s in shared.unique_secs])} {product_name}"
+    medium_str = "/".join(shared.media)
+
+    sheet.raw(sheet.table_open() + "<tbody>")
+    sheet.row([_print_td("Media Schedule", "c b f48", total_cols)], 61)
+    sheet.row([_print_td("", "", total_cols)], 29)
+    infos = [("客戶名稱：", client_name), ("Product：", p_str), ("Period :", f"{start_dt.strftime('%Y. %m. %d')} - {end_dt.strftime('%Y. %m. %d')}"), ("Medium :", medium_str)]
+    for i, (lbl, val) in enumerate(infos):
+        cells = [_print_td(_print_txt(lbl), "b f14"), _print_td(_print_txt(val), "b f14", 6)]
+        if i == 3: cells += [_print_td(f"{start_dt.month}月", "c b f16"), _print_td("", "", total_cols - 8)]
+        else: cells.append(_print_td("", "", total_cols - 7))
+        sheet.row(cells, 40, "top-thin" if i == 0 else "")
+    sheet.raw("</tbody><tbody class='box'>")
+
+    heads = ["Station", "Location", "Program", "Day-part", "Size", "rate\n(Net)", "Package-cost\n(Net)"]
+    cells = [_print_td(_print_txt(h), "c b f14 w" + (" br" if i == 0 else ""), rowspan=2) for i, h in enumerate(heads)]
+    cells += [_print_td(f"{d.month}/{d.day}", "c f12") for d in dates]
+    cells.append(_print_td("檔次", "c b f14 bl", rowspan=2))
+    sheet.row(cells, 40, "g")
+    sheet.row([_print_td(["一", "二", "三", "四", "五", "六", "日"][d.weekday()], "c f12" + (" we" if d.weekday() >= 5 else "")) for d in dates], 40, "g")
+    sheet.raw("</tbody>")
+
+    names = {"全家廣播": "全家便利商店\n通路廣播廣告", "新鮮視": "全家便利商店\n新鮮視廣告", "家樂福": "家樂福"}
+    for m_key, data in shared.groups:
+        if not data: continue
+        sheet.raw("<tbody class='box'>")
+        dp_spans = _print_merge_runs([r["daypart"] for r in data])
+        sec_spans = _print_merge_runs([f"{r['seconds']}秒" for r in data])
+        for idx, r in enumerate(data):
+            cells = []
+            if idx == 0: cells.append(_print_td(_print_txt(names[m_key]), "c f12 w br", rowspan=len(data)))
+            cells += [_print_td(_print_txt(r["region"]), "c f12"), _print_td(_print_txt(r.get("program_num", 0)), "c f12")]
+            if dp_spans[idx]: cells.append(_print_td(_print_txt(r["daypart"]), "c f12", rowspan=dp_spans[idx]))
+            if sec_spans[idx]: cells.append(_print_td(f"{r['seconds']}秒", "c f12", rowspan=sec_spans[idx]))
+            rate = r['rate_display']
+            cells.append(_print_td(_print_money(rate), "c f12"))
+            if r.get("is_pkg_member"):
+                if idx == 0: cells.append(_print_td(_print_money(r['nat_pkg_display']), "c f12", rowspan=len(data)))
+            else:
+                cells.append(_print_td(_print_money(r['pkg_display']), "c f12"))
+            sch = r["schedule"][:eff_days]
+            cells += [_print_td(f"{v:,}", "c f12") for v in sch] + [_print_td("", "f12")] * (eff_days - len(sch))
+            cells.append(_print_td(f"{sum(sch)}", "c f12 bl"))
+            sheet.row(cells, 40, "g")
+        sheet.raw("</tbody>")
+
+    sheet.raw("<tbody class='box'>")
+    cells = [_print_td("", "br")] + [_print_td("")] * 3 + [_print_td("Total", "c b f14"), _print_td(_print_money(shared.rate_sum), "c b f14"), _print_td(_print_money(budget), "c b f14")]
+    cells += [_print_td(f"{v:,}", "c f12") for v in shared.day_totals] + [_print_td(f"{shared.grand_total}", "c f12 bl br")]
+    sheet.row(cells, 30, "g tot")
+    vat = int(budget * 0.05); grand_total = budget + vat
+    for lbl, val in [("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]:
+        cells = [_print_td("", "", 5), _print_td(_print_txt(lbl), "l f12 g bl"), _print_td(_print_money(val), "c f12 g br"), _print_td("", "", total_cols - 7)]
+        sheet.row(cells, 30, "tot" if lbl == "Grand Total" else "")
+    sheet.raw("</tbody></table>")
+
+    remark_html = "".join([f"<div class='f14 {_print_remark_cls(rm)}'>{_print_txt(rm)}</div>" for rm in remarks_list])
+    sheet.raw(f"<div style='margin-top:20px'><div class='b f16 ul'>Remarks:</div>{remark_html}</div>", (len(remarks_list) + 2) * 20)
+    left = "".join([f"<div class='l f12'>{_print_txt(x)}</div>" for x in ["甲    方：東吳廣告股份有限公司", "統一編號：20935458", sales_person]])
+    right = "".join([f"<div class='l f12'>{_print_txt(x)}</div>" for x in [f"乙    方：{client_name}", "統一編號：", "客戶簽章："]])
+    sheet.raw(f"<table class='top-thin' style='width:{sum(sheet.col_px)}px; margin-top:30px'><tr><td style='vertical-align:top'>{left}</td><td style='vertical-align:top'>{right}</td></tr></table>", 120)
+
+def _print_shenghuo_bolin(sheet, shared, is_bolin, start_dt, end_dt, client_name, product_name, remarks_list, budget, prod, sales_person, logo_bytes=None):
+    eff_days = (end_dt - start_dt).days + 1
+    end_c_start = 6 + eff_days
+    total_cols = end_c_start + 2
+    dates = [start_dt + timedelta(days=i) for i in range(eff_days)]
+    sec_str = " ".join([f"{s}秒廣告" for s in shared.unique_secs])
+    period_str = f"執行期間：{start_dt.strftime('%Y.%m.%d')} - {end_dt.strftime('%Y.%m.%d')}"
+    info_cls = "l b f14" if is_bolin else "l f14"
+
+    sheet.raw(sheet.table_open() + "<tbody>")
+    if is_bolin:
+        logo = ""
+        if logo_bytes:
+            logo = f"<img src='data:image/png;base64,{base64.b64encode(logo_bytes).decode()}' style='height:125px'>"
+        sheet.row([_print_td("鉑霖行動行銷-媒體計劃排程表 Mobi Media Schedule", "l b f28", total_cols - 2), _print_td(logo, "r", 2)], 70)
+        sheet.row([_print_td("TO：", "l b f20 red"), _print_td(_print_txt(client_name), "l b f20 red", total_cols - 1)], 33.5)
+        sheet.row([_print_td("FROM：", "l b f20"), _print_td(_print_txt(f"鉑霖行動行銷 {sales_person}"), "l b f20", total_cols - 1)], 33.5)
+        info_h, month_h, head_h = 46, 40, 35
+    else:
+        sheet.row([_print_td("聲活數位-媒體計劃排程表", "c b f24", total_cols)], 30)
+        sheet.row([_print_td("Media Schedule", "c b f18", total_cols)], 30)
+        sheet.row([_print_td("聲活數位科技股份有限公司 統編 28710100", "l f16", total_cols)], 46)
+        sheet.row([_print_td(_print_txt(sales_person), "l f16", total_cols)], 46)
+        info_h, month_h, head_h = 40, 40, 35
+    sheet.raw("</tbody><tbody class='box'>")
+    sheet.row([_print_td("客戶名稱：", info_cls), _print_td(_print_txt(client_name), info_cls, 4),
+               _print_td(_print_txt(f"廣告規格：{sec_str}"), info_cls, eff_days + 1), _print_td(_print_txt(period_str), info_cls, 2)], info_h)
+    sheet.raw("</tbody><tbody class='box'>")
+    month_groups = []
+    for i, d in enumerate(dates):
+        m_key = (d.year, d.month)
+        if not month_groups or month_groups[-1][0] != m_key: month_groups.append([m_key, i, i])
+        else: month_groups[-1][2] = i
+    cells = [_print_td("廣告名稱：", info_cls), _print_td(_print_txt(product_name), info_cls, 4)]
+    cells += [_print_td(f"{m_key[1]}月", "l b f14 g", e_idx - s_idx + 1) for m_key, s_idx, e_idx in month_groups]
+    cells.append(_print_td("", "", 3))
+    sheet.row(cells, month_h)
+    sheet.raw("</tbody><tbody class='box'>")
+
+    heads = ["頻道", "播出地區", "播出店數", "播出時間", "秒數\n規格"]
+    cells = [_print_td(_print_txt(h), "c b f14 w" + (" br" if i == 4 else ""), rowspan=2) for i, h in enumerate(heads)]
+    cells += [_print_td(f"{d.day}", "c b f14") for d in dates]
+    cells += [_print_td(h, "c b f14", rowspan=2) for h in ["檔次", "定價", "專案價"]]
+    sheet.row(cells, head_h, "g")
+    sheet.row([_print_td(["日", "一", "二", "三", "四", "五", "六"][(d.weekday() + 1) % 7], "c b f14" + (" we" if d.weekday() >= 5 else "")) for d in dates], head_h, "g")
+    sheet.raw("</tbody>")
+
+    for m_key, data in shared.groups:
+        if not data: continue
+        sheet.raw("<tbody class='box'>")
+        d_name = f"全家便利商店\n{m_key}廣告" if m_key != "家樂福" else "家樂福"
+        for idx, r in enumerate(data):
+            cells = []
+            if idx == 0: cells.append(_print_td(_print_txt(d_name), "c f12 w", rowspan=len(data)))
+            p_num = int(r.get('program_num', 0))
+            suffix = "面" if m_key == "新鮮視" else "店"
+            sec_txt = f"{r['seconds']}秒\n影片/影像 1920x1080 (mp4)" if m_key == "新鮮視" else f"{r['seconds']}秒廣告"
+            cells += [_print_td(_print_txt(r['region']), "c f12"), _print_td(f"{p_num:,}{suffix}", "c f12"),
+                      _print_td(_print_txt(r['daypart']), "c f12"), _print_td(_print_txt(sec_txt), "c f10 w br")]
+            sch = r["schedule"][:eff_days]
+            cells += [_print_td(f"{v}", "c f12") for v in sch] + [_print_td("", "f12")] * (eff_days - len(sch))
+            cells.append(_print_td(f"{sum(sch)}", "c f12"))
+            rate_val = r['rate_display']
+            cells.append(_print_td(_print_money(rate_val), "c f12"))
+            if r.get('is_pkg_member'):
+                if idx == 0: cells.append(_print_td(_print_money(r['nat_pkg_display']), "c f12", rowspan=len(data)))
+            else:
+                cells.append(_print_td(_print_money(r['pkg_display']), "c f12"))
+            sheet.row(cells, 40, "g")
+        sheet.raw("</tbody>")
+
+    sheet.raw("<tbody class='box'>")
+    cells = [_print_td(""), _print_td(""), _print_td(f"{shared.store_count:,}", "c b f14"), _print_td(""), _print_td("Total", "c b f14 br")]
+    cells += [_print_td(f"{v}", "c b f14") for v in shared.day_totals]
+    cells += [_print_td(f"{shared.grand_total}", "c b f14"), _print_td(_print_money(shared.rate_sum), "c b f14"), _print_td(_print_money(budget), "c b f14")]
+    sheet.row(cells, 40, "g tot")
+    vat = int(budget * 0.05); grand_total = budget + vat
+    for lbl, val in [("製作", prod), ("5% VAT", vat), ("Grand Total", grand_total)]:
+        cells = [_print_td("", "", end_c_start), _print_td(_print_txt(lbl), "r f12 g bl"), _print_td(_print_money(val), "c b f12 g br")]
+        sheet.row(cells, 30, "tot" if lbl == "Grand Total" else "")
+    sheet.raw("</tbody></table>")
+
+    left_px = sum(sheet.col_px[:5])
+    sig = "".join([f"<div class='f16' style='height:33px'>{_print_txt(x)}</div>" for x in ["乙        方：", f"　　{client_name}", "統一編號：", "客戶簽章："]])
+    remark_html = "".join([f"<div class='f16 {_print_remark_cls(rm, blue_6=True)}' style='height:33px'>{_print_txt(rm)}</div>" for rm in remarks_list])
+    sheet.raw(f"<table class='dbl' style='width:{sum(sheet.col_px)}px; margin-top:20px'><tr>"
+              f"<td style='width:{left_px}px; vertical-align:top'>{sig}</td>"
+              f"<td style='vertical-align:top'><div class='b f16'>Remarks：</div>{remark_html}</td></tr></table>",
+              (len(remarks_list) + 3) * 33)
+
+def generate_print_html(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, budget, prod, sales_person, logo_bytes=None, shared=None):
+    """
+    產生與 Excel 版面對應的列印用 HTML (A4 橫向)。
+    回傳 (html, zoom)，zoom 為塞進單頁所需的縮放比例，已套用在 html 的欄寬、列高與字級上 (等同 Excel 的 fitToPage)，
+    輸出 PDF 時不需再縮放；shared 為同一方案共用的 PlanSummary。
+    """
+    eff_days = (end_dt - start_dt).days + 1
+    shared = shared or PlanSummary(rows, eff_days)
+    if format_type == "東吳":
+        sheet = _PrintSheet([19.6, 22.8, 14.6, 20.0, 13.0, 19.6, 17.9] + [8.5] * eff_days + [13.0])
+        _print_dongwu(sheet, shared, start_dt, end_dt, client_name, product_name, remarks_list, budget, prod, sales_person)
+    elif format_type == "聲活":
+        sheet = _PrintSheet([22.5, 24.5, 13.8, 19.4, 15.0] + [8.1] * eff_days + [9.5, 58.0, 20.0])
+        _print_shenghuo_bolin(sheet, shared, False, start_dt, end_dt, client_name, product_name, remarks_list, budget, prod, sales_person)
+    else:
+        sheet = _PrintSheet([21.0, 21.0, 13.8, 19.4, 15.0] + [8.1] * eff_days + [9.5, 36.0, 20.0])
+        _print_shenghuo_bolin(sheet, shared, True, start_dt, end_dt, client_name, product_name, remarks_list, budget, prod, sales_person, logo_bytes)
+    # WeasyPrint 的 write_pdf(zoom=) 連 @page 紙張一起縮小，因此縮放直接做在長度上 (只改 style 屬性，不動文字與圖片資料)
+    zoom = sheet.zoom()
+    body = _PRINT_STYLE_ATTR_RE.sub(lambda m: f"style='{_print_scale(m.group(1), zoom)}'", "".join(sheet.parts))
+    html = f"<html><head><meta charset='utf-8'><style>{_print_scale(PRINT_CSS, zoom)}</style></head><body>{body}</body></html>"
+    return html, zoom
+
+_PRINT_CODE_FINGERPRINT = None
+
+def print_code_fingerprint():
+    """列印版面程式 (本模組的渲染函式、_PrintSheet 與 PRINT_CSS) 的指紋，納入 plan_fingerprint 讓版面改動後舊 PDF 自動失效。"""
+    global _PRINT_CODE_FINGERPRINT
+    if _PRINT_CODE_FINGERPRINT is None:
+        _PRINT_CODE_FINGERPRINT = source_fingerprint([_print_scale, _print_txt, _print_money, _print_td, _print_merge_runs, _print_remark_cls,
+                                                      _print_dongwu, _print_shenghuo_bolin, _PrintSheet, generate_print_html], PRINT_CSS)
+    return _PRINT_CODE_FINGERPRINT
+
+def _load_weasyprint():
+    # WeasyPrint 需要系統的 pango；缺少時 import 會丟 OSError，視為不可用
+    try:
+        import weasyprint
+        return weasyprint
+    except (ImportError, OSError):
+        return None
+
+@traced("pdf_native")
+def generate_pdf_native(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, shared=None):
+    weasyprint = _load_weasyprint()
+    if weasyprint is None: return None, "Fail", "伺服器未安裝 WeasyPrint"
+    try:
+        logo_bytes = get_cloud_logo_bytes() if format_type == "鉑霖" else None
+        html, _ = generate_print_html(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, logo_bytes, shared)
+        return weasyprint.HTML(string=html).write_pdf(), PDF_ENGINE_NATIVE, ""
+    except Exception as e: return None, "Fail", str(e)
+    finally: gc.collect()
+
+def generate_pdf_bytes(engine, get_xlsx, format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, soffice=None):
+    """
+    依選擇的引擎產生 PDF；原生引擎失敗時自動退回 LibreOffice 轉檔。
+    get_xlsx 為取得 Excel 位元組的函式，只有真的需要 LibreOffice 時才會呼叫 (避免多做一次 Excel 渲染)。
+    soffice: 取得 LibreOffice 結果 (pdf_bytes, method, err_msg) 的函式 (例如先查快取)，預設直接轉檔。
+    """
+    soffice = soffice or (lambda: xlsx_bytes_to_pdf_bytes(get_xlsx()))
+    if engine == PDF_ENGINE_NATIVE:
+        pdf_bytes, method, err = generate_pdf_native(format_type, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person)
+        if pdf_bytes: return pdf_bytes, method, err
+        pdf_bytes, method, err2 = soffice()
+        return pdf_bytes, method, err2 if not pdf_bytes else f"WeasyPrint 失敗，已改用 LibreOffice: {err}"
+    return soffice()
+
+def generate_pdf_formats(engine, get_xlsx_many, formats, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, shared=None, soffice_many=None):
+    """
+    同一方案一次產生多種格式的 PDF，回傳 {格式: (pdf_bytes, method, err_msg)}。
+    原生引擎逐一渲染 (共用 PlanSummary)；需要 LibreOffice 的格式 (選擇 LibreOffice 或原生失敗) 集中成一次轉檔工作。
+    get_xlsx_many(格式清單) 回傳對應的 Excel 位元組清單，只有真的需要 LibreOffice 時才會呼叫。
+    soffice_many(格式清單): 取得 LibreOffice 結果清單的函式 (例如先查快取)，預設直接批次轉檔。
+    """
+    soffice_many = soffice_many or (lambda fmts: xlsx_batch_to_pdf_bytes(get_xlsx_many(fmts)))
+    shared = shared or PlanSummary(rows, (end_dt - start_dt).days + 1)
+    out, native_err = {}, {}
+    if engine == PDF_ENGINE_NATIVE:
+        for fmt in formats:
+            pdf_bytes, method, err = generate_pdf_native(fmt, start_dt, end_dt, client_name, product_name, rows, remarks_list, final_budget_val, prod_cost, sales_person, shared)
+            if pdf_bytes: out[fmt] = (pdf_bytes, method, err)
+            else: native_err[fmt] = err
+    pending = [fmt for fmt in formats if fmt not in out]
+    if pending:
+        for fmt, (pdf_bytes, method, err) in zip(pending, soffice_many(pending)):
+            if pdf_bytes and fmt in native_err: err = f"WeasyPrint 失敗，已改用 LibreOffice: {native_err[fmt]}"
+            out[fmt] = (pdf_bytes, method, err)
+    return {fmt: out[fmt] for fmt in formats}
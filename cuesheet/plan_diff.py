@@ -0,0 +1,272 @@
+"""
+方案改版比較：兩個 calculate_plan_data 輸出的結構化差異 (增刪 / 變動的列、每日檔次差、金額差、1.1 加價的觸發變化)，
+並輸出為醒目標示的 HTML 或 XLSX 變更報告，取代人工比對兩份 PDF。
+
+- 列以 (媒體, 區域, 秒數) 對應；每日檔次差以 PlanMatrix 的唯一排程對齊到兩版走期的聯集後相減，
+  長走期只計算唯一排程數 × 天數，不展開逐列逐日的 dict
+- HTML 報告把每日差異相同的連續日期合併為一段，預算調整造成的全期變動仍只有少數幾欄
+"""
+import io
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+import numpy as np
+
+from .helpers import html_escape, region_display
+from .metrics import traced
+from .pricing import PlanMatrix
+
+DIFF_ADDED, DIFF_REMOVED, DIFF_CHANGED, DIFF_UNCHANGED = "added", "removed", "changed", "unchanged"
+DIFF_STATUS_LABELS = {DIFF_ADDED: "新增", DIFF_REMOVED: "刪除", DIFF_CHANGED: "變更", DIFF_UNCHANGED: "相同"}
+DIFF_COLORS = {DIFF_ADDED: "#E2EFDA", DIFF_REMOVED: "#FCE4D6", DIFF_CHANGED: "#FFF2CC", "cell": "#FFD966"}
+MEDIA_ORDER = {"全家廣播": 1, "新鮮視": 2, "家樂福": 3}
+
+@dataclass
+class PlanVersion:
+    """比較用的一個版本：calculate_plan_data 的 rows / logs 與開始日，budget / total_list 只用於摘要。"""
+    rows: list
+    start: date
+    logs: list = field(default_factory=list)
+    budget: int = None
+    total_list: int = None
+    label: str = ""
+
+    @property
+    def days(self):
+        return max([len(r["schedule"]) for r in self.rows], default=0)
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=max(self.days, 1) - 1)
+
+def _num(v):
+    return v if isinstance(v, (int, float)) and not isinstance(v, bool) else None
+
+def _delta(old, new):
+    return new - old if _num(old) is not None and _num(new) is not None else None
+
+def _penalties(logs):
+    """(媒體, 秒數) -> 是否觸發 1.1 加價 (檔次未達 Std_Spots)。"""
+    return {(log["media"], log["seconds"]): bool(log["is_under_target"]) for log in logs or []}
+
+class PlanDiff:
+    """
+    兩個版本的差異，建立時一次算好：
+    rows 為每個 (媒體, 區域, 秒數) 的比較結果 (新版順序在前，刪除的列接在後面)，
+    deltas 為各列在走期聯集上的每日檔次差 (列數 × days)，day_deltas 為每日合計差，penalty_flips 為加價觸發有變化的 (媒體, 秒數)。
+    """
+    def __init__(self, old, new):
+        self.old, self.new = old, new
+        self.start = min(old.start, new.start)
+        self.days = (max(old.end, new.end) - self.start).days + 1
+        old_by_key = {(r["media"], r["region"], r["seconds"]): i for i, r in enumerate(old.rows)}
+        new_by_key = {(r["media"], r["region"], r["seconds"]): i for i, r in enumerate(new.rows)}
+        keys = list(new_by_key) + [k for k in old_by_key if k not in new_by_key]
+
+        # 唯一排程對齊到聯集走期，最後一列為「不存在」的全 0 排程
+        self.old_plan, self.new_plan = PlanMatrix(old.rows, old.days), PlanMatrix(new.rows, new.days)
+        def aligned(plan, version):
+            out = np.zeros((plan.schedules.shape[0] + 1, self.days), dtype=np.int64)
+            offset = (version.start - self.start).days
+            out[:-1, offset:offset + plan.days] = plan.schedules
+            return out
+        old_sched, new_sched = aligned(self.old_plan, old), aligned(self.new_plan, new)
+        old_idx = np.array([self.old_plan.row_index[old_by_key[k]] if k in old_by_key else len(old_sched) - 1 for k in keys], dtype=np.intp)
+        new_idx = np.array([self.new_plan.row_index[new_by_key[k]] if k in new_by_key else len(new_sched) - 1 for k in keys], dtype=np.intp)
+        self.deltas = new_sched[new_idx] - old_sched[old_idx]
+        self.day_deltas = self.deltas.sum(axis=0)
+        schedule_changed = self.deltas.any(axis=1)
+
+        old_pen, new_pen = _penalties(old.logs), _penalties(new.logs)
+        self.penalty_flips = [{"media": m, "seconds": s, "old": old_pen[(m, s)], "new": new_pen[(m, s)]}
+                              for (m, s) in sorted(set(old_pen) & set(new_pen), key=lambda k: (MEDIA_ORDER.get(k[0], 99), k[1])) if old_pen[(m, s)] != new_pen[(m, s)]]
+        self.rows = []
+        for i, key in enumerate(keys):
+            o = old.rows[old_by_key[key]] if key in old_by_key else None
+            n = new.rows[new_by_key[key]] if key in new_by_key else None
+            rec = {"media": key[0], "region": key[1], "seconds": key[2],
+                   "old_spots": o["spots"] if o else None, "new_spots": n["spots"] if n else None,
+                   "old_rate": o["rate_display"] if o else None, "new_rate": n["rate_display"] if n else None,
+                   "old_pkg": o.get("nat_pkg_display") if o and o["is_pkg_member"] else (o["pkg_display"] if o else None),
+                   "new_pkg": n.get("nat_pkg_display") if n and n["is_pkg_member"] else (n["pkg_display"] if n else None),
+                   "old_penalty": old_pen.get((key[0], key[2])) if o else None, "new_penalty": new_pen.get((key[0], key[2])) if n else None}
+            rec["spots_delta"] = _delta(rec["old_spots"] or 0, rec["new_spots"] or 0)
+            rec["rate_delta"], rec["pkg_delta"] = _delta(rec["old_rate"], rec["new_rate"]), _delta(rec["old_pkg"], rec["new_pkg"])
+            if o is None or n is None:
+                rec["status"], rec["changes"] = DIFF_ADDED if o is None else DIFF_REMOVED, []
+            else:
+                rec["changes"] = [name for name, changed in (
+                    ("spots", o["spots"] != n["spots"]), ("schedule", bool(schedule_changed[i])), ("rate", o["rate_display"] != n["rate_display"]),
+                    ("pkg", rec["old_pkg"] != rec["new_pkg"]), ("penalty", rec["old_penalty"] != rec["new_penalty"]),
+                    ("program_num", o["program_num"] != n["program_num"]), ("daypart", o["daypart"] != n["daypart"])) if changed]
+                rec["status"] = DIFF_CHANGED if rec["changes"] else DIFF_UNCHANGED
+            self.rows.append(rec)
+
+    @property
+    def has_changes(self):
+        return bool(self.penalty_flips) or any([r["status"] != DIFF_UNCHANGED for r in self.rows]) or self.old.start != self.new.start or self.old.days != self.new.days
+
+    def dates(self):
+        return [self.start + timedelta(days=i) for i in range(self.days)]
+
+    def counts(self):
+        out = {s: 0 for s in DIFF_STATUS_LABELS}
+        for r in self.rows: out[r["status"]] += 1
+        return out
+
+    def summary(self):
+        """[(項目, 舊版, 新版, 差異)]：走期、天數、總檔次、列數與 (有提供時) 成交價 / 定價合計。"""
+        o, n = self.old, self.new
+        out = [("走期", f"{o.start:%Y/%m/%d} - {o.end:%Y/%m/%d}", f"{n.start:%Y/%m/%d} - {n.end:%Y/%m/%d}", ""),
+               ("天數", o.days, n.days, n.days - o.days),
+               ("總檔次", self.old_plan.grand_total, self.new_plan.grand_total, self.new_plan.grand_total - self.old_plan.grand_total),
+               ("列數", len(o.rows), len(n.rows), len(n.rows) - len(o.rows))]
+        if o.budget is not None and n.budget is not None: out.append(("成交價", o.budget, n.budget, n.budget - o.budget))
+        if o.total_list is not None and n.total_list is not None: out.append(("定價合計", o.total_list, n.total_list, n.total_list - o.total_list))
+        return out
+
+    def changed_day_runs(self, rows=None):
+        """
+        有差異的日期分段 [(開始 index, 結束 index (含), 各列差異 np.int64[列數])]：
+        rows 為要比較的列 index (預設為所有有每日差異的列)，連續且各列差異都相同的日期合併為一段。
+        """
+        rows = np.nonzero(self.deltas.any(axis=1))[0] if rows is None else np.asarray(rows, dtype=np.intp)
+        sub = self.deltas[rows]
+        active = np.nonzero(sub.any(axis=0))[0]
+        runs = []
+        for d in active.tolist():
+            if runs and runs[-1][1] == d - 1 and np.array_equal(sub[:, d], runs[-1][2]): runs[-1][1] = d
+            else: runs.append([d, d, sub[:, d]])
+        return [tuple(r) for r in runs]
+
+# ==========================================
+# 報告輸出
+# ==========================================
+DIFF_CSS = """
+    body { font-family: sans-serif; font-size: 11px; color: #000; padding: 5px; }
+    table { border-collapse: collapse; margin-bottom: 12px; }
+    th, td { border: 0.5pt solid #999; padding: 3px 6px; text-align: center; white-space: nowrap; }
+    th { background-color: #4472C4; color: white; }
+    .added { background-color: %s; } .removed { background-color: %s; text-decoration: line-through; } .changed { background-color: %s; }
+    .cell { background-color: %s; font-weight: bold; } .neg { color: #C00000; } .pos { color: #375623; }
+    """ % (DIFF_COLORS[DIFF_ADDED], DIFF_COLORS[DIFF_REMOVED], DIFF_COLORS[DIFF_CHANGED], DIFF_COLORS["cell"])
+
+_CHANGE_COLUMNS = {"spots": ("舊檔次", "新檔次", "檔次差"), "rate": ("舊單價", "新單價", "單價差"), "pkg": ("舊金額", "新金額", "金額差")}
+
+def _fmt(v):
+    if v is None: return ""
+    if isinstance(v, bool): return "1.1 加價" if v else "-"
+    return f"{v:,}" if isinstance(v, (int, np.integer)) else html_escape(v)
+
+def _signed(v):
+    if v is None or v == 0: return "" if v is None else "0"
+    return f"<span class='{'pos' if v > 0 else 'neg'}'>{v:+,}</span>"
+
+def _run_label(diff, lo, hi):
+    a, b = diff.start + timedelta(days=lo), diff.start + timedelta(days=hi)
+    return f"{a.month}/{a.day}" if lo == hi else f"{a.month}/{a.day}-{b.month}/{b.day}"
+
+@traced("plan_diff_html")
+def diff_report_html(diff, title="方案改版比較"):
+    """HTML 變更報告：摘要、加價觸發變化、逐列比較 (變動的欄位標色)、每日檔次差 (相同差異的連續日期合併)。"""
+    o_label, n_label = html_escape(diff.old.label or "舊版"), html_escape(diff.new.label or "新版")
+    counts = diff.counts()
+    parts = [f"<html><head><style>{DIFF_CSS}</style></head><body><h3>{html_escape(title)}</h3>",
+             f"<div>{o_label} → {n_label}：" + " / ".join([f"{DIFF_STATUS_LABELS[s]} {c} 列" for s, c in counts.items()]) + "</div>",
+             "<table><tr><th>項目</th><th>舊版</th><th>新版</th><th>差異</th></tr>"]
+    for name, old_v, new_v, delta in diff.summary():
+        cls = " class='cell'" if delta not in ("", 0) else ""
+        parts.append(f"<tr><td>{name}</td><td>{_fmt(old_v)}</td><td{cls}>{_fmt(new_v)}</td><td>{_signed(delta) if delta != '' else ''}</td></tr>")
+    parts.append("</table>")
+
+    if diff.penalty_flips:
+        parts.append("<b>1.1 加價觸發變化</b><table><tr><th>媒體</th><th>秒數</th><th>舊版</th><th>新版</th></tr>")
+        for f in diff.penalty_flips:
+            parts.append(f"<tr class='changed'><td>{f['media']}</td><td>{f['seconds']}秒</td><td>{_fmt(f['old'])}</td><td class='cell'>{_fmt(f['new'])}</td></tr>")
+        parts.append("</table>")
+
+    parts.append("<b>逐列比較</b><table><tr><th>狀態</th><th>媒體</th><th>區域</th><th>秒數</th>"
+                 + "".join([f"<th>{h}</th>" for cols in _CHANGE_COLUMNS.values() for h in cols]) + "<th>加價</th><th>其他變更</th></tr>")
+    for r in diff.rows:
+        cells = []
+        for key, _ in _CHANGE_COLUMNS.items():
+            hit = key in r["changes"] or (key == "spots" and "schedule" in r["changes"])
+            cells.append(f"<td>{_fmt(r['old_' + key])}</td><td{' class=cell' if hit else ''}>{_fmt(r['new_' + key])}</td><td>{_signed(r[key + '_delta'])}</td>")
+        pen = f"{_fmt(r['old_penalty'])} → {_fmt(r['new_penalty'])}" if "penalty" in r["changes"] else _fmt(r["new_penalty"] if r["new_penalty"] is not None else r["old_penalty"])
+        other = "、".join([{"schedule": "每日分配", "program_num": "店數", "daypart": "時段"}[c] for c in r["changes"] if c in ("schedule", "program_num", "daypart")])
+        parts.append(f"<tr class='{r['status']}'><td>{DIFF_STATUS_LABELS[r['status']]}</td><td>{r['media']}</td><td>{html_escape(region_display(r['region']))}</td>"
+                     f"<td>{r['seconds']}秒</td>{''.join(cells)}<td{' class=cell' if 'penalty' in r['changes'] else ''}>{pen}</td><td>{other}</td></tr>")
+    parts.append("</table>")
+
+    rows = np.nonzero(diff.deltas.any(axis=1))[0]
+    runs = diff.changed_day_runs(rows)
+    if runs:
+        parts.append(f"<b>每日檔次差</b> (共 {sum([hi - lo + 1 for lo, hi, _ in runs])} 天有變動，差異相同的連續日期合併顯示)<div style='overflow-x:auto;'>"
+                     "<table><tr><th>媒體</th><th>區域</th><th>秒數</th>" + "".join([f"<th>{_run_label(diff, lo, hi)}</th>" for lo, hi, _ in runs]) + "</tr>")
+        for j, i in enumerate(rows.tolist()):
+            r = diff.rows[i]
+            parts.append(f"<tr class='{r['status']}'><td>{r['media']}</td><td>{html_escape(region_display(r['region']))}</td><td>{r['seconds']}秒</td>"
+                         + "".join([f"<td>{_signed(int(vec[j]))}</td>" for _, _, vec in runs]) + "</tr>")
+        parts.append("<tr><td colspan=3><b>每日合計</b></td>" + "".join([f"<td>{_signed(int(diff.day_deltas[lo]))}</td>" for lo, _, _ in runs]) + "</tr></table></div>")
+    elif not diff.has_changes: parts.append("<div>兩個版本的排程完全相同。</div>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+@traced("plan_diff_xlsx")
+def diff_report_xlsx(diff, title="方案改版比較"):
+    """XLSX 變更報告：「比較」工作表 (摘要 + 逐列比較，變動處標色) 與「每日差異」工作表 (有差異的列 × 走期聯集逐日)。"""
+    import xlsxwriter
+    out = io.BytesIO()
+    wb = xlsxwriter.Workbook(out, {"in_memory": True})
+    bold = wb.add_format({"bold": True})
+    head = wb.add_format({"bold": True, "bg_color": "#4472C4", "font_color": "white", "border": 1, "align": "center"})
+    num = wb.add_format({"num_format": "#,##0", "border": 1})
+    signed = wb.add_format({"num_format": "+#,##0;[Red]-#,##0;0", "border": 1})
+    fmts = {s: wb.add_format({"bg_color": c, "border": 1, "num_format": "#,##0"}) for s, c in DIFF_COLORS.items()}
+    fmts[DIFF_UNCHANGED] = num
+
+    ws = wb.add_worksheet("比較")
+    ws.write(0, 0, title, bold)
+    ws.write(1, 0, f"{diff.old.label or '舊版'} → {diff.new.label or '新版'}")
+    ws.write_row(3, 0, ["項目", "舊版", "新版", "差異"], head)
+    for i, (name, old_v, new_v, delta) in enumerate(diff.summary(), start=4):
+        ws.write(i, 0, name, num); ws.write(i, 1, old_v, num)
+        ws.write(i, 2, new_v, fmts["cell"] if delta not in ("", 0) else num); ws.write(i, 3, delta, signed)
+    row = 5 + len(diff.summary())
+    if diff.penalty_flips:
+        ws.write(row, 0, "1.1 加價觸發變化", bold)
+        ws.write_row(row + 1, 0, ["媒體", "秒數", "舊版", "新版"], head)
+        for f in diff.penalty_flips:
+            row += 1
+            ws.write_row(row + 1, 0, [f["media"], f["seconds"], "1.1 加價" if f["old"] else "-", "1.1 加價" if f["new"] else "-"], fmts[DIFF_CHANGED])
+        row += 3
+    headers = ["狀態", "媒體", "區域", "秒數"] + [h for cols in _CHANGE_COLUMNS.values() for h in cols] + ["舊加價", "新加價", "變更項目"]
+    ws.write_row(row, 0, headers, head)
+    for r in diff.rows:
+        row += 1
+        base = fmts[r["status"]]
+        ws.write_row(row, 0, [DIFF_STATUS_LABELS[r["status"]], r["media"], region_display(r["region"]), r["seconds"]], base)
+        col = 4
+        for key in _CHANGE_COLUMNS:
+            hit = key in r["changes"] or (key == "spots" and "schedule" in r["changes"])
+            ws.write(row, col, r["old_" + key], base); ws.write(row, col + 1, r["new_" + key], fmts["cell"] if hit else base)
+            ws.write(row, col + 2, r[key + "_delta"], signed)
+            col += 3
+        pen = lambda v: "" if v is None else ("1.1 加價" if v else "-")
+        ws.write(row, col, pen(r["old_penalty"]), base); ws.write(row, col + 1, pen(r["new_penalty"]), fmts["cell"] if "penalty" in r["changes"] else base)
+        ws.write(row, col + 2, "、".join(r["changes"]), base)
+    ws.set_column(0, len(headers) - 1, 11)
+
+    ws2 = wb.add_worksheet("每日差異")
+    rows = np.nonzero(diff.deltas.any(axis=1))[0]
+    dates = diff.dates()
+    ws2.write_row(0, 0, ["媒體", "區域", "秒數"] + [f"{d.month}/{d.day}" for d in dates], head)
+    for j, i in enumerate(rows.tolist(), start=1):
+        r = diff.rows[i]
+        ws2.write_row(j, 0, [r["media"], region_display(r["region"]), r["seconds"]], fmts[r["status"]])
+        ws2.write_row(j, 3, diff.deltas[i].tolist(), signed)
+    ws2.write(len(rows) + 1, 0, "每日合計", bold)
+    ws2.write_row(len(rows) + 1, 3, diff.day_deltas.tolist(), signed)
+    ws2.freeze_panes(1, 3)
+    wb.close()
+    return out.getvalue()
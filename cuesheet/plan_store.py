@@ -0,0 +1,110 @@
+"""
+方案紀錄：把產生過的 Cue 表輸入 (表單欄位與媒體設定) 保存在本機 SQLite，之後可搜尋並一鍵載回表單修改。
+- id 為 plan_record_id (表單輸入、媒體設定與排程列的雜湊，不含渲染程式版本)，同一內容重複儲存只更新時間與檔案雜湊；
+  檔案快取的 plan_fingerprint 另含渲染程式指紋，改版或重新部署後不會讓同一方案變成新的一筆
+- 客戶 / 產品 / 業務 / 走期各有索引，搜尋只回傳摘要欄位 (不解析 JSON)，數萬筆紀錄仍在毫秒級
+- 關鍵字比對預先合併的小寫 search_key 欄位；(updated_at, search_key) 索引讓比對只掃索引、不讀整列，由新到舊湊滿 limit 筆即停止
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from .cache import singleton
+from .metrics import span
+from .settings import PLAN_SEARCH_LIMIT, PLAN_STORE_DB_PATH
+
+PLAN_INPUT_DATES = ("start_date", "end_date", "sign_deadline", "payment_date")   # inputs 中以 ISO 字串保存的日期欄位
+_SUMMARY_COLUMNS = "id, client, product, sales, format, start_date, end_date, total_budget, final_budget, total_spots, created_at, updated_at"
+
+def plan_record_id(inputs, config, rows):
+    """方案紀錄的 id：表單輸入、媒體設定與排程列的雜湊；載回方案重算後也以此比較排程是否與保存時相同。"""
+    blob = json.dumps([inputs, config, rows], ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _search_key(*parts):
+    return "\n".join([str(p or "").strip().lower() for p in parts])
+
+class PlanStore:
+    """
+    本機方案紀錄；執行緒安全，多個程序可共用同一個檔案 (WAL)。
+    save 的 inputs 為表單欄位 (日期可為 date)，config 為 calculate_plan_data 的媒體設定，artifacts 為 {檔案種類: sha256}。
+    """
+    def __init__(self, db_path=PLAN_STORE_DB_PATH):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS plans (
+                id TEXT PRIMARY KEY, client TEXT NOT NULL, product TEXT NOT NULL, sales TEXT NOT NULL, format TEXT NOT NULL,
+                start_date TEXT NOT NULL, end_date TEXT NOT NULL, total_budget INTEGER NOT NULL, final_budget INTEGER NOT NULL,
+                total_spots INTEGER NOT NULL, search_key TEXT NOT NULL, inputs TEXT NOT NULL, config TEXT NOT NULL,
+                artifacts TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)""")
+            for name, cols in (("updated", "updated_at, search_key"), ("client", "client, updated_at"), ("product", "product, updated_at"),
+                               ("sales", "sales, updated_at"), ("dates", "start_date, end_date")):
+                self.db.execute(f"CREATE INDEX IF NOT EXISTS idx_plans_{name} ON plans ({cols})")
+
+    def save(self, plan_id, inputs, config, total_spots=0, artifacts=None):
+        """新增或更新一筆方案；已存在時保留建立時間，檔案雜湊與既有的合併。"""
+        now = time.time()
+        payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+        with span("plan_store_save"), self.lock:
+            row = self.db.execute("SELECT artifacts FROM plans WHERE id=?", (plan_id,)).fetchone()
+            merged = dict(json.loads(row["artifacts"]) if row else {}, **(artifacts or {}))
+            self.db.execute("""INSERT INTO plans (id, client, product, sales, format, start_date, end_date, total_budget, final_budget, total_spots,
+                search_key, inputs, config, artifacts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET inputs=excluded.inputs, artifacts=excluded.artifacts, updated_at=excluded.updated_at""",
+                (plan_id, inputs["client_name"], inputs["product_name"], inputs.get("sales_person") or "", inputs["format_type"],
+                 str(inputs["start_date"]), str(inputs["end_date"]), int(inputs["total_budget"]), int(inputs.get("final_budget", inputs["total_budget"])),
+                 int(total_spots), _search_key(inputs["client_name"], inputs["product_name"], inputs.get("sales_person")), payload,
+                 json.dumps(config, ensure_ascii=False, sort_keys=True), json.dumps(merged, sort_keys=True), now, now))
+
+    def get(self, plan_id):
+        """完整紀錄 (含 inputs / config / artifacts)；日期欄位與秒數配比的 key 還原為 date / int。"""
+        with self.lock:
+            row = self.db.execute("SELECT * FROM plans WHERE id=?", (plan_id,)).fetchone()
+        if row is None: return None
+        plan = dict(row)
+        inputs = json.loads(plan["inputs"])
+        for k in PLAN_INPUT_DATES:
+            if inputs.get(k): inputs[k] = date.fromisoformat(inputs[k][:10])
+        plan["inputs"] = inputs
+        plan["config"] = {m: dict(cfg, sec_shares={int(s): p for s, p in cfg["sec_shares"].items()}) for m, cfg in json.loads(plan["config"]).items()}
+        plan["artifacts"] = json.loads(plan["artifacts"])
+        return plan
+
+    def search(self, text="", sales=None, client=None, date_from=None, date_to=None, limit=PLAN_SEARCH_LIMIT):
+        """
+        依關鍵字 (空白分隔，每個字都須出現在客戶 / 產品 / 業務中)、業務、客戶與走期 (與區間重疊) 搜尋，
+        由最近更新到最舊回傳摘要欄位。
+        """
+        where, args = [], []
+        for term in text.lower().split():
+            where.append("instr(search_key, ?) > 0"); args.append(term)
+        if sales: where.append("sales = ?"); args.append(sales)
+        if client: where.append("client = ?"); args.append(client)
+        if date_to: where.append("start_date <= ?"); args.append(str(date_to))
+        if date_from: where.append("end_date >= ?"); args.append(str(date_from))
+        sql = f"SELECT {_SUMMARY_COLUMNS} FROM plans {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY updated_at DESC LIMIT ?"
+        with span("plan_store_search"), self.lock:
+            return [dict(r) for r in self.db.execute(sql, args + [int(limit)])]
+
+    def delete(self, plan_id):
+        with self.lock:
+            return self.db.execute("DELETE FROM plans WHERE id=?", (plan_id,)).rowcount > 0
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+
+    def close(self):
+        with self.lock: self.db.close()
+
+@singleton
+def get_plan_store():
+    return PlanStore(PLAN_STORE_DB_PATH)
@@ -0,0 +1,247 @@
+"""
+跨訂單彙總 (Portfolio)：把多筆方案 (訂單表 / 一個月的 Ragic 紀錄) 展開成欄式儲存，
+回答「區間內每日各媒體 / 區域的總檔次」「各業務 / 客戶的成交金額」等查詢，供主管對照 Std_Spots 檢查檔次負載。
+
+- 每筆方案的排程列以欄位 (media / region / seconds / spots ...) 分開存放，查詢明細時才組成 DataFrame
+- 每日負載 (媒體 × 區域 × 日) 與業務 / 客戶金額為增量維護的彙總：方案加入時只把它的排程累加上去，
+  同一 plan_id 再次加入 (改版) 時先扣掉舊的貢獻，不重掃其他方案
+"""
+import hashlib
+import json
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .batch import build_batch_order, plan_order
+from .helpers import parse_campaign_details
+from .metrics import span
+from .pricing import PRICING_MEDIA, PlanMatrix
+from .ragic import RAGIC_FIELDS
+from .settings import REGIONS_ORDER
+
+PORTFOLIO_GROUPS = {"sales": "業務", "client": "客戶"}
+_GROUP_STATS = ("plans", "final_budget", "window_budget", "window_spots")   # 各分組累加的數值欄位
+
+def month_window(year, month):
+    """該月第一天與最後一天。"""
+    start = date(year, month, 1)
+    return start, (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+def ragic_record_to_order(rec):
+    """把 fetch_ragic_records 取得的一筆紀錄轉成 build_batch_order 可接受的原始訂單 (媒體設定由詳細投放摘要還原)。"""
+    f = RAGIC_FIELDS
+    return {
+        "client": str(rec.get(f["client"], "")), "product": str(rec.get(f["product"], "")), "format": str(rec.get(f["format"], "")),
+        "budget": str(rec.get(f["budget_raw"], "")), "final_budget": str(rec.get(f["budget_fin"], "")), "prod_cost": str(rec.get(f["prod_cost"], "")),
+        "start": str(rec.get(f["date_start"], "")), "end": str(rec.get(f["date_end"], "")), "sales": str(rec.get(f["sales"], "")),
+        "media": parse_campaign_details(rec.get(f["details"], "")),
+    }
+
+_REGION_ORDER = REGIONS_ORDER + ["全省量販", "全省超市"]
+
+def _load_order(item):
+    (media, region), _ = item
+    return (PRICING_MEDIA.index(media) if media in PRICING_MEDIA else 99, _REGION_ORDER.index(region) if region in _REGION_ORDER else 99, region)
+
+def upload_plan_ids(raws, source):
+    """
+    訂單表各列的穩定 plan_id：upload:<檔名>:<客戶>|<產品>|<開始日>，同一檔案內重複的組合依出現順序加上 #2、#3…；
+    金額或媒體設定改版時 id 不變，重新加入會取代舊版本而不是多算一筆。
+    """
+    seen, plan_ids = {}, []
+    for raw in raws:
+        base = f"upload:{source}:{raw.get('client', '')}|{raw.get('product', '')}|{raw.get('start', '')}"
+        seen[base] = seen.get(base, 0) + 1
+        plan_ids.append(base if seen[base] == 1 else f"{base}#{seen[base]}")
+    return plan_ids
+
+def _content_key(raw):
+    return hashlib.sha256(json.dumps(raw, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class Portfolio:
+    """
+    固定區間 (start ~ end，通常為一個月) 的跨訂單彙總；執行緒安全。
+    add_plan / add_order 回傳該方案是否與區間重疊 (不重疊的方案不記錄)。
+    """
+    def __init__(self, start, end):
+        if end < start: raise ValueError("結束日早於開始日")
+        self.start, self.end = start, end
+        self.days = (end - start).days + 1
+        self._lock = threading.Lock()
+        self._plans = {}    # plan_id -> {"meta": 方案欄位, "rows": 列欄位, "load": {(媒體, 區域): 每日檔次}, "key": 內容 hash}
+        self._load = {}     # (媒體, 區域) -> np.int64[days]，所有方案的每日檔次合計
+        self._groups = {g: {} for g in PORTFOLIO_GROUPS}   # 分組 -> 值 -> np.float64[len(_GROUP_STATS)]
+        self._frames = {}   # 明細 DataFrame 快取，方案變動時清除
+        self._outside = {}  # plan_id -> 內容 hash，走期不在區間內的方案 (重新加入時同樣略過計算)
+
+    def __len__(self):
+        return len(self._plans)
+
+    def __contains__(self, plan_id):
+        return plan_id in self._plans
+
+    # --- 增量維護 ---
+    def _apply(self, entry, sign):
+        for key, vec in entry["load"].items():
+            total = self._load.get(key)
+            if total is None: total = self._load[key] = np.zeros(self.days, dtype=np.int64)
+            total[entry["lo"]:entry["hi"]] += sign * vec
+            if sign < 0 and not total.any(): del self._load[key]
+        meta = entry["meta"]
+        stats = np.array([1, meta["final_budget"], meta["window_budget"], meta["window_spots"]], dtype=np.float64)
+        for group, values in self._groups.items():
+            acc = values.get(meta[group])
+            if acc is None: acc = values[meta[group]] = np.zeros(len(_GROUP_STATS))
+            acc += sign * stats
+            if acc[0] <= 0: del values[meta[group]]
+        self._frames.clear()
+
+    def add_plan(self, plan_id, order, rows, content_key=None):
+        """
+        加入 (或以新版本取代) 一筆方案：order 為 build_batch_order 的結果，rows 為其排程列。
+        只有走期與區間重疊的部分計入每日負載；區間內成交金額依區間內檔次比例攤提。
+        """
+        days_count = (order["end"] - order["start"]).days + 1
+        offset = (order["start"] - self.start).days
+        a, b = max(0, -offset), min(days_count, self.days - offset)   # 方案內落在區間的日 index
+        if a >= b:
+            self.remove(plan_id)
+            return False
+        plan = PlanMatrix(rows, days_count)
+        window = plan.matrix[:, a:b]
+        load = {}
+        for r, vec in zip(rows, window):
+            key = (r["media"], r["region"])
+            load[key] = load[key] + vec if key in load else vec.copy()
+        window_spots = int(window.sum())
+        meta = {"plan_id": plan_id, "client": order["client"], "product": order["product"], "sales": order.get("sales") or "(未填)",
+                "format": order["format"], "start": order["start"], "end": order["end"], "days_in_window": b - a,
+                "final_budget": order["final_budget"], "total_spots": plan.grand_total, "window_spots": window_spots,
+                "window_budget": round(order["final_budget"] * window_spots / plan.grand_total) if plan.grand_total else 0}
+        row_cols = {"plan_id": [plan_id] * len(rows), "media": [r["media"] for r in rows], "region": [r["region"] for r in rows],
+                    "seconds": [r["seconds"] for r in rows], "spots": plan.row_totals.tolist(), "window_spots": window.sum(axis=1).tolist()}
+        entry = {"meta": meta, "rows": row_cols, "load": load, "lo": offset + a, "hi": offset + b, "key": content_key}
+        with self._lock:
+            old = self._plans.pop(plan_id, None)
+            if old is not None: self._apply(old, -1)
+            self._plans[plan_id] = entry
+            self._apply(entry, 1)
+        return True
+
+    def remove(self, plan_id):
+        with self._lock:
+            self._outside.pop(plan_id, None)
+            old = self._plans.pop(plan_id, None)
+            if old is not None: self._apply(old, -1)
+        return old is not None
+
+    def add_order(self, raw, cfg, plan_id=None):
+        """以原始訂單 (訂單表一列 / ragic_record_to_order 的結果) 計算排程後加入；內容與已加入的版本相同時直接略過。"""
+        key = _content_key(raw)
+        plan_id = plan_id or key[:16]
+        entry = self._plans.get(plan_id)
+        if entry is not None and entry["key"] == key: return True
+        if self._outside.get(plan_id) == key: return False
+        order = build_batch_order(raw)
+        rows = plan_order(order, cfg)[0]
+        inside = self.add_plan(plan_id, order, rows, key)
+        if not inside: self._outside[plan_id] = key
+        return inside
+
+    def add_orders(self, raws, cfg, plan_ids=None):
+        """逐筆加入，回傳 (加入筆數, [(序號, plan_id, 錯誤訊息), ...])；單筆錯誤不影響其他訂單。"""
+        added, errors = 0, []
+        with span("portfolio_ingest"):
+            for i, raw in enumerate(raws):
+                plan_id = plan_ids[i] if plan_ids else None
+                try: added += self.add_order(raw, cfg, plan_id)
+                except Exception as e: errors.append((i + 1, plan_id, f"{type(e).__name__}: {e}"))
+        return added, errors
+
+    def add_ragic_records(self, records, cfg):
+        """
+        以一次讀取的 Ragic 紀錄同步 (plan_id 為 ragic:<紀錄 ID>)：內容未變的紀錄不重新計算，
+        先前加入但這次已不在結果中的 Ragic 紀錄 (已刪除或走期改到區間外) 一併移除。
+        """
+        plan_ids = [f"ragic:{rec['_ragicId']}" if rec.get("_ragicId") is not None else None for rec in records]
+        added, errors = self.add_orders([ragic_record_to_order(rec) for rec in records], cfg, plan_ids)
+        self._drop_missing("ragic:", plan_ids)
+        return added, errors
+
+    def add_upload(self, raws, cfg, source):
+        """
+        以一份訂單表同步 (plan_id 見 upload_plan_ids，source 為檔名)：改版的列取代舊版本，
+        同一檔案先前加入但這次已不在表中的訂單一併移除。
+        """
+        plan_ids = upload_plan_ids(raws, source)
+        added, errors = self.add_orders(raws, cfg, plan_ids)
+        self._drop_missing(f"upload:{source}:", plan_ids)
+        return added, errors
+
+    def _drop_missing(self, prefix, plan_ids):
+        keep = set(plan_ids)
+        with self._lock: stale = [p for p in list(self._plans) + list(self._outside) if p.startswith(prefix) and p not in keep]
+        for plan_id in stale: self.remove(plan_id)
+
+    # --- 查詢 ---
+    def dates(self):
+        return [self.start + timedelta(days=i) for i in range(self.days)]
+
+    def daily_load(self, media=None):
+        """每日檔次負載：列為 (媒體, 區域)，欄為日期，另附合計與單日最高。"""
+        with self._lock:
+            items = sorted([(k, v.copy()) for k, v in self._load.items() if media is None or k[0] == media], key=_load_order)
+        cols = [f"{d.month}/{d.day}" for d in self.dates()]
+        if not items: return pd.DataFrame(columns=["媒體", "區域"] + cols + ["合計", "單日最高"])
+        mat = np.vstack([v for _, v in items])
+        df = pd.DataFrame(mat, columns=cols)
+        df.insert(0, "區域", [k[1] for k, _ in items]); df.insert(0, "媒體", [k[0] for k, _ in items])
+        df["合計"] = mat.sum(axis=1); df["單日最高"] = mat.max(axis=1)
+        return df
+
+    def load_summary(self, pricing_db=None):
+        """各媒體 / 區域在區間內的總檔次、單日最高與平均；提供 pricing_db 時附上 Std_Spots 與相當的標準檔次倍數。"""
+        with self._lock:
+            items = sorted([(k, v.copy()) for k, v in self._load.items()], key=_load_order)
+        out = []
+        for (media, region), vec in items:
+            peak = int(vec.argmax())
+            rec = {"媒體": media, "區域": region, "總檔次": int(vec.sum()), "單日最高": int(vec[peak]),
+                   "最高日": self.start + timedelta(days=peak), "日平均": round(float(vec.mean()), 1)}
+            if pricing_db is not None:
+                db = pricing_db.get(media, {})
+                std = db.get("量販_全省" if region == "全省量販" else "超市_全省", {}).get("Std_Spots") if media == "家樂福" else db.get("Std_Spots")
+                rec["Std_Spots"] = std
+                rec["標準檔次倍數"] = round(rec["總檔次"] / std, 2) if std else None
+            out.append(rec)
+        return pd.DataFrame(out)
+
+    def budget_by(self, group="sales"):
+        """依業務 (sales) 或客戶 (client) 彙總：方案數、成交價合計、區間內攤提金額與檔次。"""
+        with self._lock:
+            items = sorted(self._groups[group].items(), key=lambda kv: -kv[1][2])
+        label = PORTFOLIO_GROUPS[group]
+        return pd.DataFrame([{label: k, "方案數": int(v[0]), "成交價合計": int(v[1]), "區間內金額": int(v[2]), "區間內檔次": int(v[3])} for k, v in items],
+                            columns=[label, "方案數", "成交價合計", "區間內金額", "區間內檔次"])
+
+    def plans_frame(self):
+        """方案明細 (每筆方案一列)。"""
+        with self._lock:
+            if "plans" not in self._frames: self._frames["plans"] = pd.DataFrame([e["meta"] for e in self._plans.values()])
+            return self._frames["plans"]
+
+    def rows_frame(self):
+        """排程列明細 (各方案的每一列)，由各方案的欄位串接而成。"""
+        with self._lock:
+            if "rows" not in self._frames:
+                cols = {c: [v for e in self._plans.values() for v in e["rows"][c]] for c in ("plan_id", "media", "region", "seconds", "spots", "window_spots")}
+                self._frames["rows"] = pd.DataFrame(cols)
+            return self._frames["rows"]
+
+    def totals(self):
+        with self._lock:
+            spots = int(sum([v.sum() for v in self._load.values()]))
+            budget = int(sum([v[2] for v in self._groups["sales"].values()]))
+        return {"plans": len(self._plans), "window_spots": spots, "window_budget": budget}
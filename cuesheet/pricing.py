@@ -0,0 +1,531 @@
+"""
+排程運算：calculate_plan_data (單一方案)、PricingEngine (向量化批次報價) 與預算配比試算。
+"""
+import math
+
+import numpy as np
+
+from .helpers import calculate_schedule, get_sec_factor, parse_count_to_int
+from .metrics import traced
+from .settings import DURATIONS
+
+def pooled_schedule(pool, spots, days_count):
+    """同一方案內檔次數相同的列共用同一個每日分配 list (PlanMatrix 也只會存一份)。"""
+    sch = pool.get(spots)
+    if sch is None: sch = pool[spots] = calculate_schedule(spots, days_count)
+    return sch
+
+@traced("pricing")
+def calculate_plan_data(config, total_budget, days_count, pricing_db, sec_factors, store_counts_num, regions_order):
+    """
+    排程運算核心函式 (已增加邏輯記錄功能)
+    """
+    rows, total_list_accum = [], 0
+    logs = [] # 初始化日誌列表
+    sch_pool = {} # 檔次數相同的列共用同一份每日分配
+
+    for m, cfg in config.items():
+        # 根據各媒體的預算佔比 (Share) 分配預算
+        m_budget_total = total_budget * (cfg["share"] / 100.0)
+          
+        for sec, sec_pct in cfg["sec_shares"].items():
+            s_budget = m_budget_total * (sec_pct / 100.0)
+            if s_budget <= 0: continue
+              
+            factor = get_sec_factor(m, sec, sec_factors)
+              
+            # --- 邏輯 A: 廣播與新鮮視 ---
+            if m in ["全家廣播", "新鮮視"]:
+                db = pricing_db[m]
+                calc_regs = ["全省"] if cfg["is_national"] else cfg["regions"]
+                display_regs = regions_order if cfg["is_national"] else cfg["regions"]
+                  
+                # 計算單位成本總和 (如果是全省，就是各區單價加總或直接取全省價)
+                # 這裡為了能夠還原 "實作價"，我們需要知道用的是哪個 Base Net
+                # 因為程式邏輯是: unit_net_sum = sum( (Region_Net / Std_Spots) * Factor )
+                  
+                # 為了 Log 清晰，我們反推 "總實作價 (Net Price Sum)"
+                base_net_price_sum = 0
+                std_spots_ref = db["Std_Spots"] # 4800 or 5040
+                  
+                # 核心運算
+                unit_net_sum = 0
+                for r in calc_regs:
+                      # 取得該區域(或全省)的實作價
+                    reg_net = db[r][1] 
+                    base_net_price_sum += reg_net
+                    # 算出該區域的單檔成本
+                    unit_net_sum += (reg_net / std_spots_ref) * factor
+                  
+                if unit_net_sum == 0: continue
+                  
+                # 計算檔次 (Spots)
+                spots_init_raw = s_budget / unit_net_sum
+                spots_init = math.ceil(spots_init_raw)
+                  
+                is_under_target = spots_init < std_spots_ref
+                calc_penalty = 1.1 if is_under_target else 1.0 
+                  
+                if cfg["is_national"]:
+                    row_display_penalty = 1.0
+                    total_display_penalty = 1.1 if is_under_target else 1.0
+                else:
+                    row_display_penalty = 1.1 if is_under_target else 1.0
+                    total_display_penalty = 1.0 
+                  
+                # 最終檔次計算
+                spots_final_raw = s_budget / (unit_net_sum * calc_penalty)
+                spots_final = math.ceil(spots_final_raw)
+                  
+                if spots_final % 2 != 0: spots_final += 1
+                if spots_final == 0: spots_final = 2
+                  
+                # --- [新增] 記錄運算邏輯 ---
+                logs.append({
+                    "media": m,
+                    "region": "全省聯播" if cfg["is_national"] else "/".join(cfg["regions"]),
+                    "seconds": sec,
+                    "budget": s_budget,
+                    "base_net_price": base_net_price_sum, # 總實作價
+                    "std_spots": std_spots_ref,            # 標準檔次
+                    "factor": factor,                      # 秒數係數
+                    "unit_cost_actual": unit_net_sum,      # 加成後的單檔成本
+                    "spots_init_raw": spots_init_raw,
+                    "is_under_target": is_under_target,
+                    "spots_final_raw_penalty": spots_final_raw,
+                    "spots": spots_final,
+                    "note": "若選全省聯播，實作價為全省定價；若選區域，則為各區實作價加總。"
+                })
+                # -------------------------
+
+                # 計算每日分配
+                sch = pooled_schedule(sch_pool, spots_final, days_count)
+                  
+                # 計算全省打包價與單一區域價
+                nat_pkg_display = 0
+                if cfg["is_national"]:
+                    nat_list = db["全省"][0]
+                    nat_unit_price = int((nat_list / db["Std_Spots"]) * factor * total_display_penalty)
+                    nat_pkg_display = nat_unit_price * spots_final
+                    total_list_accum += nat_pkg_display
+                  
+                for i, r in enumerate(display_regs):
+                    list_price_region = db[r][0]
+                    unit_rate_display = int((list_price_region / db["Std_Spots"]) * factor * row_display_penalty)
+                    total_rate_display = unit_rate_display * spots_final
+                    row_pkg_display = total_rate_display
+                    if not cfg["is_national"]: total_list_accum += row_pkg_display
+                      
+                    rows.append({
+                        "media": m, "region": r, "program_num": store_counts_num.get(f"新鮮視_{r}" if m=="新鮮視" else r, 0),
+                        "daypart": db["Day_Part"], "seconds": sec, "spots": spots_final, "schedule": sch,
+                        "rate_display": total_rate_display, "pkg_display": row_pkg_display,
+                        "is_pkg_member": cfg["is_national"], "nat_pkg_display": nat_pkg_display
+                    })
+              
+            # --- 邏輯 B: 家樂福 ---
+            elif m == "家樂福":
+                db = pricing_db["家樂福"]
+                base_std = db["量販_全省"]["Std_Spots"]
+                base_net_price = db["量販_全省"]["Net"]
+                  
+                # 核心運算
+                unit_net = (base_net_price / base_std) * factor
+                  
+                spots_init_raw = s_budget / unit_net
+                spots_init = math.ceil(spots_init_raw)
+                  
+                is_under_target = spots_init < base_std
+                penalty = 1.1 if is_under_target else 1.0
+                  
+                spots_final_raw = s_budget / (unit_net * penalty)
+                spots_final = math.ceil(spots_final_raw)
+                  
+                if spots_final % 2 != 0: spots_final += 1
+                  
+                # --- [新增] 記錄運算邏輯 ---
+                logs.append({
+                    "media": m,
+                    "region": "全省量販+超市",
+                    "seconds": sec,
+                    "budget": s_budget,
+                    "base_net_price": base_net_price,
+                    "std_spots": base_std,
+                    "factor": factor,
+                    "unit_cost_actual": unit_net,
+                    "spots_init_raw": spots_init_raw,
+                    "is_under_target": is_under_target,
+                    "spots_final_raw_penalty": spots_final_raw,
+                    "spots": spots_final,
+                    "note": f"超市檔次會依照比例自動計算 (量販:{spots_final})"
+                })
+                # -------------------------
+
+                sch_h = pooled_schedule(sch_pool, spots_final, days_count)
+                base_list = db["量販_全省"]["List"]
+                unit_rate_h = int((base_list / base_std) * factor * penalty)
+                total_rate_h = unit_rate_h * spots_final
+                total_list_accum += total_rate_h
+                  
+                rows.append({
+                    "media": m, "region": "全省量販", "program_num": store_counts_num["家樂福_量販"],
+                    "daypart": db["量販_全省"]["Day_Part"], "seconds": sec, "spots": spots_final, "schedule": sch_h,
+                    "rate_display": total_rate_h, "pkg_display": total_rate_h, "is_pkg_member": False
+                })
+                  
+                # 家樂福超市的檔次是依照量販比例計算
+                spots_s = int(spots_final * (db["超市_全省"]["Std_Spots"] / base_std))
+                sch_s = pooled_schedule(sch_pool, spots_s, days_count)
+                rows.append({
+                    "media": m, "region": "全省超市", "program_num": store_counts_num["家樂福_超市"],
+                    "daypart": db["超市_全省"]["Day_Part"], "seconds": sec, "spots": spots_s, "schedule": sch_s,
+                    "rate_display": "計量販", "pkg_display": "計量販", "is_pkg_member": False
+                })
+                  
+    return rows, total_list_accum, logs
+
+# --- 批次報價引擎 (向量化版 calculate_plan_data) ---
+PRICING_MEDIA = ["全家廣播", "新鮮視", "家樂福"]
+
+def calculate_schedule_matrix(total_spots, days):
+    """calculate_schedule 的向量版：每個檔次數產生一列每日分配 (shape: n × days)。"""
+    spots = np.asarray(total_spots, dtype=np.int64)
+    if days <= 0: return np.zeros((spots.size, 0), dtype=np.int64)
+    half = (spots + spots % 2) // 2
+    base, rem = np.divmod(half, days)
+    return (base[:, None] + (np.arange(days)[None, :] < rem[:, None])) * 2
+
+class PlanMatrix:
+    """
+    方案排程的陣列表示 (rows 仍為 calculate_plan_data 輸出的 dict 列表)。
+    內容相同的每日分配只存一份 (schedules: 唯一排程數 × days, int64)，各列以 row_index 指向其排程；
+    列合計 / 每日合計 / 總檔次在建立時一次算好，渲染時不必再逐日逐列加總。
+    排程短於 days 的部分補 0、超過的部分截掉 (與各渲染器只輸出走期內欄位一致)。
+    """
+    def __init__(self, rows, days):
+        self.rows, self.days = rows, days
+        by_id, by_content, unique, index = {}, {}, [], []
+        for r in rows:
+            sch = r["schedule"]
+            k = by_id.get(id(sch))
+            if k is None:
+                key = tuple(sch[:days])
+                k = by_content.get(key)
+                if k is None: k = by_content[key] = len(unique); unique.append(key)
+                by_id[id(sch)] = k
+            index.append(k)
+        self.schedules = np.zeros((len(unique), days), dtype=np.int64)
+        for k, sch in enumerate(unique): self.schedules[k, :len(sch)] = sch
+        self.row_index = np.asarray(index, dtype=np.intp)
+        self.row_totals = self.schedules.sum(axis=1)[self.row_index]
+        self.day_totals = np.bincount(self.row_index, minlength=len(unique)) @ self.schedules   # 每個唯一排程 × 使用的列數
+        self.grand_total = int(self.day_totals.sum())
+
+    @property
+    def matrix(self):
+        """列數 × days 的完整矩陣 (依 row_index 展開，會複製)。"""
+        return self.schedules[self.row_index]
+
+    def period_sums(self, spans):
+        """依 [(開始, 結束), ...] 區段加總：回傳 (唯一排程 × 區段數, 各區段合計)。"""
+        cum = np.zeros((self.schedules.shape[0], self.days + 1), dtype=np.int64)
+        np.cumsum(self.schedules, axis=1, out=cum[:, 1:])
+        lo, hi = np.asarray(spans, dtype=np.intp).reshape(-1, 2).T
+        day_cum = np.concatenate(([0], np.cumsum(self.day_totals)))
+        return cum[:, hi] - cum[:, lo], day_cum[hi] - day_cum[lo]
+
+class PlanSummary:
+    """
+    各格式渲染 (Excel / 列印 HTML) 共用的彙總：依媒體分組並依秒數排序的列、秒數與媒體清單、
+    每日合計 / 總檔次 (PlanMatrix)、定價合計與店數合計。同一方案一次輸出多種格式時只建立一次。
+    """
+    def __init__(self, rows, days):
+        self.rows, self.days = rows, days
+        self.plan = PlanMatrix(rows, days)
+        self.groups = [(m, sorted([r for r in rows if r["media"] == m], key=lambda x: x["seconds"])) for m in PRICING_MEDIA]
+        self.unique_secs = sorted(set([r["seconds"] for r in rows]))
+        self.media = sorted(set([r["media"] for r in rows]))
+        self.day_totals = self.plan.day_totals.tolist()
+        self.grand_total = self.plan.grand_total
+        grouped = [r for _, data in self.groups for r in data]
+        self.rate_sum = sum([r["rate_display"] for r in grouped if isinstance(r["rate_display"], (int, float))])
+        self.store_count = sum([int(r.get("program_num", 0)) for r in grouped])
+
+class PricingEngine:
+    """
+    批次報價引擎。
+    將 pricing_db / sec_factors 預先整理成價格矩陣 (媒體 × 區域 × [定價, 實作價]) 與秒數係數表，
+    以 NumPy 一次計算大量預算組合，用於 what-if 試算。
+    運算順序與 calculate_plan_data 逐步相同 (含 1.1 懲罰、偶數進位、顯示單價取整)，結果完全一致。
+    """
+    def __init__(self, pricing_db, sec_factors, store_counts_num, regions_order):
+        self.pricing_db = pricing_db
+        self.sec_factors = sec_factors
+        self.store_counts_num = store_counts_num
+        self.regions_order = list(regions_order)
+        self.regions = ["全省"] + self.regions_order
+        self.region_idx = {r: i for i, r in enumerate(self.regions)}
+
+        # 價格矩陣：缺少的區域為 NaN，使用時會丟 KeyError (與原函式查表失敗一致)
+        self.price_matrix = np.full((2, len(self.regions), 2), np.nan)
+        self.std_spots = np.zeros(2)
+        for m_idx, m in enumerate(PRICING_MEDIA[:2]):
+            db = pricing_db.get(m)
+            if not db: continue
+            self.std_spots[m_idx] = db["Std_Spots"]
+            for r, r_idx in self.region_idx.items():
+                if r in db: self.price_matrix[m_idx, r_idx] = db[r]
+
+        self.duration_idx = {s: i for i, s in enumerate(DURATIONS)}
+        self.factor_table = np.array([[get_sec_factor(m, s, sec_factors) for s in DURATIONS] for m in PRICING_MEDIA])
+
+    def factor(self, media, seconds):
+        if seconds in self.duration_idx: return float(self.factor_table[PRICING_MEDIA.index(media), self.duration_idx[seconds]])
+        return get_sec_factor(media, seconds, self.sec_factors)
+
+    def _price(self, m_idx, region, col):
+        val = self.price_matrix[m_idx, self.region_idx[region], col] if region in self.region_idx else np.nan
+        if np.isnan(val): raise KeyError(region)
+        return int(val)
+
+    def price_segments(self, media, seconds, is_national, regions, budgets):
+        """
+        計算單一 (媒體, 秒數, 區域設定) 在多組預算下的結果。
+        budgets 為一維陣列 (各組合分配到這個秒數的預算)；回傳 dict，陣列欄位與 budgets 等長。
+        預算 <= 0 的組合在 "active" 為 False (原函式會略過該段)。
+        """
+        budgets = np.asarray(budgets, dtype=np.float64)
+        factor = self.factor(media, seconds)
+        active = budgets > 0
+
+        if media in ("全家廣播", "新鮮視"):
+            m_idx = PRICING_MEDIA.index(media)
+            std = int(self.std_spots[m_idx])
+            calc_regs = ["全省"] if is_national else regions
+            display_regs = self.regions_order if is_national else regions
+            unit_net_sum = 0; base_net_price_sum = 0
+            for r in calc_regs:
+                reg_net = self._price(m_idx, r, 1)
+                base_net_price_sum += reg_net
+                unit_net_sum += (reg_net / std) * factor
+            if unit_net_sum == 0: active = np.zeros_like(active)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                spots_init_raw = budgets / unit_net_sum
+                is_under = np.ceil(spots_init_raw) < std
+                calc_penalty = np.where(is_under, 1.1, 1.0)
+                spots_final_raw = budgets / (unit_net_sum * calc_penalty)
+                spots = np.nan_to_num(np.ceil(spots_final_raw)).astype(np.int64)
+            spots += spots % 2
+            spots[spots == 0] = 2
+            row_penalty = np.ones_like(calc_penalty) if is_national else calc_penalty
+            total_penalty = calc_penalty if is_national else np.ones_like(calc_penalty)
+            row_rates = [np.trunc((self._price(m_idx, r, 0) / std) * factor * row_penalty).astype(np.int64) * spots for r in display_regs]
+            nat_pkg = np.zeros_like(spots)
+            if is_national:
+                nat_pkg = np.trunc((self._price(m_idx, "全省", 0) / std) * factor * total_penalty).astype(np.int64) * spots
+                list_total = nat_pkg
+            else:
+                list_total = np.sum(row_rates, axis=0) if row_rates else np.zeros_like(spots)
+            return {"media": media, "seconds": seconds, "is_national": is_national, "factor": factor, "std_spots": std,
+                    "base_net_price": base_net_price_sum, "unit_cost": unit_net_sum, "display_regions": list(display_regs),
+                    "active": active, "budget": budgets, "spots_init_raw": spots_init_raw, "is_under_target": is_under,
+                    "spots_final_raw": spots_final_raw, "spots": spots, "row_rates": row_rates, "nat_pkg": nat_pkg,
+                    "row_spots": [spots] * len(display_regs), "list_total": np.where(active, list_total, 0)}
+
+        db = self.pricing_db["家樂福"]
+        base_std = db["量販_全省"]["Std_Spots"]
+        base_net_price = db["量販_全省"]["Net"]
+        unit_net = (base_net_price / base_std) * factor
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spots_init_raw = budgets / unit_net
+            is_under = np.ceil(spots_init_raw) < base_std
+            penalty = np.where(is_under, 1.1, 1.0)
+            spots_final_raw = budgets / (unit_net * penalty)
+            spots = np.nan_to_num(np.ceil(spots_final_raw)).astype(np.int64)
+        spots += spots % 2
+        rate_h = np.trunc((db["量販_全省"]["List"] / base_std) * factor * penalty).astype(np.int64) * spots
+        spots_s = np.trunc(spots * (db["超市_全省"]["Std_Spots"] / base_std)).astype(np.int64)
+        return {"media": media, "seconds": seconds, "is_national": False, "factor": factor, "std_spots": base_std,
+                "base_net_price": base_net_price, "unit_cost": unit_net, "display_regions": ["全省量販", "全省超市"],
+                "active": active, "budget": budgets, "spots_init_raw": spots_init_raw, "is_under_target": is_under,
+                "spots_final_raw": spots_final_raw, "spots": spots, "row_rates": [rate_h, None], "nat_pkg": np.zeros_like(spots),
+                "row_spots": [spots, spots_s], "list_total": np.where(active, rate_h, 0)}
+
+    @staticmethod
+    def segment_totals(seg, days_count):
+        """段落的 (總檔次, 定價合計, 是否觸發懲罰) 三個陣列；未啟用的組合皆為 0。"""
+        act = seg["active"]
+        spots = np.zeros(act.size, dtype=np.int64)
+        for sp in seg["row_spots"]:
+            # 每日分配會把奇數檔次補成偶數 (calculate_schedule)
+            row_total = (sp + sp % 2) if days_count > 0 else np.zeros_like(sp)
+            spots += np.where(act, row_total, 0)
+        return spots, seg["list_total"], (act & seg["is_under_target"]).astype(np.int64)
+
+    def region_stores(self, media, is_national, regions):
+        """方案涵蓋的店數 (新鮮視為面數)，與明細列的 program_num 加總相同。"""
+        if media == "家樂福":
+            return parse_count_to_int(self.store_counts_num.get("家樂福_量販")) + parse_count_to_int(self.store_counts_num.get("家樂福_超市"))
+        display_regs = self.regions_order if is_national else regions
+        return sum([parse_count_to_int(self.store_counts_num.get(f"新鮮視_{r}" if media == "新鮮視" else r, 0)) for r in display_regs])
+
+    def iter_segments(self, config, total_budgets):
+        """依 config 展開每個 (媒體, 秒數) 段落，total_budgets 可為多組總預算。"""
+        total_budgets = np.atleast_1d(np.asarray(total_budgets, dtype=np.float64))
+        for m, cfg in config.items():
+            m_budget_total = total_budgets * (cfg["share"] / 100.0)
+            for sec, sec_pct in cfg["sec_shares"].items():
+                s_budget = m_budget_total * (sec_pct / 100.0)
+                yield m, cfg, self.price_segments(m, sec, cfg.get("is_national", False), cfg["regions"], s_budget)
+
+    def evaluate(self, config, total_budgets, days_count):
+        """
+        多組總預算下的方案摘要 (不產生明細列)，回傳 DataFrame：
+        total_budget / total_spots (全部列的檔次加總) / total_list (定價合計) / penalty_segments (觸發 1.1 懲罰的段落數)
+        """
+        total_budgets = np.atleast_1d(np.asarray(total_budgets, dtype=np.float64))
+        total_spots = np.zeros(total_budgets.size, dtype=np.int64)
+        total_list = np.zeros(total_budgets.size, dtype=np.int64)
+        penalties = np.zeros(total_budgets.size, dtype=np.int64)
+        for m, cfg, seg in self.iter_segments(config, total_budgets):
+            spots, lst, pen = self.segment_totals(seg, days_count)
+            total_spots += spots; total_list += lst; penalties += pen
+        import pandas as pd
+        return pd.DataFrame({"total_budget": total_budgets, "total_spots": total_spots, "total_list": total_list, "penalty_segments": penalties})
+
+    def calculate_plan(self, config, total_budget, days_count):
+        """與 calculate_plan_data 相同介面與輸出 (rows, total_list_accum, logs)。"""
+        rows, total_list_accum, logs, sch_pool = [], 0, [], {}
+        for m, cfg, seg in self.iter_segments(config, [total_budget]):
+            if not seg["active"][0]: continue
+            spots = int(seg["spots"][0])
+            if m in ("全家廣播", "新鮮視"): region_label = "全省聯播" if cfg["is_national"] else "/".join(cfg["regions"])
+            else: region_label = "全省量販+超市"
+            log = {"media": m, "region": region_label, "seconds": seg["seconds"], "budget": float(seg["budget"][0]), "base_net_price": seg["base_net_price"],
+                   "std_spots": seg["std_spots"], "factor": seg["factor"], "unit_cost_actual": seg["unit_cost"],
+                   "spots_init_raw": float(seg["spots_init_raw"][0]), "is_under_target": bool(seg["is_under_target"][0]),
+                   "spots_final_raw_penalty": float(seg["spots_final_raw"][0]), "spots": spots}
+            total_list_accum += int(seg["list_total"][0])
+            if m in ("全家廣播", "新鮮視"):
+                db = self.pricing_db[m]
+                log["note"] = "若選全省聯播，實作價為全省定價；若選區域，則為各區實作價加總。"
+                logs.append(log)
+                sch = pooled_schedule(sch_pool, spots, days_count)
+                nat_pkg_display = int(seg["nat_pkg"][0])
+                for r, rate in zip(seg["display_regions"], seg["row_rates"]):
+                    rate = int(rate[0])
+                    rows.append({
+                        "media": m, "region": r, "program_num": self.store_counts_num.get(f"新鮮視_{r}" if m == "新鮮視" else r, 0),
+                        "daypart": db["Day_Part"], "seconds": seg["seconds"], "spots": spots, "schedule": sch,
+                        "rate_display": rate, "pkg_display": rate,
+                        "is_pkg_member": cfg["is_national"], "nat_pkg_display": nat_pkg_display
+                    })
+            else:
+                db = self.pricing_db["家樂福"]
+                log["note"] = f"超市檔次會依照比例自動計算 (量販:{spots})"
+                logs.append(log)
+                rate_h = int(seg["row_rates"][0][0])
+                spots_s = int(seg["row_spots"][1][0])
+                rows.append({
+                    "media": m, "region": "全省量販", "program_num": self.store_counts_num["家樂福_量販"],
+                    "daypart": db["量販_全省"]["Day_Part"], "seconds": seg["seconds"], "spots": spots, "schedule": pooled_schedule(sch_pool, spots, days_count),
+                    "rate_display": rate_h, "pkg_display": rate_h, "is_pkg_member": False
+                })
+                rows.append({
+                    "media": m, "region": "全省超市", "program_num": self.store_counts_num["家樂福_超市"],
+                    "daypart": db["超市_全省"]["Day_Part"], "seconds": seg["seconds"], "spots": spots_s, "schedule": pooled_schedule(sch_pool, spots_s, days_count),
+                    "rate_display": "計量販", "pkg_display": "計量販", "is_pkg_member": False
+                })
+        return rows, total_list_accum, logs
+
+# --- 預算配比試算 (Scenario Sweep) ---
+SWEEP_OBJECTIVES = {
+    "max_spots": "總檔次最多",
+    "no_penalty": "避免未達標懲罰 (再比總檔次)",
+    "max_stores": "涵蓋店數最多 (再比總檔次)",
+}
+SWEEP_MAX_ROWS = 200000   # 組合數上限，超過時每個媒體只保留較佳的選項
+
+def _share_combos(n, step, total=100):
+    """n 個百分比 (以 step 為級距) 加總為 total 的所有組合。"""
+    if n == 1: return [(total,)]
+    return [(first,) + rest for first in range(0, total + 1, step) for rest in _share_combos(n - 1, step, total - first)]
+
+def sweep_scenarios(engine, config, total_budget, days_count, share_step=10, sec_step=25, region_options=None,
+                    objective="max_spots", min_spots=0, min_stores=0, top_n=10, max_rows=SWEEP_MAX_ROWS):
+    """
+    在不產生任何檔案的前提下，試算媒體佔比 / 秒數配比 / 區域的所有組合並排名。
+    運算語意與 calculate_plan_data 相同 (透過 PricingEngine)。
+    region_options: {媒體: [(is_national, regions), ...]}，未指定時沿用 config 的設定。
+    回傳 (DataFrame, 方案 config 列表, 試算組合總數)。
+    share_step / sec_step 須能整除 100 (佔比級距以索引展開，否則最後一個媒體的剩餘佔比會落在級距之間)。
+    """
+    for name, step in (("媒體佔比級距", share_step), ("秒數配比級距", sec_step)):
+        if not 0 < step <= 100 or 100 % step: raise ValueError(f"{name}須能整除 100: {step}")
+    medias = list(config.keys())
+    share_levels = np.arange(0, 101, share_step)
+    per_media = []
+    for m in medias:
+        cfg = config[m]
+        secs = sorted(cfg["sec_shares"].keys())
+        mixes = [dict(zip(secs, mix)) for mix in _share_combos(len(secs), sec_step)]
+        regs = (region_options or {}).get(m) or [(cfg.get("is_national", False), cfg["regions"])]
+        m_budgets = total_budget * (share_levels / 100.0)
+        opts, metrics = [], []
+        for is_nat, regions in regs:
+            stores = engine.region_stores(m, is_nat, regions)
+            for mix in mixes:
+                spots = np.zeros(share_levels.size, dtype=np.int64); lst = np.zeros_like(spots); pen = np.zeros_like(spots)
+                any_active = np.zeros(share_levels.size, dtype=bool)
+                for sec, pct in mix.items():
+                    seg = engine.price_segments(m, sec, is_nat, regions, m_budgets * (pct / 100.0))
+                    sp, ls, pn = engine.segment_totals(seg, days_count)
+                    spots += sp; lst += ls; pen += pn; any_active |= seg["active"]
+                opts.append({"sec_shares": mix, "is_national": is_nat, "regions": list(regions)})
+                metrics.append(np.stack([spots, pen, lst, np.where(any_active, stores, 0)]))
+        per_media.append((opts, np.array(metrics)))   # metrics: (選項數, 4 指標, 佔比級距數)
+
+    combos = np.array([c for c in _share_combos(len(medias), share_step)]) // share_step   # 佔比級距索引
+    # 組合過多時，每個媒體依最佳表現只保留前 k 個選項
+    k_keep = max(1, int((max_rows / max(1, len(combos))) ** (1.0 / len(medias))))
+    for j, (opts, mets) in enumerate(per_media):
+        if len(opts) > k_keep:
+            best = mets[:, 0, :].max(axis=1) if objective == "max_spots" else (mets[:, 3, :].max(axis=1) if objective == "max_stores" else -mets[:, 1, :].min(axis=1))
+            keep = np.argsort(-best, kind="stable")[:k_keep]
+            per_media[j] = ([opts[i] for i in keep], mets[keep])
+
+    # 以 broadcasting 展開 (佔比組合 × 各媒體選項) 並加總指標
+    shape = [len(combos)] + [len(opts) for opts, _ in per_media] + [4]
+    total = np.zeros(shape, dtype=np.int64)
+    for j, (opts, mets) in enumerate(per_media):
+        arr = np.moveaxis(mets[:, :, combos[:, j]], 2, 0)            # (佔比組合, 選項, 指標)
+        view = [len(combos)] + [1] * len(medias) + [4]
+        view[j + 1] = len(opts)
+        total = total + arr.reshape(view)
+    flat = total.reshape(-1, 4)
+    spots, pen, lst, stores = flat[:, 0], flat[:, 1], flat[:, 2], flat[:, 3]
+    meets = (spots >= min_spots) & (stores >= min_stores)
+    if objective == "no_penalty": order = np.lexsort((-spots, pen, ~meets))
+    elif objective == "max_stores": order = np.lexsort((-spots, -stores, ~meets))
+    else: order = np.lexsort((pen, -spots, ~meets))
+
+    records, scenarios = [], []
+    for rank, idx in enumerate(order[:top_n], start=1):
+        pos = np.unravel_index(idx, shape[:-1])
+        scenario = {}
+        for j, m in enumerate(medias):
+            opt = per_media[j][0][pos[j + 1]]
+            scenario[m] = {"is_national": opt["is_national"], "regions": opt["regions"], "sec_shares": opt["sec_shares"],
+                           "share": int(combos[pos[0], j] * share_step)}
+            if m == "家樂福": scenario[m].pop("is_national")
+        scenarios.append(scenario)
+        records.append({
+            "排名": rank,
+            "媒體佔比": " / ".join([f"{m} {c['share']}%" for m, c in scenario.items()]),
+            "秒數配比": " / ".join([f"{m}: " + ", ".join([f"{s}秒{p}%" for s, p in c["sec_shares"].items()]) for m, c in scenario.items() if c["share"] > 0]),
+            "區域": " / ".join([f"{m}: " + ("全省聯播" if c.get("is_national") else "/".join(c["regions"])) for m, c in scenario.items() if c["share"] > 0]),
+            "總檔次": int(spots[idx]), "懲罰段落數": int(pen[idx]), "定價合計": int(lst[idx]), "涵蓋店數": int(stores[idx]),
+            "達成目標": bool(meets[idx]),
+        })
+    import pandas as pd
+    return pd.DataFrame(records), scenarios, int(flat.shape[0])
@@ -0,0 +1,109 @@
+"""
+Ragic API 整合：以 multipart 表單上傳 Cue 表資料與檔案，以及讀取既有紀錄 (跨訂單彙總用)。
+"""
+import requests
+
+from .httpclient import HTTP_SAFE_RETRY_STATUS, get_http_client, is_connect_error
+from .metrics import traced
+from .settings import RAGIC_API_KEY
+
+RAGIC_UNKNOWN_STATUS = {500, 502, 504}   # Ragic 可能已寫入紀錄後才回錯誤，不可自動重送
+RAGIC_PAGE_SIZE = 1000
+
+_API_KEYS = {}   # 表單網址 -> 本程序中主管設定的 API Key (只存在記憶體，不寫入工作佇列)
+
+def set_ragic_api_key(api_url, api_key):
+    _API_KEYS[api_url] = api_key
+
+def ragic_api_key(api_url):
+    """上傳時才取得 API Key：本程序設定過的優先，否則為設定值 (環境變數 CUE_RAGIC_KEY)。"""
+    return _API_KEYS.get(api_url) or RAGIC_API_KEY
+
+# Ragic 欄位對照表 (請勿隨意修改 ID)
+RAGIC_FIELDS = {
+    'client':     '1000080',  # 客戶名稱
+    'product':    '1000081',  # 產品名稱
+    'budget_raw': '1000082',  # 總預算 (未稅 Net)
+    'budget_fin': '1000083',  # 最終成交價 (主管覆寫後)
+    'prod_cost':  '1000084',  # 製作費
+    'format':     '1000078',  # 報表格式 (Dongwu/Shenghuo/Bolin)
+    'sales':      '1000079',  # 業務名稱
+    'date_start': '1000085',  # 開始日
+    'date_end':   '1000086',  # 結束日
+    'date_sign':  '1000087',  # 回簽截止日
+    'bill_month': '1000089',  # 請款月份
+    'date_pay':   '1000088',  # 付款兌現日
+    'details':    '1000090',  # 詳細投放設定摘要
+    'file_xls':   '1000091',  # Excel 檔案上傳欄位
+    'file_pdf':   '1000092'   # PDF 檔案上傳欄位
+}
+
+@traced("ragic_upload")
+def post_to_ragic(api_url, api_key, data_dict, files_dict=None):
+    """
+    上傳一筆資料到 Ragic，回傳 (成功與否, 訊息, 是否可重試)。
+    只有在確定 Ragic 沒有收到資料時 (連線階段失敗、回 429 / 503) 才標記為可重試，避免重複建立紀錄；
+    500 / 502 / 504 與讀取中斷時無法確定是否已寫入，回報失敗並請使用者先到 Ragic 確認。
+    """
+    if not api_url or not api_key:
+        return False, "API URL 或 API Key 未設定", False
+    base_url = api_url.split("?")[0]
+    headers = {"Authorization": f"Basic {api_key}"}
+    payload = dict(data_dict)
+    payload["api"] = ""   
+    payload["v"] = "3"    
+    try:
+        resp = get_http_client().post(
+            "ragic", base_url, headers=headers, data=payload, files=files_dict
+        )
+        try:
+            j = resp.json()
+        except:
+            j = None
+        if resp.status_code in RAGIC_UNKNOWN_STATUS:
+            return False, f"HTTP {resp.status_code}: Ragic 可能已建立紀錄，請先到 Ragic 確認後再重新上傳 ({resp.text[:200]})", False
+        if resp.status_code != 200:
+            return False, f"HTTP {resp.status_code}: {resp.text[:200]}", resp.status_code in HTTP_SAFE_RETRY_STATUS
+        if not j:
+            return False, f"Ragic 回傳非 JSON 格式: {resp.text[:200]}", False
+        if j.get("status") == "SUCCESS":
+            return True, f"✅ 上傳成功! Ragic ID: {j.get('ragicId')}", False
+        return False, f"❌ Ragic 錯誤 (Code: {j.get('code')}): {j.get('msg')}", False
+    except requests.exceptions.ConnectionError as e:
+        if is_connect_error(e): return False, f"❌ 連線異常: {str(e)}", True
+        return False, f"❌ 連線中斷，Ragic 可能已建立紀錄，請先到 Ragic 確認後再重新上傳: {str(e)}", False
+    except Exception as e:
+        return False, f"❌ 連線異常: {str(e)}", False
+
+def upload_to_ragic(api_url, api_key, data_dict, files_dict=None):
+    success, msg, _ = post_to_ragic(api_url, api_key, data_dict, files_dict)
+    return success, msg
+
+def fetch_ragic_records(api_url, api_key, start=None, end=None, page_size=RAGIC_PAGE_SIZE):
+    """
+    讀取 Ragic 表單紀錄 (欄位以 RAGIC_FIELDS 的 ID 為 key，另含 _ragicId)，回傳 (紀錄列表, 錯誤訊息)。
+    指定 start / end 時只取走期與該區間重疊的紀錄；每次取 page_size 筆直到取完。
+    """
+    if not api_url or not api_key:
+        return None, "API URL 或 API Key 未設定"
+    base_url = api_url.split("?")[0]
+    headers = {"Authorization": f"Basic {api_key}"}
+    params = [("api", ""), ("v", "3"), ("naming", "EID")]
+    if end: params.append(("where", f"{RAGIC_FIELDS['date_start']},lte,{end:%Y/%m/%d}"))
+    if start: params.append(("where", f"{RAGIC_FIELDS['date_end']},gte,{start:%Y/%m/%d}"))
+    records, offset = [], 0
+    try:
+        while True:
+            resp = get_http_client().get("ragic", base_url, headers=headers, params=params + [("limit", f"{offset},{page_size}")])
+            if resp.status_code != 200:
+                return None, f"HTTP {resp.status_code}: {resp.text[:200]}"
+            page = resp.json()
+            if not isinstance(page, dict):
+                return None, f"Ragic 回傳格式錯誤: {resp.text[:200]}"
+            records += [dict(rec, _ragicId=rec.get("_ragicId", rid)) for rid, rec in page.items() if isinstance(rec, dict)]
+            if len(page) < page_size: return records, None
+            offset += page_size
+    except ValueError:
+        return None, f"Ragic 回傳非 JSON 格式: {resp.text[:200]}"
+    except requests.exceptions.RequestException as e:
+        return None, f"❌ 連線異常: {str(e)}"
@@ -0,0 +1,260 @@
+"""
+REST / JSON 服務 (標準函式庫 http.server，不依賴 Streamlit)：python -m cuesheet serve
+
+    GET  /health                 服務與設定檔狀態
+    GET  /metrics                各端點延遲分佈 (histogram) 與處理中請求數；?format=prometheus 時輸出文字格式 (含各步驟 span)
+    POST /v1/plan                計算排程，回傳 rows / total_list / logs / totals
+    POST /v1/render/html|xlsx|pdf  直接回傳檔案內容 (以 plan_key 作為 ETag)；html 可指定 granularity = day / week / month
+
+請求內容為 JSON，欄位與批次訂單表相同 (見 batch.BATCH_COLUMNS)；
+media 可為批次的文字格式，或與頁面 config 相同結構的物件：
+    {"client": "客戶", "product": "產品", "budget": 1000000, "start": "2026-01-01", "end": "2026-01-31",
+     "media": {"全家廣播": {"is_national": true, "regions": ["全省"], "sec_shares": {"20": 100}, "share": 100}}}
+
+請求由固定大小的執行緒池處理 (API_WORKERS)，處理中 + 排隊超過 API_QUEUE_LIMIT 時回 503；
+keep-alive 連線閒置超過 API_KEEPALIVE_TIMEOUT 秒即關閉，不會長期佔住工作執行緒。
+"""
+import hmac
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import quote, urlsplit
+
+from .html_preview import PREVIEW_GRANULARITIES
+from .metrics import LatencyHistogram, prometheus_histogram, prometheus_text
+from .settings import (API_HOST, API_KEEPALIVE_TIMEOUT, API_LATENCY_BUCKETS_MS, API_MAX_BODY, API_PORT, API_QUEUE_LIMIT, API_TOKEN, API_WORKERS,
+                       GSHEET_SHARE_URL, PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE)
+
+RENDER_TYPES = {
+    "html": ("text/html; charset=utf-8", "html"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "pdf": ("application/pdf", "pdf"),
+}
+STREAM_CHUNK = 64 * 1024
+
+# ==========================================
+# 請求處理
+# ==========================================
+def _json_default(obj):
+    if hasattr(obj, "item"): return obj.item()            # numpy 純量
+    if isinstance(obj, (date, datetime)): return obj.isoformat()
+    return str(obj)
+
+def _load_cfg():
+    from .config import get_config_store
+    cfg, err = get_config_store(GSHEET_SHARE_URL).get()
+    if cfg is None: raise ConnectionError(f"設定檔載入失敗: {err}")
+    return cfg
+
+def _plan_request(body):
+    """JSON 請求 → (訂單, rows, 定價合計, logs, 渲染參數, plan_key)。"""
+    from .batch import BATCH_COLUMNS, build_batch_order, plan_order
+    from .cache import plan_fingerprint
+    if not isinstance(body, dict): raise ValueError("請求內容需為 JSON 物件")
+    if "config" in body and "media" not in body: body = dict(body, media=body["config"])   # 與頁面 config 同名亦可
+    raw = {k: (v if k == "media" and isinstance(v, dict) else str(v)) for k, v in body.items() if k in BATCH_COLUMNS and v is not None}
+    raw.setdefault("client", "客戶"); raw.setdefault("product", "產品"); raw.setdefault("format", "東吳")
+    order = build_batch_order(raw)
+    rows, total_list, logs, render_args = plan_order(order, _load_cfg())
+    return order, rows, total_list, logs, render_args, plan_fingerprint(*render_args)
+
+def render_etag(plan_key, kind, granularity="day", engine=PDF_ENGINE_NATIVE):
+    """檔案的 ETag：plan_key 加上檔案種類、非逐日的預覽粒度與 PDF 引擎 (不同引擎的 PDF 內容不同)。"""
+    if kind == "html" and granularity != "day": variant = f"html-{granularity}"
+    elif kind == "pdf": variant = f"pdf-{engine}"
+    else: variant = kind
+    return f'"{plan_key}-{variant}"'
+
+class CueSheetHandler(BaseHTTPRequestHandler):
+    server_version = "cue-sheet"
+    protocol_version = "HTTP/1.1"
+    timeout = API_KEEPALIVE_TIMEOUT   # keep-alive 連線閒置超過此秒數即關閉，釋放執行緒池的工作執行緒
+
+    # --- 路由 ---
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health": self._timed("GET /health", self._health)
+        elif path == "/metrics": self._timed("GET /metrics", self._metrics)
+        else: self._send_error(404, f"找不到路徑: {path}")
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path == "/v1/plan": self._timed("POST /v1/plan", self._plan)
+        elif path.startswith("/v1/render/") and path.rsplit("/", 1)[-1] in RENDER_TYPES:
+            kind = path.rsplit("/", 1)[-1]
+            self._timed(f"POST /v1/render/{kind}", lambda: self._render(kind))
+        else: self._send_error(404, f"找不到路徑: {path}")
+
+    def _timed(self, endpoint, fn):
+        t0 = time.perf_counter()
+        self._status = 500
+        try:
+            if not self._authorized(): self._send_error(401, "未授權")
+            else: fn()
+        except (ValueError, KeyError) as e: self._send_error(400, str(e))
+        except ConnectionError as e: self._send_error(503, str(e))
+        except Exception as e:
+            self.log_error("%s 失敗: %r", endpoint, e)
+            self._send_error(500, f"{type(e).__name__}: {e}")
+        finally: self.server.observe(endpoint, (time.perf_counter() - t0) * 1000, self._status >= 400)
+
+    def _authorized(self):
+        if not API_TOKEN: return True
+        return hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {API_TOKEN}")
+
+    # --- 端點 ---
+    def _health(self):
+        from .config import get_config_store
+        store = get_config_store(GSHEET_SHARE_URL)
+        cfg = store.config
+        self._send_json(200, {"status": "ok", "config_loaded": cfg is not None, "config_source": cfg.source if cfg else None,
+                              "config_fetched_at": cfg.fetched_at if cfg else None, "config_error": store.last_error or None})
+
+    def _metrics(self):
+        if "format=prometheus" not in urlsplit(self.path).query: return self._send_json(200, self.server.metrics())
+        data = (self.server.prometheus_text() + prometheus_text()).encode("utf-8")
+        self._status = 200
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _plan(self):
+        from .batch import order_totals
+        order, rows, total_list, logs, _, plan_key = _plan_request(self._read_json())
+        self._send_json(200, {"plan_key": plan_key, "rows": rows, "total_list": total_list, "logs": logs, "totals": order_totals(order, rows)})
+
+    def _render(self, kind):
+        from .batch import order_preview_html
+        from .cache import cached_excel, cached_pdf, get_artifact_cache, pdf_produced_by
+        from .helpers import safe_filename
+        body = self._read_json()
+        engine = body.get("pdf_engine", PDF_ENGINE_NATIVE) if isinstance(body, dict) else PDF_ENGINE_NATIVE
+        if engine not in (PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE): raise ValueError(f"未知的 PDF 引擎: {engine}")
+        order, rows, total_list, _, render_args, plan_key = _plan_request(body)
+        etag = render_etag(plan_key, kind, body.get("granularity", "day"), engine)
+        if self.headers.get("If-None-Match") == etag:
+            self._status = 304
+            self.send_response(304); self.send_header("ETag", etag); self.send_header("Content-Length", "0"); self.end_headers()
+            return
+        cache, extra = get_artifact_cache(), {}
+        if kind == "html":
+            granularity = body.get("granularity", "day")
+            if granularity not in PREVIEW_GRANULARITIES: raise ValueError(f"未知的預覽粒度: {granularity}")
+            data = order_preview_html(order, rows, total_list, render_args, granularity).encode("utf-8")
+        elif kind == "xlsx": data = cached_excel(cache, plan_key, *render_args)
+        else:
+            data, method, err = cached_pdf(cache, plan_key, engine, *render_args)
+            if not data: raise RuntimeError(f"PDF 生成失敗: {err}")
+            extra["X-Pdf-Method"] = method.encode("utf-8").decode("latin-1")
+            if pdf_produced_by(method) != engine: etag = None   # 原生引擎失敗改用 LibreOffice 的結果不給 ETag，引擎恢復後用戶端會取得原生版本
+        content_type, ext = RENDER_TYPES[kind]
+        filename = f"Cue_{safe_filename(order['client'])}_{safe_filename(order['product'])}.{ext}"
+        self._status = 200
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename, safe='')}")
+        if etag: self.send_header("ETag", etag)
+        for k, v in extra.items(): self.send_header(k, v)
+        self.end_headers()
+        view = memoryview(data)
+        for i in range(0, len(view), STREAM_CHUNK): self.wfile.write(view[i:i + STREAM_CHUNK])
+
+    # --- 輸入 / 輸出 ---
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > API_MAX_BODY: raise ValueError(f"請求內容超過上限 {API_MAX_BODY} bytes")
+        try: return json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e: raise ValueError(f"JSON 格式錯誤: {e}")
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self._status = status
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"error": message})
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet: super().log_message(fmt, *args)
+
+# ==========================================
+# 伺服器 (固定大小的工作執行緒池)
+# ==========================================
+class CueSheetHTTPServer(HTTPServer):
+    """
+    以 ThreadPoolExecutor 處理連線 (而非每個連線一條執行緒)，
+    處理中 + 排隊的連線超過 queue_limit 時直接回 503，避免請求堆積拖垮延遲。
+    """
+    daemon_threads = True
+
+    def __init__(self, address, workers=API_WORKERS, queue_limit=API_QUEUE_LIMIT, quiet=False):
+        super().__init__(address, CueSheetHandler)
+        self.workers, self.quiet = workers, quiet
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cue-api")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._histograms, self._hist_lock = {}, threading.Lock()
+        self._in_flight = 0; self.rejected = 0
+        self.started_at = time.time()
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            try: request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nRetry-After: 1\r\nConnection: close\r\n\r\n")
+            except OSError: pass
+            self.shutdown_request(request)
+            return
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        with self._hist_lock: self._in_flight += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._hist_lock: self._in_flight -= 1
+            self._slots.release()
+
+    def observe(self, endpoint, ms, error=False):
+        with self._hist_lock:
+            hist = self._histograms.get(endpoint)
+            if hist is None: hist = self._histograms[endpoint] = LatencyHistogram(API_LATENCY_BUCKETS_MS)
+        hist.observe(ms, error)
+
+    def metrics(self):
+        with self._hist_lock: hists, in_flight = dict(self._histograms), self._in_flight
+        return {"uptime_s": round(time.time() - self.started_at, 1), "workers": self.workers, "in_flight": in_flight,
+                "rejected": self.rejected, "endpoints": {k: h.snapshot() for k, h in sorted(hists.items())}}
+
+    def prometheus_text(self):
+        with self._hist_lock: hists = dict(self._histograms)
+        series = {(("method", k.split(" ", 1)[0]), ("path", k.split(" ", 1)[1])): h for k, h in hists.items()}
+        return prometheus_histogram("cue_api_request", "API 請求處理時間", series) + \
+            f"# TYPE cue_api_in_flight gauge\ncue_api_in_flight {self._in_flight}\n# TYPE cue_api_rejected_total counter\ncue_api_rejected_total {self.rejected}\n"
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def serve(host=API_HOST, port=API_PORT, workers=API_WORKERS, queue_limit=API_QUEUE_LIMIT):
+    """啟動服務直到 Ctrl+C；設定檔在啟動時先載入 (之後依 TTL 背景更新)。"""
+    try: _load_cfg()
+    except ConnectionError as e: print(f"⚠️ {e} (收到請求時會再重試)", file=sys.stderr)
+    httpd = CueSheetHTTPServer((host, port), workers, queue_limit)
+    print(f"cue-sheet API → http://{host}:{httpd.server_address[1]} (workers {workers}, queue {queue_limit})", flush=True)
+    try: httpd.serve_forever()
+    except KeyboardInterrupt: pass
+    finally: httpd.server_close()
+    return 0
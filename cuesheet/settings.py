@@ -0,0 +1,92 @@
+"""
+全域常數設定：外部服務網址、版面常數，以及可由環境變數調整的各項服務參數。
+"""
+import os
+import tempfile
+
+GSHEET_SHARE_URL = "https://docs.google.com/spreadsheets/d/1bzmG-N8XFsj8m3LUPqA8K70AcIqaK4Qhq1VPWcK0w_s/edit?usp=sharing"
+GSHEET_BASE_URL = "https://docs.google.com"
+CONFIG_SNAPSHOT_PATH = os.environ.get("CUE_CONFIG_SNAPSHOT", os.path.join(tempfile.gettempdir(), "cue_sheet_config.json"))
+CONFIG_REFRESH_TTL = 300        # 設定檔背景更新間隔秒數
+CONFIG_FETCH_TIMEOUT = 15
+RAGIC_API_URL = "https://ap15.ragic.com/liuskyo/cue/2"
+RAGIC_API_KEY = os.environ.get("CUE_RAGIC_KEY", "L04zZGhrVmtTV3pqN1VLbUpnOFZMa01NTHh3OUw3RUVlb0ovNXUrTXJsaGJhMWpKOUxHanFUODREMmN1dEZvcw==")
+BOLIN_LOGO_URL = "https://docs.google.com/drawings/d/17Uqgp-7LJJj9E4bV7Azo7TwXESPKTTIsmTbf-9tU9eE/export/png"
+
+FONT_MAIN = "微軟正黑體"
+BS_THIN = 'thin'
+BS_MEDIUM = 'medium'
+BS_HAIR = 'hair'
+FMT_MONEY = '"$"#,##0_);[Red]("$"#,##0)'
+FMT_NUMBER = '#,##0'
+
+REGIONS_ORDER = ["北區", "桃竹苗", "中區", "雲嘉南", "高屏", "東區"]
+CUE_FORMATS = ("東吳", "聲活", "鉑霖")   # 各公司的 Cue 表格式
+DURATIONS = [5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
+REGION_DISPLAY_MAP = {
+    "北區": "北區-北北基",
+    "桃竹苗": "桃區-桃竹苗",
+    "中區": "中區-中彰投",
+    "雲嘉南": "雲嘉南區-雲嘉南",
+    "高屏": "高屏區-高屏",
+    "東區": "東區-宜花東",
+    "全省量販": "全省量販",
+    "全省超市": "全省超市"
+}
+
+# PDF 轉檔服務 (LibreOffice 常駐程序池)
+SOFFICE_POOL_SIZE = int(os.environ.get("CUE_SOFFICE_POOL_SIZE", "2"))     # 常駐轉檔程序數量
+SOFFICE_QUEUE_LIMIT = int(os.environ.get("CUE_SOFFICE_QUEUE_LIMIT", "8")) # 最多排隊等待的轉檔工作
+SOFFICE_JOB_TIMEOUT = 60        # 單一轉檔工作逾時秒數
+SOFFICE_START_TIMEOUT = 45      # 常駐程序啟動逾時秒數
+SOFFICE_MAX_JOBS = 200          # 每個程序處理多少份後重啟 (避免記憶體累積)
+SOFFICE_HEALTH_INTERVAL = 30    # 閒置程序健康檢查間隔秒數
+
+# 產出檔案快取 (XLSX / PDF 落地於磁碟，重啟後仍可命中)
+ARTIFACT_CACHE_DIR = os.environ.get("CUE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cue_sheet_cache"))
+ARTIFACT_CACHE_MAX_MB = int(os.environ.get("CUE_CACHE_MAX_MB", "512"))
+ARTIFACT_CACHE_VERSION = "1"    # 運算邏輯有改動時遞增，讓舊檔全部失效 (Excel / 列印版面程式的改動由程式碼指紋自動反映)
+
+# --- PDF 引擎 ---
+PDF_ENGINE_NATIVE = "WeasyPrint"      # 原生渲染 (不經過 Excel)
+PDF_ENGINE_SOFFICE = "LibreOffice"   # Excel 經 LibreOffice 轉檔
+
+# --- 背景工作佇列設定 ---
+JOB_DB_PATH = os.environ.get("CUE_JOB_DB", os.path.join(tempfile.gettempdir(), "cue_sheet_jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("CUE_JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = 4            # 含第一次執行的最多嘗試次數
+JOB_BACKOFF_BASE = 2            # 重試等待秒數 = base * 2^(次數-1)
+JOB_BACKOFF_MAX = 60
+JOB_POLL_INTERVAL = 1.5         # 頁面輪詢工作進度的間隔秒數
+JOB_KEEP_DAYS = 7               # 已結束的工作紀錄保留天數
+JOB_LEASE_TTL = 60              # 執行中工作的租約秒數；持有的程序每 1/4 TTL 續約，過期視為程序已停止並重新排入佇列
+
+# --- 檔次庫存 (容量預約) 設定 ---
+INVENTORY_DB_PATH = os.environ.get("CUE_INVENTORY_DB", os.path.join(tempfile.gettempdir(), "cue_sheet_inventory.sqlite3"))
+INVENTORY_LOCK_TIMEOUT = 30     # 等待其他程序的預約交易 (SQLite 寫入鎖) 的秒數
+
+# --- 方案紀錄 (本機保存的 Cue 表輸入) 設定 ---
+PLAN_STORE_DB_PATH = os.environ.get("CUE_PLAN_STORE_DB", os.path.join(tempfile.gettempdir(), "cue_sheet_plans.sqlite3"))
+PLAN_SEARCH_LIMIT = 50          # 搜尋結果最多顯示筆數
+
+# --- 批次產生設定 ---
+BATCH_WORKERS = int(os.environ.get("CUE_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+BATCH_MAX_ORDERS = 500          # 單次批次最多訂單數
+
+# --- REST / JSON 服務設定 ---
+API_HOST = os.environ.get("CUE_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("CUE_API_PORT", "8600"))
+API_WORKERS = int(os.environ.get("CUE_API_WORKERS", "8"))           # 同時處理的請求數
+API_QUEUE_LIMIT = int(os.environ.get("CUE_API_QUEUE_LIMIT", "32"))  # 超過 (處理中 + 排隊) 時直接回 503
+API_MAX_BODY = 1024 * 1024      # 請求內容上限 (bytes)
+API_KEEPALIVE_TIMEOUT = 15       # 閒置的 keep-alive 連線最多佔用工作執行緒的秒數
+API_TOKEN = os.environ.get("CUE_API_TOKEN", "")                     # 有設定時需帶 Authorization: Bearer <token>
+API_LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# --- 效能量測 (span) 設定 ---
+METRICS_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+METRICS_LOG_PATH = os.environ.get("CUE_METRICS_LOG", "")            # 有設定時每個 span 寫一行 JSON (輪替)
+METRICS_LOG_MAX_MB = int(os.environ.get("CUE_METRICS_LOG_MAX_MB", "10"))
+METRICS_LOG_BACKUPS = 5
+METRICS_PROM_FILE = os.environ.get("CUE_METRICS_PROM_FILE", "")     # 有設定時定期寫出 Prometheus 文字檔
+METRICS_FLUSH_INTERVAL = 15     # Prometheus 文字檔最短寫出間隔秒數
@@ -0,0 +1,298 @@
+"""
+LibreOffice 轉檔：常駐 soffice 程序池 (UNO)，未安裝 python3-uno 時退回命令列轉檔 (每次轉檔冷啟動一次 soffice，明顯較慢)。
+"""
+import atexit
+import gc
+import os
+import pathlib
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from .cache import singleton
+from .metrics import traced
+from .settings import SOFFICE_HEALTH_INTERVAL, SOFFICE_JOB_TIMEOUT, SOFFICE_MAX_JOBS, SOFFICE_POOL_SIZE, SOFFICE_QUEUE_LIMIT, SOFFICE_START_TIMEOUT
+
+# LibreOffice UNO 橋接 (選用)：有安裝 python3-uno 時使用常駐轉檔程序，否則退回命令列轉檔
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:
+    uno = None
+
+def find_soffice_path():
+    soffice = shutil.which("soffice") or shutil.which("libreoffice")
+    if soffice: return soffice
+    if os.name == "nt":
+        candidates = [r"C:\Program Files\LibreOffice\program\soffice.exe", r"C:\Program Files (x86)\LibreOffice\program\soffice.exe"]
+        for p in candidates:
+            if os.path.exists(p): return p
+    return None
+
+def _free_local_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _uno_props(**kwargs):
+    props = []
+    for k, v in kwargs.items():
+        p = PropertyValue(); p.Name = k; p.Value = v
+        props.append(p)
+    return tuple(props)
+
+class SofficeWorker:
+    """
+    單一 LibreOffice 轉檔程序。
+    每個程序使用獨立的使用者設定檔目錄，避免多人同時轉檔時互相鎖定 profile。
+    有 UNO 時為常駐 listener (只需冷啟動一次)；沒有 UNO 時每份工作都以命令列冷啟動一次 soffice，
+    設定檔目錄在暖機時先初始化並保留重用，省下首次建立 profile 的時間。cold_starts 為 soffice 啟動次數。
+    """
+    def __init__(self, soffice, idx, profile_root):
+        self.soffice = soffice
+        self.idx = idx
+        self.profile_dir = os.path.join(profile_root, f"worker_{idx}")
+        self.profile_url = pathlib.Path(self.profile_dir).as_uri()
+        self.proc = None
+        self.desktop = None
+        self.port = None
+        self.jobs_done = 0
+        self.restarts = 0
+        self.cold_starts = 0
+
+    @property
+    def mode(self):
+        return "UNO" if uno is not None else "CLI"
+
+    def start(self):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.jobs_done = 0
+        if uno is None:
+            self._init_profile()
+            return
+        self.port = _free_local_port()
+        self.cold_starts += 1
+        self.proc = subprocess.Popen(
+            [self.soffice, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault", "--nolockcheck",
+             f"-env:UserInstallation={self.profile_url}",
+             f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_ctx)
+        deadline = time.monotonic() + SOFFICE_START_TIMEOUT
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+                self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+                return
+            except NoConnectException:
+                if self.proc.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"LibreOffice 常駐程序 #{self.idx} 啟動失敗")
+                time.sleep(0.25)
+
+    def _init_profile(self):
+        """命令列模式：設定檔目錄尚未建立時先啟動一次 soffice 完成初始化 (之後的轉檔沿用)。"""
+        if os.path.isdir(os.path.join(self.profile_dir, "user")): return
+        self.cold_starts += 1
+        subprocess.run([self.soffice, "--headless", "--nologo", "--norestore", "--terminate_after_init", f"-env:UserInstallation={self.profile_url}"],
+                       capture_output=True, timeout=SOFFICE_START_TIMEOUT)
+
+    def stop(self):
+        self.desktop = None
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.kill()
+                try: self.proc.wait(timeout=10)
+                except subprocess.TimeoutExpired: pass
+            self.proc = None
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def is_healthy(self):
+        """健康檢查：程序仍存活且 UNO 連線可回應。"""
+        if uno is None: return True
+        if self.proc is None or self.proc.poll() is not None or self.desktop is None: return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, xlsx_path, pdf_path):
+        self.convert_many([(xlsx_path, pdf_path)])
+
+    def convert_many(self, pairs):
+        """
+        同一個轉檔程序依序轉換多份檔案 [(xlsx_path, pdf_path), ...]。
+        命令列模式只啟動一次 soffice (所有檔案一起傳入，輸出到同一個目錄，檔名為 xlsx 主檔名 + .pdf)；UNO 模式在常駐程序內逐份轉換。
+        """
+        if uno is None:
+            self.cold_starts += 1
+            subprocess.run(
+                [self.soffice, "--headless", "--nologo", "--norestore", f"-env:UserInstallation={self.profile_url}",
+                 "--convert-to", "pdf:calc_pdf_Export", "--outdir", os.path.dirname(pairs[0][1])] + [x for x, _ in pairs],
+                capture_output=True, timeout=SOFFICE_JOB_TIMEOUT * len(pairs)
+            )
+        else:
+            for xlsx_path, pdf_path in pairs:
+                doc = self.desktop.loadComponentFromURL(uno.systemPathToFileUrl(xlsx_path), "_blank", 0, _uno_props(Hidden=True, ReadOnly=True))
+                try:
+                    doc.storeToURL(uno.systemPathToFileUrl(pdf_path), _uno_props(FilterName="calc_pdf_Export"))
+                finally:
+                    doc.close(True)
+        self.jobs_done += len(pairs)
+
+class SofficePool:
+    """
+    LibreOffice 轉檔程序池。
+    - 固定數量的常駐程序，閒置程序放在 queue 中輪流取用
+    - 排隊數量有上限，超過時直接回報忙碌而不是無限等待
+    - 每份工作有逾時，逾時或程序卡死時強制重啟該程序
+    - 背景執行緒定期對閒置程序做健康檢查
+    - stats 計數由 lock 保護 (多個轉檔工作同時更新)；讀取請用 snapshot()
+    """
+    def __init__(self, soffice, size=SOFFICE_POOL_SIZE, queue_limit=SOFFICE_QUEUE_LIMIT, job_timeout=SOFFICE_JOB_TIMEOUT):
+        self.job_timeout = job_timeout
+        self.profile_root = tempfile.mkdtemp(prefix="cue_soffice_")
+        self.workers = [SofficeWorker(soffice, i, self.profile_root) for i in range(max(1, size))]
+        self.idle = queue.Queue()
+        self.slots = threading.BoundedSemaphore(len(self.workers) + max(0, queue_limit))
+        self.lock = threading.Lock()
+        self.stats = {"jobs": 0, "failed": 0, "timeouts": 0, "rejected": 0}
+        self._closed = threading.Event()
+        for w in self.workers:
+            threading.Thread(target=self._warm_up, args=(w,), daemon=True).start()
+        threading.Thread(target=self._health_loop, daemon=True).start()
+
+    def _warm_up(self, worker):
+        try: worker.start()
+        except Exception: worker.stop()
+        self.idle.put(worker)
+
+    def _ensure_ready(self, worker):
+        if worker.jobs_done >= SOFFICE_MAX_JOBS or not worker.is_healthy():
+            worker.restart()
+
+    def _health_loop(self):
+        while not self._closed.wait(SOFFICE_HEALTH_INTERVAL):
+            for _ in range(len(self.workers)):
+                try: worker = self.idle.get_nowait()
+                except queue.Empty: break
+                try: self._ensure_ready(worker)
+                except Exception: worker.stop()
+                finally: self.idle.put(worker)
+
+    def _run_job(self, worker, pairs):
+        result = {}
+        timeout = self.job_timeout * len(pairs)
+        def target():
+            try: worker.convert_many(pairs)
+            except Exception as e: result["error"] = e
+        t = threading.Thread(target=target, daemon=True)
+        t.start()
+        t.join(timeout)
+        if t.is_alive():
+            with self.lock: self.stats["timeouts"] += 1
+            worker.stop()  # 強制結束卡住的程序，讓 UNO 呼叫中斷
+            raise TimeoutError(f"轉檔逾時 ({timeout}s)")
+        if "error" in result: raise result["error"]
+
+    def convert(self, xlsx_bytes):
+        """回傳 (pdf_bytes, method, err_msg)，格式與 xlsx_bytes_to_pdf_bytes 相同。"""
+        return self.convert_many([xlsx_bytes])[0]
+
+    def convert_many(self, xlsx_list):
+        """
+        多份 Excel 在同一個轉檔程序、同一次工作中轉成 PDF (只佔一個排隊名額、命令列模式只啟動一次 soffice)。
+        回傳與 xlsx_list 對應的 [(pdf_bytes, method, err_msg), ...]。
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.lock: self.stats["rejected"] += 1
+            return [(None, "Fail", "轉檔佇列已滿，請稍後再試")] * len(xlsx_list)
+        try:
+            try: worker = self.idle.get(timeout=self.job_timeout)
+            except queue.Empty:
+                with self.lock: self.stats["timeouts"] += 1
+                return [(None, "Fail", "等待轉檔程序逾時")] * len(xlsx_list)
+            try:
+                self._ensure_ready(worker)
+                with tempfile.TemporaryDirectory() as tmp:
+                    pairs = [(os.path.join(tmp, f"cue_{i}.xlsx"), os.path.join(tmp, f"cue_{i}.pdf")) for i in range(len(xlsx_list))]
+                    for (xlsx_path, _), xlsx_bytes in zip(pairs, xlsx_list):
+                        with open(xlsx_path, "wb") as f: f.write(xlsx_bytes)
+                    self._run_job(worker, pairs)
+                    if len(pairs) == 1 and not os.path.exists(pairs[0][1]):
+                        for fn in os.listdir(tmp):
+                            if fn.endswith(".pdf"): pairs = [(pairs[0][0], os.path.join(tmp, fn))]; break
+                    out = []
+                    for _, pdf_path in pairs:
+                        if os.path.exists(pdf_path):
+                            with open(pdf_path, "rb") as f: out.append((f.read(), f"LibreOffice ({worker.mode})", ""))
+                        else: out.append((None, "Fail", "LibreOffice 未產出檔案"))
+                    done = len([res for res in out if res[0]])
+                    with self.lock:
+                        self.stats["jobs"] += done
+                        self.stats["failed"] += len(out) - done
+                    return out
+            except Exception as e:
+                with self.lock: self.stats["failed"] += len(xlsx_list)
+                return [(None, "Fail", str(e))] * len(xlsx_list)
+            finally:
+                self.idle.put(worker)
+        finally:
+            self.slots.release()
+
+    @property
+    def mode(self):
+        """"UNO" (常駐程序) 或 "CLI" (未安裝 python3-uno，每次轉檔冷啟動一次 soffice)。"""
+        return self.workers[0].mode
+
+    def snapshot(self):
+        """計數快照：stats 加上轉檔模式與 soffice 累計啟動次數。"""
+        with self.lock: out = dict(self.stats)
+        out.update(mode=self.mode, cold_starts=sum([w.cold_starts for w in self.workers]))
+        return out
+
+    def status(self):
+        return [{"worker": w.idx, "mode": w.mode, "alive": w.is_healthy(), "jobs": w.jobs_done, "restarts": w.restarts, "cold_starts": w.cold_starts} for w in self.workers]
+
+    def shutdown(self):
+        self._closed.set()
+        for w in self.workers: w.stop()
+        shutil.rmtree(self.profile_root, ignore_errors=True)
+
+@singleton
+def get_soffice_pool():
+    soffice = find_soffice_path()
+    if not soffice: return None
+    pool = SofficePool(soffice)
+    atexit.register(pool.shutdown)
+    return pool
+
+@traced("pdf_soffice")
+def xlsx_bytes_to_pdf_bytes(xlsx_bytes: bytes):
+    pool = get_soffice_pool()
+    if pool is None: return None, "Fail", "伺服器未安裝 LibreOffice"
+    try: return pool.convert(xlsx_bytes)
+    except Exception as e: return None, "Fail", str(e)
+    finally: gc.collect()
+
+@traced("pdf_soffice_batch")
+def xlsx_batch_to_pdf_bytes(xlsx_list):
+    """多份 Excel 以同一個轉檔工作轉成 PDF，回傳對應的 [(pdf_bytes, method, err_msg), ...]。"""
+    if not xlsx_list: return []
+    pool = get_soffice_pool()
+    if pool is None: return [(None, "Fail", "伺服器未安裝 LibreOffice")] * len(xlsx_list)
+    try: return pool.convert_many(list(xlsx_list))
+    except Exception as e: return [(None, "Fail", str(e))] * len(xlsx_list)
+    finally: gc.collect()
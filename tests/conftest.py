@@ -0,0 +1,92 @@
+"""
+測試共用設定：把專案根目錄加入匯入路徑，並提供與 parse_config_sheets 輸出結構相同的合成價格資料 (不需連線 Google 試算表)
+與 127.0.0.1 上的 HTTP 替身伺服器 (stand_in)。
+"""
+import hashlib
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cuesheet.settings import REGIONS_ORDER  # noqa: E402
+
+def synthetic_pricing():
+    """(pricing_db, sec_factors, store_counts_num)；各區價格刻意不整齊，讓取整 / 進位的差異能顯現出來。"""
+    pricing_db = {}
+    for m, std in (("全家廣播", 4800), ("新鮮視", 5040)):
+        pricing_db[m] = {"Std_Spots": std, "Day_Part": "00:00-24:00", "全省": [900000, 400000]}
+        for i, r in enumerate(REGIONS_ORDER): pricing_db[m][r] = [200000 + i * 13000, 90000 + i * 7001]
+    pricing_db["家樂福"] = {"量販_全省": {"List": 300000, "Net": 150000, "Std_Spots": 1500, "Day_Part": "09:00-22:00"},
+                         "超市_全省": {"List": 0, "Net": 0, "Std_Spots": 900, "Day_Part": "09:00-22:00"}}
+    sec_factors = {"全家廣播": {5: 0.5, 10: 0.6, 15: 0.8, 20: 1.0, 30: 1.5}, "新鮮視": {10: 1.0, 15: 1.3, 20: 1.6, 30: 2.2}, "家樂福": {10: 0.7, 20: 1.0}}
+    store_counts_num = {r: 1000 + i for i, r in enumerate(REGIONS_ORDER)}
+    store_counts_num.update({f"新鮮視_{r}": 500 + i for i, r in enumerate(REGIONS_ORDER)})
+    store_counts_num.update({"家樂福_量販": 68, "家樂福_超市": 250})
+    return pricing_db, sec_factors, store_counts_num
+
+@pytest.fixture(scope="session")
+def pricing():
+    return synthetic_pricing()
+
+@pytest.fixture(scope="session")
+def sample_plan(pricing):
+    """三種媒體、全省 + 分區混合的 31 天方案 (rows, total_list, logs)。"""
+    from cuesheet.pricing import calculate_plan_data
+    config = {"全家廣播": {"is_national": True, "regions": ["全省"], "sec_shares": {10: 40, 20: 60}, "share": 50},
+              "新鮮視": {"is_national": False, "regions": ["北區", "中區"], "sec_shares": {15: 100}, "share": 30},
+              "家樂福": {"regions": ["全省"], "sec_shares": {20: 100}, "share": 20}}
+    return calculate_plan_data(config, 3_000_000, 31, *pricing, REGIONS_ORDER)
+
+class StandIn(BaseHTTPRequestHandler):
+    """
+    依 server.script 依序回應：整數為狀態碼，"drop" 為讀完請求後不回應直接斷線。
+    回應 200 且查詢字串的 sheet 在 server.files 中時回傳該內容並帶 ETag (If-None-Match 相符時回 304)；
+    送出的狀態碼依序記錄在 server.replies。
+    """
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        srv = self.server
+        with srv.lock:
+            srv.calls.append(self.client_address[1])
+            action = srv.script.pop(0) if srv.script else 200
+            sheet = parse_qs(urlsplit(self.path).query).get("sheet", [None])[0]
+            text = srv.files.get(sheet) if action == 200 else None
+        if action == "drop":
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        body, ctype, etag = b'{"ok": true}', "application/json", None
+        if text is not None:
+            body, ctype = text.encode("utf-8"), "text/csv; charset=utf-8"
+            etag = '"' + hashlib.sha1(body).hexdigest()[:12] + '"'
+            if self.headers.get("If-None-Match") == etag: action, body = 304, b""
+        with srv.lock: srv.replies.append(action)
+        self.send_response(action)
+        if etag: self.send_header("ETag", etag)
+        if action != 304:
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, fmt, *args): pass
+
+@pytest.fixture
+def stand_in():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    srv.daemon_threads = True
+    srv.calls, srv.script, srv.files, srv.replies, srv.lock = [], [], {}, [], threading.Lock()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}/"
+    yield srv
+    srv.shutdown(); srv.server_close()
@@ -0,0 +1,106 @@
+"""
+ArtifactCache 的 PDF 存放規則：原生引擎 (WeasyPrint) 失敗改用 LibreOffice 的結果存在 LibreOffice 名下，
+下次仍先試原生引擎並沿用已轉好的 LibreOffice 檔；渲染程式的指紋納入 plan_fingerprint。
+"""
+import os
+import shutil
+import subprocess
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+from cuesheet import cache as cache_mod, excel, helpers, pdf, soffice
+from cuesheet.cache import ArtifactCache, cached_formats, cached_pdf, pdf_cache_kind, plan_fingerprint, renderer_fingerprint
+from cuesheet.settings import PDF_ENGINE_NATIVE, PDF_ENGINE_SOFFICE
+
+START = date(2026, 3, 1)
+
+class FakeWeasyPrint:
+    class HTML:
+        def __init__(self, string): pass
+        def write_pdf(self, zoom=1): return b"%PDF-native"
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    """weasyprint 可由 state["native"] 切換；LibreOffice 轉檔以計數的假函式取代。"""
+    state = {"native": False, "converted": 0}
+    def convert(xlsx):
+        state["converted"] += 1
+        return b"%PDF-soffice", "LibreOffice (UNO)", ""
+    monkeypatch.setattr(excel, "get_cloud_logo_bytes", lambda: None)
+    monkeypatch.setattr(pdf, "get_cloud_logo_bytes", lambda: None)
+    monkeypatch.setattr(pdf, "_load_weasyprint", lambda: FakeWeasyPrint if state["native"] else None)
+    monkeypatch.setattr(pdf, "xlsx_bytes_to_pdf_bytes", convert)
+    monkeypatch.setattr(pdf, "xlsx_batch_to_pdf_bytes", lambda items: [convert(x) for x in items])
+    monkeypatch.setattr(soffice, "xlsx_batch_to_pdf_bytes", lambda items: [convert(x) for x in items])
+    state["cache"] = ArtifactCache(str(tmp_path), 50 * 1024 * 1024)
+    return state
+
+def _args(sample_plan, fmt="東吳"):
+    return (fmt, START, START + timedelta(days=30), "客戶", "產品", sample_plan[0], helpers.get_remarks_text(START, "2026年3月", START), 3_000_000, 10000, "業務")
+
+def test_native_fallback_is_not_cached_as_native(env, sample_plan):
+    cache, args = env["cache"], _args(sample_plan)
+    key = plan_fingerprint(*args)
+    data, method, err = cached_pdf(cache, key, PDF_ENGINE_NATIVE, *args)
+    assert data == b"%PDF-soffice" and method == "LibreOffice (UNO)" and err.startswith("WeasyPrint 失敗")
+    assert not cache.has(key, pdf_cache_kind(PDF_ENGINE_NATIVE))
+    assert cache.get(key, pdf_cache_kind(PDF_ENGINE_SOFFICE)) == b"%PDF-soffice"
+
+    # 原生引擎仍失敗：沿用已轉好的 LibreOffice 檔，不再轉檔
+    data, method, _ = cached_pdf(cache, key, PDF_ENGINE_NATIVE, *args)
+    assert (data, method, env["converted"]) == (b"%PDF-soffice", f"{PDF_ENGINE_SOFFICE} (快取)", 1)
+
+    # 原生引擎恢復：取得並快取原生版本；選擇 LibreOffice 的請求仍拿到 LibreOffice 版本
+    env["native"] = True
+    assert cached_pdf(cache, key, PDF_ENGINE_NATIVE, *args)[:2] == (b"%PDF-native", PDF_ENGINE_NATIVE)
+    assert cache.get(key, pdf_cache_kind(PDF_ENGINE_NATIVE)) == b"%PDF-native"
+    assert cached_pdf(cache, key, PDF_ENGINE_SOFFICE, *args)[0] == b"%PDF-soffice"
+
+def test_formats_fallback_is_not_cached_as_native(env, sample_plan):
+    cache, args = env["cache"], _args(sample_plan)[1:]
+    formats = ["東吳", "聲活"]
+    out = cached_formats(cache, PDF_ENGINE_NATIVE, formats, *args, with_xlsx=False)
+    assert [out[fmt]["pdf"][0] for fmt in formats] == [b"%PDF-soffice"] * 2
+    for fmt in formats:
+        assert not cache.has(out[fmt]["key"], pdf_cache_kind(PDF_ENGINE_NATIVE))
+        assert cache.has(out[fmt]["key"], pdf_cache_kind(PDF_ENGINE_SOFFICE))
+
+    out = cached_formats(cache, PDF_ENGINE_NATIVE, formats, *args, with_xlsx=False)
+    assert env["converted"] == 2
+    assert [out[fmt]["pdf"][1] for fmt in formats] == [f"{PDF_ENGINE_SOFFICE} (快取)"] * 2
+
+    env["native"] = True
+    out = cached_formats(cache, PDF_ENGINE_NATIVE, formats, *args, with_xlsx=False)
+    assert [out[fmt]["pdf"][:2] for fmt in formats] == [(b"%PDF-native", PDF_ENGINE_NATIVE)] * 2
+    assert all([cache.has(out[fmt]["key"], pdf_cache_kind(PDF_ENGINE_NATIVE)) for fmt in formats])
+
+def test_plan_fingerprint_follows_renderer_code(monkeypatch, sample_plan):
+    args = _args(sample_plan)
+    before = plan_fingerprint(*args)
+    assert plan_fingerprint(*args) == before
+    monkeypatch.setattr(pdf, "_PRINT_CODE_FINGERPRINT", "changed")
+    assert plan_fingerprint(*args) != before
+    monkeypatch.undo()
+    monkeypatch.setattr(excel, "_EXCEL_CODE_FINGERPRINT", "changed")
+    assert plan_fingerprint(*args) != before
+    monkeypatch.undo()
+    monkeypatch.setattr(cache_mod, "ARTIFACT_CACHE_VERSION", "changed")
+    assert plan_fingerprint(*args) != before
+
+def test_renderer_fingerprint_survives_redeploy(tmp_path):
+    """同一份程式碼放到別的目錄 (重新部署) 時指紋不變，持久快取與 ETag 才能沿用。"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(pdf.__file__)))
+    shutil.copytree(os.path.join(root, "cuesheet"), tmp_path / "cuesheet", ignore=shutil.ignore_patterns("__pycache__"))
+    out = subprocess.run([sys.executable, "-c", "from cuesheet.cache import renderer_fingerprint; print(renderer_fingerprint())"],
+                         cwd=tmp_path, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == renderer_fingerprint()
+
+def test_overwrite_counts_size_once(tmp_path):
+    cache = ArtifactCache(str(tmp_path), 1000)
+    cache.put("ab" * 32, "xlsx", b"x" * 400)
+    cache.put("ab" * 32, "xlsx", b"x" * 300)
+    assert cache.total_bytes == 300
+    cache.put("cd" * 32, "xlsx", b"x" * 600)   # 900 bytes，未超過上限不淘汰
+    assert cache.stats["evictions"] == 0 and cache.has("ab" * 32, "xlsx")
@@ -0,0 +1,75 @@
+"""
+雲端設定檔的條件式更新與本機快照，對象為 127.0.0.1 上的試算表替身 (conftest.stand_in)：
+未變動的分頁回 304 時不重新解析、更新失敗時沿用快照的設定、冷啟動直接由快照提供設定而不連線。
+"""
+import time
+
+import pytest
+
+from cuesheet import httpclient
+from cuesheet.config import CONFIG_OPTIONAL_SHEETS, CONFIG_SHEETS, ConfigStore
+
+SHARE_URL = "https://docs.google.com/spreadsheets/d/TEST-sheet_1/edit?usp=sharing"
+SHEETS = {
+    "Stores": "Key,Display_Name,Count\n北區,北區-北北基,1200\n",
+    "Factors": "Media,Seconds,Factor\n全家廣播,10,0.6\n全家廣播,20,1.0\n",
+    "Pricing": "Media,Region,List_Price,Net_Price,Std_Spots,Day_Part\n全家廣播,北區,200000,90000,4800,00:00-24:00\n",
+    "Sales": "Name,Nickname\n王小明,小明\n",
+    "Capacity": "Media,Region,Seconds,Daily_Spots\n全家廣播,全省,,300\n",
+}
+N_SHEETS = len(CONFIG_SHEETS) + len(CONFIG_OPTIONAL_SHEETS)
+
+@pytest.fixture
+def sheets(stand_in, monkeypatch):
+    monkeypatch.setattr(httpclient, "HTTP_BACKOFF_BASE", 0)
+    stand_in.files.update(SHEETS)
+    return stand_in
+
+def make_store(srv, tmp_path, ttl=300):
+    return ConfigStore(SHARE_URL, snapshot_path=str(tmp_path / "snap.json"), ttl=ttl, base_url=srv.url)
+
+def wait_for(cond, timeout=5):
+    deadline = time.time() + timeout
+    while not cond():
+        if time.time() > deadline: raise AssertionError("等待逾時")
+        time.sleep(0.02)
+
+def test_unchanged_sheets_are_not_reparsed(sheets, tmp_path):
+    store = make_store(sheets, tmp_path)
+    assert store.refresh() and sheets.replies == [200] * N_SHEETS
+    first = store.config
+    assert first.source == "cloud" and first.sales_map == {"王小明": "小明"} and first.capacity == {("全家廣播", "全省", 0): 300}
+
+    assert store.refresh()
+    assert sheets.replies[N_SHEETS:] == [304] * N_SHEETS   # 帶 If-None-Match，全部未變動
+    assert store.config is first and store.config.fetched_at >= first.fetched_at
+
+    sheets.files["Sales"] = "Name,Nickname\n王小明,阿明\n"
+    assert store.refresh()
+    assert sorted(sheets.replies[2 * N_SHEETS:]) == [200] + [304] * (N_SHEETS - 1)
+    assert store.config is not first and store.config.sales_map == {"王小明": "阿明"}
+
+def test_failed_refresh_falls_back_to_snapshot(sheets, tmp_path):
+    assert make_store(sheets, tmp_path).refresh()
+    sheets.script = [404] * N_SHEETS   # 雲端無法讀取
+    store = make_store(sheets, tmp_path, ttl=0)
+    config, err = store.get()   # 先讀快照，再於背景更新
+    assert config.source == "snapshot" and config.sales_map == {"王小明": "小明"} and err is None
+    wait_for(lambda: store.last_error is not None)
+    assert store.config is config and store.last_error.startswith("讀取失敗")   # 沿用快照的設定
+    assert set(sheets.replies[N_SHEETS:]) == {404}
+
+def test_cold_start_served_from_snapshot(sheets, tmp_path):
+    assert make_store(sheets, tmp_path).refresh()
+    calls = len(sheets.calls)
+    config, err = make_store(sheets, tmp_path).get()
+    assert (config.source, err) == ("snapshot", None) and config.capacity == {("全家廣播", "全省", 0): 300}
+    assert len(sheets.calls) == calls   # 快照在 TTL 內，不連線
+
+    other = ConfigStore(SHARE_URL.replace("TEST-sheet_1", "OTHER"), snapshot_path=str(tmp_path / "snap.json"), base_url=sheets.url)
+    assert other.get()[0].source == "cloud"   # 別的試算表的快照不採用
+
+def test_cold_start_without_snapshot_reports_error(sheets, tmp_path):
+    sheets.script = [404] * N_SHEETS
+    config, err = make_store(sheets, tmp_path).get()
+    assert config is None and err.startswith("讀取失敗")
@@ -0,0 +1,51 @@
+"""
+HttpClient 的重試政策與連線重用，對象為 127.0.0.1 上的 http.server 替身 (conftest.stand_in，不連外)。
+"""
+import socket
+
+import pytest
+import requests
+
+from cuesheet import httpclient
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(httpclient, "HTTP_BACKOFF_BASE", 0)
+    c = httpclient.HttpClient(endpoints={"t": {"timeout": (2, 5), "retries": 2}})
+    yield c
+    c.close()
+
+def test_post_retries_on_503_then_succeeds(stand_in, client):
+    stand_in.script = [503]
+    resp = client.post("t", stand_in.url, data={"a": "1"})
+    assert resp.status_code == 200
+    assert len(stand_in.calls) == 2
+    assert client.stats()["t"]["retries"] == 1
+
+def test_post_not_retried_on_500(stand_in, client):
+    stand_in.script = [500]
+    assert client.post("t", stand_in.url, data={"a": "1"}).status_code == 500
+    assert len(stand_in.calls) == 1
+
+def test_post_not_retried_after_mid_response_disconnect(stand_in, client):
+    stand_in.script = ["drop"]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post("t", stand_in.url, data={"a": "1"})
+    assert len(stand_in.calls) == 1   # 請求已送達，不可重送
+
+def test_get_retried_after_disconnect(stand_in, client):
+    stand_in.script = ["drop"]
+    assert client.get("t", stand_in.url).status_code == 200
+    assert len(stand_in.calls) == 2
+
+def test_post_retried_when_connection_refused(client):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0)); port = sock.getsockname()[1]   # 關閉後此埠沒有人在聽
+    with pytest.raises(requests.exceptions.ConnectionError) as err:
+        client.post("t", f"http://127.0.0.1:{port}/", data={"a": "1"})
+    assert httpclient.is_connect_error(err.value)
+    assert client.stats()["t"]["retries"] == 2
+
+def test_session_connection_is_reused(stand_in, client):
+    for _ in range(3): assert client.get("t", stand_in.url).status_code == 200
+    assert len(stand_in.calls) == 3 and len(set(stand_in.calls)) == 1   # 同一個來源埠 = 同一條 TCP 連線
@@ -0,0 +1,66 @@
+"""
+檔次預約帳本：以小型容量表驗證 check / reserve、同一預約改版 (exclude)、各秒數合計上限 (ALL_SECONDS)、
+超賣日期明細，以及多個連線同時預約時合計不超過容量。
+"""
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from cuesheet.inventory import ALL_SECONDS, InventoryLedger
+
+START = date(2026, 3, 1)
+CAPACITY = {("全家廣播", "全省", 10): 10, ("全家廣播", "全省", ALL_SECONDS): 15, ("全家廣播", "北區", 10): 6}
+
+def row(schedule, seconds=10, region="北區", media="全家廣播"):
+    return {"media": media, "region": region, "seconds": seconds, "schedule": list(schedule)}
+
+@pytest.fixture
+def ledger(tmp_path):
+    led = InventoryLedger(str(tmp_path / "inv.sqlite3"))
+    yield led
+    led.close()
+
+def test_check_and_reserve(ledger):
+    assert ledger.check([row([4, 4, 4])], START, CAPACITY) == []
+    assert ledger.reserve("a", [row([4, 4, 4])], START, CAPACITY) == (True, [])
+    conflicts = ledger.check([row([1, 3, 2])], START, CAPACITY)   # 北區 10 秒容量 6 (該區設定優先於全省)
+    assert [(c["date"], c["seconds"], c["capacity"], c["booked"], c["requested"], c["over"]) for c in conflicts] == [(START + timedelta(days=1), 10, 6, 4, 3, 1)]
+    ok, rejected = ledger.reserve("b", [row([1, 3, 2])], START, CAPACITY)
+    assert not ok and rejected == conflicts
+    assert [r["id"] for r in ledger.reservations()] == ["a"]   # 超賣時不寫入
+    assert ledger.usage(START, START + timedelta(days=2))[("全家廣播", "北區", 10)].tolist() == [4, 4, 4]
+
+def test_overbooked_days_are_reported(ledger):
+    ledger.reserve("a", [row([5] * 5, region="中區")], START, CAPACITY)
+    conflicts = ledger.check([row([0, 6, 5, 7, 0], region="中區")], START, CAPACITY)   # 中區沿用全省 10 檔
+    assert [(c["date"], c["over"]) for c in conflicts] == [(START + timedelta(days=1), 1), (START + timedelta(days=3), 2)]
+
+def test_exclude_ignores_old_version_of_same_plan(ledger):
+    ledger.reserve("a", [row([5, 5])], START, CAPACITY)
+    assert ledger.check([row([6, 6])], START, CAPACITY) != []
+    assert ledger.check([row([6, 6])], START, CAPACITY, exclude="a") == []
+    assert ledger.reserve("a", [row([6, 6])], START, CAPACITY) == (True, [])   # 改版取代舊的檔次
+    assert ledger.usage(START, START + timedelta(days=1))[("全家廣播", "北區", 10)].tolist() == [6, 6]
+    ledger.release("a")
+    assert ledger.usage(START, START + timedelta(days=1)) == {} and ledger.reservations() == []
+
+def test_all_seconds_limit_sums_every_duration(ledger):
+    ledger.reserve("a", [row([8], region="南區"), row([4], seconds=20, region="南區")], START, CAPACITY)
+    conflicts = ledger.check([row([4], seconds=30, region="南區")], START, CAPACITY)   # 30 秒本身無上限，但合計 12 + 4 > 15
+    assert [(c["seconds"], c["booked"], c["requested"], c["over"]) for c in conflicts] == [(ALL_SECONDS, 12, 4, 1)]
+    assert ledger.check([row([3], seconds=30, region="南區")], START, CAPACITY) == []
+
+def test_concurrent_reserve_never_exceeds_capacity(tmp_path):
+    db = str(tmp_path / "inv.sqlite3")
+    ledgers = [InventoryLedger(db) for _ in range(4)]   # 各自的連線，等同多個程序
+    barrier, results = threading.Barrier(16), []
+    def worker(i):
+        barrier.wait()
+        results.append(ledgers[i % 4].reserve(f"plan-{i}", [row([2, 1, 2])], START, CAPACITY)[0])
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    usage = ledgers[0].usage(START, START + timedelta(days=2))[("全家廣播", "北區", 10)]
+    assert results.count(True) == 3 and usage.tolist() == [6, 3, 6]
+    for led in ledgers: led.close()
@@ -0,0 +1,178 @@
+"""
+背景工作佇列：重試用盡時的清理 (Ragic 上傳的檔次預約)、多個程序共用資料庫時的租約與搶占，
+工作內容以 JSON 保存且不含 API Key，背景執行緒遇到例外後繼續運作。
+"""
+import collections
+import json
+import sqlite3
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from cuesheet import inventory, jobs, ragic
+from cuesheet.cache import plan_fingerprint
+from cuesheet.settings import RAGIC_API_KEY
+
+def wait_done(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] not in jobs.JOB_ACTIVE: return job
+        time.sleep(0.02)
+    raise AssertionError(f"工作未在 {timeout} 秒內結束: {queue.get(job_id)}")
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    led = inventory.InventoryLedger(str(tmp_path / "inv.sqlite3"))
+    monkeypatch.setattr(inventory, "get_inventory_ledger", lambda: led)
+    yield led
+    led.close()
+
+@pytest.fixture
+def ragic_queue(tmp_path, monkeypatch, ledger):
+    """以替身取代設定檔、檔案產生與 Ragic 上傳的 ragic 工作佇列；post_to_ragic 的結果由 outcome 決定。"""
+    outcome, posts = {"result": (False, "HTTP 503", True)}, []
+    monkeypatch.setattr(jobs, "load_config_from_cloud", lambda url: (SimpleNamespace(capacity={}), None))
+    monkeypatch.setattr(jobs, "cached_excel", lambda *a: b"xlsx")
+    monkeypatch.setattr(jobs, "cached_pdf", lambda *a: (b"pdf", "stub", ""))
+    monkeypatch.setattr(jobs, "post_to_ragic", lambda *a: posts.append(a) or outcome["result"])
+    monkeypatch.setattr(ragic, "_API_KEYS", {})
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), {"ragic": lambda payload, report: jobs._job_upload_ragic(None, payload, report)},
+                          workers=1, on_final_failure={"ragic": jobs._release_reservation})
+    queue.outcome, queue.posts = outcome, posts
+    yield queue
+    queue.shutdown()
+
+def ragic_payload(rows):
+    return {"plan_key": "k", "engine": "x", "render_args": (), "url": "http://127.0.0.1/", "data": {},
+            "file_stem": "Cue", "file_fields": {"xlsx": "1", "pdf": "2"},
+            "reservation": {"id": "plan-1", "rows": rows, "start": date(2026, 3, 1), "label": "c - p"}}
+
+def test_reservation_released_when_retries_exhausted(ragic_queue, ledger, sample_plan):
+    job_id, _ = ragic_queue.submit("ragic", ragic_payload(sample_plan[0]), max_attempts=1)
+    job = wait_done(ragic_queue, job_id)
+    assert job["status"] == "failed" and "已嘗試 1 次" in job["message"]
+    assert ledger.reservations() == []
+
+def test_reservation_kept_on_success(ragic_queue, ledger, sample_plan):
+    ragic_queue.outcome["result"] = (True, "ok", False)
+    job_id, _ = ragic_queue.submit("ragic", ragic_payload(sample_plan[0]), max_attempts=1)
+    assert wait_done(ragic_queue, job_id)["status"] == "succeeded"
+    assert [r["id"] for r in ledger.reservations()] == ["plan-1"]
+
+def test_reservation_released_on_non_retryable_failure(ragic_queue, ledger, sample_plan):
+    ragic_queue.outcome["result"] = (False, "HTTP 500", False)
+    job_id, _ = ragic_queue.submit("ragic", ragic_payload(sample_plan[0]))
+    assert wait_done(ragic_queue, job_id)["status"] == "failed"
+    assert ledger.reservations() == []
+
+def test_final_failure_hook_not_called_while_retrying(tmp_path):
+    calls = []
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), {"x": lambda payload, report: 1 / 0}, workers=1,
+                          on_final_failure={"x": lambda payload, err: calls.append((payload, type(err)))})
+    try:
+        job_id, _ = queue.submit("x", {"n": 1}, max_attempts=2)
+        job = wait_done(queue, job_id, timeout=15)
+    finally: queue.shutdown()
+    assert job["status"] == "failed" and job["attempts"] == 2
+    assert calls == [({"n": 1}, ZeroDivisionError)]
+
+def test_payload_stored_as_json_without_key(ragic_queue, sample_plan):
+    ragic_queue.outcome["result"] = (True, "ok", False)
+    ragic.set_ragic_api_key("http://127.0.0.1/", "session-key")
+    job_id, _ = ragic_queue.submit("ragic", ragic_payload(sample_plan[0]))
+    assert wait_done(ragic_queue, job_id)["status"] == "succeeded"
+    blob = ragic_queue.db.execute("SELECT payload FROM jobs WHERE id=?", (job_id,)).fetchone()[0]
+    assert "key" not in json.loads(blob) and "session-key" not in blob
+    assert ragic_queue.posts[0][1] == "session-key"   # 上傳時才取得
+
+    ragic.set_ragic_api_key("http://127.0.0.1/", "")
+    job_id, _ = ragic_queue.submit("ragic", dict(ragic_payload(sample_plan[0]), data={"n": 2}))
+    assert wait_done(ragic_queue, job_id)["status"] == "succeeded"
+    assert ragic_queue.posts[1][1] == RAGIC_API_KEY   # 未設定時用設定值 (CUE_RAGIC_KEY)
+
+def test_payload_round_trip_keeps_render_args(sample_plan):
+    start = date(2026, 3, 1)
+    render_args = ("東吳", start, date(2026, 3, 31), "客戶", "產品", sample_plan[0], ["備註"], 3_000_000, 10000, "業務")
+    payload = jobs.load_payload(jobs.dump_payload({"render_args": render_args, "reservation": {"start": start}}))
+    assert payload["render_args"][1] == start and payload["reservation"]["start"] == start
+    assert plan_fingerprint(*payload["render_args"]) == plan_fingerprint(*render_args)
+    with pytest.raises(TypeError): jobs.dump_payload({"x": object()})
+
+def test_worker_survives_loop_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_BACKOFF_BASE", 0.01)
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), {"x": lambda payload, report: "ok"}, workers=0)
+    claim, failures = queue._claim, []
+    def flaky_claim():
+        if len(failures) < 3:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return claim()
+    queue._claim = flaky_claim
+    worker = threading.Thread(target=queue._worker_loop, daemon=True)
+    queue.threads.append(worker); worker.start()
+    try:
+        job_id, _ = queue.submit("x", 1)
+        assert wait_done(queue, job_id)["status"] == "succeeded" and len(failures) == 3
+    finally: queue.shutdown()
+
+def test_lease_loop_survives_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_TTL", 0.2)
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), {"x": lambda payload, report: "ok"}, workers=0)
+    calls = []
+    def flaky_requeue():
+        calls.append(1)
+        if len(calls) == 1: raise sqlite3.OperationalError("database is locked")
+    queue._requeue_expired = flaky_requeue
+    try:
+        deadline = time.time() + 5
+        while len(calls) < 3 and time.time() < deadline: time.sleep(0.02)
+        assert len(calls) >= 3 and queue.threads[-1].is_alive()
+    finally: queue.shutdown()
+
+# --- 多個程序共用同一個資料庫 ---
+def test_second_queue_does_not_requeue_running_job(tmp_path):
+    db, started, release, runs = str(tmp_path / "jobs.sqlite3"), threading.Event(), threading.Event(), []
+    def handler(payload, report):
+        runs.append(payload); started.set(); release.wait(10)
+    first = jobs.JobQueue(db, {"x": handler}, workers=1)
+    try:
+        job_id, _ = first.submit("x", 1)
+        assert started.wait(5)
+        second = jobs.JobQueue(db, {"x": handler}, workers=1)   # 另一個程序啟動
+        try:
+            time.sleep(0.3)
+            assert second.get(job_id)["status"] == "running" and second.get(job_id)["owner"] == first.owner
+            release.set()
+            assert wait_done(first, job_id)["status"] == "succeeded"
+            assert runs == [1]
+        finally: second.shutdown()
+    finally:
+        release.set(); first.shutdown()
+
+def test_expired_lease_is_requeued(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    dead = jobs.JobQueue(db, {"x": lambda payload, report: "ok"}, workers=0)   # 只排入工作，不執行
+    job_id, _ = dead.submit("x", 1)
+    dead.db.execute("UPDATE jobs SET status='running', attempts=1, owner='gone:1', lease_until=? WHERE id=?", (time.time() - 1, job_id))
+    dead.shutdown()
+    queue = jobs.JobQueue(db, {"x": lambda payload, report: "ok"}, workers=1)
+    try:
+        job = wait_done(queue, job_id)
+        assert job["status"] == "succeeded" and job["owner"] == queue.owner and job["attempts"] == 2
+    finally: queue.shutdown()
+
+def test_each_job_claimed_once_across_queues(tmp_path):
+    db, lock, runs = str(tmp_path / "jobs.sqlite3"), threading.Lock(), collections.Counter()
+    def handler(payload, report):
+        with lock: runs[payload] += 1
+    queues = [jobs.JobQueue(db, {"x": handler}, workers=3) for _ in range(3)]
+    try:
+        ids = [queues[i % 3].submit("x", i)[0] for i in range(60)]
+        for job_id in ids: assert wait_done(queues[0], job_id)["status"] == "succeeded"
+    finally:
+        for q in queues: q.shutdown()
+    assert runs == collections.Counter(range(60))
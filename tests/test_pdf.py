@@ -0,0 +1,61 @@
+"""
+原生 PDF (WeasyPrint) 的縮放：紙張固定為 A4 橫向，塞進單頁的縮放比例套用在 HTML 的欄寬 / 列高 / 字級上，
+write_pdf 不再傳 zoom (否則 @page 紙張會跟著縮小)。
+"""
+import base64
+import re
+from datetime import date, timedelta
+
+import pytest
+
+from cuesheet import helpers, pdf
+from cuesheet.settings import PDF_ENGINE_NATIVE
+
+START = date(2026, 3, 1)
+PAGE_RULE = f"@page {{ size: A4 landscape; margin: {pdf.PRINT_MARGIN_MM}mm; }}"
+
+@pytest.fixture(autouse=True)
+def no_logo(monkeypatch):
+    monkeypatch.setattr(pdf, "get_cloud_logo_bytes", lambda: None)
+
+def _args(sample_plan, days, fmt):
+    return (fmt, START, START + timedelta(days=days - 1), "客戶", "產品", sample_plan[0],
+            helpers.get_remarks_text(START, "2026年3月", START), 3_000_000, 10000, "業務")
+
+def _px(html, pattern):
+    return [float(x) for x in re.findall(pattern, html)]
+
+@pytest.mark.parametrize("days", [14, 31])
+@pytest.mark.parametrize("fmt", ["東吳", "聲活", "鉑霖"])
+def test_print_html_is_scaled_to_a4(sample_plan, days, fmt):
+    html, zoom = pdf.generate_print_html(*_args(sample_plan, days, fmt))
+    assert zoom < 1
+    assert PAGE_RULE in html   # 紙張不隨縮放改變
+    assert f".f16 {{ font-size: {16 * zoom:.2f}".rstrip("0").rstrip(".") in html
+
+    table_w = _px(html, r"<table style='width:([\d.]+)px'>")[0]
+    cols = _px(html, r"<col style='width:([\d.]+)px'>")
+    rows = _px(html, r"<tr[^>]*style='height:([\d.]+)px'>")
+    assert table_w <= pdf.PRINT_PAGE_W_PX + 1
+    assert sum(cols) == pytest.approx(table_w, abs=len(cols) * 0.01)
+    # 寬或高其中一邊剛好撐滿可列印範圍 (與 Excel 的 fitToPage 相同)
+    assert table_w >= pdf.PRINT_PAGE_W_PX * 0.98 or sum(rows) >= pdf.PRINT_PAGE_H_PX * 0.75
+
+def test_logo_data_is_not_scaled(sample_plan):
+    logo = base64.b64decode("QUFB12ptQUFB")   # base64 內容剛好含 "12pt"
+    html, zoom = pdf.generate_print_html(*_args(sample_plan, 31, "鉑霖"), logo_bytes=logo)
+    assert "QUFB12ptQUFB" in html
+    assert f"height:{125 * zoom:.2f}".rstrip("0").rstrip(".") + "px" in html
+
+def test_native_pdf_is_written_without_zoom(monkeypatch, sample_plan):
+    calls = []
+    class FakeWeasyPrint:
+        class HTML:
+            def __init__(self, string): self.string = string
+            def write_pdf(self, **kwargs):
+                calls.append((self.string, kwargs))
+                return b"%PDF-native"
+    monkeypatch.setattr(pdf, "_load_weasyprint", lambda: FakeWeasyPrint)
+    assert pdf.generate_pdf_native(*_args(sample_plan, 31, "東吳")) == (b"%PDF-native", PDF_ENGINE_NATIVE, "")
+    (html, kwargs), = calls
+    assert kwargs == {} and PAGE_RULE in html
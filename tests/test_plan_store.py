@@ -0,0 +1,36 @@
+"""
+方案紀錄的 id：不含渲染程式指紋，改版 / 重新部署後儲存同一方案仍更新同一筆；載回後以同一個 id 比較排程是否相同。
+"""
+from datetime import date
+
+from cuesheet import pdf
+from cuesheet.cache import plan_fingerprint
+from cuesheet.plan_store import PlanStore, plan_record_id
+
+INPUTS = {"format_type": "東吳", "client_name": "客戶", "product_name": "產品", "total_budget": 3_000_000, "final_budget": 3_000_000,
+          "prod_cost": 10000, "sales_person": "業務", "start_date": date(2026, 3, 1), "end_date": date(2026, 3, 31),
+          "sign_deadline": date(2026, 2, 25), "billing_month": "2026年3月", "payment_date": date(2026, 4, 30)}
+CONFIG = {"全家廣播": {"is_national": True, "regions": ["全省"], "sec_shares": {10: 40, 20: 60}, "share": 50},
+          "新鮮視": {"is_national": False, "regions": ["北區", "中區"], "sec_shares": {15: 100}, "share": 30},
+          "家樂福": {"regions": ["全省"], "sec_shares": {20: 100}, "share": 20}}
+
+def test_record_id_ignores_renderer_changes(monkeypatch, tmp_path, sample_plan):
+    rows = sample_plan[0]
+    render_args = ("東吳", INPUTS["start_date"], INPUTS["end_date"], "客戶", "產品", rows, ["備註"], 3_000_000, 10000, "業務")
+    store = PlanStore(str(tmp_path / "plans.db"))
+    store.save(plan_record_id(INPUTS, CONFIG, rows), INPUTS, CONFIG, 100)
+
+    key_before = plan_fingerprint(*render_args)
+    monkeypatch.setattr(pdf, "_PRINT_CODE_FINGERPRINT", "changed")   # 列印版面程式改版
+    assert plan_fingerprint(*render_args) != key_before
+    store.save(plan_record_id(INPUTS, CONFIG, rows), INPUTS, CONFIG, 100)
+    assert store.count() == 1
+
+def test_reloaded_plan_has_the_same_id(tmp_path, sample_plan):
+    rows = sample_plan[0]
+    store = PlanStore(str(tmp_path / "plans.db"))
+    plan_id = plan_record_id(INPUTS, CONFIG, rows)
+    store.save(plan_id, INPUTS, CONFIG, 100)
+    plan = store.get(plan_id)   # 日期與秒數配比 key 還原後，重算的 id 與保存時相同
+    assert plan_record_id(plan["inputs"], plan["config"], rows) == plan_id
+    assert plan_record_id(plan["inputs"], plan["config"], rows[1:]) != plan_id
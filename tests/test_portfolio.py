@@ -0,0 +1,50 @@
+"""
+月度總覽的訂單表同步：同一檔案的列以 (客戶, 產品, 開始日) 識別，改版取代舊版本、已刪除的列移除，不重複計算。
+"""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from cuesheet import metrics
+from cuesheet.portfolio import Portfolio, month_window, upload_plan_ids
+
+def _order(client, budget, media="全家廣播 100% 全省 20", start="2026-01-01"):
+    return {"client": client, "product": "產品", "budget": str(budget), "prod_cost": "0", "start": start, "end": "2026-01-31",
+            "format": "東吳", "sales": "業務", "media": media}
+
+@pytest.fixture
+def cfg(pricing):
+    pricing_db, sec_factors, store_counts_num = pricing
+    return SimpleNamespace(pricing_db=pricing_db, sec_factors=sec_factors, store_counts_num=store_counts_num)
+
+def _totals(cfg, raws):
+    pf = Portfolio(*month_window(2026, 1))
+    pf.add_upload(raws, cfg, "orders.csv")
+    return pf.totals()
+
+def test_revised_upload_replaces_old_version(cfg):
+    pf = Portfolio(*month_window(2026, 1))
+    pf.add_upload([_order("甲", 1_000_000), _order("乙", 500_000)], cfg, "orders.csv")
+    pf.add_upload([_order("甲", 1_200_000), _order("乙", 500_000)], cfg, "orders.csv")
+    assert pf.totals() == _totals(cfg, [_order("甲", 1_200_000), _order("乙", 500_000)])
+    assert pf.totals()["plans"] == 2 and pf.totals()["window_budget"] == 1_700_000
+
+def test_rows_missing_from_upload_are_removed(cfg):
+    pf = Portfolio(*month_window(2026, 1))
+    pf.add_upload([_order("甲", 1_000_000), _order("乙", 500_000)], cfg, "orders.csv")
+    pf.add_upload([_order("丙", 300_000)], cfg, "other.csv")
+    pf.add_upload([_order("乙", 500_000)], cfg, "orders.csv")
+    assert sorted(pf.plans_frame()["client"]) == ["丙", "乙"]   # 別的檔案不受影響
+
+def test_upload_ids_are_stable_and_unique():
+    raws = [_order("甲", 1), _order("甲", 2), _order("甲", 3, start="2026-01-05")]
+    ids = upload_plan_ids(raws, "orders.csv")
+    assert len(set(ids)) == 3 and ids[1] == ids[0] + "#2"
+    assert upload_plan_ids([_order("甲", 9)], "orders.csv")[0] == ids[0]
+
+def test_ingest_span_has_no_count_label(cfg):
+    with metrics.collect() as spans:
+        Portfolio(date(2026, 1, 1), date(2026, 1, 31)).add_upload([_order("甲", 1_000_000)], cfg, "orders.csv")
+    rec = next(s for s in spans if s["span"] == "portfolio_ingest")
+    assert set(rec) == {"span", "depth", "ms", "error"}
@@ -0,0 +1,65 @@
+"""
+PricingEngine.calculate_plan 與 calculate_plan_data 的等價性：以固定種子的亂數產生媒體組合、佔比、
+全省 / 分區、秒數配比、預算與走期天數，逐筆比對 rows / total_list / logs；
+sweep_scenarios 排名的指標與以該方案重新計算的結果一致。
+"""
+import random
+
+import pytest
+
+from cuesheet.pricing import PricingEngine, calculate_plan_data, sweep_scenarios
+from cuesheet.settings import DURATIONS, REGIONS_ORDER
+
+CASES = 400
+
+def _split(rng, total, n):
+    """把 total (%) 隨機拆成 n 份整數 (可能有 0)。"""
+    cuts = sorted([rng.randint(0, total) for _ in range(n - 1)])
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+def random_config(rng):
+    medias = rng.sample(["全家廣播", "新鮮視", "家樂福"], rng.randint(1, 3))
+    config = {}
+    for m, share in zip(medias, _split(rng, 100, len(medias))):
+        secs = rng.sample([10, 20] if m == "家樂福" else DURATIONS, rng.randint(1, 2 if m == "家樂福" else 4))
+        cfg = {"sec_shares": dict(zip(secs, _split(rng, 100, len(secs)))), "share": share}
+        if m == "家樂福": cfg["regions"] = ["全省"]
+        else:
+            national = rng.random() < 0.4
+            cfg.update(is_national=national, regions=["全省"] if national else rng.sample(REGIONS_ORDER, rng.randint(1, len(REGIONS_ORDER))))
+        config[m] = cfg
+    return config
+
+@pytest.fixture(scope="module")
+def engine(pricing):
+    return PricingEngine(*pricing, REGIONS_ORDER)
+
+@pytest.mark.parametrize("seed", range(CASES))
+def test_calculate_plan_matches_reference(seed, engine, pricing):
+    rng = random.Random(seed)
+    config = random_config(rng)
+    budget = rng.choice([rng.randint(1, 50_000), rng.randint(50_000, 2_000_000), rng.randint(2_000_000, 30_000_000)])
+    days = rng.choice([1, 2, rng.randint(3, 60), rng.randint(60, 400)])
+    rows, total_list, logs = engine.calculate_plan(config, budget, days)
+    ref_rows, ref_total, ref_logs = calculate_plan_data(config, budget, days, *pricing, REGIONS_ORDER)
+    assert rows == ref_rows
+    assert total_list == ref_total
+    assert logs == ref_logs
+
+SWEEP_CONFIG = {"全家廣播": {"is_national": True, "regions": ["全省"], "sec_shares": {10: 40, 20: 60}, "share": 50},
+                "新鮮視": {"is_national": False, "regions": ["北區", "中區"], "sec_shares": {15: 100}, "share": 30},
+                "家樂福": {"regions": ["全省"], "sec_shares": {10: 50, 20: 50}, "share": 20}}
+
+@pytest.mark.parametrize("share_step, sec_step", [(20, 50), (25, 25), (5, 100)])
+def test_sweep_metrics_match_calculate_plan(share_step, sec_step, engine, pricing):
+    df, scenarios, _ = sweep_scenarios(engine, SWEEP_CONFIG, 3_000_000, 31, share_step, sec_step, top_n=5)
+    for rec, scenario in zip(df.to_dict("records"), scenarios):
+        assert sum([c["share"] for c in scenario.values()]) == 100
+        assert all([c["share"] % share_step == 0 for c in scenario.values()])
+        rows, total_list, _ = calculate_plan_data(scenario, 3_000_000, 31, *pricing, REGIONS_ORDER)
+        assert (sum([r["spots"] for r in rows]), total_list) == (rec["總檔次"], rec["定價合計"])
+
+@pytest.mark.parametrize("share_step, sec_step", [(30, 25), (10, 30), (0, 25), (10, 200)])
+def test_sweep_rejects_steps_not_dividing_100(share_step, sec_step, engine):
+    with pytest.raises(ValueError, match="整除 100"):
+        sweep_scenarios(engine, SWEEP_CONFIG, 3_000_000, 31, share_step, sec_step)
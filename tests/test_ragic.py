@@ -0,0 +1,34 @@
+"""
+post_to_ragic 的可重試判斷：只有確定 Ragic 沒有收到資料時才交給工作佇列重送。
+"""
+import socket
+
+import pytest
+
+from cuesheet import httpclient, ragic
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(httpclient, "HTTP_BACKOFF_BASE", 0)
+    c = httpclient.HttpClient(endpoints={"ragic": {"timeout": (2, 5), "retries": 0}})
+    monkeypatch.setattr(ragic, "get_http_client", lambda: c)
+    yield c
+    c.close()
+
+@pytest.mark.parametrize("status, retryable", [(429, True), (503, True), (500, False), (502, False), (504, False), (400, False)])
+def test_status_retryable(stand_in, client, status, retryable):
+    stand_in.script = [status]
+    ok, msg, can_retry = ragic.post_to_ragic(stand_in.url, "key", {"a": "1"})
+    assert not ok and can_retry is retryable
+    if status in ragic.RAGIC_UNKNOWN_STATUS: assert "確認" in msg
+
+def test_disconnect_after_send_is_not_retryable(stand_in, client):
+    stand_in.script = ["drop"]
+    ok, msg, can_retry = ragic.post_to_ragic(stand_in.url, "key", {"a": "1"})
+    assert not ok and not can_retry and "確認" in msg
+
+def test_connection_refused_is_retryable(client):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0)); port = sock.getsockname()[1]
+    ok, _, can_retry = ragic.post_to_ragic(f"http://127.0.0.1:{port}/", "key", {"a": "1"})
+    assert not ok and can_retry
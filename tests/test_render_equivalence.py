@@ -0,0 +1,117 @@
+"""
+三種格式的版面一致性：xlsxwriter 與 openpyxl 兩種 Excel 後端輸出的儲存格值 / 合併範圍 / Total 列必須相同；
+列印用 HTML (原生 PDF) 的主表格逐列對應 Excel 第 1 列起，文字、合併範圍與 Total 列也須與 openpyxl 版本一致。
+"""
+import io
+import re
+from datetime import date, datetime, timedelta
+from html.parser import HTMLParser
+
+import openpyxl
+import pytest
+
+from cuesheet import excel, helpers, pdf
+from cuesheet.excel import EXCEL_BACKEND_OPENPYXL, EXCEL_BACKEND_XLSXWRITER
+
+FORMATS = ("東吳", "聲活", "鉑霖")
+START = date(2026, 3, 1)
+END = START + timedelta(days=30)
+
+@pytest.fixture(autouse=True)
+def no_logo(monkeypatch):
+    monkeypatch.setattr(excel, "get_cloud_logo_bytes", lambda: None)
+    monkeypatch.setattr(pdf, "get_cloud_logo_bytes", lambda: None)
+
+def _args(sample_plan):
+    rows = sample_plan[0]
+    return (START, END, "客戶", "產品", rows, helpers.get_remarks_text(START, "2026年3月", START), 3_000_000, 10000, "業務")
+
+def _sheet(fmt, sample_plan, backend):
+    data = excel.generate_excel_from_scratch(fmt, *_args(sample_plan), backend=backend)
+    return openpyxl.load_workbook(io.BytesIO(data)).active
+
+def _merges(ws, max_row=None):
+    return {(m.min_row, m.min_col, m.max_row, m.max_col) for m in ws.merged_cells.ranges if max_row is None or m.max_row <= max_row}
+
+def _total_row(ws):
+    return next(r for r in range(1, ws.max_row + 1) if ws.cell(r, 5).value == "Total")
+
+class _TableGrid(HTMLParser):
+    """只收第一層 <table> 的儲存格：每列為 [colspan, rowspan, 文字]，<br> 轉成換行。"""
+    def __init__(self):
+        super().__init__()
+        self.rows, self.depth, self.cell, self.done = [], 0, None, False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table": self.depth += 1
+        if self.done or self.depth != 1: return
+        a = dict(attrs)
+        if tag == "tr": self.rows.append([])
+        elif tag == "td": self.cell = [int(a.get("colspan", 1)), int(a.get("rowspan", 1)), ""]
+        elif tag == "br" and self.cell is not None: self.cell[2] += "\n"
+
+    def handle_endtag(self, tag):
+        if tag == "td" and self.cell is not None and self.depth == 1: self.rows[-1].append(self.cell); self.cell = None
+        if tag == "table":
+            self.depth -= 1
+            if self.depth == 0 and self.rows: self.done = True
+
+    def handle_data(self, data):
+        if self.cell is not None: self.cell[2] += data
+
+def _html_grid(html):
+    """把 rowspan / colspan 展開成 {(列, 欄): 文字} 與合併範圍集合，座標與 openpyxl 相同 (從 1 起算)。"""
+    p = _TableGrid(); p.feed(html)
+    grid, merges, taken = {}, set(), set()
+    for r, cells in enumerate(p.rows, 1):
+        c = 1
+        for cs, rs, text in cells:
+            while (r, c) in taken: c += 1
+            grid[(r, c)] = text
+            if cs > 1 or rs > 1: merges.add((r, c, r + rs - 1, c + cs - 1))
+            taken.update((r + i, c + j) for i in range(rs) for j in range(cs))
+            c += cs
+    return grid, merges, len(p.rows)
+
+def _html_value(text):
+    """列印版的金額 / 數字帶 $ 與千分位，轉回與 Excel 相同的數值。"""
+    text = text.strip()
+    num = text.replace("$", "").replace(",", "")
+    if re.fullmatch(r"-?\d+", num): return int(num)
+    if re.fullmatch(r"-?\d+\.\d+", num): return float(num)
+    return text
+
+def _xl_value(v):
+    if v is None: return ""
+    if isinstance(v, datetime): return f"{v.month}/{v.day}"
+    return v
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_excel_backends_match(fmt, sample_plan):
+    a, b = _sheet(fmt, sample_plan, EXCEL_BACKEND_OPENPYXL), _sheet(fmt, sample_plan, EXCEL_BACKEND_XLSXWRITER)
+    assert (a.max_row, a.max_column) == (b.max_row, b.max_column)
+    for r in range(1, a.max_row + 1):
+        for c in range(1, a.max_column + 1):
+            assert a.cell(r, c).value == b.cell(r, c).value, (r, c)
+    assert _merges(a) == _merges(b)
+    ra, rb = _total_row(a), _total_row(b)
+    assert ra == rb
+    assert [a.cell(ra, c).value for c in range(1, a.max_column + 1)] == [b.cell(rb, c).value for c in range(1, b.max_column + 1)]
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_print_html_matches_excel(fmt, sample_plan):
+    ws = _sheet(fmt, sample_plan, EXCEL_BACKEND_OPENPYXL)
+    html, _ = pdf.generate_print_html(fmt, *_args(sample_plan))
+    grid, html_merges, n = _html_grid(html)
+    total = _total_row(ws)
+    assert n >= total
+    for r in range(1, n + 1):
+        for c in range(1, ws.max_column + 1):
+            assert _html_value(grid.get((r, c), "")) == _xl_value(ws.cell(r, c).value), (r, c)
+    # Total 列整列一致 (金額、檔次、每日合計)
+    assert [_html_value(grid.get((total, c), "")) for c in range(1, ws.max_column + 1)] == [_xl_value(ws.cell(total, c).value) for c in range(1, ws.max_column + 1)]
+    # Excel 的合併在 HTML 都要有對應的 rowspan / colspan；HTML 可以多合併 (Excel 靠文字溢出顯示的區塊)。
+    # 鉑霖標題列例外：Excel 整列合併、Logo 浮在上面，HTML 則切出右側兩欄放 Logo。
+    expected = _merges(ws, n)
+    if fmt == "鉑霖": expected.discard((1, 1, 1, ws.max_column))
+    assert expected <= html_merges
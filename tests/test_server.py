@@ -0,0 +1,41 @@
+"""
+REST 服務的連線處理：閒置的 keep-alive 連線不得長期佔住執行緒池，PDF 的 ETag 依引擎區分。
+"""
+import http.client
+import socket
+import threading
+
+import pytest
+
+from cuesheet import server
+
+@pytest.fixture
+def httpd(monkeypatch):
+    monkeypatch.setattr(server.CueSheetHandler, "timeout", 0.5)
+    srv = server.CueSheetHTTPServer(("127.0.0.1", 0), workers=2, queue_limit=4, quiet=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown(); srv.server_close()
+
+def _idle_keepalive(port):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    sock.sendall(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n")
+    assert sock.recv(65536).startswith(b"HTTP/1.1 200")
+    return sock
+
+def test_idle_keepalive_connections_do_not_block_workers(httpd):
+    port = httpd.server_address[1]
+    idle = [_idle_keepalive(port) for _ in range(httpd.workers)]   # 佔滿所有工作執行緒後不再送請求
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", "/metrics")
+        assert conn.getresponse().status == 200
+        conn.close()
+    finally:
+        for sock in idle: sock.close()
+
+def test_pdf_etag_depends_on_engine():
+    key = "k" * 64
+    assert server.render_etag(key, "pdf", engine=server.PDF_ENGINE_NATIVE) != server.render_etag(key, "pdf", engine=server.PDF_ENGINE_SOFFICE)
+    assert server.render_etag(key, "xlsx", engine=server.PDF_ENGINE_NATIVE) == server.render_etag(key, "xlsx", engine=server.PDF_ENGINE_SOFFICE)
+    assert server.render_etag(key, "html", "week") != server.render_etag(key, "html")
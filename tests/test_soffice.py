@@ -0,0 +1,72 @@
+"""
+SofficePool 命令列模式 (未安裝 python3-uno)：以假的 soffice 指令確認冷啟動次數與模式有回報、
+設定檔目錄只初始化一次，以及多執行緒同時轉檔時 stats 計數正確。
+"""
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+from cuesheet import soffice
+from cuesheet.soffice import SofficePool
+
+pytestmark = pytest.mark.skipif(soffice.uno is not None, reason="測試命令列模式，需在未安裝 python3-uno 的環境執行")
+
+FAKE_SOFFICE = """#!{python}
+import os, shutil, sys
+from urllib.parse import unquote, urlparse
+args = sys.argv[1:]
+profile = unquote(urlparse([a for a in args if a.startswith("-env:UserInstallation=")][0].split("=", 1)[1]).path)
+if "--terminate_after_init" in args:
+    os.makedirs(os.path.join(profile, "user"), exist_ok=True)
+else:
+    out = args[args.index("--outdir") + 1]
+    for a in args:
+        if a.endswith(".xlsx"): shutil.copy(a, os.path.join(out, os.path.basename(a)[:-5] + ".pdf"))
+"""
+
+@pytest.fixture
+def make_pool(tmp_path):
+    path = tmp_path / "soffice"
+    path.write_text(FAKE_SOFFICE.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    pools = []
+    def make(size=1):
+        pool = SofficePool(str(path), size=size, queue_limit=32)
+        pools.append(pool)
+        deadline = time.monotonic() + 30
+        while pool.idle.qsize() < size and time.monotonic() < deadline: time.sleep(0.05)
+        return pool
+    yield make
+    for pool in pools: pool.shutdown()
+
+def test_cli_mode_reports_cold_starts_and_reuses_profile(make_pool):
+    pool = make_pool()
+    worker = pool.workers[0]
+    assert os.path.isdir(os.path.join(worker.profile_dir, "user"))
+    assert pool.snapshot()["mode"] == "CLI" and pool.snapshot()["cold_starts"] == 1   # 暖機時初始化設定檔
+
+    for i in range(3): assert pool.convert(f"xlsx-{i}".encode()) == (f"xlsx-{i}".encode(), "LibreOffice (CLI)", "")
+    assert pool.snapshot()["cold_starts"] == 4   # 每次轉檔冷啟動一次 soffice
+    assert pool.status()[0]["cold_starts"] == 4
+
+    worker.restart()   # 重啟後沿用已初始化的設定檔目錄
+    assert pool.snapshot()["cold_starts"] == 4
+
+def test_stats_are_counted_under_concurrency(make_pool):
+    pool = make_pool(size=2)
+    errors = []
+    def run():
+        for i in range(5):
+            out = pool.convert_many([b"a", b"b"])
+            if [res[0] for res in out] != [b"a", b"b"]: errors.append(out)
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    snap = pool.snapshot()
+    assert (snap["jobs"], snap["failed"], snap["rejected"], snap["timeouts"]) == (80, 0, 0, 0)
+    assert sum([w["jobs"] for w in pool.status()]) == 80